@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inkrementaalinen EWMA-tuotto­kovarianssi (per timeframe).
+
+Jokainen baarin sulkeutuminen päivittää log-tuottojen EWMA-keskiarvon ja
+-kovarianssin O(k²):lla k symbolille – ei pivotointia eikä .corr()-uudelleen-
+laskentaa päätöshetkellä:
+
+    eng = get_engine("1h")
+    eng.update(start, {"EURUSD": 1.0831, "US500": 5120.5})   # yksi poikkileikkaus
+    eng.add_frame(symbol, df); eng.commit()                 # trade_engine: kynttilät -> tila
+    eng.attach(stream)                                      # market_stream "bar" -tapahtumat
+
+Päivitys (West 1979, paino a = 1 - lam, lam = 0.5**(1/halflife)):
+
+    d    = r - mu
+    mu  += a * d
+    S    = lam * (S + a * d d')
+
+Puuttuvat symbolit jätetään pois kyseiseltä baarilta (vain havaittujen alimatriisi
+päivitetään), ja niiden edellinen close unohdetaan: seuraava tuotto lasketaan
+vasta kahdesta peräkkäisestä havainnosta, ei usean baarin yli. Lukuarvot ovat per baari, painot ovat signed exposure / equity:
+
+    eng.corr(), eng.cov()              DataFrame
+    eng.vol(w)                         sqrt(w' S w)
+    eng.risk_contrib(w)                w_i (S w)_i / vol, summa = vol
+    eng.var(w, 0.95)                   parametrinen VaR (z * vol - w' mu)
+    eng.var(w, 0.95, "historical")     viimeisten KEEP tuottovektorien kvantiili
+    eng.es(w, 0.95)                    historiallinen expected shortfall
+
+Tila talletetaan state/cov/<tf>.json (atominen, korkeintaan COV_SAVE_SEC välein
+ja exitissä) ja ladataan käynnistyksessä.
+"""
+from __future__ import annotations
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from statistics import NormalDist
+from typing import Callable, Deque, Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+STATE_DIR = Path(os.getenv("COV_STATE_DIR", str(ROOT / "state" / "cov")))
+HALFLIFE = float(os.getenv("COV_HALFLIFE", "60"))  # baareina
+KEEP = int(os.getenv("COV_KEEP", "500"))            # historiallisen VaR:n ikkuna
+MIN_OBS = int(os.getenv("COV_MIN_OBS", "20"))
+SAVE_SEC = float(os.getenv("COV_SAVE_SEC", "5"))
+
+_TIME_COLS = ("time", "timestamp", "ts", "date", "datetime", "start")
+
+
+def _z(alpha: float) -> float:
+    return NormalDist().inv_cdf(float(alpha))
+
+
+def _epoch_seconds(df: pd.DataFrame) -> Optional[np.ndarray]:
+    cols = {str(c).lower(): c for c in df.columns}
+    col = next((cols[c] for c in _TIME_COLS if c in cols), None)
+    s = df[col] if col is not None else (pd.Series(df.index) if isinstance(df.index, pd.DatetimeIndex) else None)
+    if s is None:
+        return None
+    if pd.api.types.is_numeric_dtype(s):
+        v = s.astype("int64").to_numpy()
+        return v // 1000 if len(v) and v.max() > 10**11 else v  # ms -> s
+    t = pd.to_datetime(s, utc=True, errors="coerce")
+    if t.isna().any():
+        return None
+    return ((t - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)).astype("int64").to_numpy()
+
+
+class EwmaCov:
+    def __init__(self, tf: str = "1h", halflife: float = HALFLIFE, keep: int = KEEP,
+                 path: Optional[Path] = None, min_obs: int = MIN_OBS):
+        self.tf = str(tf)
+        self.halflife = float(halflife)
+        self.lam = 0.5 ** (1.0 / self.halflife)
+        self.keep = int(keep)
+        self.min_obs = int(min_obs)
+        self.path = Path(path) if path else None
+        self.symbols: List[str] = []
+        self._ix: Dict[str, int] = {}
+        self.mu = np.zeros(0)
+        self.S = np.zeros((0, 0))
+        self.n = np.zeros(0, dtype=np.int64)
+        self.prev = np.full(0, np.nan)   # viimeisin close per symboli
+        self.last: Optional[int] = None  # viimeisimmän foldatun baarin alku (epoch s)
+        self.hist: Deque[np.ndarray] = deque(maxlen=self.keep)
+        self._pending: Dict[int, Dict[str, float]] = {}
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._saved_at = 0.0
+        self.load()
+
+    # ---- rakenne ----
+    def _index(self, sym: str) -> int:
+        i = self._ix.get(sym)
+        if i is None:
+            i = self._ix[sym] = len(self.symbols)
+            self.symbols.append(sym)
+            k = len(self.symbols)
+            self.mu = np.append(self.mu, 0.0)
+            S = np.zeros((k, k))
+            S[:-1, :-1] = self.S
+            self.S = S
+            self.n = np.append(self.n, 0)
+            self.prev = np.append(self.prev, np.nan)
+        return i
+
+    # ---- päivitykset ----
+    def update(self, start: int, closes: Mapping[str, float]) -> bool:
+        """Fold one cross-section of closes; bars not newer than the state are ignored."""
+        start = int(start)
+        with self._lock:
+            if self.last is not None and start <= self.last:
+                return False
+            idx, px = [], []
+            for sym, c in closes.items():
+                c = float(c)
+                if c > 0 and math.isfinite(c):
+                    idx.append(self._index(str(sym).upper()))
+                    px.append(c)
+            self.last = start
+            if not idx:
+                return True
+            idx_a, px_a = np.asarray(idx), np.asarray(px)
+            prev = self.prev[idx_a]
+            fresh = np.full(len(self.symbols), np.nan)
+            fresh[idx_a] = px_a
+            self.prev = fresh  # poissaolleille ei lasketa monen baarin tuottoa
+            have = np.isfinite(prev)
+            if have.any():
+                j = idx_a[have]
+                r = np.log(px_a[have] / prev[have])
+                a = 1.0 - self.lam
+                d = r - self.mu[j]
+                self.mu[j] += a * d
+                g = np.ix_(j, j)
+                self.S[g] = self.lam * (self.S[g] + a * np.outer(d, d))
+                self.n[j] += 1
+                vec = np.full(len(self.symbols), np.nan)
+                vec[j] = r
+                self.hist.append(vec)
+            self._dirty = True
+        self._maybe_save()
+        return True
+
+    def add_close(self, symbol: str, start: int, close: float):
+        """Buffer one closed bar; commit() (or a newer bar via on_bar) folds it."""
+        start = int(start)
+        with self._lock:
+            if self.last is None or start > self.last:
+                self._pending.setdefault(start, {})[str(symbol).upper()] = float(close)
+
+    def add_frame(self, symbol: str, df: pd.DataFrame, closed_before: Optional[int] = None) -> int:
+        """Buffer closes of df newer than the state (rows starting at/after closed_before are skipped)."""
+        if df is None or len(df) == 0:
+            return 0
+        lower = {str(c).lower(): c for c in df.columns}
+        ts = _epoch_seconds(df)
+        if "close" not in lower or ts is None:
+            return 0
+        c = df[lower["close"]].astype(float).to_numpy()
+        m = np.ones(len(ts), dtype=bool)
+        if self.last is not None:
+            m &= ts > self.last
+        if closed_before is not None:
+            m &= ts < int(closed_before)
+        sel = np.flatnonzero(m)[-self.keep:]
+        sym = str(symbol).upper()
+        with self._lock:
+            for t, v in zip(ts[sel].tolist(), c[sel].tolist()):
+                self._pending.setdefault(int(t), {})[sym] = v
+        return len(sel)
+
+    def commit(self, before: Optional[int] = None) -> int:
+        """Fold buffered cross-sections in time order (only starts < before, if given)."""
+        with self._lock:
+            starts = sorted(t for t in self._pending if before is None or t < before)
+            for t in starts:
+                self.update(t, self._pending.pop(t))
+        return len(starts)
+
+    def on_bar(self, bar) -> None:
+        """market_stream "bar" subscriber: a newer bar completes every older cross-section."""
+        if bar.tf != self.tf:
+            return
+        self.add_close(bar.symbol, bar.start, bar.close)
+        self.commit(before=bar.start)
+
+    def attach(self, stream) -> Callable[[], None]:
+        return stream.subscribe("bar", self.on_bar)
+
+    # ---- luku ----
+    def ready(self, symbols: Optional[Iterable[str]] = None) -> List[str]:
+        """Symbols with at least min_obs folded returns."""
+        syms = self.symbols if symbols is None else [str(s).upper() for s in symbols]
+        return [s for s in syms if s in self._ix and self.n[self._ix[s]] >= self.min_obs]
+
+    def _sel(self, symbols: Optional[Iterable[str]]) -> List[str]:
+        return list(self.symbols) if symbols is None else [s for s in (str(x).upper() for x in symbols) if s in self._ix]
+
+    def cov(self, symbols: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        syms = self._sel(symbols)
+        j = [self._ix[s] for s in syms]
+        return pd.DataFrame(self.S[np.ix_(j, j)], index=syms, columns=syms)
+
+    def corr(self, symbols: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        c = self.cov(symbols)
+        sd = np.sqrt(np.diag(c.to_numpy()))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = c.to_numpy() / np.outer(sd, sd)
+        r = np.nan_to_num(r, nan=0.0, posinf=0.0, neginf=0.0)
+        np.fill_diagonal(r, 1.0)
+        return pd.DataFrame(np.clip(r, -1.0, 1.0), index=c.index, columns=c.columns)
+
+    def _w(self, weights: Mapping[str, float]):
+        items = [(self._ix[s], float(w)) for s, w in ((str(k).upper(), v) for k, v in weights.items()) if s in self._ix]
+        j = np.asarray([i for i, _ in items], dtype=int)
+        return j, np.asarray([w for _, w in items], dtype=float)
+
+    def vol(self, weights: Mapping[str, float]) -> float:
+        j, w = self._w(weights)
+        return float(math.sqrt(max(w @ self.S[np.ix_(j, j)] @ w, 0.0))) if len(j) else 0.0
+
+    def risk_contrib(self, weights: Mapping[str, float]) -> Dict[str, float]:
+        """Euler contributions w_i (S w)_i / vol; they sum to vol."""
+        j, w = self._w(weights)
+        if not len(j):
+            return {}
+        sw = self.S[np.ix_(j, j)] @ w
+        v = math.sqrt(max(float(w @ sw), 0.0))
+        rc = w * sw / v if v > 0 else np.zeros_like(w)
+        return {self.symbols[i]: float(x) for i, x in zip(j, rc)}
+
+    def _pnl_hist(self, weights: Mapping[str, float]) -> np.ndarray:
+        j, w = self._w(weights)
+        if not len(j) or not self.hist:
+            return np.zeros(0)
+        k = len(self.symbols)
+        R = np.vstack([np.pad(v, (0, k - len(v)), constant_values=np.nan) for v in self.hist])[:, j]
+        return np.nan_to_num(R, nan=0.0) @ w
+
+    def var(self, weights: Mapping[str, float], alpha: float = 0.95, method: str = "parametric") -> float:
+        """Loss (positive number, fraction of equity per bar) not exceeded with probability alpha."""
+        if method == "historical":
+            pnl = self._pnl_hist(weights)
+            return float(max(-np.quantile(pnl, 1.0 - alpha), 0.0)) if len(pnl) else 0.0
+        j, w = self._w(weights)
+        mean = float(w @ self.mu[j]) if len(j) else 0.0
+        return float(max(_z(alpha) * self.vol(weights) - mean, 0.0))
+
+    def es(self, weights: Mapping[str, float], alpha: float = 0.95) -> float:
+        pnl = self._pnl_hist(weights)
+        if not len(pnl):
+            return 0.0
+        tail = pnl[pnl <= np.quantile(pnl, 1.0 - alpha)]
+        return float(max(-tail.mean(), 0.0))
+
+    def snapshot(self, weights: Optional[Mapping[str, float]] = None, alpha: float = 0.95) -> dict:
+        """JSON-friendly summary for risk_state.json / dashboards."""
+        out = {"tf": self.tf, "last": self.last, "halflife": self.halflife, "bars": len(self.hist),
+               "symbols": {s: {"vol": float(math.sqrt(max(self.S[i, i], 0.0))), "n": int(self.n[i])}
+                           for s, i in self._ix.items()},
+               "corr_matrix": self.corr(self.ready()).round(3).to_dict()}
+        if weights:
+            out["portfolio"] = {"vol": self.vol(weights), "VaR": self.var(weights, alpha),
+                                "VaR_hist": self.var(weights, alpha, "historical"), "ES": self.es(weights, alpha),
+                                "contrib": self.risk_contrib(weights), "alpha": alpha}
+        return out
+
+    # ---- persistenssi ----
+    def load(self):
+        if not self.path or not self.path.exists():
+            return
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception:
+            return
+        syms = list(raw.get("symbols") or [])
+        k = len(syms)
+        with self._lock:
+            self.symbols = syms
+            self._ix = {s: i for i, s in enumerate(syms)}
+            self.mu = np.asarray(raw.get("mu") or [0.0] * k, dtype=float)
+            self.S = np.asarray(raw.get("cov") or np.zeros((k, k)), dtype=float).reshape(k, k)
+            self.n = np.asarray(raw.get("n") or [0] * k, dtype=np.int64)
+            self.prev = np.asarray([np.nan if p is None else p for p in raw.get("prev") or [None] * k], dtype=float)
+            self.last = raw.get("last")
+            self.hist.clear()
+            for v in raw.get("hist") or []:
+                self.hist.append(np.asarray([np.nan if x is None else x for x in v], dtype=float))
+
+    def save(self):
+        if not self.path:
+            return
+
+        def _l(a):
+            return [None if not math.isfinite(x) else x for x in a.tolist()]
+
+        with self._lock:
+            data = {"version": 1, "tf": self.tf, "halflife": self.halflife, "last": self.last,
+                    "symbols": self.symbols, "mu": self.mu.tolist(), "cov": self.S.tolist(),
+                    "n": self.n.tolist(), "prev": _l(self.prev), "hist": [_l(v) for v in self.hist]}
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def _maybe_save(self):
+        if self._dirty and time.monotonic() - self._saved_at >= SAVE_SEC:
+            try:
+                self.save()
+            except Exception as e:
+                print(f"[COV] save failed: {e}", flush=True)
+
+    def flush(self):
+        if self._dirty:
+            self.save()
+
+
+_engines: Dict[str, EwmaCov] = {}
+_elock = threading.Lock()
+
+
+def get_engine(tf: str = "1h") -> EwmaCov:
+    """Process-wide engine for tf, persisted under STATE_DIR/<tf>.json."""
+    eng = _engines.get(tf)
+    if eng is None:
+        with _elock:
+            eng = _engines.get(tf)
+            if eng is None:
+                eng = _engines[tf] = EwmaCov(tf, path=STATE_DIR / f"{tf}.json")
+                atexit.register(eng.flush)
+    return eng
+
+
+def set_engine(tf: str, eng: Optional[EwmaCov]):
+    if eng is None:
+        _engines.pop(tf, None)
+    else:
+        _engines[tf] = eng
+
+
+def engines() -> Dict[str, EwmaCov]:
+    return dict(_engines)
+
+
+def on_bar(bar) -> None:
+    """market_stream "bar" subscriber routing every tf to its engine."""
+    get_engine(bar.tf).on_bar(bar)
+
+
+def load_all(state_dir: Path = STATE_DIR) -> Dict[str, EwmaCov]:
+    """Read-only view of every persisted engine (for batch reports in another process)."""
+    out: Dict[str, EwmaCov] = {}
+    for p in sorted(Path(state_dir).glob("*.json")):
+        out[p.stem] = EwmaCov(p.stem, path=p)
+    return out
@@ -1,26 +1,118 @@
 from __future__ import annotations
+from typing import Mapping, Sequence
+
 import numpy as np
 import pandas as pd
 
-def rolling_corr_guard(returns_df: pd.DataFrame,
+def select_diversified(corr: np.ndarray,
+                       scores: np.ndarray,
+                       max_avg_corr: float,
+                       groups: Sequence[str] | None = None,
+                       group_caps: Mapping[str, int] | None = None,
+                       max_n: int | None = None,
+                       lookahead: int = 3,
+                       depth: int = 8) -> list[int]:
+    """
+    Valitse indeksit jotka maksimoivat pisteiden summan niin, että jokaisen
+    valitun keskimääräinen |korrelaatio| aiemmin valittuihin on <= max_avg_corr
+    ja ryhmäkohtaiset katot (group_caps[groups[i]]) pitävät.
+
+    Ahne valinta pisteiden mukaan, vektoroituna: jokaisella askeleella kaikkien
+    ehdokkaiden |corr|-summa valittuihin päivitetään yhdellä sarakkeella
+    (O(n) / askel). Budjetin kerran ylittänyt ehdokas suljetaan pois pysyvästi,
+    vaikka keskiarvo myöhemmin laimenisi rajan alle (kuten vanhassa
+    järjestyksessä tarkistavassa guardissa). lookahead > 1: jos parhaan ottaminen sulkisi pois jonkin
+    muun L parhaasta, kokeillaan kutakin ja valitaan se, jonka ahne täydennys
+    (depth askelta) antaa suurimman pistesumman (O(L * depth * n) / askel).
+    Ei-positiiviset ja NaN-pisteet jätetään pois. Palauttaa indeksit
+    valintajärjestyksessä.
+    """
+    s = np.asarray(scores, dtype=float)
+    n = len(s)
+    if n == 0:
+        return []
+    C = np.abs(np.nan_to_num(np.asarray(corr, dtype=float), nan=0.0))
+    if groups is not None and group_caps:
+        names, gid = np.unique(np.asarray([str(g) for g in groups]), return_inverse=True)
+        cap = np.array([group_caps.get(g, np.inf) for g in names], dtype=float)
+    else:
+        gid, cap = np.zeros(n, dtype=int), np.array([np.inf])
+    limit = n if max_n is None else int(max_n)
+    ok = np.isfinite(s) & (s > 0)
+
+    def feasible(taken, sums, k, counts, alive):
+        return alive & ~taken & (counts[gid] < cap[gid])
+
+    def take(state, j):
+        taken, sums, k, counts = state[0].copy(), state[1] + C[:, j], state[2] + 1, state[3].copy()
+        taken[j] = True
+        counts[gid[j]] += 1
+        alive = state[4] & (sums <= max_avg_corr * k + 1e-12)  # hylätty pysyy hylättynä
+        return taken, sums, k, counts, alive
+
+    def complete(state) -> float:
+        total, stop = 0.0, min(limit, state[2] + depth)
+        while state[2] < stop:
+            f = feasible(*state)
+            if not f.any():
+                break
+            j = int(np.argmax(np.where(f, s, -np.inf)))
+            total += s[j]
+            state = take(state, j)
+        return total
+
+    state = (np.zeros(n, dtype=bool), np.zeros(n), 0, np.zeros(len(cap)), ok.copy())
+    chosen: list[int] = []
+    while state[2] < limit:
+        f = np.flatnonzero(feasible(*state))
+        if not len(f):
+            break
+        top = f[np.argsort(-s[f], kind="stable")[:max(1, lookahead)]]
+        nxt = take(state, int(top[0]))
+        if len(top) == 1 or feasible(*nxt)[top[1:]].all():
+            j = int(top[0])  # paras ei sulje pois muita -> ahne riittää
+        else:
+            gains = [s[c] + complete(take(state, c)) for c in top]
+            j = int(top[int(np.argmax(gains))])  # tasapelissä korkein piste (argsort-järjestys)
+        chosen.append(j)
+        state = take(state, j)
+    return chosen
+
+def rolling_corr_guard(returns_df: pd.DataFrame | None,
                        lookback: int,
                        max_avg_corr: float,
-                       candidates: list[str]) -> list[str]:
+                       candidates: list[str],
+                       engine=None,
+                       scores: Sequence[float] | None = None,
+                       group_caps: Mapping[str, int] | None = None,
+                       max_n: int | None = None) -> list[str]:
     """
-    Pidä vähiten keskenään korreloiva alijoukko ehdokkaista.
+    Pidä vähiten keskenään korreloiva alijoukko ehdokkaista (select_diversified).
+
+    engine (core.cov_engine.EwmaCov): korrelaatio luetaan sen EWMA-tilasta eikä
+    returns_df:ää tarvita; symbolit joilla ei vielä ole tarpeeksi havaintoja
+    katsotaan korreloimattomiksi.
+    scores: odotettu pistemäärä per ehdokas; ilman sitä järjestys = prioriteetti
+    ja valinta on puhdas ahne läpikäynti (ei lookaheadia, joka ohittaisi prioriteetin).
+    group_caps: ryhmäkatot tools.corr_guard.group_of-ryhmille (esim. GROUP_CAPS).
     """
-    if returns_df.shape[0] < lookback or len(candidates) <= 1:
+    if len(candidates) <= 1:
         return candidates
-    r = returns_df.tail(lookback).pct_change().dropna().corr()
-    chosen: list[str] = []
-    for sym in candidates:
-        if not chosen:
-            chosen.append(sym); continue
-        vals = []
-        for c in chosen:
-            if sym in r.index and c in r.columns:
-                vals.append(abs(float(r.loc[sym, c])))
-        avg = np.mean(vals) if vals else 0.0
-        if not np.isnan(avg) and avg <= max_avg_corr:
-            chosen.append(sym)
-    return chosen
+    if engine is not None:
+        names = {s.upper(): s for s in candidates}
+        r = engine.corr(engine.ready(candidates)).rename(index=names, columns=names)
+    elif returns_df is None or returns_df.shape[0] < lookback:
+        r = None
+    else:
+        r = returns_df.tail(lookback).pct_change().dropna().corr()
+    if r is None and not group_caps and max_n is None:
+        return candidates
+    n = len(candidates)
+    C = np.zeros((n, n)) if r is None else r.reindex(index=candidates, columns=candidates).to_numpy(dtype=float)
+    sc = np.arange(n, 0, -1, dtype=float) if scores is None else np.asarray(scores, dtype=float)
+    groups = None
+    if group_caps:
+        from tools.corr_guard import group_of
+        groups = [group_of(s) for s in candidates]
+    idx = select_diversified(C, sc, max_avg_corr, groups, group_caps, max_n, lookahead=1 if scores is None else 3)
+    return [candidates[i] for i in idx]
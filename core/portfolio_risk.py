@@ -4,6 +4,7 @@
 CapitalBot – Portfolio Risk (yhtenäinen)
 - Lukee train_history.json
 - Laskee corr-matriisin, portfolion volatiliteetin, Sharpen ja Sortinon
+- Liittää mukaan tuottopohjaiset riskiluvut core.cov_engine-tilasta (EWMA, per TF)
 - Kirjoittaa data/risk_state.json
 - Lähettää Telegram-yhteenvedon (valinnainen)
 """
@@ -89,12 +90,28 @@ def compute(df: pd.DataFrame)->dict:
         print("[risk] compute fail:", e)
     return out
 
+def returns_risk() -> dict:
+    """Per-TF EWMA-kovarianssin yhteenveto; live-prosessi pitää tilan ajan tasalla."""
+    try:
+        from core import cov_engine
+    except ImportError:
+        try:
+            import cov_engine
+        except ImportError:
+            return {}
+    try:
+        return {tf: eng.snapshot() for tf, eng in cov_engine.load_all().items() if eng.symbols}
+    except Exception as e:
+        print("[risk] cov state read fail:", e)
+        return {}
+
 def main():
     df = load_history()
     if df.empty:
         print("[risk] no data")
         return
     res = compute(df)
+    res["returns"] = returns_risk()
     try:
         json.dump(res, open(RISK,"w"), indent=2)
     except Exception as e:
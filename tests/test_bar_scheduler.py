@@ -0,0 +1,79 @@
+"""Tests for the bar-close-aligned scheduler."""
+
+import asyncio
+import time
+
+from tools.bar_scheduler import BarScheduler, next_bar_close, seconds_until_next_close
+
+
+def test_next_bar_close_alignment():
+    t = 1_700_000_123.4
+    assert next_bar_close("15m", t) % 900 == 0 and 0 < next_bar_close("15m", t) - t <= 900
+    assert next_bar_close("4h", 14400.0) == 28800
+    assert next_bar_close("weird", 10.0) == 3600  # unknown TF falls back to 1h
+    assert abs(seconds_until_next_close(["1h", "15m"], grace=0.3, now=3600 * 10 + 100) - 800.3) < 1e-9
+
+
+def test_run_boundary_fires_due_jobs_and_records_lateness():
+    boundary = 3600.0 * 5
+    now = {"t": boundary + 0.25}
+    sched = BarScheduler(grace=0.0, clock=lambda: now["t"])
+    hits = []
+    sched.add_job("15m", lambda: hits.append("15m"), name="a")
+    sched.add_job("1h", lambda: hits.append("1h"), name="b")
+    sched.add_job("4h", lambda: hits.append("4h"), name="c")  # 18000 % 14400 != 0
+
+    asyncio.run(sched.run_boundary(boundary))
+
+    assert sorted(hits) == ["15m", "1h"]
+    st = sched.stats()
+    assert st["a"]["runs"] == 1 and st["c"]["runs"] == 0
+    assert abs(st["b"]["last_late_ms"] - 250.0) < 1e-6
+
+
+def test_deadline_and_errors_are_counted():
+    sched = BarScheduler(grace=0.0)
+
+    async def slow():
+        await asyncio.sleep(1.0)
+
+    def broken():
+        raise RuntimeError("boom")
+
+    sched.add_job("15m", slow, name="slow", deadline=0.05)
+    sched.add_job("15m", broken, name="broken")
+    t0 = time.monotonic()
+    asyncio.run(sched.run_boundary(900.0))
+    assert time.monotonic() - t0 < 0.9
+
+    st = sched.stats()
+    assert st["slow"]["timeouts"] == 1
+    assert st["broken"]["errors"] == 1 and st["broken"]["last_error"] == "boom"
+
+
+def test_timed_out_sync_job_blocks_next_run_until_thread_ends():
+    sched = BarScheduler(grace=0.0)
+    release = __import__("threading").Event()
+    calls = []
+
+    def stuck():
+        calls.append(1)
+        release.wait(2.0)
+
+    sched.add_job("15m", stuck, name="stuck", deadline=0.05)
+
+    async def scenario():
+        await sched.run_boundary(900.0)
+        assert sched.jobs[0].running  # thread still busy after the deadline
+        await sched.run_boundary(1800.0)
+        release.set()
+        for _ in range(100):
+            if not sched.jobs[0].running:
+                break
+            await asyncio.sleep(0.01)
+        assert not sched.jobs[0].running
+        await sched.run_boundary(2700.0)
+
+    asyncio.run(scenario())
+    st = sched.stats()
+    assert st["stuck"]["timeouts"] == 1 and st["stuck"]["skipped"] == 1 and len(calls) == 2
@@ -0,0 +1,60 @@
+"""Tests for cycle-level batched inference."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools import model_cache
+from tools.batch_infer import InferenceJob, predict_batch
+
+
+class _CountingModel:
+    def __init__(self):
+        self.calls = 0
+
+    def predict_proba(self, X):
+        self.calls += 1
+        p = 1.0 / (1.0 + np.exp(-X["f1"].to_numpy(dtype=float)))
+        return np.column_stack([1.0 - p, p])
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    model_cache.clear()
+    yield
+    model_cache.clear()
+
+
+def _features(value):
+    return pd.DataFrame({"f1": [0.0, value], "f2": [1.0, 2.0]})
+
+
+def _cfg(fname):
+    return {"features": ["f1", "f2"], "models": {"gbdt": {"file": fname}}}
+
+
+def test_one_predict_per_artefact(tmp_path):
+    (tmp_path / "shared.joblib").write_bytes(b"x")
+    model = _CountingModel()
+    jobs = [
+        InferenceJob("EURUSD", "1h", features=_features(0.0), config=_cfg("shared.joblib")),
+        InferenceJob("GBPUSD", "1h", features=_features(2.0), config=_cfg("shared.joblib")),
+        InferenceJob("USDJPY", "1h", features=_features(-2.0), config=_cfg("shared.joblib")),
+    ]
+    out = predict_batch(jobs, model_dir=tmp_path, loader=lambda p: model)
+
+    assert model.calls == 1
+    assert out[("EURUSD", "1h")]["gbdt"] == pytest.approx(0.5)
+    assert out[("GBPUSD", "1h")]["gbdt"] > 0.5 > out[("USDJPY", "1h")]["gbdt"]
+
+
+def test_missing_config_and_artefact_are_reported(tmp_path):
+    jobs = [
+        InferenceJob("GOLD", "4h", features=_features(1.0), config=None),
+        InferenceJob("AAPL", "4h", features=_features(1.0), config=_cfg("nope.joblib")),
+    ]
+    out = predict_batch(jobs, model_dir=tmp_path, loader=lambda p: _CountingModel())
+
+    assert out == {("GOLD", "4h"): {}, ("AAPL", "4h"): {}}
+    assert jobs[0].errors == ["no_config"]
+    assert jobs[1].errors == ["missing nope.joblib"]
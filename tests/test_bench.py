@@ -0,0 +1,43 @@
+"""Smoke tests for the offline benchmark runner."""
+
+import json
+
+from tools import bench
+
+
+def test_synthetic_is_deterministic():
+    a, b = bench.synthetic_ohlcv(500, seed=3), bench.synthetic_ohlcv(500, seed=3)
+    assert a.equals(b)
+    assert (a["high"] >= a[["open", "close"]].max(axis=1)).all()
+    assert (a["low"] <= a[["open", "close"]].min(axis=1)).all()
+
+
+def test_run_small_and_compare(tmp_path):
+    res = bench.run(["features", "exec_sim", "metrics", "label_meta", "backtest_engine"],
+                    sizes=[1000, 20_000], repeat=1, log=lambda s: None)
+    rows = {(r["case"], r["n"]): r for r in res["results"]}
+    assert all("error" not in r for r in rows.values()), rows
+    assert rows[("features", 1000)]["peak_mb"] > 0
+    assert "skipped" in rows[("backtest_engine", 20_000)]
+
+    out = tmp_path / "r.json"
+    assert bench.main(["--cases", "metrics", "--sizes", "1000", "--repeat", "1", "--out", str(out)]) == 0
+    base = json.loads(out.read_text())
+    slow = json.loads(json.dumps(base))
+    slow["results"][0]["seconds"] *= 10
+    assert bench.compare(base, base) == []
+    assert [r["case"] for r in bench.compare(slow, base)] == ["metrics"]
+
+
+def test_compare_reports_errors_and_vanished_rows():
+    base = {"results": [{"case": "metrics", "n": 1000, "seconds": 0.1},
+                        {"case": "features", "n": 1000, "seconds": 0.1},
+                        {"case": "old_case", "n": 1000, "seconds": 0.1},
+                        {"case": "exec_sim", "n": 1000, "seconds": 0.1}]}
+    cur = {"results": [{"case": "metrics", "n": 1000, "error": "ValueError: boom"},
+                       {"case": "features", "n": 1000, "skipped": "n > max_n=10"}]}
+    regs = {(r["case"], r["n"]): r for r in bench.compare(cur, base)}
+    assert regs[("metrics", 1000)]["error"] == "ValueError: boom"
+    assert regs[("features", 1000)]["missing"].startswith("n > max_n")
+    assert regs[("old_case", 1000)]["missing"] == "case removed"
+    assert ("exec_sim", 1000) not in regs  # ei ajettu tällä kertaa
@@ -0,0 +1,84 @@
+"""Tests for the shared dashboard producer (file-watch + JSON Patch deltas)."""
+
+import asyncio
+import json
+import os
+
+from ui.broadcaster import Broadcaster, apply_patch, downsample, equity_view, json_patch
+
+
+def _write(p, obj, bump):
+    p.write_text(json.dumps(obj))
+    os.utime(p, ns=(bump, bump))  # varma mtime-muutos nopeissa testeissä
+
+
+def test_patch_roundtrip():
+    old = {"positions": {"GOLD": {"size": 1}, "EURUSD": {"size": 2}}, "train": [1, 2, 3], "x/y": 1}
+    new = {"positions": {"GOLD": {"size": 1.5}}, "train": [1, 2, 3, 4], "x/y": 2, "risk": {"dd": 0.1}}
+    ops = json_patch(old, new)
+    assert apply_patch(json.loads(json.dumps(old)), ops) == new
+    assert {"op": "add", "path": "/train/-", "value": 4} in ops
+    assert json_patch(new, new) == []
+
+
+def test_downsample_tail_is_stable():
+    a = downsample(list(range(1000)), 100)
+    b = downsample(list(range(1001)), 100)
+    assert len(a) <= 100 and a[0] == 0 and a[-1] == 999 and b[-1] == 1000
+    assert len(json_patch(a, b)) <= 2  # vain häntä muuttuu
+
+
+def test_broadcaster_parses_once_and_fans_out(tmp_path):
+    pos, eq = tmp_path / "pos.json", tmp_path / "eq.json"
+    _write(pos, {"positions": {}}, 10**18)
+    _write(eq, {"entries": [{"equity": i} for i in range(2000)]}, 10**18)
+    bus = Broadcaster({"positions": pos, "equity": eq}, views={"equity": equity_view}, queue_size=2)
+    bus.poll()
+    assert bus.parses == 2 and bus.state["equity"]["total"] == 2000
+    assert len(bus.state["equity"]["entries"]) <= 500
+    assert bus.page("equity", "entries", 1990, 50)["entries"][-1] == {"equity": 1999}
+
+    async def scenario():
+        snaps = [bus.subscribe() for _ in range(3)]
+        state = [json.loads(s)["data"] for s, _ in snaps]
+        assert bus.poll() == [] and bus.parses == 2  # ei muutosta -> ei parsintaa
+
+        _write(pos, {"positions": {"GOLD": {"side": "LONG"}}}, 2 * 10**18)
+        bus.publish(bus.poll())
+        assert bus.parses == 3
+        msgs = [q.get_nowait() for _, q in snaps]
+        assert len(set(msgs)) == 1  # sama serialisoitu viesti kaikille
+        m = json.loads(msgs[0])
+        for st in state:
+            assert apply_patch(st, m["ops"]) == bus.state
+
+        # täysi jono -> snapshot
+        slow = snaps[0][1]
+        for i in range(3):
+            _write(pos, {"positions": {"GOLD": {"side": "LONG", "i": i}}}, (3 + i) * 10**18)
+            bus.publish(bus.poll())
+        assert slow.qsize() == 1
+        last = json.loads(slow.get_nowait())
+        assert last["type"] == "snapshot" and last["data"] == bus.state
+
+    asyncio.run(scenario())
+
+
+def test_subscriber_during_read_gets_snapshot_then_patch(tmp_path):
+    pos = tmp_path / "pos.json"
+    _write(pos, {"positions": {}}, 10**18)
+    bus = Broadcaster({"positions": pos})
+    bus.poll()
+
+    async def scenario():
+        _write(pos, {"positions": {"GOLD": {"side": "LONG"}}}, 2 * 10**18)
+        changed = bus._read()  # run(): säikeessä, tila ennallaan
+        snap, q = bus.subscribe()
+        snap = json.loads(snap)
+        assert snap["data"] == {"positions": {"positions": {}}}
+        bus.publish(bus._apply(changed))
+        m = json.loads(q.get_nowait())
+        assert m["version"] == snap["version"] + 1
+        assert apply_patch(snap["data"], m["ops"]) == bus.state
+
+    asyncio.run(scenario())
@@ -0,0 +1,78 @@
+"""End-to-end tests of the real HTTP clients against the local Capital mock."""
+
+import time
+
+import pytest
+import requests
+
+from tools import capital_session as cs
+from tools import sync_positions as sp
+from tools.capital_mock import MockCapital, MockConfig
+from tools.ops_runtime import HTTP_429
+
+
+@pytest.fixture
+def mock(monkeypatch, tmp_path):
+    def start(**kw):
+        m = MockCapital(MockConfig(symbols=("EURUSD", "US500", "BTCUSD"), history_bars=1000, **kw)).start()
+        for k, v in m.env().items():
+            monkeypatch.setenv(k, v)
+        monkeypatch.setattr(cs, "SESSION_PATH", tmp_path / "sess.json")
+        monkeypatch.setattr(cs, "COOKIES_PATH", tmp_path / "cookies.pkl")
+        monkeypatch.setattr(cs, "EPIC_CACHE_PATH", tmp_path / "epics.json")
+        monkeypatch.setattr(cs, "_CAPITAL_SESS", None)
+        monkeypatch.setattr(cs, "_COOLDOWN_UNTIL", 0.0)
+        monkeypatch.setattr(cs, "_RATE_LIMIT_SLEEP", 0)
+        monkeypatch.setattr(cs, "_CANDLES_429_MIN_SLEEP", 0)
+        started.append(m)
+        return m
+
+    started = []
+    yield start
+    for m in started:
+        m.stop()
+
+
+def test_paged_candles_with_429_bursts(mock):
+    m = mock(burst_every=4, burst_len=2)
+    before = HTTP_429.value(endpoint="prices") or 0
+    df = cs.capital_get_candles_df("EURUSD", "1h", total_limit=450, page_size=200, sleep_sec=0)
+    assert len(df) == 450 and df["time"].is_unique and df["time"].is_monotonic_increasing
+    assert (df["high"] >= df["low"]).all()
+    st = m.stats()
+    assert st["faults"]["429"] > 0 and (HTTP_429.value(endpoint="prices") or 0) > before
+    assert st["by_path"]["GET /api/v1/markets"] == 1  # epic haettu kerran
+
+
+def test_orders_positions_and_sync(mock):
+    m = mock()
+    s = requests.Session()
+    assert sp.capital_login(s)
+    base = m.base
+    r = s.post(f"{base}/api/v1/positions", json={"epic": "US500", "direction": "BUY", "size": 2, "stopLevel": 1.0})
+    ref = r.json()["dealReference"]
+    conf = s.get(f"{base}/api/v1/confirms/{ref}").json()
+    assert conf["dealStatus"] == "ACCEPTED"
+
+    raw, path = sp.fetch_positions(s)
+    pos = sp.normalize_position(raw[0])
+    assert path.startswith("/api/v1/positions")
+    assert pos["symbol"] == "US500" and pos["side"] == "LONG" and pos["size"] == 2.0 and pos["sl"] == 1.0
+
+    assert s.delete(f"{base}/api/v1/positions/{conf['dealId']}").status_code == 200
+    assert sp.fetch_positions(s)[0] == []
+    acc = s.get(f"{base}/api/v1/accounts").json()["accounts"][0]
+    assert acc["balance"]["balance"] == 10_000.0
+
+
+def test_token_expiry_and_rate_limit(mock):
+    m = mock(token_ttl=0.2, rate=5.0, burst=2)
+    s = requests.Session()
+    assert sp.capital_login(s)
+    url = f"{m.base}/api/v1/positions"
+    codes = [s.get(url).status_code for _ in range(4)]
+    assert codes[:2] == [200, 200] and 429 in codes[2:]
+    time.sleep(0.45)
+    assert s.get(url).status_code == 401
+    assert sp.capital_login(s) and s.get(url).status_code == 200
+    assert m.stats()["faults"]["401"] == 1
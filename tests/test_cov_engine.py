@@ -0,0 +1,63 @@
+"""Tests for the incremental EWMA return-covariance engine."""
+
+import numpy as np
+import pandas as pd
+
+from core import cov_engine as ce
+from core.portfolio import rolling_corr_guard
+from tools.market_stream import Bar
+
+
+def _prices(n=3000, rho=0.7, seed=0):
+    rng = np.random.default_rng(seed)
+    L = np.linalg.cholesky(np.array([[1.0, rho, 0.0], [rho, 1.0, 0.0], [0.0, 0.0, 1.0]]))
+    r = rng.standard_normal((n, 3)) @ L.T * np.array([0.01, 0.02, 0.01])
+    return 100.0 * np.exp(np.cumsum(r, axis=0))
+
+
+def test_converges_and_risk_decomposition(tmp_path):
+    px = _prices()
+    eng = ce.EwmaCov("1h", halflife=500, keep=1000, path=tmp_path / "1h.json")
+    for t, row in enumerate(px):
+        eng.update(t * 3600, dict(zip(["A", "B", "C"], row)))
+    c = eng.corr()
+    assert abs(c.loc["A", "B"] - 0.7) < 0.1 and abs(c.loc["A", "C"]) < 0.15
+    assert abs(np.sqrt(eng.cov().loc["B", "B"]) - 0.02) < 0.003
+
+    w = {"A": 0.5, "B": 0.3, "C": -0.2}
+    rc = eng.risk_contrib(w)
+    assert abs(sum(rc.values()) - eng.vol(w)) < 1e-12
+    assert 1.5 < eng.var(w, 0.95) / eng.vol(w) < 1.7
+    assert abs(eng.var(w, 0.95, "historical") / eng.var(w, 0.95) - 1) < 0.2
+    assert eng.es(w, 0.95) > eng.var(w, 0.95, "historical")
+
+    eng.save()
+    back = ce.EwmaCov("1h", halflife=500, keep=1000, path=tmp_path / "1h.json")
+    assert back.last == eng.last and np.allclose(back.S, eng.S) and len(back.hist) == len(eng.hist)
+    assert not back.update(eng.last, {"A": 1.0})  # vanha baari ohitetaan
+
+
+def test_missing_symbols_frames_and_stream():
+    eng = ce.EwmaCov("15m", halflife=20, min_obs=5)
+    t0 = 1_700_000_000
+    times = pd.to_datetime([t0 + 900 * i for i in range(40)], unit="s", utc=True)
+    px = _prices(40, seed=1)
+    eng.add_frame("A", pd.DataFrame({"time": times, "close": px[:, 0]}))
+    keep = [i for i in range(40) if i != 10]  # B puuttuu baarilta 10
+    eng.add_frame("B", pd.DataFrame({"time": times[keep], "close": px[keep, 1]}), closed_before=t0 + 900 * 30)
+    assert eng.commit() == 40
+    # 9 + 18 tuottoa: aukon yli (baari 9 -> 11) ei lasketa kahden baarin tuottoa
+    assert eng.n[eng._ix["A"]] == 39 and eng.n[eng._ix["B"]] == 27
+    assert eng.ready() == ["A", "B"]
+
+    n = eng.n.copy()
+    eng.on_bar(Bar("A", "15m", t0 + 900 * 40, 1, 1, 1, float(px[-1, 0])))
+    eng.on_bar(Bar("A", "1h", t0 + 900 * 41, 1, 1, 1, 1.0))  # eri TF ei vaikuta
+    assert (eng.n == n).all() and eng.commit(before=t0 + 900 * 41) == 1 and eng.n[0] == n[0] + 1
+
+
+def test_corr_guard_reads_engine():
+    eng = ce.EwmaCov(halflife=200, min_obs=10)
+    for t, row in enumerate(_prices(1000, rho=0.95)):
+        eng.update(t, dict(zip(["A", "B", "C"], row)))
+    assert rolling_corr_guard(None, 100, 0.5, ["a", "B", "C", "D"], engine=eng) == ["a", "C", "D"]
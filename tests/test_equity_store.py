@@ -0,0 +1,75 @@
+"""Tests for the equity time-series store (rollups + LTTB views)."""
+
+import json
+
+import numpy as np
+
+from tools import equity_store as es
+
+T0 = 1772409600.0  # 2026-03-02T00:00Z
+
+
+def test_rollups_and_late_sample(tmp_path):
+    con = es.conn(tmp_path / "eq.sqlite")
+    for i, v in enumerate([100.0, 105.0, 95.0, 101.0]):
+        es.append(v, ts=T0 + i * 10, con=con)
+    es.append(200.0, ts=T0 + 5, con=con)  # myöhässä: high päivittyy, close ei
+    bar = es.ohlc("1m", con=con)[0]
+    assert (bar["open"], bar["high"], bar["low"], bar["close"], bar["n"]) == (100.0, 200.0, 95.0, 101.0, 5)
+    assert es.ohlc("1h", con=con)[0]["close"] == es.ohlc("1d", con=con)[0]["close"] == 101.0
+    assert es.latest(con)["equity"] == 101.0
+
+
+def test_lttb_keeps_extremes_and_endpoints():
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 500.0)
+    y[4321] = 9.0
+    idx = es.lttb(x, y, 200)
+    assert len(idx) == 200 and idx[0] == 0 and idx[-1] == 9999
+    assert 4321 in idx
+    assert es.lttb([0, 1, 2], [0, 1, 2], 10) == [0, 1, 2]
+
+
+def test_views_are_bounded_and_export(tmp_path):
+    con = es.conn(tmp_path / "eq.sqlite")
+    now = T0 + 40 * 86400
+    ts = np.arange(now - 40 * 86400, now, 300.0)  # 5 min näytteet 40 päivältä
+    with con:
+        for t in ts:
+            es.append(10_000 + float(np.sin(t / 86400.0)) * 100, ts=float(t), con=con)
+    for span in es.VIEWS.values():
+        v = es.view(span, 300, now=now, con=con)
+        assert 2 < len(v) <= 300
+    doc = es.export_json(tmp_path / "equity_history.json", con=con, now=now)
+    assert set(doc["views"]) == {"1h", "1d"} and len(doc["entries"]) <= es.VIEW_POINTS
+    assert len((tmp_path / "equity_history.json").read_bytes()) < 32_000
+
+
+def test_import_legacy_history(tmp_path):
+    con = es.conn(tmp_path / "eq.sqlite")
+    legacy = tmp_path / "equity_history.json"
+    legacy.write_text(json.dumps({"entries": [
+        {"timestamp": "2026-03-02T10:00:00", "equity": 1000.0, "balance": 990.0},
+        {"timestamp": "2026-03-02T11:00:00", "equity": 1010.0, "balance": 990.0},
+    ]}))
+    assert es.import_history_json(legacy, con=con) == 2
+    assert es.import_history_json(legacy, con=con) == 0
+    assert [b["close"] for b in es.ohlc("1h", con=con)] == [1000.0, 1010.0]
+
+
+def test_record_throttles_export_and_page_reads_raw(tmp_path, monkeypatch):
+    con = es.conn(tmp_path / "eq.sqlite")
+    out = tmp_path / "equity_history.json"
+    monkeypatch.setattr(es, "conn", lambda path=None: con)
+    monkeypatch.setattr(es, "HISTORY_JSON", out)
+    monkeypatch.setattr(es, "_imported", True)
+    monkeypatch.setattr(es, "_exported_at", None)
+    exports = []
+    monkeypatch.setattr(es, "export_json", lambda *a, **k: exports.append(1))
+    for i in range(5):
+        es.record(1000.0 + i, 990.0)
+    assert len(exports) == 1  # EXPORT_MIN_SEC sisällä vain yksi vienti
+
+    p = es.page(3, 10, con=con)
+    assert p["total"] == 5 and [e["equity"] for e in p["entries"]] == [1003.0, 1004.0]
+    assert p["entries"][0]["balance"] == 990.0
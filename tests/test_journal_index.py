@@ -0,0 +1,81 @@
+"""Tests for the incremental trade journal index."""
+
+import json
+
+from tools.journal_index import JournalIndex
+
+
+def _close(sym, r, ts="2026-03-02T10:00:00Z"):
+    return {"event": "CLOSE", "symbol": sym, "ts": ts, "r_realized": r}
+
+
+def test_rollups_maintained_on_append(tmp_path):
+    idx = JournalIndex(tmp_path / "trade_journal.jsonl", max_bytes=0, keep_days=0)
+    idx.append({"event": "OPEN", "symbol": "gold", "size": 2.0, "orig_size": 2.0, "risk_per_unit": 5.0})
+    idx.append({"event": "SCALE_IN", "symbol": "GOLD", "size": 1.0, "risk_per_unit": 5.0})
+    assert idx.symbol_state("GOLD")["adds_done"] == 1
+    assert idx.open_risk() == 15.0
+
+    idx.append(_close("GOLD", 1.5))
+    idx.append(_close("EURUSD", -0.5))
+    idx.append(_close("EURUSD", 2.0, ts="2026-03-01T23:59:00+00:00"))
+    assert idx.realized_R("2026-03-02") == 1.0
+    assert idx.realized_R("2026-03-02", symbol="eurusd") == -0.5
+    assert idx.realized_R("2026-02-01") is None
+    assert idx.open_risk() == 0.0
+
+
+def test_other_writer_lines_are_tailed_and_rebuild_matches(tmp_path):
+    path = tmp_path / "trade_journal.jsonl"
+    a = JournalIndex(path, max_bytes=0, keep_days=0)
+    b = JournalIndex(path, max_bytes=0, keep_days=0)
+    a.append(_close("AAPL", 1.0))
+    assert b.realized_R("2026-03-02") == 1.0
+    with path.open("a") as f:  # legacy writer appending directly
+        f.write(json.dumps(_close("AAPL", 2.0)) + "\n")
+    assert a.realized_R("2026-03-02") == 3.0
+
+    b.rebuild()
+    assert b.realized_R("2026-03-02", "AAPL") == 3.0
+
+
+def test_rotation_keeps_rollups(tmp_path):
+    path = tmp_path / "trade_journal.jsonl"
+    idx = JournalIndex(path, max_bytes=200, keep_days=0)
+    for _ in range(10):
+        idx.append(_close("US500", 0.5))
+    rotated = list(tmp_path.glob("trade_journal.*.jsonl"))
+    assert rotated, "journal should have rotated"
+    assert idx.realized_R("2026-03-02") == 5.0
+    assert JournalIndex(path, max_bytes=200, keep_days=0).realized_R("2026-03-02") == 5.0
+
+
+def test_truncation_and_replacement_rebuild_rollups(tmp_path):
+    path = tmp_path / "trade_journal.jsonl"
+    idx = JournalIndex(path, max_bytes=0, keep_days=0)
+    for r in (1.0, 2.0, 3.0):
+        idx.append(_close("AAPL", r))
+    assert idx.realized_R("2026-03-02") == 6.0
+
+    path.write_text(json.dumps(_close("AAPL", 1.0)) + "\n")  # truncated in place
+    assert idx.realized_R("2026-03-02") == 1.0
+
+    tmp = tmp_path / "copy.jsonl"
+    tmp.write_text(path.read_text() + json.dumps(_close("AAPL", 0.5)) + "\n")
+    tmp.replace(path)  # replaced by a new inode holding the old lines again
+    assert idx.realized_R("2026-03-02") == 1.5
+    assert idx.open_risk() == 0.0
+
+
+def test_index_failure_after_write_does_not_raise(tmp_path, monkeypatch):
+    path = tmp_path / "trade_journal.jsonl"
+    idx = JournalIndex(path, max_bytes=0, keep_days=0)
+    idx.append(_close("AAPL", 1.0))
+
+    def broken():
+        raise OSError("disk full")
+    monkeypatch.setattr(idx, "_save_idx", broken)
+    idx.append(_close("AAPL", 2.0))  # line is written, index save fails silently
+    monkeypatch.undo()
+    assert len(path.read_text().splitlines()) == 2
+    assert idx.realized_R("2026-03-02") == 3.0
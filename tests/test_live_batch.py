@@ -0,0 +1,83 @@
+"""Tests for live_one scoring and the long-lived live_batch worker pool."""
+
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from joblib import dump
+from sklearn.linear_model import LogisticRegression
+
+from tools import live_batch, live_one, model_cache
+
+
+@pytest.fixture
+def live_dirs(tmp_path, monkeypatch):
+    data, models = tmp_path / "data", tmp_path / "models"
+    data.mkdir()
+    models.mkdir()
+    close = 100 + np.cumsum(np.random.default_rng(0).normal(0, 1, 300))
+    time_ = pd.date_range("2025-01-01", periods=len(close), freq="h", tz="UTC")
+    pd.DataFrame({"time": time_, "open": close, "high": close, "low": close, "close": close}).to_csv(
+        data / "BTCUSD_1h.csv", index=False)
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(200, 5))
+    clf = LogisticRegression().fit(X, (X[:, 0] > 0).astype(int))  # 5 featurea -> padataan
+    dump(clf, models / "pro_BTCUSD_1h.joblib")
+    monkeypatch.setattr(live_one, "DATA_DIR", data)
+    monkeypatch.setattr(live_one, "MODELS_DIR", models)
+    monkeypatch.setattr(live_one, "_HIST_CACHE", {})
+    model_cache.clear()
+    yield data, models, clf
+    model_cache.clear()
+
+
+def test_run_one_prints_side_and_warns_on_missing_model(live_dirs, capsys):
+    data, _models, clf = live_dirs
+    live_one.run_one("BTCUSD", "1h")
+    out = json.loads(capsys.readouterr().out)
+    hist = live_one.load_history(data, "BTCUSD", "1h")
+    assert len(hist) == 300
+    X = live_one.pad_or_truncate(live_one.safe_features(hist), 5)
+    assert np.abs(X[-1, :3]).sum() > 0
+    assert out == {"symbol": "BTCUSD", "tf": "1h", "side": "BUY" if clf.predict(X[-1:])[0] == 1 else "SELL"}
+
+    live_one.run_one("ETHUSD", "1h")
+    cap = capsys.readouterr()
+    assert cap.out == "" and "model missing" in cap.err
+
+
+def test_history_cache_reloads_only_on_change(live_dirs):
+    data, _models, _clf = live_dirs
+    a = live_one.load_history_cached(data, "BTCUSD", "1h")
+    assert live_one.load_history_cached(data, "BTCUSD", "1h") is a
+    time.sleep(0.01)
+    pd.DataFrame({"time": ["2025-01-01T00:00:00Z", "2025-01-01T01:00:00Z"], "open": 1.0, "high": 1.0,
+                  "low": 1.0, "close": [1.0, 2.0]}).to_csv(data / "BTCUSD_1h.csv", index=False)
+    assert len(live_one.load_history_cached(data, "BTCUSD", "1h")) == 2
+
+
+def test_pad_or_truncate_and_empty_features():
+    X = np.arange(6, dtype=float).reshape(2, 3)
+    assert live_one.pad_or_truncate(X, 2).tolist() == [[1.0, 2.0], [4.0, 5.0]]
+    assert live_one.pad_or_truncate(X, 4)[:, 3].tolist() == [0.0, 0.0]
+    assert live_one.safe_features(pd.DataFrame()).shape == (1, 1)
+    assert live_one.safe_features(pd.DataFrame({"x": [1, 2]})).shape == (2, 1)
+
+
+def test_worker_pool_keeps_order_and_separates_streams(live_dirs):
+    with live_batch.LiveWorkerPool(workers=2) as pool:
+        res = list(pool.run(["btcusd", "ETHUSD", "BTCUSD"], "1h"))
+    assert [r[0] for r in res] == ["btcusd", "ETHUSD", "BTCUSD"]
+    assert json.loads(res[0][1])["symbol"] == "BTCUSD" and res[0][2] == ""
+    assert res[1][1] == "" and "model missing" in res[1][2]
+    assert res[0][1] == res[2][1]
+
+
+def test_worker_run_reports_exceptions(monkeypatch):
+    def boom(symbol, tf):
+        raise RuntimeError("no data")
+    monkeypatch.setattr(live_one, "run_one", boom)
+    out, err = live_batch._worker_run("x", "15m")
+    assert out == "" and err.strip() == "[ERROR] x 15m: no data"
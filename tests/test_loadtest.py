@@ -0,0 +1,18 @@
+"""Smoke test of the live-cycle load harness against the Capital mock."""
+
+from tools import loadtest
+
+
+def test_small_run_and_baseline_compare():
+    res = loadtest.run(n_symbols=2, tfs=("1h",), cycles=2, history_bars=800, log=lambda _m: None)
+    s = res["summary"]
+    assert len(res["rows"]) == 2 and s["api_calls_per_cycle"] > 0
+    assert s["pair_p99_ms"] >= s["pair_p50_ms"] > 0
+    assert sum(res["rows"][-1]["status"].values()) == 2
+    assert loadtest.compare(res, res) == []
+
+    slow = {**res, "summary": {**s, "cycle_wall_p50_s": s["cycle_wall_p50_s"] * 2,
+                               "api_calls_per_cycle": s["api_calls_per_cycle"] * 2}}
+    regs = loadtest.compare(slow, res)
+    assert any(r.startswith("cycle_wall_p50_s") for r in regs)
+    assert any(r.startswith("api_calls_per_cycle") for r in regs)
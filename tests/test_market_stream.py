@@ -0,0 +1,123 @@
+"""Tests for the streaming market data layer (replay transport, no network)."""
+
+import threading
+
+from tools.market_stream import MarketStream, Quote, ReplayTransport, SimulatedTransport
+from tools import risk_guard
+
+
+def _q(sym, px, ts, spread=0.0002):
+    return Quote(sym, px - spread / 2, px + spread / 2, ts)
+
+
+def test_candles_built_incrementally_and_bar_events_published():
+    base = 900 * 1000
+    quotes = [
+        _q("EURUSD", 1.10, base + 1),
+        _q("EURUSD", 1.12, base + 100),
+        _q("EURUSD", 1.09, base + 200),
+        _q("EURUSD", 1.11, base + 899),
+        _q("EURUSD", 1.20, base + 900),  # closes the first 15m bar
+    ]
+    stream = MarketStream(ReplayTransport(quotes), tfs=("15m", "1h"))
+    closed = []
+    stream.subscribe("bar", closed.append)
+    stream.transport.run(stream.on_quote, threading.Event())
+
+    assert [(b.tf, b.start) for b in closed] == [("15m", base)]
+    b = closed[0]
+    assert (b.open, b.high, b.low, b.close, b.ticks) == (1.10, 1.12, 1.09, 1.11, 4)
+    assert abs(stream.last_price("EURUSD") - 1.20) < 1e-12
+
+    # quiet market: the flusher closes the second bar without a new tick
+    flushed = stream.flush(now=base + 1800)
+    assert [(x.tf, x.start) for x in flushed] == [("15m", base + 900)]
+    df = stream.candles_df("EURUSD", "15m")
+    assert list(df["close"]) == [1.11, 1.20]
+
+
+def test_simulated_transport_is_seeded():
+    a = SimulatedTransport(["X", "Y"], seed=7).next_quotes(0.0)
+    b = SimulatedTransport(["X", "Y"], seed=7).next_quotes(0.0)
+    assert [q.bid for q in a] == [q.bid for q in b]
+    assert all(q.ask > q.bid for q in a)
+
+
+def test_watch_stops_fires_once_per_level():
+    stream = MarketStream(ReplayTransport([]), tfs=("15m",))
+    hits = []
+    positions = {"GOLD": {"side": "LONG", "sl": 1990.0, "tp": 2020.0}}
+    risk_guard.watch_stops(stream, positions, lambda s, r, px, pos: hits.append((s, r)))
+
+    for px in (2000.0, 1995.0, 1989.0, 1988.0):
+        stream.on_quote(_q("GOLD", px, 10.0, spread=0.0))
+    assert hits == [("GOLD", "SL")]
+
+    positions["GOLD"] = {"side": "SHORT", "sl": 2050.0, "tp": 1980.0}
+    stream.on_quote(_q("GOLD", 1979.0, 11.0, spread=0.0))
+    assert hits[-1] == ("GOLD", "TP")
+
+
+def test_trailing_stop_resets_when_position_changes(monkeypatch):
+    monkeypatch.setattr(risk_guard, "atr", lambda sym, tf: 5.0)
+    stream = MarketStream(ReplayTransport([]), tfs=("15m",))
+    hits = []
+    positions = {"GOLD": {"side": "LONG", "sl": 1990.0, "entry_price": 2000.0}}
+    risk_guard.watch_stops(stream, positions, lambda s, r, px, pos: hits.append((r, pos["sl"])), trail_atr_mult=2.0)
+
+    stream.on_quote(_q("GOLD", 2030.0, 1.0, spread=0.0))  # trail -> 2020
+    stream.on_quote(_q("GOLD", 2019.0, 2.0, spread=0.0))
+    assert hits == [("SL", 2020.0)]
+
+    del positions["GOLD"]
+    stream.on_quote(_q("GOLD", 2019.0, 3.0, spread=0.0))
+    positions["GOLD"] = {"side": "LONG", "sl": 2000.0, "entry_price": 2015.0}
+    stream.on_quote(_q("GOLD", 2012.0, 4.0, spread=0.0))  # old 2020 trail must not apply
+    assert hits == [("SL", 2020.0)]
+
+    positions["GOLD"] = {"side": "LONG", "sl": 2000.0, "entry_price": 2016.0}  # replaced without a gap
+    stream.on_quote(_q("GOLD", 2011.0, 5.0, spread=0.0))
+    assert hits == [("SL", 2020.0)]
+
+
+def test_late_tick_after_flush_does_not_reopen_bar():
+    stream = MarketStream(ReplayTransport([]), tfs=("15m",))
+    closed = []
+    stream.subscribe("bar", closed.append)
+    stream.on_quote(_q("EURUSD", 1.10, 900.0))
+    assert len(stream.flush(now=1800.0)) == 1
+    stream.on_quote(_q("EURUSD", 1.11, 1799.0))  # late tick for the flushed bar
+    stream.on_quote(_q("EURUSD", 1.12, 1800.0))
+    stream.flush(now=2700.0)
+    assert [b.start for b in closed] == [900, 1800]
+
+
+def test_replay_closes_bars_on_quote_time():
+    quotes = [_q("EURUSD", 1.10, 10.0), _q("GOLD", 2000.0, 20.0), _q("GOLD", 2001.0, 905.0)]
+    stream = MarketStream(ReplayTransport(quotes), tfs=("15m",))
+    closed = []
+    stream.subscribe("bar", closed.append)
+    stream.start(flush_every=0.01)
+    try:
+        assert [t.name for t in stream._threads] == ["market-stream"]  # no wall-clock flusher
+        stream._threads[0].join(5.0)
+    finally:
+        stream.stop()
+    # the quiet EURUSD bar closes on GOLD's quote time, not on wall time (which is far later)
+    assert sorted((b.symbol, b.start) for b in closed) == [("EURUSD", 0), ("GOLD", 0)]
+
+
+def test_watch_stops_maps_symbols_and_caches_book():
+    stream = MarketStream(ReplayTransport([]), tfs=("15m",))
+    hits, reads = [], []
+
+    def book():
+        reads.append(1)
+        return {"GOLD": {"side": "LONG", "sl": 1990.0}, "BTCUSD": {"side": "SHORT", "sl": 70000.0}}
+    risk_guard.watch_stops(stream, book, lambda s, r, px, pos: hits.append((s, r)),
+                           key_fn=lambda s: {"XAUUSD": "GOLD"}.get(s, s), refresh_sec=60.0)
+    stream.on_quote(_q("XAUUSD", 1989.0, 1.0, spread=0.0))
+    stream.on_quote(_q("BTC/USD", 70001.0, 2.0, spread=0.0))
+    stream.on_quote(_q("BTC/USD", 70002.0, 3.0, spread=0.0))
+    assert hits == [("XAUUSD", "SL"), ("BTC/USD", "SL")]
+    assert len(reads) == 1  # one book query per refresh_sec, not per quote
@@ -0,0 +1,88 @@
+"""Tests for the in-process registry/model cache."""
+
+import json
+import os
+
+import pytest
+
+from tools import model_cache
+
+
+@pytest.fixture(autouse=True)
+def _isolated_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_cache, "VERSION_FILE", tmp_path / "models.version")
+    model_cache.clear()
+    yield
+    model_cache.clear()
+
+
+def _write_reg(path, rows, mtime_ns=None):
+    path.write_text(json.dumps({"models": rows}))
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_registry_parsed_once_until_file_changes(tmp_path):
+    reg = tmp_path / "models_pro.json"
+    _write_reg(reg, [{"symbol": "EURUSD", "tf": "1h", "trained_at": 1}], mtime_ns=1_000)
+
+    first = model_cache.load_json(reg)
+    assert model_cache.load_json(reg) is first
+
+    _write_reg(reg, [{"symbol": "EURUSD", "tf": "1h", "trained_at": 2}], mtime_ns=2_000)
+    second = model_cache.load_json(reg)
+    assert second is not first
+    assert second["models"][0]["trained_at"] == 2
+
+
+def test_find_in_registry_first_vs_latest(tmp_path):
+    reg = tmp_path / "models_pro.json"
+    _write_reg(reg, [
+        {"symbol": "GOLD", "tf": "1h", "trained_at": 5, "id": "a"},
+        {"symbol": "GOLD", "tf": "1h", "trained_at": 9, "id": "b"},
+        {"symbol": "GOLD", "tf": "4h", "trained_at": 1, "id": "c"},
+    ])
+    assert model_cache.find_in_registry(reg, "GOLD", "1h")["id"] == "a"
+    assert model_cache.find_in_registry(reg, "GOLD", "1h", latest=True)["id"] == "b"
+    assert model_cache.find_in_registry(reg, "GOLD", "15m") is None
+    assert model_cache.find_in_registry(tmp_path / "missing.json", "GOLD", "1h") is None
+
+
+def test_model_lru_and_version_bump(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_cache, "MODEL_CACHE_MAX", 2)
+    calls = []
+
+    def loader(p):
+        calls.append(p.name)
+        return object()
+
+    paths = []
+    for i in range(3):
+        p = tmp_path / f"m{i}.joblib"
+        p.write_bytes(b"x")
+        paths.append(p)
+
+    m0 = model_cache.load_model(paths[0], loader=loader)
+    assert model_cache.load_model(paths[0], loader=loader) is m0
+    model_cache.load_model(paths[1], loader=loader)
+    model_cache.load_model(paths[2], loader=loader)  # evicts m0
+    assert model_cache.stats()["models"] == 2
+    assert model_cache.load_model(paths[0], loader=loader) is not m0
+    assert calls == ["m0.joblib", "m1.joblib", "m2.joblib", "m0.joblib"]
+
+    model_cache.bump_version("v2")
+    model_cache.load_model(paths[0], loader=loader)
+    assert calls[-1] == "m0.joblib" and len(calls) == 5
+
+
+def test_failed_reload_keeps_previous_model(tmp_path):
+    p = tmp_path / "m.joblib"
+    p.write_bytes(b"x")
+    os.utime(p, ns=(1_000, 1_000))
+    good = model_cache.load_model(p, loader=lambda _: "good")
+    os.utime(p, ns=(2_000, 2_000))
+
+    def broken(_):
+        raise EOFError("half-written")
+
+    assert model_cache.load_model(p, loader=broken) is good
@@ -0,0 +1,76 @@
+"""Tests for the news calendar interval index."""
+
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from tools import news_calendar as nc
+
+DAY0 = pd.Timestamp("2025-09-01", tz="UTC")
+EVENTS = [
+    {"ts": "2025-09-01T12:30:00Z", "label": "CPI", "impact": "high"},
+    {"ts": "2025-09-01T12:45:00Z", "label": "Claims", "impact": "medium"},
+    {"ts": "2025-09-02T08:00:00Z", "label": "PMI", "impact": "low"},
+    {"ts": "broken"},
+]
+
+
+def _ts(s):
+    return int(pd.Timestamp(s, tz="UTC").timestamp())
+
+
+def test_merge_wrap_and_point_lookup():
+    cal = nc.NewsCalendar("FOMC@23:50Z±20;X@23:55Z±5", EVENTS)
+    assert nc.parse_news_windows("CPI@13:30Z±30;bad;FOMC@18:00Z±45") == [(780, 840), (1035, 1125)]
+    assert list(cal.r_start) == [0, 23 * 3600 + 30 * 60] and list(cal.r_end) == [600, 86399]
+    assert list(cal.o_start) == [_ts("2025-09-01 12:00")] and list(cal.o_end) == [_ts("2025-09-01 13:00")]
+    assert cal.o_label == ["CPI+Claims"]
+
+    assert cal.in_blackout(_ts("2025-09-01 12:50")) == "CPI+Claims"
+    assert cal.in_blackout(_ts("2025-09-01 13:01")) is None
+    assert cal.in_blackout(_ts("2025-09-02 08:00")) is None  # low: ±0 min
+    assert "FOMC" in cal.in_blackout(_ts("2025-09-03 00:05"))
+    assert cal.in_blackout(_ts("2025-09-03 00:11")) is None
+
+
+def test_features_match_bruteforce():
+    cal = nc.NewsCalendar("ECB@12:15Z±10", EVENTS)
+    idx = pd.date_range(DAY0, periods=4 * 24 * 3, freq="15min")
+    f = cal.features(idx, horizon_min=600)
+    assert list(f.index) == list(idx)
+
+    t = idx.as_unit("s").asi8
+    ev = [(_ts(e["ts"].replace("Z", "")), nc.IMPACT[e["impact"]]) for e in EVENTS[:3]]
+    rec = [_ts((DAY0 + pd.Timedelta(days=d)).strftime("%Y-%m-%d") + " 12:15") for d in range(-1, 5)]
+    ev += [(r, 3) for r in rec]
+    for i in range(len(t)):
+        nxt = sorted((e - t[i], -imp) for e, imp in ev if e >= t[i])[0]
+        prev = min(t[i] - e for e, _ in ev if e <= t[i]) if any(e <= t[i] for e, _ in ev) else np.inf
+        assert f["news_min_to_next"].iloc[i] == min(nxt[0], 36000) / 60
+        assert f["news_min_since_last"].iloc[i] == min(prev, 36000) / 60
+        assert f["news_next_impact"].iloc[i] == (-nxt[1] if nxt[0] <= 36000 else 0)
+        assert bool(f["news_blackout"].iloc[i]) == (cal.in_blackout(t[i]) is not None)
+
+
+def test_ten_years_of_15m_bars_is_fast():
+    rng = np.random.default_rng(0)
+    ts = pd.to_datetime(_ts("2015-01-01") + rng.integers(0, 10 * 365 * 86400, 2000), unit="s", utc=True)
+    events = [{"ts": t.strftime("%Y-%m-%dT%H:%M:%SZ"), "label": "E", "impact": "high"} for t in ts]
+    cal = nc.NewsCalendar("CPI@13:30Z±30;FOMC@18:00Z±45", events)
+    idx = pd.date_range("2015-01-01", periods=10 * 365 * 96, freq="15min", tz="UTC")
+    t0 = time.perf_counter()
+    f = cal.features(idx)
+    assert time.perf_counter() - t0 < 1.0
+    assert len(f) == len(idx) and f["news_blackout"].sum() > 0
+
+
+def test_get_calendar_reloads_on_file_change(tmp_path):
+    p = tmp_path / "news.json"
+    p.write_text(json.dumps(EVENTS[:1]))
+    a = nc.get_calendar("", p)
+    assert nc.get_calendar("", p) is a and len(a) == 1
+    p.write_text(json.dumps(EVENTS[:2]))
+    assert len(nc.get_calendar("", p)) == 2
+    assert len(nc.get_calendar("", tmp_path / "missing.json")) == 0
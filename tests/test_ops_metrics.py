@@ -0,0 +1,47 @@
+"""Tests for the in-process metrics registry (histograms, counters, gauges)."""
+
+import pytest
+
+from tools import ops_runtime as ops
+
+
+def test_histogram_buckets_and_render():
+    reg = ops.Registry()
+    h = reg.histogram("t_seconds", "test", ("stage",), buckets=(0.01, 0.1, 1.0))
+    for v in (0.005, 0.05, 0.05, 2.0):
+        h.observe(v, stage="predict")
+    text = reg.render()
+    assert "# TYPE t_seconds histogram" in text
+    assert 't_seconds_bucket{stage="predict",le="0.01"} 1' in text
+    assert 't_seconds_bucket{stage="predict",le="0.1"} 3' in text
+    assert 't_seconds_bucket{stage="predict",le="+Inf"} 4' in text
+    assert 't_seconds_count{stage="predict"} 4' in text
+    assert h.count(stage="predict") == 4
+
+
+def test_counter_gauge_and_type_clash():
+    reg = ops.Registry()
+    c = reg.counter("c_total", "", ("endpoint",))
+    c.inc(endpoint="prices")
+    c.inc(2, endpoint="prices")
+    assert reg.counter("c_total") is c and c.value(endpoint="prices") == 3
+    g = reg.gauge("q_depth", "", ("queue",))
+    g.set_function(lambda: 7, queue="telemetry")
+    assert 'q_depth{queue="telemetry"} 7' in reg.render()
+    with pytest.raises(ValueError):
+        reg.gauge("c_total")
+
+
+def test_stage_timer_records_errors():
+    before = ops.STAGE_SECONDS.count(stage="t_fail")
+    with pytest.raises(RuntimeError):
+        with ops.stage_timer("t_fail"):
+            raise RuntimeError("boom")
+    assert ops.STAGE_SECONDS.count(stage="t_fail") == before + 1
+    assert ops.ERRORS.value(stage="t_fail") >= 1
+
+    @ops.timed("t_ok")
+    def f(x):
+        return x * 2
+
+    assert f(2) == 4 and ops.STAGE_SECONDS.count(stage="t_ok") >= 1
@@ -0,0 +1,56 @@
+"""Tests for diversified candidate selection."""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from core.portfolio import rolling_corr_guard, select_diversified
+from tools.corr_guard import GROUP_CAPS
+
+
+def test_lookahead_beats_greedy_and_respects_budget():
+    # A (paras) korreloi B:n ja C:n kanssa; B + C yhdessä ovat arvokkaampia
+    C = np.array([[1.0, 0.9, 0.9], [0.9, 1.0, 0.1], [0.9, 0.1, 1.0]])
+    s = np.array([1.0, 0.8, 0.7])
+    assert select_diversified(C, s, 0.5, lookahead=1) == [0]
+    assert sorted(select_diversified(C, s, 0.5, lookahead=3)) == [1, 2]
+    # järjestysriippumaton
+    p = [2, 0, 1]
+    assert sorted(p[i] for i in select_diversified(C[np.ix_(p, p)], s[p], 0.5)) == [1, 2]
+
+
+def test_group_caps_and_guard_wrapper():
+    syms = ["EURUSD", "GBPUSD", "US500", "US100", "BTCUSD", "AAPL", "MSFT"]
+    rng = np.random.default_rng(0)
+    rets = pd.DataFrame(100 + rng.standard_normal((200, len(syms))).cumsum(axis=0), columns=syms)
+    out = rolling_corr_guard(rets, 100, 0.5, syms, scores=[0.2, 0.9, 0.3, 0.8, 0.5, 0.4, 0.1],
+                             group_caps=GROUP_CAPS)
+    assert sorted(out) == ["AAPL", "BTCUSD", "GBPUSD", "MSFT", "US100"]
+    assert rolling_corr_guard(rets, 500, 0.5, syms) == syms  # liian lyhyt historia
+    assert rolling_corr_guard(rets, 100, 0.5, syms, max_n=2) == syms[:2]
+
+
+def test_hundreds_of_candidates_fast():
+    rng = np.random.default_rng(1)
+    n = 400
+    f = rng.standard_normal((n, 5))
+    C = np.corrcoef(f @ rng.standard_normal((5, 250)) + rng.standard_normal((n, 250)))
+    s = rng.random(n)
+    groups = [f"G{i % 20}" for i in range(n)]
+    t0 = time.perf_counter()
+    idx = select_diversified(C, s, 0.3, groups, {f"G{i}": 2 for i in range(20)}, max_n=25)
+    dt = time.perf_counter() - t0
+    assert 0 < len(idx) <= 25 and dt < 0.5
+    sub = np.abs(C[np.ix_(idx, idx)])
+    for k in range(1, len(idx)):
+        assert sub[k, :k].mean() <= 0.3 + 1e-9
+    assert max(np.bincount([i % 20 for i in idx])) <= 2
+
+
+def test_rejected_candidate_is_not_readmitted():
+    # B ylittää budjetin A:n jälkeen; C ja D laimentaisivat keskiarvon rajan alle
+    C = np.eye(4)
+    C[0, 1] = C[1, 0] = 0.95
+    s = np.array([4.0, 3.0, 2.0, 1.0])
+    assert select_diversified(C, s, 0.5, lookahead=1) == [0, 2, 3]
@@ -0,0 +1,60 @@
+"""Tests for batch position sizing."""
+
+import json
+
+import numpy as np
+import pytest
+
+from tools import position_sizer as ps
+
+
+@pytest.fixture
+def rules(tmp_path, monkeypatch):
+    (tmp_path / "sizes.json").write_text(json.dumps({
+        "EURUSD": {"min": 1000, "step": 100}, "BTCUSD": {"min": 0.01, "step": 0.01}, "US500": {"min": 1, "step": 1}}))
+    (tmp_path / "over.json").write_text(json.dumps({"US500": 2}))
+    monkeypatch.setattr(ps, "SIZES", tmp_path / "sizes.json")
+    monkeypatch.setattr(ps, "SIZE_OVERRIDES", tmp_path / "over.json")
+    for k in ("RISK_MAX_PER_TRADE_PCT", "SIZE_MAX_NOTIONAL_PCT", "SIZE_MAX_TOTAL_NOTIONAL_PCT", "RISK_MAX_TOTAL_PCT"):
+        monkeypatch.delenv(k, raising=False)
+
+
+def test_batch_matches_scalar_formula_and_broker_rules(rules):
+    syms = ["EURUSD", "BTCUSD", "US500", "AAPL"]
+    px = [1.10, 60_000.0, 5_000.0, 200.0]
+    dist = [0.002, 1_500.0, 40.0, 0.0]  # AAPL: ei stoppia -> 1 % hinnasta
+    raw = ps.size_batch(syms, px, dist, 10_000, risk_pct=[0.5] * 4, apply_rules=False)
+    assert np.allclose(raw, [50 / 0.002, 50 / 1500, 50 / 40, 50 / 2.0])
+    q = ps.size_batch(syms, px, dist, 10_000, risk_pct=[0.5] * 4)
+    assert q.tolist() == [25_000, 0.03, 0.0, 25.0]  # US500 1.25 -> 1 < override-min 2
+    assert ps.size_batch(syms, px, dist, 10_000, risk_pct=[0.5] * 4, round_up_min=True)[2] == 2
+
+    # metriikat: NaN -> fallback, muuten _risk_pct_from_metrics; kattona RISK_MAX_PER_TRADE_PCT
+    rp = ps.risk_pct_batch([1.0, 5.0], [1.5, 3.0], [-0.1, 0.0])
+    assert rp[0] == pytest.approx(ps._risk_pct_from_metrics(1.0, 1.5, -0.1)) and rp[1] == 1.0
+    q = ps.size_batch(["X", "Y"], [100.0, 100.0], [1.0, 1.0], 10_000, sharpe=[np.nan, 5.0], pf=[1, 3], maxdd=[0, 0],
+                      max_risk_pct=0.8)
+    assert np.allclose(q, [25.0, 80.0])
+
+
+def test_equity_caps(rules):
+    syms, px, dist = ["A", "B"], [100.0, 50.0], [1.0, 1.0]
+    q = ps.size_batch(syms, px, dist, 10_000, risk_pct=[1.0, 1.0], max_notional_pct=50)
+    assert np.allclose(q, [50.0, 100.0])  # 5 000 notional kumpikin
+    q = ps.size_batch(syms, px, dist, 10_000, risk_pct=[1.0, 1.0], max_total_notional_pct=100)
+    assert np.isclose((q * px).sum(), 10_000) and np.isclose(q[0] / q[1], 1.0)
+    q = ps.size_batch(syms, px, dist, 10_000, risk_pct=[1.0, 1.0], max_total_risk_pct=1.0)
+    assert np.isclose((q * dist).sum(), 100.0)
+
+
+def test_pick_size_uses_registry_metrics(tmp_path, monkeypatch, rules):
+    reg = tmp_path / "models_pro.json"
+    reg.write_text(json.dumps({"models": [{"symbol": "EURUSD", "tf": "1h", "trained_at": 1,
+                                           "metrics": {"sh_oos_mean": 1.0, "pf_oos_mean": 1.5, "maxdd_oos_min": -0.1}}]}))
+    monkeypatch.setattr(ps, "REG", reg)
+    r = ps._risk_pct_from_metrics(1.0, 1.5, -0.1)
+    assert ps.pick_size("EURUSD", "1h", 1.1, 10_000) == pytest.approx(10_000 * r / 100 / 0.011)
+    sigs = [{"symbol": "EURUSD", "tf": "1h", "price": 1.1, "stop_dist": 0.002},
+            {"symbol": "BTCUSD", "tf": "1h", "price": 60_000.0, "stop_dist": 1_500.0}]
+    q = ps.pick_sizes(sigs, 10_000)
+    assert q[0] == np.floor(10_000 * r / 100 / 0.002 / 100) * 100 and q[1] == 0.01  # 25/1500 -> step
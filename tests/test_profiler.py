@@ -0,0 +1,41 @@
+"""Tests for the opt-in trace spans and stack sampler."""
+
+import json
+import time
+
+from tools import profiler
+
+
+def test_off_is_noop(monkeypatch):
+    monkeypatch.setattr(profiler, "_events", [])
+    assert not profiler.enabled()
+    with profiler.span("cycle", tf="15m"):
+        pass
+    assert profiler.span("x") is profiler.span("y")  # jaettu tyhjä konteksti
+    assert profiler._events == []
+
+
+def test_trace_and_samples_written(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiler, "PROFILE_DIR", tmp_path)
+    monkeypatch.setattr(profiler, "_events", [])
+    profiler.enable(trace=True, sample=True, hz=500)
+    try:
+        with profiler.span("cycle"):
+            with profiler.span("symbol", symbol="GOLD"):
+                t0 = time.time()
+                while time.time() - t0 < 0.1:
+                    sum(range(1000))
+    finally:
+        paths = profiler.disable()
+    assert not profiler.enabled()
+
+    trace = next(p for p in paths if p.name.endswith(".trace.json"))
+    evs = [e for e in json.loads(trace.read_text())["traceEvents"] if e["ph"] == "X"]
+    assert [e["name"] for e in evs] == ["symbol", "cycle"]
+    inner, outer = evs
+    assert outer["ts"] <= inner["ts"] and inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+    assert inner["args"] == {"symbol": "GOLD"} and inner["dur"] >= 90_000
+
+    folded = next(p for p in paths if p.suffix == ".folded").read_text().splitlines()
+    assert folded and all(line.rsplit(" ", 1)[1].isdigit() for line in folded)
+    assert any("test_trace_and_samples_written" in line for line in folded)
@@ -0,0 +1,97 @@
+"""Tests for the compiled pre-trade risk rule engine."""
+
+import os
+import time
+
+import yaml
+
+from tools import risk_rules as rr
+
+RULES = {
+    "risk_per_trade": 0.01,
+    "rules": {"max_leverage": 2.0, "daily_r_stop": -3.0, "cooldown_min": 10,
+              "cooldown_min_by_symbol": {"BTCUSD": 0}, "group_exposure_pct": {"USD": 100},
+              "max_group_positions": {"INDEX": 1}, "news_windows": "CPI@23:50Z±20", "news_groups": ["USD"]},
+}
+NOON = 1_700_000_000 - 1_700_000_000 % 86400 + 12 * 3600
+
+
+def test_each_rule_allows_and_denies():
+    eng = rr.RiskRules(cfg=RULES, day_r_fn=lambda: 0.0)
+    book = rr.Book(exposure={"GBPUSD": 6_000.0, "US500": 5_000.0})
+    ok = eng.evaluate(rr.Order("AAPL", size=10, price=100.0, equity=10_000, risk_pct=0.5, ts=NOON), book)
+    assert ok.allow and ok.reasons == [] and len(ok.checks) == 6
+
+    d = eng.evaluate(rr.Order("EURUSD", size=5_000, price=1.0, equity=10_000, risk_pct=2.0, ts=NOON), book)
+    assert not d.allow
+    assert {r.split(":")[0] for r in d.reasons} == {"risk_pct", "group_exposure"}
+    assert eng.evaluate(rr.Order("AAPL", size=100, price=100.0, equity=10_000, ts=NOON), book).reasons[0].startswith("leverage")
+    assert eng.evaluate(rr.Order("US100", ts=NOON), book).reasons == ["group_positions: INDEX 1 >= 1"]
+    assert eng.evaluate(rr.Order("US500", ts=NOON), book).allow  # lisäys olemassa olevaan
+
+    assert eng.evaluate(rr.Order("AAPL", ts=NOON), rr.Book(day_r=-3.5)).reasons[0].startswith("daily_r_stop")
+
+    eng.note_order("AAPL", NOON - 60)
+    eng.note_order("BTCUSD", NOON - 60)
+    assert eng.evaluate(rr.Order("aapl", ts=NOON)).reasons[0].startswith("cooldown")
+    assert eng.evaluate(rr.Order("BTCUSD", ts=NOON)).allow
+    assert eng.evaluate(rr.Order("AAPL", ts=NOON + 600)).allow
+
+    midnight = NOON + 12 * 3600  # 23:50 ± 20 kiertää vuorokauden yli
+    assert eng.evaluate(rr.Order("EURUSD", ts=midnight + 5 * 60)).reasons[0].startswith("news_blackout")
+    assert eng.evaluate(rr.Order("AAPL", ts=midnight + 5 * 60)).allow
+    assert eng.evaluate(rr.Order("EURUSD", ts=midnight + 15 * 60)).allow
+
+
+def test_hot_reload_and_latency(tmp_path, monkeypatch):
+    monkeypatch.setattr(rr, "CHECK_SEC", 0.0)
+    p = tmp_path / "risk.yaml"
+    p.write_text(yaml.safe_dump({"rules": {"max_leverage": 10}}))
+    eng = rr.RiskRules(config=p, day_r_fn=lambda: None)
+    o = rr.Order("AAPL", size=50, price=100.0, equity=1_000)
+    assert eng.evaluate(o).allow and eng.evaluate(o).checks == ["leverage"]
+
+    p.write_text(yaml.safe_dump({"rules": {"max_leverage": 2}}))
+    st = p.stat()
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    d = eng.evaluate(o)
+    assert not d.allow and d.version == 2
+
+    p.write_text(yaml.safe_dump(RULES))
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 2 * 10**9))
+    monkeypatch.setattr(rr, "CHECK_SEC", 60.0)
+    book = rr.Book(exposure={f"SYN{i:04d}": 100.0 for i in range(50)}, day_r=0.0)
+    order = rr.Order("EURUSD", size=10, price=1.1, equity=10_000, risk_pct=0.3)
+    eng.evaluate(order, book)
+    t0 = time.perf_counter()
+    us = [eng.evaluate(order, book).us for _ in range(2000)]
+    assert sorted(us)[len(us) // 2] < 1000 and (time.perf_counter() - t0) / 2000 < 1e-3
+
+
+def test_portfolio_var_reads_cov_engine(tmp_path):
+    import numpy as np
+    from core import cov_engine as ce
+
+    cov = ce.EwmaCov("1h", halflife=50, path=None, min_obs=20)
+    rng = np.random.default_rng(0)
+    px = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.01, (200, 2)), axis=0))
+    for t, row in enumerate(px):
+        cov.update(t * 3600, {"EURUSD": row[0], "GBPUSD": row[1]})
+    eng = rr.RiskRules(cfg={"rules": {"max_var_pct": 3.0}}, day_r_fn=lambda: None, cov_fn=lambda tf: cov)
+    book = rr.Book(exposure={"GBPUSD": 10_000.0}, net={"GBPUSD": 10_000.0})
+    small = rr.Order("EURUSD", "BUY", size=10_000, price=1.0, equity=10_000, tf="1h")
+    assert eng.evaluate(small, book).allow
+    big = rr.Order("EURUSD", "BUY", size=100_000, price=1.0, equity=10_000, tf="1h")
+    d = eng.evaluate(big, book)
+    assert not d.allow and d.reasons[0].startswith("portfolio_var")
+    hedge = rr.Order("GBPUSD", "SELL", size=10_000, price=1.0, equity=10_000)
+    assert eng.evaluate(hedge, book).allow
+    assert eng.evaluate(rr.Order("AAPL", size=10**6, price=1.0, equity=10_000), book).allow  # ei historiaa
+
+
+def test_shipped_config_is_opt_in():
+    eng = rr.RiskRules(config=rr.ROOT / "config" / "risk.yaml", day_r_fn=lambda: -10.0)
+    d = eng.evaluate(rr.Order("EURUSD", size=10**6, price=1.0, equity=1.0, risk_pct=50.0, ts=NOON))
+    assert d.allow and not {"leverage", "risk_pct", "daily_r_stop", "portfolio_var", "news_blackout"} & set(d.checks)
+    off = rr.RiskRules(cfg={"risk_per_trade": 0.01, "rules": {"max_risk_pct": 0}})
+    assert off.evaluate(rr.Order("EURUSD", risk_pct=5.0)).allow
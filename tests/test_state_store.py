@@ -0,0 +1,101 @@
+"""Tests for the SQLite position/order/fill store."""
+
+import json
+import threading
+
+from tools import state_store
+
+
+def test_apply_fill_matches_ledger_rules(tmp_path):
+    con = state_store.conn(tmp_path / "s.sqlite")
+    state_store.apply_fill("EURUSD", "BUY", 2, 1.10, con=con)
+    p = state_store.apply_fill("EURUSD", "BUY", 2, 1.20, order_id="o1", con=con)
+    assert p["qty"] == 4 and abs(p["avg"] - 1.15) < 1e-12
+
+    p = state_store.apply_fill("EURUSD", "SELL", 10, 1.25, con=con)  # no shorts: capped at qty
+    assert p["qty"] == 0.0 and abs(p["realized"] - 0.4) < 1e-9
+    assert [f["order_id"] for f in state_store.fills(symbol="EURUSD", con=con)][-2] == "o1"
+
+
+def test_concurrent_fills_do_not_lose_updates(tmp_path):
+    path = tmp_path / "s.sqlite"
+    state_store.conn(path)
+
+    def worker():
+        c = state_store.conn(path)  # own per-thread connection
+        for _ in range(25):
+            state_store.apply_fill("GOLD", "BUY", 1, 2000.0, con=c)
+
+    ts = [threading.Thread(target=worker) for _ in range(4)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    assert state_store.get_position("ledger", "GOLD", con=state_store.conn(path))["qty"] == 100
+
+
+def test_replace_positions_reports_diff(tmp_path):
+    con = state_store.conn(tmp_path / "s.sqlite")
+    d = state_store.replace_positions("broker", {"A": {"side": "LONG"}, "B": {"side": "SHORT"}}, con=con)
+    assert sorted(d["opened"]) == ["A", "B"]
+    d = state_store.replace_positions("broker", {"A": {"side": "LONG"}, "C": {"side": "LONG"}}, con=con)
+    assert d == {"opened": ["C"], "closed": ["B"], "modified": []}
+    d = state_store.replace_positions("broker", {"A": {"side": "LONG"}, "C": {"side": "LONG"}}, con=con)
+    assert not any(d.values())
+    assert state_store.positions_for("C", con=con)[0]["_source"] == "broker"
+
+
+def test_migration_from_json_is_idempotent(tmp_path):
+    st, data = tmp_path / "state", tmp_path / "data"
+    st.mkdir(); data.mkdir()
+    (st / "positions.json").write_text(json.dumps({"AAPL": {"qty": 3.0, "avg": 150.0, "realized": 0.0}}))
+    (st / "trade_engine_positions.json").write_text(json.dumps({"BTC/USD_1h": {"status": "open"}}))
+    (st / "trade_engine_orders.json").write_text(json.dumps([{"timestamp": 1, "symbol": "BTC/USD", "status": "dry_run"}]))
+    (data / "open_positions.json").write_text(json.dumps({"positions": {"US500": {"side": "SHORT"}}}))
+
+    con = state_store.conn(tmp_path / "s.sqlite")
+    counts = state_store.migrate_from_json(con, state_dir=st, data_dir=data)
+    assert counts == {"ledger": 1, "engine": 1, "broker": 1, "orders": 1}
+    assert state_store.migrate_from_json(con, state_dir=st, data_dir=data) == {}
+
+    assert state_store.get_position("ledger", "AAPL", con=con)["qty"] == 3.0
+    assert state_store.positions_for("BTC/USD", "1h", con=con)[0]["status"] == "open"
+    assert state_store.orders("BTC/USD", con=con)[0]["status"] == "dry_run"
+
+
+def test_concurrent_migrations_run_once(tmp_path):
+    st, data = tmp_path / "state", tmp_path / "data"
+    st.mkdir(); data.mkdir()
+    (st / "positions.json").write_text(json.dumps({"AAPL": {"qty": 3.0, "avg": 150.0, "realized": 0.0}}))
+    path = tmp_path / "s.sqlite"
+    state_store.conn(path)
+    gate = threading.Barrier(6)
+    results, errors = [], []
+
+    class _Proc:
+        """Erillinen yhteys; kaikki lukevat migrations-taulun ennen kuin kukaan migroi."""
+
+        def __init__(self):
+            self.c = state_store._connect(path)
+
+        def execute(self, sql, *args):
+            cur = self.c.execute(sql, *args)
+            if sql.startswith("SELECT name FROM migrations"):
+                rows = cur.fetchall()
+                gate.wait()
+                return rows
+            return cur
+
+    def worker():
+        try:
+            results.append(state_store.migrate_from_json(_Proc(), state_dir=st, data_dir=data))
+        except Exception as e:  # IntegrityError ennen korjausta
+            errors.append(e)
+
+    ts = [threading.Thread(target=worker) for _ in range(6)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    assert errors == []
+    assert sorted(bool(r) for r in results) == [False] * 5 + [True]
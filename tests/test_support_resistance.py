@@ -0,0 +1,61 @@
+"""Tests for sliding-window pivots and the incremental S/R tracker."""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from tools import support_resistance as sr
+
+
+def _ohlc(n, seed=1, rnd=1):
+    rng = np.random.default_rng(seed)
+    c = 100 + np.cumsum(rng.normal(0, 0.3, n))
+    h = np.round(c + rng.random(n) * 0.3, rnd)  # pyöristys -> tasapelejä
+    l = np.round(c - rng.random(n) * 0.3, rnd)
+    return pd.DataFrame({"open": c, "high": h, "low": l, "close": c})
+
+
+def _pivots_slow(df, left=3, right=3):
+    h, l, n = df["high"].values, df["low"].values, len(df)
+    ph, pl = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+    for i in range(left, n - right):
+        ph[i] = h[i] == max(h[i - left:i + right + 1])
+        pl[i] = l[i] == min(l[i - left:i + right + 1])
+    return ph, pl
+
+
+def test_pivots_match_neighbour_scan():
+    df = _ohlc(2000)
+    for left, right in ((3, 3), (2, 5), (1, 1)):
+        ph, pl = _pivots_slow(df, left, right)
+        out = sr.pivots(df, left, right)
+        assert (out["pivot_high"].values == ph).all() and (out["pivot_low"].values == pl).all()
+    assert not sr.pivots(df.head(4))["pivot_high"].any()
+
+
+def test_tracker_matches_sr_levels_and_batch():
+    df = _ohlc(1500, seed=3)
+    tr = sr.SRTracker()
+    f = sr.sr_features(df)
+    checked = 0
+    for i, (h, l, c) in enumerate(zip(df["high"], df["low"], df["close"])):
+        if tr.update(h, l, c) and i % 5 == 0:
+            want = sr.sr_levels(df.iloc[:i + 1])
+            got = tr.levels()
+            assert list(want["type"]) == [x[1] for x in got]
+            assert np.allclose(want["level"].values, [x[0] for x in got])
+            checked += 1
+        sup, res = tr.nearest(c)
+        assert np.isnan(f["sr_sup_dist"].iloc[i]) if sup is None else f["sr_sup_dist"].iloc[i] == (c - sup) / c
+        assert np.isnan(f["sr_res_dist"].iloc[i]) if res is None else f["sr_res_dist"].iloc[i] == (res - c) / c
+    assert checked > 50
+    assert (f["sr_sup_dist"].dropna() >= 0).all() and (f["sr_res_dist"].dropna() >= 0).all()
+
+
+def test_batch_features_are_fast():
+    df = _ohlc(100_000, seed=5, rnd=4)
+    t0 = time.perf_counter()
+    f = sr.sr_features(df)
+    assert time.perf_counter() - t0 < 5.0
+    assert len(f) == len(df) and f["sr_sup_n"].max() >= 1
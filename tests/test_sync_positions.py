@@ -0,0 +1,68 @@
+"""Tests for the diffing, adaptive position sync service."""
+
+from tools import sync_positions as sp
+
+
+class _Clock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+def _rec(epic, size, sl=None, pnl=0.0):
+    return {"epic": epic, "direction": "BUY", "size": size, "level": 100.0, "stopLevel": sl,
+            "profitLossPercentage": pnl}
+
+
+def _make(monkeypatch, tmp_path, responses):
+    monkeypatch.setattr(sp, "NUDGE_PATH", tmp_path / ".nudge")
+    calls, writes, events = [], [], []
+
+    def fetch(session, prefer):
+        calls.append(prefer)
+        return responses.pop(0), "/api/v1/positions/open"
+
+    clock = _Clock()
+    sync = sp.PositionSync(session=sp.requests.Session(), fetch=fetch, login=lambda s: True,
+                           clock=clock, write=writes.append, events_path=tmp_path / "ev.jsonl",
+                           last_order_ts=lambda: 0.0, snapshot={})
+    sync.subscribe(events.append)
+    return sync, clock, calls, writes, events
+
+
+def test_diff_events_and_write_throttling(monkeypatch, tmp_path):
+    responses = [
+        [_rec("GOLD", 1.0)],
+        [_rec("GOLD", 1.0, pnl=0.5)],          # vain pnl -> ei tapahtumaa, ei kirjoitusta
+        [_rec("GOLD", 1.0, sl=95.0, pnl=0.6)],  # SL siirtyi -> modify
+        [],                                     # suljettu
+    ]
+    sync, clock, calls, writes, events = _make(monkeypatch, tmp_path, responses)
+
+    assert [e["type"] for e in sync.poll_once()] == ["open"]
+    assert calls == [None] and sync.endpoint == "/api/v1/positions/open"
+    clock.t += 5
+    assert sync.poll_once() == [] and len(writes) == 1
+    clock.t += 5
+    ev = sync.poll_once()
+    assert [e["type"] for e in ev] == ["modify"] and ev[0]["changed"] == ["sl"]
+    clock.t += 5
+    assert [e["type"] for e in sync.poll_once()] == ["close"]
+
+    assert calls[1:] == ["/api/v1/positions/open"] * 3  # toimiva polku muistetaan
+    assert [e["type"] for e in events] == ["open", "modify", "close"]
+    assert len((tmp_path / "ev.jsonl").read_text().splitlines()) == 3
+    assert len(writes) == 3
+
+
+def test_adaptive_interval(monkeypatch, tmp_path):
+    sync, clock, *_ = _make(monkeypatch, tmp_path, [[_rec("GOLD", 1.0)]])
+    assert sync.next_interval() == sp.IDLE_SEC
+    sync.poll_once()
+    assert sync.next_interval() == sp.FAST_SEC  # juuri muuttunut
+    clock.t += sp.HOT_SEC + 1
+    assert sync.next_interval() == sp.POLL_SEC
+    sync.last_order_ts = lambda: clock.t - 1
+    assert sync.next_interval() == sp.FAST_SEC
@@ -0,0 +1,40 @@
+"""Tests for the deterministic synthetic OHLCV generator."""
+
+import numpy as np
+import pandas as pd
+
+from core.io import load_history
+from tools import synth_data as sd
+
+
+def test_written_files_load_and_are_deterministic(tmp_path):
+    syms = ["EURUSD", "US500", "AAPL", "BTCUSD"]
+    sd.write(syms, ["15m", "1h"], tmp_path / "a" / "history", years=0.25, seed=5)
+    sd.write(syms[::-1], ["15m", "1h"], tmp_path / "b" / "history", years=0.25, seed=5)
+    for s in syms:
+        a = load_history(tmp_path / "a", s, "1h")
+        b = load_history(tmp_path / "b", s, "1h")
+        assert len(a) > 100 and a.equals(b)  # ei riipu symbolijärjestyksestä
+        assert {"time", "open", "high", "low", "close", "volume", "spread"} <= set(a.columns)
+        assert (a["high"] >= a[["open", "close"]].max(axis=1)).all()
+        assert (a["low"] <= a[["open", "close"]].min(axis=1)).all()
+        assert (a["spread"] > 0).all()
+
+
+def test_sessions_gaps_and_correlation():
+    g = {s: df for s, _tf, df in sd.generate(["AAPL", "EURUSD", "SYN0001", "SYN0005"], ["1h"], years=1.0, seed=3)}
+    aapl, fx = g["AAPL"], g["EURUSD"]
+    assert not (aapl["time"].dt.dayofweek >= 5).any() and set(aapl["time"].dt.hour) <= set(range(14, 21))
+    assert (fx["time"].dt.dayofweek == 5).sum() == 0
+    # suljetun ajan tuotto näkyy gappina seuraavan baarin openissa
+    assert (aapl["open"] / aapl["close"].shift() - 1).abs().max() > 0.005
+    r = {s: np.log(df.set_index("time")["close"]).diff() for s, df in g.items()}
+    same = pd.concat([r["SYN0001"], r["SYN0005"]], axis=1).corr().iloc[0, 1]  # sama luokka
+    assert same > 0.2
+    assert pd.Series(r["AAPL"]).kurt() > 1.0  # paksut hännät
+
+
+def test_exact_length_series():
+    df = sd.ohlcv(3000, tf="15m", seed=1)
+    assert len(df) == 3000 and (df["time"].diff().dropna() == pd.Timedelta("15min")).all()
+    assert df.equals(sd.ohlcv(3000, tf="15m", seed=1))
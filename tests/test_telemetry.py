@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import time
+
+from tools import telemetry
+
+
+def test_buffered_writer_and_query(tmp_path, monkeypatch):
+    db = tmp_path / "t.sqlite"
+    monkeypatch.setattr(telemetry, "DB", db)
+    telemetry.shutdown()
+    t0 = time.time()
+    for i in range(50):
+        telemetry.log("order", {"i": i})
+    with telemetry.stage("predict", symbol="GOLD", tf="1h") as extra:
+        extra["rows"] = 3
+    assert telemetry.flush()
+    st = telemetry.stats()
+    assert st["written"] == 51 and st["dropped"] == 0
+
+    orders = telemetry.query("order", since=t0, path=db)
+    assert len(orders) == 50
+    assert orders[0].payload["i"] == 49  # newest first
+    assert telemetry.query("order", limit=5, path=db)[-1].payload["i"] == 45
+
+    summ = telemetry.stage_summary(path=db)
+    assert summ["predict"].count == 1 and summ["predict"].errors == 0
+    ev = telemetry.query("timing", path=db)[0]
+    assert ev.payload["symbol"] == "GOLD" and ev.payload["rows"] == 3
+    telemetry.shutdown()
+
+
+def test_shutdown_flushes_pending(tmp_path, monkeypatch):
+    db = tmp_path / "t.sqlite"
+    monkeypatch.setattr(telemetry, "DB", db)
+    monkeypatch.setattr(telemetry, "FLUSH_SEC", 60.0)
+    telemetry.shutdown()
+    telemetry.log("x", {"a": 1})
+    telemetry.shutdown()
+    assert [e.payload for e in telemetry.query("x", path=db)] == [{"a": 1}]
+
+
+def test_stage_reserved_field_names_do_not_clash(tmp_path, monkeypatch):
+    db = tmp_path / "t.sqlite"
+    monkeypatch.setattr(telemetry, "DB", db)
+    telemetry.shutdown()
+    with telemetry.stage("order", name="EURUSD", ok="maybe") as extra:
+        extra["ms"] = 1
+        extra["stage"] = "inner"
+    telemetry.shutdown()
+    p = telemetry.query("timing", path=db)[0].payload
+    assert p["stage"] == "order" and p["ok"] is True and p["ms"] != 1
+    assert p["name"] == "EURUSD" and p["x_ok"] == "maybe" and p["x_ms"] == 1 and p["x_stage"] == "inner"
+
+
+def test_flush_waits_for_rows_logged_while_writer_is_busy(tmp_path, monkeypatch):
+    db = tmp_path / "t.sqlite"
+    monkeypatch.setattr(telemetry, "DB", db)
+    monkeypatch.setattr(telemetry, "FLUSH_SEC", 60.0)
+    telemetry.shutdown()
+    for n in range(1, 21):
+        telemetry.log("burst", {"n": n})
+        assert telemetry.flush()
+        assert telemetry.stats()["written"] == n
+    telemetry.shutdown()
+
+
+def _log_in_child():
+    telemetry.log("child", {"pid": os.getpid()})
+    assert telemetry.flush(5.0)
+
+
+def test_writer_restarts_after_fork(tmp_path, monkeypatch):
+    db = tmp_path / "t.sqlite"
+    monkeypatch.setattr(telemetry, "DB", db)
+    telemetry.shutdown()
+    telemetry.log("parent", {})
+    assert telemetry.flush()
+    p = multiprocessing.get_context("fork").Process(target=_log_in_child)
+    p.start()
+    p.join(10)
+    assert p.exitcode == 0
+    assert len(telemetry.query("child", path=db)) == 1
+    telemetry.shutdown()
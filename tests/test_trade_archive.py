@@ -0,0 +1,94 @@
+"""Tests for the append-only trade archive behind ledger.append_trade."""
+
+import pandas as pd
+import pytest
+
+from tools.trade_archive import TradeArchive, _arrow_available
+
+DAY1 = 1772445600000  # 2026-03-02T10:00Z
+DAY2 = DAY1 + 86_400_000
+
+
+def _row(ts, sym, pnl):
+    return {"ts": ts, "symbol": sym, "tf": "1h", "side": "SELL", "price": 1.0, "amount": 1.0,
+            "notional": 1.0, "mode": "paper", "p": None, "why": "", "order_id": "", "fee": 0.0, "pnl": pnl}
+
+
+def _reference_kpi(pnl):
+    s = pd.Series(pnl, dtype=float)
+    eq = s.cumsum()
+    return {"trades": len(s), "pnl": eq.iloc[-1], "hit": (s > 0).mean(),
+            "sharpe": s.mean() / (s.std() + 1e-9) * 252 ** 0.5, "maxdd": (eq - eq.cummax()).min()}
+
+
+def test_append_scan_and_incremental_kpis(tmp_path):
+    ar = TradeArchive(tmp_path)
+    pnls = [5.0, -2.0, 3.0, -4.0]
+    ar.append(_row(DAY1, "GOLD", pnls[0]))
+    ar.append(_row(DAY1 + 1, "EURUSD", pnls[1]))
+    k = ar.update_kpis()
+    assert k["trades"] == 2 and k["pnl"] == 3.0
+
+    ar.append(_row(DAY2, "GOLD", pnls[2]))  # päivä vaihtuu -> DAY1 tiivistetään
+    ar.append(_row(DAY2 + 1, "GOLD", pnls[3]))
+    if _arrow_available:
+        assert (tmp_path / "archive" / "date=2026-03-02.parquet").exists()
+        assert not (tmp_path / "journal" / "2026-03-02.jsonl").exists()
+
+    k = ar.update_kpis()
+    ref = _reference_kpi(pnls)
+    for key in ("trades", "pnl", "hit", "sharpe", "maxdd"):
+        assert k[key] == pytest.approx(ref[key])
+    assert list(ar.equity()["equity"]) == [5.0, 3.0, 6.0, 2.0]
+    assert ar.update_kpis() == k  # ei uusia rivejä -> ei muutosta
+
+    gold = ar.scan(symbols=["GOLD"])
+    assert list(gold["pnl"]) == [5.0, 3.0, -4.0]
+    assert len(ar.scan(start="2026-03-03")) == 2
+
+
+def test_export_and_import_csv_roundtrip(tmp_path):
+    ar = TradeArchive(tmp_path / "a")
+    ar.append(_row(DAY1, "GOLD", None))
+    ar.append(_row(DAY2, "US500", None))
+    out = tmp_path / "trades.csv"
+    assert ar.export_csv(out) == 2
+    df = pd.read_csv(out)
+    assert "pnl" not in df.columns and list(df["symbol"]) == ["GOLD", "US500"]
+
+    br = TradeArchive(tmp_path / "b")
+    assert br.import_csv(out) == 2
+    assert list(br.scan()["symbol"]) == ["GOLD", "US500"]
+    assert br.import_csv(out) == 0  # vain tyhjään arkistoon
+
+
+def test_import_is_recorded_and_skips_mirrored_rows(tmp_path):
+    ar = TradeArchive(tmp_path / "a")
+    ar.append(_row(DAY1, "GOLD", 1.0))
+    ar.append(_row(DAY1 + 1, "US500", 2.0))
+    out = tmp_path / "trades.csv"
+    ar.export_csv(out)
+
+    br = TradeArchive(tmp_path / "b")
+    br.append(_row(DAY1 + 1, "US500", 2.0))  # ledger ehti jo peilata tämän rivin
+    assert br.import_csv(out) == 1  # arkisto ei ole tyhjä, mutta tuontia ei ole tehty
+    assert sorted(br.scan()["symbol"]) == ["GOLD", "US500"]
+    assert br.import_csv(out) == 0 and TradeArchive(tmp_path / "b").import_csv(out) == 0
+
+
+@pytest.mark.skipif(not _arrow_available, reason="pyarrow puuttuu")
+def test_late_rows_merge_into_compacted_day(tmp_path):
+    ar = TradeArchive(tmp_path)
+    ar.append(_row(DAY1, "GOLD", 1.0))
+    ar.append(_row(DAY1 + 1, "GOLD", 2.0))
+    ar.append(_row(DAY2, "GOLD", 3.0))  # DAY1 tiivistetään
+    assert ar.update_kpis()["pnl"] == 6.0
+    ar.append(_row(DAY1 + 2, "EURUSD", 4.0))  # myöhästynyt täyttö jo tiivistetylle päivälle
+    assert list(ar.scan(end="2026-03-02")["pnl"]) == [1.0, 2.0, 4.0]
+    k = ar.update_kpis()  # myöhästynyt rivi lasketaan, vaikka DAY2 on jo luettu
+    assert k["pnl"] == 10.0 and k["trades"] == 4
+    assert ar.compact(before="2026-03-03") == ["2026-03-02"]
+    day1 = ar.scan(end="2026-03-02")
+    assert sorted(day1["pnl"]) == [1.0, 2.0, 4.0]
+    assert sorted(ar._read_day("2026-03-02")["seq"]) == [0, 1, 2]
+    assert ar.update_kpis()["trades"] == 4  # tiivistys ei laske samaa riviä uudelleen
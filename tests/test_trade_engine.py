@@ -0,0 +1,118 @@
+"""run_cycle end to end with a stubbed candle fetch, registry and models."""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import cov_engine
+from tools import model_cache, risk_rules, state_store, telemetry
+from tools import trade_engine as te
+
+
+class _Model:
+    def __init__(self, p):
+        self.p = p
+
+    def predict_proba(self, X):
+        return np.column_stack([np.full(len(X), 1.0 - self.p), np.full(len(X), self.p)])
+
+
+def _candles(symbol, tf, **_kw):
+    idx = pd.date_range(end=pd.Timestamp.now(tz="UTC").floor("h"), periods=200, freq="h")
+    c = 100 + np.cumsum(np.random.default_rng(len(symbol)).normal(0, 0.5, len(idx)))
+    return pd.DataFrame({"open": c, "high": c + 0.5, "low": c - 0.5, "close": c, "volume": 1.0}, index=idx)
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    mdir = tmp_path / "models_meta"
+    mdir.mkdir()
+    for name in ("a.joblib", "b.joblib"):
+        (mdir / name).write_bytes(b"x")
+    models = {"a.joblib": _Model(0.9), "b.joblib": _Model(0.8)}
+    reg = {"models": [{"symbol": "EURUSD", "tf": "1h", "features": ["ret"],
+                       "models": {"gbdt": {"file": "a.joblib"}, "lr": {"file": "b.joblib"}}}]}
+    (tmp_path / "models_meta.json").write_text(json.dumps(reg))
+
+    model_cache.clear()
+    monkeypatch.setattr(state_store, "DB_PATH", tmp_path / "state.sqlite")
+    monkeypatch.setattr(cov_engine, "STATE_DIR", tmp_path / "cov")
+    monkeypatch.setattr(cov_engine, "_engines", {})
+    if telemetry._writer is None:
+        monkeypatch.setattr(telemetry, "DB", tmp_path / "telemetry.sqlite")
+    monkeypatch.setattr(te, "META_REG", tmp_path / "models_meta.json")
+    monkeypatch.setattr(te, "META_DIR", mdir)
+    monkeypatch.setattr(te, "_capital_available", True)
+    monkeypatch.setattr(te, "capital_rest_login", lambda: None)
+    monkeypatch.setattr(te, "capital_get_candles_df", _candles)
+    monkeypatch.setattr(te, "_ml_features_available", True)
+    monkeypatch.setattr(te, "compute_features", lambda df: pd.DataFrame({"ret": df["close"].pct_change()}))
+    monkeypatch.setattr(te, "_joblib_available", True)
+    monkeypatch.setattr(te, "joblib_load", lambda p: models[p.name])
+    monkeypatch.setattr(te, "_telegram_available", False)
+    monkeypatch.setattr(te, "_account_equity", lambda: 10.0)
+    risk_rules.set_engine(risk_rules.RiskRules(cfg={"rules": {}}))
+    yield te
+    risk_rules.set_engine(None)
+    model_cache.clear()
+
+
+def test_run_cycle_scores_and_logs_orders(engine):
+    res = engine.run_cycle(["EURUSD", "GBPUSD"], ["1h"], dry_run=True)
+    eur = res[("EURUSD", "1h")]
+    assert eur["status"] == "dry_run" and eur["signal"] == "BUY"
+    assert eur["predictions"] == pytest.approx({"gbdt": 0.9, "lr": 0.8})
+    assert res[("GBPUSD", "1h")] == {"status": "skipped", "reason": "no_predictions"}
+    assert [o["symbol"] for o in state_store.orders()] == ["EURUSD"]
+    assert cov_engine.get_engine("1h").ready(["EURUSD", "GBPUSD"]) == ["EURUSD", "GBPUSD"]
+
+
+def test_run_cycle_skips_open_positions_and_denied_orders(engine):
+    state_store.upsert_position("engine", "EURUSD_1h", {"status": "open"}, symbol="EURUSD")
+    assert engine.run_cycle(["EURUSD"], ["1h"], dry_run=True)[("EURUSD", "1h")]["reason"] == "already_open"
+
+    state_store.upsert_position("engine", "EURUSD_1h", {"status": "closed"}, symbol="EURUSD")
+    risk_rules.set_engine(risk_rules.RiskRules(cfg={"rules": {"daily_r_stop": -1.0}}, day_r_fn=lambda: -2.0))
+    r = engine.run_cycle(["EURUSD"], ["1h"], dry_run=True)[("EURUSD", "1h")]
+    assert r["status"] == "denied" and r["reasons"][0].startswith("daily_r_stop")
+
+
+def test_daemon_stream_watches_broker_stops(engine):
+    import threading
+    from tools import market_stream
+
+    # broker book is keyed by epic, the stream by CLI symbol ("XAUUSD" -> "GOLD", "BTC/USD" -> "BTCUSD")
+    state_store.replace_positions("broker", {"GOLD": {"side": "LONG", "size": 1.0, "sl": 1_000.0, "tp": None},
+                                             "BTCUSD": {"side": "SHORT", "size": 1.0, "sl": 1.0, "tp": None}})
+    hit = threading.Event()
+    seen = []
+
+    def on_hit(*a):
+        seen.append(a[:2])
+        if len(seen) == 2:
+            hit.set()
+    stream, stop = engine.start_market_stream(["XAUUSD", "BTC/USD"], "sim", on_hit=on_hit)
+    try:
+        assert market_stream.get_default_stream() is stream
+        assert hit.wait(5.0)
+    finally:
+        stop()
+    assert sorted(seen) == [("BTC/USD", "SL"), ("XAUUSD", "SL")] and market_stream.get_default_stream() is None
+    assert engine.start_market_stream(["EURUSD"], "")[0] is None
+
+
+def test_run_cycle_feeds_price_equity_and_book_to_rules(engine):
+    state_store.replace_positions("broker", {"US500": {"side": "LONG", "size": 0.1, "entry_price": 50.0}})
+    assert risk_rules.book_from_state("broker").exposure == {"US500": 5.0}
+    risk_rules.set_engine(risk_rules.RiskRules(cfg={"rules": {"max_leverage": 0.55}}, day_r_fn=lambda: None))
+    r = engine.run_cycle(["EURUSD"], ["1h"], dry_run=True)[("EURUSD", "1h")]
+    assert r["status"] == "denied" and r["reasons"][0].startswith("leverage")  # (5 + ~1) / 10 > 0.55
+
+
+def test_cov_commit_failure_does_not_abort_cycle(engine, monkeypatch):
+    def boom(self, before=None):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(cov_engine.EwmaCov, "commit", boom)
+    assert engine.run_cycle(["EURUSD"], ["1h"], dry_run=True)[("EURUSD", "1h")]["status"] == "dry_run"
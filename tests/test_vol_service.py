@@ -0,0 +1,80 @@
+"""Tests for the incremental per-(symbol, tf) volatility state."""
+
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.market_stream import Bar
+from tools.vol_service import VolService, atr_from_df
+
+
+def _frame(n=200, seed=3):
+    rng = np.random.default_rng(seed)
+    c = 100 + np.cumsum(rng.normal(0, 1, n))
+    h = c + rng.uniform(0.1, 1.0, n)
+    l = c - rng.uniform(0.1, 1.0, n)
+    t = pd.date_range("2026-03-02", periods=n, freq="h", tz="UTC")
+    return pd.DataFrame({"time": t, "open": c, "high": h, "low": l, "close": c})
+
+
+def _ref_atr(df, n):
+    h, l, c = df["high"], df["low"], df["close"]
+    tr = pd.concat([h - l, (h - c.shift()).abs(), (l - c.shift()).abs()], axis=1).max(axis=1)
+    return tr.rolling(n).mean()
+
+
+def test_incremental_matches_batch(tmp_path):
+    df = _frame()
+    svc = VolService(tmp_path / "vol.json")
+    assert svc.seed("gold", "1h", df.iloc[:150]) == 150
+    for r in df.iloc[150:].itertuples():
+        svc.on_bar(Bar("GOLD", "1h", int(r.time.timestamp()), r.open, r.high, r.low, r.close))
+    assert svc.seed("GOLD", "1h", df) == 0  # kaikki rivit jo mukana
+
+    ref = _ref_atr(df, 14)
+    assert svc.atr("GOLD", "1h", 14) == pytest.approx(ref.iloc[-1])
+    assert svc.atr_ref("GOLD", "1h", 14, 5) == pytest.approx(ref.iloc[-70:].median())
+    assert atr_from_df(df, 14) == pytest.approx(ref.iloc[-1])
+
+    rv = np.log(df["close"]).diff().iloc[-20:].std()
+    assert svc.realized_vol("GOLD", "1h", 20) == pytest.approx(rv)
+    pk = math.sqrt((np.log(df["high"] / df["low"]).iloc[-20:] ** 2).mean() / (4 * math.log(2)))
+    assert svc.parkinson_vol("GOLD", "1h", 20) == pytest.approx(pk)
+
+
+def test_persistence_and_stamp_reseed(tmp_path):
+    df = _frame(60)
+    calls = []
+    src = {"df": df.iloc[:40], "stamp": 1}
+
+    def loader(sym, tf):
+        calls.append((sym, tf))
+        return src["df"]
+
+    svc = VolService(tmp_path / "vol.json", loader=loader, stamp=lambda s, t: src["stamp"])
+    a1 = svc.atr("EURUSD", "15m", 14)
+    svc.atr("EURUSD", "15m", 14)
+    assert a1 == pytest.approx(_ref_atr(df.iloc[:40], 14).iloc[-1]) and len(calls) == 1
+
+    src["df"], src["stamp"] = df, 2
+    assert svc.atr("EURUSD", "15m", 14) == pytest.approx(_ref_atr(df, 14).iloc[-1])
+    assert len(calls) == 2 and svc.bars("EURUSD", "15m") == 60
+
+    svc.save()
+    again = VolService(tmp_path / "vol.json")
+    assert again.atr("EURUSD", "15m", 14) == pytest.approx(_ref_atr(df, 14).iloc[-1])
+    assert again.last_bar_time("EURUSD", "15m") == int(df["time"].iloc[-1].timestamp())
+
+
+def test_seed_skips_forming_candle(tmp_path):
+    df = _frame(30)
+    t_last = int(df["time"].iloc[-1].timestamp())
+    svc = VolService(tmp_path / "vol.json")
+    assert svc.seed("GOLD", "1h", df, now=t_last + 1800) == 29  # viimeinen baari vielä auki
+    assert svc.last_bar_time("GOLD", "1h") == t_last - 3600
+    final = df.iloc[-1]
+    assert svc.update_bar("GOLD", "1h", t_last, final.high + 1, final.low, final.close)
+    assert svc.seed("GOLD", "1h", df, now=t_last + 3600) == 0
+    assert svc.bars("GOLD", "1h") == 30
@@ -1,5 +1,7 @@
 import json, os, sys
 
+from tools import model_cache
+
 METRICS_NEW = "results/train/metrics.json"
 ACTIVE_JSON = "models/active.json"
 
@@ -18,8 +20,11 @@ def main():
 
     if new_model and (new_score > cur_score):
         active.update({"model": new_model, "profit_factor": new_score})
-        with open(ACTIVE_JSON,"w") as f:
+        tmp = ACTIVE_JSON + ".tmp"
+        with open(tmp,"w") as f:
             json.dump(active, f, indent=2)
+        os.replace(tmp, ACTIVE_JSON)
+        model_cache.bump_version()
         print("activated", new_model)
     else:
         print("kept_current")
@@ -25,15 +25,18 @@ import json
 from pathlib import Path
 from typing import Dict, Any, Tuple, Optional
 
+from tools import model_cache
+
 ROOT = Path("/root/pro_botti")
 MODELS_DIR = ROOT / "models"
 
 def _load_meta(symbol: str, tf: str) -> Dict[str, Any]:
     p = MODELS_DIR / f"pro_{symbol}_{tf}.json"
     try:
-        return json.loads(p.read_text(encoding="utf-8"))
+        meta = model_cache.load_json(p, {})
     except Exception:
         return {}
+    return meta if isinstance(meta, dict) else {}
 
 def _thr_from_meta(meta: Dict[str, Any]) -> Tuple[float, float]:
     thr = meta.get("ai_thresholds")
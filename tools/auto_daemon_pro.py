@@ -12,6 +12,8 @@ from tools.frequency_controller import record_trade, calibrate_thresholds
 from tools.symbol_resolver import read_symbols
 from tools.capital_client import connect_and_prepare
 from tools.meta_filter import should_take_trade
+from tools.bar_scheduler import sleep_until_next_close
+from tools import profiler, vol_service
 
 STATE = Path(__file__).resolve().parents[1] / "state"
 LIVE_STATE = STATE / "live_state.json"
@@ -90,7 +92,9 @@ def _calc_sl_tp(df: pd.DataFrame, symbol: str, tf: str, action: str, entry_px: f
     min_sl_pct = float(os.getenv("LIVE_MIN_SL_PCT", "0.001"))
     min_tp_pct = float(os.getenv("LIVE_MIN_TP_PCT", "0.001"))
 
-    atrv = _atr(df, atr_n)
+    atrv = vol_service.atr(symbol, tf, atr_n, df=df)
+    if atrv is None:  # lämpenemisvaihe: alle atr_n+1 kynttilää
+        atrv = _atr(df, atr_n)
     tick = _tick_for_symbol(symbol)
 
     # ATR-pohjainen etäisyys (voit laajentaa meta-moodiin myöhemmin)
@@ -107,6 +111,7 @@ def _calc_sl_tp(df: pd.DataFrame, symbol: str, tf: str, action: str, entry_px: f
 
 def main_loop():
     print("[AUTO] starting auto_daemon_pro loop…", flush=True)
+    profiler.install("auto_daemon_pro")
 
     # Login
     while True:
@@ -150,45 +155,49 @@ def main_loop():
 
             pro_reg = _pro_registry()
 
-            for sym in symbols:
-                for tf in tf_map.get(sym, []):
-                    rows = [m for m in pro_reg.get("models", [])
-                            if m.get("symbol") == sym and m.get("tf") == tf and m.get("strategy") == "CONSENSUS"]
-                    if not rows:
-                        continue
-                    rows.sort(key=lambda r: int(r.get("trained_at", 0)), reverse=True)
-                    cfg = rows[0].get("config") or {}
-
-                    df = capital_get_candles_df(sym, tf, total_limit=max_total)
-                    if df.empty or len(df) < 50:
-                        continue
-
-                    sig = consensus_signal(df, cfg)
-                    last_sig = int(sig[-1]) if len(sig) else 0
-                    key = f"{sym}__{tf}"
-                    prev = int(live_state.get(key, {}).get("last_sig", 0))
-
-                    action = "HOLD"
-                    if prev <= 0 and last_sig > 0: action = "BUY"
-                    if prev >= 0 and last_sig < 0 and os.getenv("LIVE_SHORTS","0")=="1": action = "SELL"
-
-                    if action in ("BUY", "SELL"):
-                        ok, p = should_take_trade(sym, tf, action, df)
-                        if not ok:
-                            print(f"[META] {sym} {tf} {action} filtered p={p:.2f}", flush=True)
-                        else:
-                            ba = capital_get_bid_ask(sym)
-                            px = (ba[1] if action == "BUY" else ba[0]) if ba else float(df["close"].iloc[-1])
-                            sl_px, tp_px = _calc_sl_tp(df, sym, tf, action, px)
-                            res = execute_action(sym, tf, action, px, equity=_equity(), sl_px=sl_px, tp_px=tp_px)
-                            if res:
-                                record_trade(sym, tf)
-                                extra = f" sl={sl_px:.5f} tp={tp_px:.5f}" if (sl_px and tp_px) else ""
-                                print(f"[AUTO] {sym} {tf}: {action} executed (p_meta={p:.2f}){extra}", flush=True)
+            with profiler.span("cycle", symbols=len(symbols)):
+                for sym in symbols:
+                    for tf in tf_map.get(sym, []):
+                        rows = [m for m in pro_reg.get("models", [])
+                                if m.get("symbol") == sym and m.get("tf") == tf and m.get("strategy") == "CONSENSUS"]
+                        if not rows:
+                            continue
+                        rows.sort(key=lambda r: int(r.get("trained_at", 0)), reverse=True)
+                        cfg = rows[0].get("config") or {}
+
+                        with profiler.span("candles", symbol=sym, tf=tf):
+                            df = capital_get_candles_df(sym, tf, total_limit=max_total)
+                        if df.empty or len(df) < 50:
+                            continue
+
+                        with profiler.span("consensus", symbol=sym, tf=tf):
+                            sig = consensus_signal(df, cfg)
+                        last_sig = int(sig[-1]) if len(sig) else 0
+                        key = f"{sym}__{tf}"
+                        prev = int(live_state.get(key, {}).get("last_sig", 0))
+
+                        action = "HOLD"
+                        if prev <= 0 and last_sig > 0: action = "BUY"
+                        if prev >= 0 and last_sig < 0 and os.getenv("LIVE_SHORTS","0")=="1": action = "SELL"
+
+                        if action in ("BUY", "SELL"):
+                            with profiler.span("meta_filter", symbol=sym, tf=tf):
+                                ok, p = should_take_trade(sym, tf, action, df)
+                            if not ok:
+                                print(f"[META] {sym} {tf} {action} filtered p={p:.2f}", flush=True)
                             else:
-                                print(f"[AUTO] {sym} {tf}: {action} skipped (risk/guard/router)", flush=True)
-
-                    live_state[key] = {"last_sig": last_sig, "pos": 0, "equity": _equity()}
+                                ba = capital_get_bid_ask(sym)
+                                px = (ba[1] if action == "BUY" else ba[0]) if ba else float(df["close"].iloc[-1])
+                                sl_px, tp_px = _calc_sl_tp(df, sym, tf, action, px)
+                                res = execute_action(sym, tf, action, px, equity=_equity(), sl_px=sl_px, tp_px=tp_px)
+                                if res:
+                                    record_trade(sym, tf)
+                                    extra = f" sl={sl_px:.5f} tp={tp_px:.5f}" if (sl_px and tp_px) else ""
+                                    print(f"[AUTO] {sym} {tf}: {action} executed (p_meta={p:.2f}){extra}", flush=True)
+                                else:
+                                    print(f"[AUTO] {sym} {tf}: {action} skipped (risk/guard/router)", flush=True)
+
+                        live_state[key] = {"last_sig": last_sig, "pos": 0, "equity": _equity()}
 
             (STATE / "live_state.json").write_text(json.dumps(live_state, ensure_ascii=False, indent=2))
 
@@ -196,6 +205,9 @@ def main_loop():
             print("[AUTO] loop error:", e, flush=True)
             traceback.print_exc()
 
+        if os.getenv("LIVE_BAR_ALIGN", "0") == "1" and tf_map:
+            sleep_until_next_close({tf for tfs in tf_map.values() for tf in tfs})
+            continue
         min_step = min({"15m":900, "1h":3600, "4h":14400}[tf] for tfs in tf_map.values() for tf in tfs) if tf_map else 60
         time.sleep(max(sleep_min, min_step // 5))
 
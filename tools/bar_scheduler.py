@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Bar-close-aligned asyncio scheduler for the live daemons.
+
+Jobs are registered per timeframe and fire a short grace period after each
+bar boundary (BAR_CLOSE_GRACE_MS, default 300 ms) instead of after a fixed
+sleep. All jobs due at the same boundary run concurrently (sync callables in
+worker threads), each with its own deadline. Start lateness, run time,
+timeouts and errors are recorded per job.
+
+Usage:
+    sched = BarScheduler()
+    sched.add_job("15m", lambda: run_cycle(symbols, ["15m"]), name="cycle_15m")
+    sched.add_job("1h",  lambda: run_cycle(symbols, ["1h"]),  name="cycle_1h")
+    asyncio.run(sched.run())
+
+Blocking loops can use sleep_until_next_close(tfs) in place of time.sleep(interval).
+"""
+from __future__ import annotations
+import asyncio
+import inspect
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from history.history_utils import tf_to_seconds
+from tools.ops_runtime import BAR_CLOSE_LAG
+
+GRACE_SEC = float(os.getenv("BAR_CLOSE_GRACE_MS", "300")) / 1000.0
+MAX_CONCURRENCY = int(os.getenv("BAR_SCHED_CONCURRENCY", "8"))
+
+
+def bar_seconds(tf: str) -> int:
+    """Bar length in seconds; unknown TFs fall back to 1h like auto_daemon_pro._bar_align."""
+    try:
+        return tf_to_seconds(tf)
+    except (ValueError, AttributeError):
+        return 3600
+
+
+def next_bar_close(tf: str, now: Optional[float] = None) -> float:
+    """Epoch seconds of the next bar boundary strictly after `now`."""
+    step = bar_seconds(tf)
+    t = time.time() if now is None else now
+    return (int(t // step) + 1) * step
+
+
+def seconds_until_next_close(tfs: Iterable[str], grace: float = GRACE_SEC, now: Optional[float] = None) -> float:
+    t = time.time() if now is None else now
+    tfs = list(tfs) or ["1h"]
+    return max(0.0, min(next_bar_close(tf, t) for tf in tfs) + grace - t)
+
+
+def sleep_until_next_close(tfs: Iterable[str], grace: float = GRACE_SEC) -> float:
+    """Blocking helper for the synchronous loops; returns seconds slept."""
+    dt = seconds_until_next_close(tfs, grace)
+    time.sleep(dt)
+    return dt
+
+
+@dataclass
+class JobStats:
+    runs: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    skipped: int = 0           # previous run still in progress at the boundary
+    last_late_ms: float = 0.0  # start time - bar boundary
+    max_late_ms: float = 0.0
+    last_duration_ms: float = 0.0
+    last_error: str = ""
+
+
+@dataclass
+class BarJob:
+    name: str
+    tf: str
+    fn: Callable[[], Any]
+    deadline: float
+    stats: JobStats = field(default_factory=JobStats)
+    running: bool = False
+
+
+class BarScheduler:
+    def __init__(self, grace: float = GRACE_SEC, max_concurrency: int = MAX_CONCURRENCY,
+                 clock: Callable[[], float] = time.time):
+        self.grace = float(grace)
+        self.clock = clock
+        self.jobs: List[BarJob] = []
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._max_concurrency = max(1, int(max_concurrency))
+        self._tasks: set = set()
+
+    def add_job(self, tf: str, fn: Callable[[], Any], name: Optional[str] = None,
+                deadline: Optional[float] = None) -> BarJob:
+        """Register fn to run after every `tf` bar close; default deadline is half a bar."""
+        job = BarJob(
+            name=name or f"{getattr(fn, '__name__', 'job')}_{tf}",
+            tf=tf,
+            fn=fn,
+            deadline=float(deadline) if deadline else bar_seconds(tf) * 0.5,
+        )
+        self.jobs.append(job)
+        return job
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {j.name: dict(vars(j.stats), tf=j.tf) for j in self.jobs}
+
+    def _due(self, boundary: float) -> List[BarJob]:
+        return [j for j in self.jobs if int(boundary) % bar_seconds(j.tf) == 0]
+
+    async def _run_job(self, job: BarJob, boundary: float):
+        st = job.stats
+        if job.running:
+            st.skipped += 1
+            return
+        job.running = True
+        fut = None
+        try:
+            async with self._sem:
+                t0 = self.clock()
+                st.last_late_ms = (t0 - boundary) * 1000.0
+                st.max_late_ms = max(st.max_late_ms, st.last_late_ms)
+                BAR_CLOSE_LAG.set(t0 - boundary, tf=job.tf)
+                st.runs += 1
+                if inspect.iscoroutinefunction(job.fn):
+                    aw = job.fn()
+                else:
+                    # säie ei peruunnu: odotetaan shieldin läpi ja vapautetaan running vasta kun säie valmis
+                    fut = asyncio.get_running_loop().run_in_executor(None, job.fn)
+                    aw = asyncio.shield(fut)
+                try:
+                    await asyncio.wait_for(aw, timeout=job.deadline)
+                except asyncio.TimeoutError:
+                    st.timeouts += 1
+                    print(f"[SCHED] {job.name} exceeded deadline {job.deadline:.1f}s", flush=True)
+                except Exception as e:
+                    st.errors += 1
+                    st.last_error = str(e)
+                    print(f"[SCHED] {job.name} failed: {e}", flush=True)
+                st.last_duration_ms = (self.clock() - t0) * 1000.0
+        finally:
+            if fut is not None and not fut.done():
+                fut.add_done_callback(lambda f, job=job: self._thread_done(job, f))
+            else:
+                job.running = False
+
+    @staticmethod
+    def _thread_done(job: BarJob, fut: "asyncio.Future"):
+        job.running = False
+        if not fut.cancelled() and fut.exception() is not None:
+            job.stats.errors += 1
+            job.stats.last_error = str(fut.exception())
+            print(f"[SCHED] {job.name} failed after deadline: {fut.exception()}", flush=True)
+
+    async def run_boundary(self, boundary: float):
+        """Fire every job due at `boundary` concurrently and wait for them."""
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self._max_concurrency)
+        due = self._due(boundary)
+        await asyncio.gather(*(self._run_job(j, boundary) for j in due))
+
+    async def run(self, stop: Optional[asyncio.Event] = None, max_boundaries: Optional[int] = None):
+        """Main loop: sleep to the next boundary (+grace), fire due jobs without blocking the clock."""
+        if not self.jobs:
+            return
+        self._sem = asyncio.Semaphore(self._max_concurrency)
+        fired = 0
+        while not (stop and stop.is_set()):
+            now = self.clock()
+            boundary = min(next_bar_close(j.tf, now) for j in self.jobs)
+            delay = max(0.0, boundary + self.grace - now)
+            if stop:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=delay)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(self.run_boundary(boundary))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            fired += 1
+            if max_boundaries is not None and fired >= max_boundaries:
+                break
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
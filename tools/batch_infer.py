@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Cycle-level batched inference for the live daemons.
+
+Instead of scoring one (symbol, tf) at a time, a trading cycle:
+1. collects the latest feature row of every due (symbol, tf),
+2. groups the rows by model artefact (file + feature list),
+3. runs ONE vectorized predict_proba per group,
+4. fans the probabilities back out per (symbol, tf) -> {model_name: prob}.
+
+The output has the same shape as trade_engine.get_model_predictions, so it can be
+passed straight to combine_signals (or ai_gate.gate_decision via p_up).
+
+Usage:
+    jobs = [InferenceJob(sym, tf, df, cfg), ...]
+    preds = predict_batch(jobs)          # {(sym, tf): {"gbdt": 0.61, "lr": 0.55}}
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tools import model_cache
+from tools.ops_runtime import stage_timer
+
+ROOT = Path(__file__).resolve().parents[1]
+META_DIR = ROOT / "state" / "models_meta"
+
+Key = Tuple[str, str]
+
+
+@dataclass
+class InferenceJob:
+    symbol: str
+    tf: str
+    df: Optional[pd.DataFrame] = None       # candles; used if features is None
+    config: Optional[Dict[str, Any]] = None  # models_meta.json row
+    features: Optional[pd.DataFrame] = None  # precomputed feature frame (optional)
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def key(self) -> Key:
+        return (self.symbol, self.tf)
+
+
+def _latest_row(job: InferenceJob, feature_fn: Callable[[pd.DataFrame], pd.DataFrame]) -> Optional[pd.DataFrame]:
+    feats = job.features
+    if feats is None:
+        if job.df is None or job.df.empty:
+            return None
+        feats = feature_fn(job.df)
+    feats = feats.replace([np.inf, -np.inf], np.nan).ffill().bfill().fillna(0.0)
+    if feats.empty:
+        return None
+    return feats.iloc[[-1]]
+
+
+def _proba(model: Any, X: pd.DataFrame) -> np.ndarray:
+    if hasattr(model, "predict_proba"):
+        return np.asarray(model.predict_proba(X))[:, 1].astype(float)
+    return np.asarray(model.predict(X), dtype=float).reshape(-1)
+
+
+def group_jobs(
+    jobs: List[InferenceJob],
+    model_dir: Path = META_DIR,
+    feature_fn: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+) -> Dict[Tuple[str, Tuple[str, ...]], List[Tuple[Key, str, pd.DataFrame]]]:
+    """
+    Build {(model_path, feature_cols): [(key, model_name, X_row), ...]}.
+
+    Jobs with no config / no features are skipped and get an entry in job.errors.
+    """
+    if feature_fn is None:
+        from tools.ml.features import compute_features as feature_fn
+    groups: Dict[Tuple[str, Tuple[str, ...]], List[Tuple[Key, str, pd.DataFrame]]] = {}
+    for job in jobs:
+        cfg = job.config
+        if not cfg:
+            job.errors.append("no_config")
+            continue
+        try:
+            row = _latest_row(job, feature_fn)
+        except Exception as e:
+            job.errors.append(f"features: {e}")
+            continue
+        if row is None:
+            job.errors.append("no_features")
+            continue
+        cols = tuple(cfg.get("features", []))
+        X = row.reindex(columns=list(cols)).fillna(0.0)
+        for name, info in (cfg.get("models") or {}).items():
+            fname = (info or {}).get("file")
+            if not fname:
+                continue
+            groups.setdefault((str(Path(model_dir) / fname), cols), []).append((job.key, name, X))
+    return groups
+
+
+def predict_batch(
+    jobs: List[InferenceJob],
+    model_dir: Path = META_DIR,
+    feature_fn: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    loader: Optional[Callable[[Path], Any]] = None,
+) -> Dict[Key, Dict[str, float]]:
+    """Score all jobs with one predict call per model artefact."""
+    out: Dict[Key, Dict[str, float]] = {job.key: {} for job in jobs}
+    by_key = {job.key: job for job in jobs}
+    with stage_timer("feature_build"):
+        groups = group_jobs(jobs, model_dir, feature_fn)
+    for (path, _cols), members in groups.items():
+        try:
+            model = model_cache.load_model(path, loader=loader)
+        except Exception as e:
+            model = None
+            err = f"load {Path(path).name}: {e}"
+        else:
+            err = f"missing {Path(path).name}"
+        if model is None:
+            for key, _name, _X in members:
+                by_key[key].errors.append(err)
+            continue
+        X = pd.concat([m[2] for m in members], axis=0, ignore_index=True)
+        try:
+            with stage_timer("predict"):
+                probs = _proba(model, X)
+        except Exception as e:
+            for key, name, _X in members:
+                by_key[key].errors.append(f"predict {name}: {e}")
+            continue
+        for (key, name, _X), p in zip(members, probs):
+            out[key][name] = float(p)
+    return out
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench.py – kvanttipolkujen suorituskykymittaus synteettisellä datalla (offline)
+
+    python -m tools.bench                          # oletuskoot 1e3..1e6, tulos results/bench/
+    python -m tools.bench --cases features,exec_sim --sizes 1000,100000
+    python -m tools.bench --baseline results/bench/<vanha>.json   # vertailu, exit 1 jos regressio
+
+Jokaisesta (case, n) -parista mitataan paras aika `--repeat` ajosta ja erillisellä ajolla
+tracemallocin huippumuisti. Puhtaasti Python-silmukoiksi kirjoitetut polut on rajattu
+`max_n`:llä (ohitetaan isommat koot, --full ajaa kaiken). Tulos-JSON sisältää commitin,
+joten eri commitien ajot ovat suoraan vertailukelpoisia.
+"""
+from __future__ import annotations
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+OUT_DIR = ROOT / "results" / "bench"
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+REGRESSION_RATIO = 1.25
+SLOW_SEC = 2.0
+
+
+def synthetic_ohlcv(n: int, seed: int = 7, tf: str = "15m") -> pd.DataFrame:
+    """Deterministinen sarja tools.synth_data:sta (+ timestamp-sarake BacktestEnginelle)."""
+    from tools.synth_data import ohlcv
+    df = ohlcv(n, tf=tf, seed=seed)
+    df["timestamp"] = df["time"]
+    return df
+
+
+@dataclass
+class Case:
+    name: str
+    setup: Callable[[pd.DataFrame], Callable[[], Any]]  # valmistelu ei kuulu mittaukseen
+    max_n: int = DEFAULT_SIZES[-1]
+
+
+def _features(df):
+    from tools.ml.features import compute_features
+    return lambda: compute_features(df)
+
+
+def _barrier_labels(df):
+    from labels.labeling import barrier_labels
+    return lambda: barrier_labels(df, tp_bp=30, sl_bp=30, max_horizon=24)
+
+
+def _label_meta(df):
+    from tools.ml.labels import label_meta_from_entries
+    idx = np.arange(50, len(df) - 1, 10)
+    dirs = np.where(np.arange(len(idx)) % 2 == 0, 1, -1)
+    return lambda: label_meta_from_entries(df, idx, dirs)
+
+
+def _walkforward(df):
+    from tools.walkforward import run_wf
+    rng = np.random.default_rng(1)
+    p3 = rng.dirichlet((1.0, 1.0, 1.0), len(df))
+    d = pd.DataFrame({"ret1": df["close"].pct_change().fillna(0.0).values})
+    return lambda: run_wf(d, p3, fee_bps=3.0, is_frac=0.5, oos_frac=0.1)
+
+
+def _consensus(df):
+    from tools.consensus_engine import consensus_signal
+    return lambda: consensus_signal(df, {"threshold": 0.5})
+
+
+def _backtest(df):
+    from utils.backtest_engine import BacktestEngine
+
+    class _Loader:
+        def load(self, symbol, tf, start, end):
+            return df
+
+    def momentum(window, params):
+        c = window["close"].values
+        return 1 if c[-1] > c[0] else (-1 if c[-1] < c[0] else 0)
+
+    eng = BacktestEngine(momentum, _Loader(), "BENCH", tf="15m", risk_model="atr")
+    return eng.run
+
+
+def _exec_sim(df):
+    from tools.exec_sim import simulate_returns
+    sig = np.sign(np.sin(np.arange(len(df)) / 50.0))
+    return lambda: simulate_returns(df, sig, position_mode="longshort")
+
+
+def _metrics(df):
+    from utils.metrics import calculate_metrics
+    r = df["close"].pct_change().fillna(0.0).values
+    sig = np.sign(np.sin(np.arange(len(df)) / 50.0))
+    return lambda: calculate_metrics(r, sig)
+
+
+CASES: Dict[str, Case] = {c.name: c for c in (
+    Case("features", _features),
+    Case("barrier_labels", _barrier_labels, max_n=100_000),
+    Case("label_meta", _label_meta),
+    Case("walkforward", _walkforward),
+    Case("consensus", _consensus),
+    Case("backtest_engine", _backtest, max_n=10_000),
+    Case("exec_sim", _exec_sim),
+    Case("metrics", _metrics),
+)}
+
+
+def measure(fn: Callable[[], Any], repeat: int = 3, memory: bool = True) -> Dict[str, Any]:
+    times: List[float] = []
+    with warnings.catch_warnings(), np.errstate(all="ignore"):
+        warnings.simplefilter("ignore")
+        for _ in range(max(1, repeat)):
+            gc.collect()
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+            if times[-1] > SLOW_SEC:  # hidas polku: yksi ajo riittää
+                break
+        out: Dict[str, Any] = {"seconds": min(times), "runs": len(times)}
+        if memory:
+            gc.collect()
+            tracemalloc.start()
+            try:
+                fn()
+                out["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+            finally:
+                tracemalloc.stop()
+    return out
+
+
+def run(cases: Optional[List[str]] = None, sizes=DEFAULT_SIZES, repeat: int = 3, full: bool = False,
+        memory: bool = True, seed: int = 7, log: Callable[[str], None] = print) -> Dict[str, Any]:
+    results: List[Dict[str, Any]] = []
+    data: Dict[int, pd.DataFrame] = {}
+    for name in cases or list(CASES):
+        case = CASES[name]
+        for n in sizes:
+            row: Dict[str, Any] = {"case": name, "n": int(n)}
+            if n > case.max_n and not full:
+                row["skipped"] = f"n > max_n={case.max_n}"
+            else:
+                df = data.get(n)
+                if df is None:
+                    df = data[n] = synthetic_ohlcv(int(n), seed)
+                try:
+                    row.update(measure(case.setup(df), repeat, memory))
+                except Exception as e:
+                    row["error"] = f"{type(e).__name__}: {e}"
+            results.append(row)
+            log(_fmt_row(row))
+    return {"commit": _git_rev(), "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "machine": platform.machine(), "seed": seed, "results": results}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], ratio: float = REGRESSION_RATIO) -> List[Dict[str, Any]]:
+    """
+    Palauta regressiorivit: (case, n), jossa aika kasvoi yli `ratio`-kertaiseksi, ajo
+    kaatui ("error") tai baselinessa mitattu rivi katosi ("missing": ohitettu tai
+    tapaus poistettu CASES-rekisteristä). Tällä kertaa ajamatta jätetyt tapaukset
+    (--cases/--sizes) eivät ole regressioita.
+    """
+    base = {(r["case"], r["n"]): r for r in baseline.get("results", []) if "seconds" in r}
+    cur = {(r["case"], r["n"]): r for r in current.get("results", [])}
+    out = []
+    for key, r in cur.items():
+        b = base.get(key)
+        if "error" in r:
+            out.append({"case": key[0], "n": key[1], "base": b["seconds"] if b else None, "now": None,
+                        "ratio": None, "error": r["error"]})
+        elif b and "seconds" not in r:
+            out.append({"case": key[0], "n": key[1], "base": b["seconds"], "now": None, "ratio": None,
+                        "missing": r.get("skipped") or "no timing"})
+        elif b and b["seconds"] > 0 and r["seconds"] / b["seconds"] > ratio:
+            out.append({"case": key[0], "n": key[1], "base": b["seconds"], "now": r["seconds"],
+                        "ratio": r["seconds"] / b["seconds"]})
+    for key, b in base.items():
+        if key not in cur and key[0] not in CASES:
+            out.append({"case": key[0], "n": key[1], "base": b["seconds"], "now": None, "ratio": None,
+                        "missing": "case removed"})
+    return out
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def _fmt_row(r: Dict[str, Any]) -> str:
+    head = f"{r['case']:<16} n={r['n']:>9,}"
+    if "seconds" in r:
+        mem = f"  peak={r['peak_mb']:.1f}MB" if "peak_mb" in r else ""
+        return f"{head}  {r['seconds'] * 1000:10.1f} ms{mem}"
+    return f"{head}  {r.get('skipped') or r.get('error')}"
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Offline benchmarks for the quant hot paths")
+    ap.add_argument("--cases", default="", help=f"comma list, default all: {','.join(CASES)}")
+    ap.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--full", action="store_true", help="ignore per-case max_n")
+    ap.add_argument("--no-memory", action="store_true")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", default="", help="result JSON (default results/bench/<utc>-<commit>.json)")
+    ap.add_argument("--baseline", default="", help="compare against an earlier result JSON")
+    ap.add_argument("--ratio", type=float, default=REGRESSION_RATIO)
+    a = ap.parse_args(argv)
+
+    cases = [c.strip() for c in a.cases.split(",") if c.strip()] or None
+    unknown = [c for c in cases or [] if c not in CASES]
+    if unknown:
+        ap.error(f"unknown cases: {unknown}")
+    sizes = [int(float(s)) for s in a.sizes.split(",") if s.strip()]
+    res = run(cases, sizes, a.repeat, a.full, not a.no_memory, a.seed)
+
+    out = Path(a.out) if a.out else OUT_DIR / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{res['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(res, indent=2), encoding="utf-8")
+    print(f"[BENCH] wrote {out}", flush=True)
+
+    if a.baseline:
+        regs = compare(res, json.loads(Path(a.baseline).read_text(encoding="utf-8")), a.ratio)
+        for r in regs:
+            if r["ratio"] is None:
+                print(f"[BENCH] REGRESSION {r['case']} n={r['n']:,}: {r.get('error') or r.get('missing')}", flush=True)
+            else:
+                print(f"[BENCH] REGRESSION {r['case']} n={r['n']:,}: {r['base']:.4f}s -> {r['now']:.4f}s (x{r['ratio']:.2f})", flush=True)
+        return 1 if regs else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,3 +11,12 @@ from tools.symbol_resolver import _MAP as SYMBOL_NORMALIZATION_MAP
 # Uses the existing symbol normalization mappings for consistency
 # When a symbol matches a key (case-insensitive), the corresponding epic is used
 SYMBOL_EPIC_OVERRIDE: dict[str, str] = SYMBOL_NORMALIZATION_MAP
+
+# Symbols traded under a different Capital.com epic (same as capital_client/capital_session)
+DISPLAY_SYMBOL_OVERRIDE: dict[str, str] = {"XAUUSD": "GOLD"}
+
+
+def get_display_symbol(symbol: str) -> str:
+    """Return the Capital.com epic a symbol is traded as (uppercased symbol if not overridden)."""
+    s = symbol.strip().upper()
+    return DISPLAY_SYMBOL_OVERRIDE.get(s, s)
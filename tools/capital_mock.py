@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+capital_mock.py – paikallinen Capital.com REST -korvike kuormatesteihin (ei verkkoa)
+
+    python -m tools.capital_mock --port 8911 --latency-ms 40 --rate 10 --token-ttl 600
+    export CAPITAL_API_BASE=http://127.0.0.1:8911
+
+    with MockCapital(MockConfig(latency_ms=20, burst_every=50)) as mock:
+        os.environ.update(mock.env())
+        ...
+
+Endpointit (samat polut ja vastausmuodot kuin oikeassa API:ssa):
+    POST   /api/v1/session                    -> CST / X-SECURITY-TOKEN headerit
+    GET    /api/v1/markets?searchTerm=        -> {"markets": [...]}
+    GET    /api/v1/prices/{epic}              -> resolution, max, pageNumber, from, to
+    GET    /api/v1/positions[/open]           -> {"positions": [{"position": {...}, "market": {...}}]}
+    POST   /api/v1/positions                  -> {"dealReference"}
+    DELETE /api/v1/positions/{dealId}         -> {"dealReference"}
+    GET    /api/v1/confirms/{dealReference}
+    GET    /api/v1/accounts
+
+Vikojen injektointi (MockConfig): viive + jitter, token bucket -rajoitin (429), 429-purskeet
+joka N:nnessä pyynnössä, sessiotokenin vanheneminen (401 error.invalid.session.token) ja
+satunnaiset 500:t. Hinnat tulevat tools.synth_data:sta, joten sama siemen -> samat kynttilät.
+stats() kertoo pyyntömäärät poluittain ja vikojen määrät.
+"""
+from __future__ import annotations
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pandas as pd
+
+from tools import synth_data
+
+RESOLUTIONS = {"MINUTE": "1m", "MINUTE_5": "5m", "MINUTE_15": "15m", "MINUTE_30": "30m",
+               "HOUR": "1h", "HOUR_4": "4h", "DAY": "1d"}
+DEFAULT_SYMBOLS = ("EURUSD", "GBPUSD", "USDJPY", "US500", "US100", "GOLD", "BTCUSD", "ETHUSD", "AAPL", "NVDA")
+INVALID_TOKEN = {"errorCode": "error.invalid.session.token"}
+TOO_MANY = {"errorCode": "error.too-many.requests"}
+
+
+@dataclass
+class MockConfig:
+    symbols: Tuple[str, ...] = DEFAULT_SYMBOLS
+    history_bars: int = 5000          # kynttilöitä per (epic, resoluutio)
+    max_page: int = 1000              # Capitalin max-parametrin yläraja
+    seed: int = 42
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    rate: float = 0.0                 # pyyntöä/s per sessio (0 = ei rajaa)
+    burst: int = 10                   # token bucketin koko
+    login_rate: float = 0.0           # sessiopyyntöä/s (oikea API ~1/s)
+    burst_every: int = 0              # joka N:s pyyntö aloittaa 429-purskeen...
+    burst_len: int = 3                # ...jonka pituus on tämä
+    token_ttl: float = 0.0            # s; 0 = ei vanhene
+    error_rate: float = 0.0           # satunnaisten 500-vastausten osuus
+    balance: float = 10_000.0
+    api_key: Optional[str] = None     # jos annettu, X-CAP-API-KEY tarkistetaan
+
+
+class _Bucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate, self.cap = rate, float(max(1, burst))
+        self.tokens, self.ts = self.cap, time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.cap, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+def _iso(t: pd.Timestamp) -> str:
+    return t.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _parse_time(v: str) -> Optional[pd.Timestamp]:
+    v = (v or "").strip()
+    if not v:
+        return None
+    try:
+        if v.isdigit():
+            return pd.Timestamp(int(v), unit="ms", tz="UTC")
+        t = pd.Timestamp(v)
+        return t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+    except (ValueError, TypeError):
+        raise ValueError(v)
+
+
+class MockState:
+    """Palvelimen tila ilman HTTP:tä (testattavissa suoraan)."""
+
+    def __init__(self, cfg: MockConfig):
+        self.cfg = cfg
+        self.lock = threading.Lock()
+        self.rng = random.Random(cfg.seed)
+        self.sessions: Dict[str, float] = {}           # CST -> luontiaika
+        self.buckets: Dict[str, _Bucket] = {}
+        self.login_bucket = _Bucket(cfg.login_rate, 1) if cfg.login_rate > 0 else None
+        self.positions: Dict[str, Dict[str, Any]] = {}  # dealId -> position
+        self.confirms: Dict[str, Dict[str, Any]] = {}
+        self.candles: Dict[Tuple[str, str], pd.DataFrame] = {}
+        self.requests = 0
+        self.by_path: Dict[str, int] = {}
+        self.faults = {"429": 0, "401": 0, "500": 0, "login_429": 0}
+        self._burst_left = 0
+
+    # ---------- markkinadata ----------
+
+    def markets(self, term: str) -> List[Dict[str, Any]]:
+        t = term.upper().replace("/", "").replace(" ", "")
+        out = []
+        for s in self.cfg.symbols:
+            if not t or t in s:
+                cls = "commodities" if s == "GOLD" else synth_data.asset_class(s)
+                out.append({"epic": s, "symbol": s, "instrumentName": s, "marketStatus": "TRADEABLE",
+                            "instrumentType": {"fx": "CURRENCIES", "index": "INDICES", "crypto": "CRYPTOCURRENCIES",
+                                               "stock": "SHARES"}.get(cls, "COMMODITIES"),
+                            "type": "COMMODITIES" if s == "GOLD" else cls.upper()})
+        return out
+
+    def series(self, epic: str, tf: str) -> pd.DataFrame:
+        key = (epic, tf)
+        with self.lock:
+            df = self.candles.get(key)
+        if df is None:
+            cls = "crypto" if epic == "GOLD" else None  # GOLD: ei luokkaa nimestä -> 24/7
+            df = next(synth_data.generate([epic], [tf], bars=self.cfg.history_bars, seed=self.cfg.seed,
+                                          classes={epic: cls} if cls else None))[2]
+            with self.lock:
+                self.candles[key] = df
+        return df
+
+    def prices(self, epic: str, q: Dict[str, str]) -> Tuple[int, Any]:
+        if epic not in self.cfg.symbols:
+            return 404, {"errorCode": "error.not-found.epic"}
+        tf = RESOLUTIONS.get(q.get("resolution", "MINUTE"), "1m")
+        df = self.series(epic, tf)
+        try:
+            n = max(1, min(int(q.get("max", 10)), self.cfg.max_page))
+            page = int(q.get("pageNumber", 1))
+            t_from, t_to = _parse_time(q.get("from", "")), _parse_time(q.get("to", ""))
+        except ValueError:
+            return 400, {"errorCode": "error.invalid.daterange"}
+        times = df["time"]
+        lo, hi = 0, len(df)
+        if t_to is not None:
+            hi = int(times.searchsorted(t_to, side="left"))
+        if t_from is not None:
+            lo = int(times.searchsorted(t_from, side="left"))
+        hi -= (page - 1) * n
+        rows = df.iloc[max(lo, hi - n):max(lo, hi)]
+        if rows.empty:
+            return 404, {"errorCode": "error.prices.not-found"}
+        m = self.markets(epic)
+        return 200, {"prices": [self._price_row(r) for r in rows.itertuples(index=False)],
+                     "instrumentType": m[0]["instrumentType"] if m else ""}
+
+    @staticmethod
+    def _price_row(r) -> Dict[str, Any]:
+        h = float(r.spread) / 2.0
+
+        def px(v):
+            return {"bid": round(float(v) - h, 6), "ask": round(float(v) + h, 6)}
+        return {"snapshotTime": _iso(r.time), "snapshotTimeUTC": _iso(r.time),
+                "openPrice": px(r.open), "closePrice": px(r.close), "highPrice": px(r.high), "lowPrice": px(r.low),
+                "lastTradedVolume": float(r.volume)}
+
+    def quote(self, epic: str) -> Tuple[float, float]:
+        r = self.series(epic, "1m").iloc[-1]
+        return float(r["close"]) - float(r["spread"]) / 2.0, float(r["close"]) + float(r["spread"]) / 2.0
+
+    # ---------- kaupankäynti ----------
+
+    def open_position(self, body: Dict[str, Any]) -> Tuple[int, Any]:
+        epic = str(body.get("epic") or "")
+        direction = str(body.get("direction") or "").upper()
+        try:
+            size = float(body.get("size") or 0)
+        except (TypeError, ValueError):
+            size = 0.0
+        ref = "o_" + uuid.uuid4().hex[:16]
+        if epic not in self.cfg.symbols or direction not in ("BUY", "SELL") or size <= 0:
+            self.confirms[ref] = {"dealReference": ref, "dealStatus": "REJECTED", "status": "REJECTED",
+                                  "reason": "VALIDATION_ERROR", "epic": epic}
+            return 200, {"dealReference": ref}
+        bid, ask = self.quote(epic)
+        deal = uuid.uuid4().hex[:16]
+        pos = {"dealId": deal, "dealReference": ref, "epic": epic, "direction": direction, "size": size,
+               "level": ask if direction == "BUY" else bid, "stopLevel": body.get("stopLevel"),
+               "profitLevel": body.get("profitLevel"), "createdDateUTC": _iso(pd.Timestamp.now(tz="UTC")),
+               "currency": "USD"}
+        with self.lock:
+            self.positions[deal] = pos
+            self.confirms[ref] = {"dealReference": ref, "dealId": deal, "dealStatus": "ACCEPTED", "status": "OPEN",
+                                  "epic": epic, "direction": direction, "size": size, "level": pos["level"],
+                                  "affectedDeals": [{"dealId": deal, "status": "OPENED"}]}
+        return 200, {"dealReference": ref}
+
+    def close_position(self, deal: str) -> Tuple[int, Any]:
+        with self.lock:
+            pos = self.positions.pop(deal, None)
+        if pos is None:
+            return 404, {"errorCode": "error.not-found.dealId"}
+        ref = "p_" + uuid.uuid4().hex[:16]
+        self.confirms[ref] = {"dealReference": ref, "dealId": deal, "dealStatus": "ACCEPTED", "status": "CLOSED",
+                              "epic": pos["epic"], "affectedDeals": [{"dealId": deal, "status": "FULLY_CLOSED"}]}
+        return 200, {"dealReference": ref}
+
+    def positions_payload(self) -> Dict[str, Any]:
+        out = []
+        with self.lock:
+            items = list(self.positions.values())
+        for p in items:
+            bid, ask = self.quote(p["epic"])
+            mark = bid if p["direction"] == "BUY" else ask
+            upl = (mark - p["level"]) * p["size"] * (1 if p["direction"] == "BUY" else -1)
+            out.append({"position": dict(p, upl=round(upl, 2)),
+                        "market": {"epic": p["epic"], "instrumentName": p["epic"], "bid": bid, "offer": ask}})
+        return {"positions": out}
+
+    def accounts(self) -> Dict[str, Any]:
+        upl = sum(p["position"]["upl"] for p in self.positions_payload()["positions"])
+        bal = self.cfg.balance
+        return {"accounts": [{"accountId": "MOCK1", "accountName": "mock", "preferred": True, "currency": "USD",
+                              "accountType": "CFD",
+                              "balance": {"balance": bal, "deposit": bal, "profitLoss": upl, "available": bal + upl}}]}
+
+    # ---------- viat ----------
+
+    def admit(self, path: str, token: Optional[str]) -> Optional[Tuple[int, Any]]:
+        """Yhteiset tarkistukset ennen käsittelyä: purskeet, rajoitin, 500:t. None = ok."""
+        with self.lock:
+            self.requests += 1
+            self.by_path[path] = self.by_path.get(path, 0) + 1
+            c = self.cfg
+            if c.burst_every and self.requests % c.burst_every == 0:
+                self._burst_left = c.burst_len
+            if self._burst_left > 0:
+                self._burst_left -= 1
+                self.faults["429"] += 1
+                return 429, TOO_MANY
+            if c.rate > 0:
+                b = self.buckets.setdefault(token or "-", _Bucket(c.rate, c.burst))
+                if not b.take():
+                    self.faults["429"] += 1
+                    return 429, TOO_MANY
+            if c.error_rate > 0 and self.rng.random() < c.error_rate:
+                self.faults["500"] += 1
+                return 500, {"errorCode": "error.internal"}
+        return None
+
+    def check_token(self, cst: Optional[str], sec: Optional[str]) -> bool:
+        with self.lock:
+            t0 = self.sessions.get(cst or "")
+            ok = t0 is not None and sec == "S" + (cst or "")[1:]
+            if ok and self.cfg.token_ttl > 0 and time.time() - t0 > self.cfg.token_ttl:
+                self.sessions.pop(cst, None)
+                ok = False
+            if not ok:
+                self.faults["401"] += 1
+            return ok
+
+    def login(self, api_key: Optional[str], body: Dict[str, Any]) -> Tuple[int, Any, Dict[str, str]]:
+        with self.lock:
+            if self.login_bucket is not None and not self.login_bucket.take():
+                self.faults["login_429"] += 1
+                return 429, TOO_MANY, {}
+        if self.cfg.api_key and api_key != self.cfg.api_key:
+            return 401, {"errorCode": "error.invalid.api.key"}, {}
+        if not body.get("identifier") or not body.get("password"):
+            return 400, {"errorCode": "error.invalid.details"}, {}
+        tok = uuid.uuid4().hex
+        cst, sec = "C" + tok, "S" + tok
+        with self.lock:
+            self.sessions[cst] = time.time()
+        return 200, {"accountType": "CFD", "currentAccountId": "MOCK1", "clientId": "mock",
+                     "CST": cst, "X-SECURITY-TOKEN": sec}, {"CST": cst, "X-SECURITY-TOKEN": sec}
+
+    def expire_tokens(self):
+        with self.lock:
+            self.sessions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"requests": self.requests, "by_path": dict(self.by_path), "faults": dict(self.faults),
+                    "sessions": len(self.sessions), "positions": len(self.positions)}
+
+
+def _route(path: str) -> str:
+    """Polku tilastoavaimeksi (/api/v1/prices/EURUSD -> /api/v1/prices/*)."""
+    parts = path.rstrip("/").split("/")
+    if len(parts) > 4 and parts[3] in ("prices", "confirms", "positions") and parts[4] != "open":
+        return "/".join(parts[:4]) + "/*"
+    return path.rstrip("/") or "/"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, code: int, obj: Any, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> Dict[str, Any]:
+        n = int(self.headers.get("Content-Length") or 0)
+        if not n:
+            return {}
+        try:
+            return json.loads(self.rfile.read(n) or b"{}")
+        except ValueError:
+            return {}
+
+    def _handle(self, method: str):
+        st = self.server.state
+        cfg = st.cfg
+        url = urlparse(self.path)
+        path = url.path.rstrip("/")
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        body = self._body() if method in ("POST", "PUT") else {}
+        if cfg.latency_ms or cfg.jitter_ms:
+            time.sleep(max(0.0, cfg.latency_ms + st.rng.uniform(-cfg.jitter_ms, cfg.jitter_ms)) / 1000.0)
+
+        cst = self.headers.get("CST")
+        fault = st.admit(f"{method} {_route(path)}", cst)
+        if fault:
+            return self._send(*fault)
+        if path == "/api/v1/session" and method == "POST":
+            code, obj, hdr = st.login(self.headers.get("X-CAP-API-KEY"), body)
+            return self._send(code, obj, hdr)
+        if path == "/api/v1/ping":
+            return self._send(200, {"status": "OK"})
+        if not st.check_token(cst, self.headers.get("X-SECURITY-TOKEN")):
+            return self._send(401, INVALID_TOKEN)
+
+        parts = path.split("/")[3:]  # ["prices", "EURUSD"] ...
+        head = parts[0] if parts else ""
+        if method == "GET" and head == "markets":
+            return self._send(200, {"markets": st.markets(q.get("searchTerm", ""))})
+        if method == "GET" and head == "prices" and len(parts) == 2:
+            return self._send(*st.prices(unquote(parts[1]), q))
+        if head == "positions":
+            if method == "GET" and (len(parts) == 1 or parts[1] == "open"):
+                return self._send(200, st.positions_payload())
+            if method == "POST" and len(parts) == 1:
+                return self._send(*st.open_position(body))
+            if method == "DELETE" and len(parts) == 2:
+                return self._send(*st.close_position(parts[1]))
+        if method == "GET" and head == "confirms" and len(parts) == 2:
+            c = st.confirms.get(parts[1])
+            return self._send(200, c) if c else self._send(404, {"errorCode": "error.not-found.dealReference"})
+        if method == "GET" and head == "accounts":
+            return self._send(200, st.accounts())
+        return self._send(404, {"errorCode": "error.not-found"})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    state: MockState
+
+
+class MockCapital:
+    """Taustasäikeessä ajettava mock-palvelin; `with MockCapital() as m: m.base`."""
+
+    def __init__(self, cfg: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.state = MockState(cfg or MockConfig())
+        self._srv = _Server((host, port), _Handler)
+        self._srv.state = self.state
+        self._thr: Optional[threading.Thread] = None
+
+    @property
+    def base(self) -> str:
+        host, port = self._srv.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Ympäristö, jolla capital_session / CapitalClient / sync_positions ohjautuvat mockiin."""
+        key = self.state.cfg.api_key or "mock-key"
+        return {"CAPITAL_API_BASE": self.base, "CAPITAL_API_KEY": key, "CAPITAL_USERNAME": "mock",
+                "CAPITAL_LOGIN": "mock", "CAPITAL_PASSWORD": "mock"}
+
+    def start(self) -> "MockCapital":
+        if self._thr is None:
+            self._thr = threading.Thread(target=self._srv.serve_forever, name="capital-mock", daemon=True)
+            self._thr.start()
+        return self
+
+    def stop(self):
+        self._srv.shutdown()
+        self._srv.server_close()
+        self._thr = None
+
+    def stats(self) -> Dict[str, Any]:
+        return self.state.stats()
+
+    def __enter__(self) -> "MockCapital":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Local Capital.com REST mock with fault injection")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8911)
+    ap.add_argument("--symbols", default=",".join(DEFAULT_SYMBOLS))
+    ap.add_argument("--bars", type=int, default=5000)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--rate", type=float, default=0.0, help="requests/s per session (0 = unlimited)")
+    ap.add_argument("--login-rate", type=float, default=1.0)
+    ap.add_argument("--burst-every", type=int, default=0)
+    ap.add_argument("--burst-len", type=int, default=3)
+    ap.add_argument("--token-ttl", type=float, default=600.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    a = ap.parse_args(argv)
+    cfg = MockConfig(symbols=tuple(s.strip().upper() for s in a.symbols.split(",") if s.strip()),
+                     history_bars=a.bars, seed=a.seed, latency_ms=a.latency_ms, jitter_ms=a.jitter_ms,
+                     rate=a.rate, login_rate=a.login_rate, burst_every=a.burst_every, burst_len=a.burst_len,
+                     token_ttl=a.token_ttl, error_rate=a.error_rate)
+    mock = MockCapital(cfg, a.host, a.port)
+    print(f"[MOCK] Capital mock on {mock.base} ({len(cfg.symbols)} symbols)", flush=True)
+    try:
+        mock._srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"[MOCK] {json.dumps(mock.stats())}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
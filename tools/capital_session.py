@@ -13,6 +13,8 @@ import datetime as dt
 import requests
 import pandas as pd
 
+from tools.ops_runtime import HTTP_429, RETRIES, stage_timer
+
 logger = logging.getLogger(__name__)
 
 # ENV (LIVE):
@@ -24,6 +26,7 @@ logger = logging.getLogger(__name__)
 #   CAPITAL_ACCOUNT_TYPE=CFD
 #   CAPITAL_LOGIN_TTL=540             # re-login interval seconds (default 9 min; token ~10 min)
 #   CAPITAL_RATE_LIMIT_SLEEP=90       # base sleep on 429 (seconds)
+#   CAPITAL_CANDLES_429_MIN_SLEEP=90  # floor for the candle-page 429 sleep (seconds)
 #   CAPITAL_RESOLVE_CACHE_TTL=2592000 # EPIC cache TTL seconds (default 30 days)
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
@@ -40,6 +43,7 @@ _CAPITAL_LAST_LOGIN_TS: float = 0.0
 
 _LOGIN_TTL: int = int(os.getenv("CAPITAL_LOGIN_TTL", "540"))
 _RATE_LIMIT_SLEEP: int = int(os.getenv("CAPITAL_RATE_LIMIT_SLEEP", "90"))
+_CANDLES_429_MIN_SLEEP: float = float(os.getenv("CAPITAL_CANDLES_429_MIN_SLEEP", "90"))
 _RESOLVE_CACHE_TTL: int = int(os.getenv("CAPITAL_RESOLVE_CACHE_TTL", str(30 * 24 * 3600)))
 
 _COOLDOWN_UNTIL: float = 0.0  # global cooldown end time after 429
@@ -162,6 +166,8 @@ def capital_rest_login(force: bool = False) -> Tuple[requests.Session, str]:
     for attempt, pause in enumerate(backoffs, start=1):
         r = s.post(url, json=payload, timeout=25)
         if r.status_code == 429:
+            HTTP_429.inc(endpoint="session")
+            RETRIES.inc(op="login")
             # Set cooldown and pause, then retry
             _COOLDOWN_UNTIL = time.time() + pause
             time.sleep(pause)
@@ -442,7 +448,9 @@ def _try_paged_by_number(sess: requests.Session, base: str, epic: str, res: str,
         if r.status_code == 404:
             break
         if r.status_code == 429:
-            time.sleep(max(_RATE_LIMIT_SLEEP, 90))
+            HTTP_429.inc(endpoint="prices")
+            RETRIES.inc(op="candles_page")
+            time.sleep(max(_RATE_LIMIT_SLEEP, _CANDLES_429_MIN_SLEEP))
             continue
         r.raise_for_status()
         items = (r.json().get("prices") or r.json().get("data") or [])
@@ -520,7 +528,9 @@ def _try_paged_by_time(sess: requests.Session, base: str, epic: str, res: str,
 
             rr = sess.get(url, params=params, timeout=25)
             if rr.status_code == 429:
-                time.sleep(max(_RATE_LIMIT_SLEEP, 90))
+                HTTP_429.inc(endpoint="prices")
+                RETRIES.inc(op="candles_time")
+                time.sleep(max(_RATE_LIMIT_SLEEP, _CANDLES_429_MIN_SLEEP))
                 continue
             if rr.status_code == 400:
                 # try next format
@@ -609,7 +619,8 @@ def capital_get_candles_df(symbol_or_epic: str, tf: str, total_limit: int = 2000
     Return standardized DataFrame [time, open, high, low, close, volume] UTC.
     Uses robust paged fetch to accumulate up to total_limit bars (newest last).
     """
-    items = capital_get_candles_paged(symbol_or_epic, tf, total_limit=total_limit, page_size=page_size, sleep_sec=sleep_sec)
+    with stage_timer("candle_fetch"):
+        items = capital_get_candles_paged(symbol_or_epic, tf, total_limit=total_limit, page_size=page_size, sleep_sec=sleep_sec)
     if not items:
         return pd.DataFrame(columns=["time","open","high","low","close","volume"])
     rows = [_entry_to_ohlc(x) for x in items]
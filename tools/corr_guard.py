@@ -5,6 +5,8 @@ GROUPS = {
   "INDEX":  ["US500","US100"],
   "CRYPTO": ["BTCUSD","ETHUSD","XRPUSD","SOLUSD","ADAUSD"]
 }
+# ryhmäkatot core.portfolio.select_diversified-valinnalle (OTHER: ei kattoa)
+GROUP_CAPS = {"USD": 1, "INDEX": 1, "CRYPTO": 1}
 def group_of(sym:str)->str:
     u = sym.upper()
     for g, arr in GROUPS.items():
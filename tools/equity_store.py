@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+equity_store.py – oman pääoman aikasarja (SQLite/WAL, data/equity.sqlite)
+
+    equity_raw(ts, equity, balance)                     raakanäytteet, EQUITY_RAW_KEEP_DAYS (oletus 7)
+    equity_ohlc(res, bucket, open, high, low, close)    valmiit koosteet: res = "1m" | "1h" | "1d"
+
+append() päivittää raakarivin ja kolme koostetta samassa transaktiossa, joten
+näkymät eivät koskaan skannaa koko historiaa. view(span, points) valitsee
+hienoimman resoluution, joka kattaa aikavälin, ja harventaa sen LTTB:llä
+(Largest-Triangle-Three-Buckets) pyydettyyn pistemäärään – kaavion payload
+pysyy muutamassa kilotavussa botin iästä riippumatta.
+
+export_json() kirjoittaa data/equity_history.json -tiedoston dashboardille:
+{"entries": [...30 pv näkymä...], "views": {"1h": [...], "1d": [...]}, "latest": {...}}
+record() tekee sen korkeintaan EQUITY_EXPORT_MIN_SEC välein (oletus 30 s).
+page(offset, limit) sivuttaa raakanäytteet (dashboardin /equity).
+"""
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+BASE = Path(__file__).resolve().parents[1]
+DATA = BASE / "data"
+DB = Path(os.getenv("EQUITY_DB", str(DATA / "equity.sqlite")))
+HISTORY_JSON = DATA / "equity_history.json"
+RAW_KEEP_DAYS = float(os.getenv("EQUITY_RAW_KEEP_DAYS", "7"))
+MINUTE_KEEP_DAYS = float(os.getenv("EQUITY_MINUTE_KEEP_DAYS", "120"))
+VIEW_POINTS = int(os.getenv("EQUITY_VIEW_POINTS", "200"))
+EXPORT_MIN_SEC = float(os.getenv("EQUITY_EXPORT_MIN_SEC", "30"))
+
+RESOLUTIONS: Tuple[Tuple[str, int], ...] = (("1m", 60), ("1h", 3600), ("1d", 86400))
+VIEWS = {"1h": 3600, "1d": 86400, "1mo": 30 * 86400}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS equity_raw(ts REAL PRIMARY KEY, equity REAL, balance REAL);
+CREATE TABLE IF NOT EXISTS equity_ohlc(
+    res TEXT, bucket INTEGER, open REAL, high REAL, low REAL, close REAL,
+    n INTEGER, last_ts REAL, PRIMARY KEY(res, bucket)
+);
+"""
+
+_local = threading.local()
+
+
+def conn(path: Optional[Path] = None) -> sqlite3.Connection:
+    path = Path(path or DB)
+    cache = getattr(_local, "cons", None)
+    if cache is None:
+        cache = _local.cons = {}
+    c = cache.get(str(path))
+    if c is None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        c = sqlite3.connect(str(path), timeout=30.0)
+        c.execute("PRAGMA journal_mode=WAL")
+        c.execute("PRAGMA synchronous=NORMAL")
+        c.executescript(_SCHEMA)
+        cache[str(path)] = c
+    return c
+
+
+def append(equity: float, balance: Optional[float] = None, ts: Optional[float] = None,
+           con: Optional[sqlite3.Connection] = None) -> None:
+    """Lisää näyte ja päivitä 1m/1h/1d OHLC-koosteet (myöhässä tuleva näyte ei siirrä closea taaksepäin)."""
+    c = con or conn()
+    ts = float(time.time() if ts is None else ts)
+    eq = float(equity)
+    with c:
+        c.execute("INSERT OR REPLACE INTO equity_raw(ts, equity, balance) VALUES(?,?,?)",
+                  (ts, eq, None if balance is None else float(balance)))
+        for res, sec in RESOLUTIONS:
+            c.execute(
+                """INSERT INTO equity_ohlc(res,bucket,open,high,low,close,n,last_ts) VALUES(?,?,?,?,?,?,1,?)
+                   ON CONFLICT(res,bucket) DO UPDATE SET
+                     high=max(high, excluded.high), low=min(low, excluded.low),
+                     close=CASE WHEN excluded.last_ts >= last_ts THEN excluded.close ELSE close END,
+                     last_ts=max(last_ts, excluded.last_ts), n=n+1""",
+                (res, int(ts // sec) * sec, eq, eq, eq, eq, ts),
+            )
+    _maybe_prune(c, ts)
+
+
+def _maybe_prune(c: sqlite3.Connection, now: float):
+    last = getattr(_local, "pruned_at", 0.0)
+    if now - last < 3600:
+        return
+    _local.pruned_at = now
+    with c:
+        c.execute("DELETE FROM equity_raw WHERE ts < ?", (now - RAW_KEEP_DAYS * 86400,))
+        c.execute("DELETE FROM equity_ohlc WHERE res='1m' AND bucket < ?", (now - MINUTE_KEEP_DAYS * 86400,))
+
+
+def latest(con: Optional[sqlite3.Connection] = None) -> Optional[Dict[str, Any]]:
+    r = (con or conn()).execute("SELECT ts, equity, balance FROM equity_raw ORDER BY ts DESC LIMIT 1").fetchone()
+    return {"ts": r[0], "equity": r[1], "balance": r[2]} if r else None
+
+
+def page(offset: int = 0, limit: int = 1000, con: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
+    """Raakanäytteiden sivu aikajärjestyksessä (säilytys EQUITY_RAW_KEEP_DAYS), ei harvennusta."""
+    c = con or conn()
+    offset, limit = max(0, int(offset)), max(1, min(int(limit), 10000))
+    total = c.execute("SELECT count(*) FROM equity_raw").fetchone()[0]
+    rows = c.execute("SELECT ts, equity, balance FROM equity_raw ORDER BY ts LIMIT ? OFFSET ?", (limit, offset))
+    return {"total": total, "offset": offset, "limit": limit,
+            "entries": [{"timestamp": datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S"),
+                         "equity": eq, "balance": bal} for ts, eq, bal in rows]}
+
+
+def ohlc(res: str, since: Optional[float] = None, until: Optional[float] = None,
+         con: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+    q, args = "SELECT bucket, open, high, low, close, n FROM equity_ohlc WHERE res=?", [res]
+    if since is not None:
+        q += " AND bucket >= ?"; args.append(int(since))
+    if until is not None:
+        q += " AND bucket < ?"; args.append(int(until))
+    q += " ORDER BY bucket"
+    return [dict(zip(("ts", "open", "high", "low", "close", "n"), r)) for r in (con or conn()).execute(q, args)]
+
+
+# ---------- LTTB ----------
+
+def lttb(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """Largest-Triangle-Three-Buckets: palauttaa säilytettävien pisteiden indeksit (eka ja vika aina mukana)."""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    x = np.asarray(xs, dtype=float)
+    y = np.asarray(ys, dtype=float)
+    every = (n - 2) / (threshold - 2)
+    out = [0]
+    a = 0
+    for i in range(threshold - 2):
+        lo = int(i * every) + 1
+        hi = min(int((i + 1) * every) + 1, n - 1)
+        nlo = hi
+        nhi = min(int((i + 2) * every) + 1, n)
+        avg_x = x[nlo:nhi].mean() if nhi > nlo else x[-1]
+        avg_y = y[nlo:nhi].mean() if nhi > nlo else y[-1]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out.append(a)
+    out.append(n - 1)
+    return out
+
+
+def _series(span: float, now: float, points: int, con: sqlite3.Connection) -> List[Tuple[float, float]]:
+    since = now - span
+    # raaka data jos sitä on säilytetty koko välille ja määrä on kohtuullinen
+    if span <= RAW_KEEP_DAYS * 86400:
+        n = con.execute("SELECT count(*) FROM equity_raw WHERE ts >= ?", (since,)).fetchone()[0]
+        if n <= max(points * 20, 5000):
+            return [tuple(r) for r in con.execute(
+                "SELECT ts, equity FROM equity_raw WHERE ts >= ? ORDER BY ts", (since,))]
+    for res, sec in RESOLUTIONS:
+        if span / sec <= max(points * 20, 5000) or res == "1d":
+            return [tuple(r) for r in con.execute(
+                "SELECT bucket, close FROM equity_ohlc WHERE res=? AND bucket >= ? ORDER BY bucket",
+                (res, int(since // sec) * sec))]
+    return []
+
+
+def view(span: float, points: int = VIEW_POINTS, now: Optional[float] = None,
+         con: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+    """Aikaväli [now-span, now] LTTB-harvennettuna korkeintaan `points` pisteeseen."""
+    c = con or conn()
+    now = float(time.time() if now is None else now)
+    s = _series(float(span), now, points, c)
+    if not s:
+        return []
+    idx = lttb([p[0] for p in s], [p[1] for p in s], points)
+    return [{"timestamp": datetime.fromtimestamp(s[i][0], tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S"),
+             "equity": round(float(s[i][1]), 2)} for i in idx]
+
+
+def export_json(path: Path = HISTORY_JSON, points: int = VIEW_POINTS, con: Optional[sqlite3.Connection] = None,
+                now: Optional[float] = None) -> Dict[str, Any]:
+    """Kirjoita dashboardin equity_history.json (pienet valmiit näkymät, ei koko historiaa)."""
+    c = con or conn()
+    views = {k: view(v, points, now=now, con=c) for k, v in VIEWS.items()}
+    doc = {"entries": views.pop("1mo"), "views": views, "latest": latest(c)}
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(doc, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+    return doc
+
+
+def import_history_json(path: Path = HISTORY_JSON, con: Optional[sqlite3.Connection] = None) -> int:
+    """Vanhan kasvavan equity_history.json:n tuonti kerran (vain jos kanta on tyhjä)."""
+    c = con or conn()
+    if c.execute("SELECT 1 FROM equity_raw LIMIT 1").fetchone() or not Path(path).exists():
+        return 0
+    try:
+        doc = json.loads(Path(path).read_text(encoding="utf-8"))
+    except Exception:
+        return 0
+    if "views" in doc:  # jo uutta muotoa
+        return 0
+    n = 0
+    for e in doc.get("entries") or []:
+        try:
+            ts = datetime.fromisoformat(str(e["timestamp"]).replace("Z", "+00:00"))
+            if ts.tzinfo is None:
+                ts = ts.replace(tzinfo=timezone.utc)
+            append(float(e["equity"]), e.get("balance"), ts.timestamp(), con=c)
+            n += 1
+        except Exception:
+            continue
+    return n
+
+
+_imported = False
+_exported_at: Optional[float] = None
+
+
+def record(equity: float, balance: Optional[float] = None, export: bool = True) -> None:
+    """
+    Kirjoittajien yhteinen polku: tuo vanha historia kerran, lisää näyte ja päivitä
+    dashboardin JSON korkeintaan EXPORT_MIN_SEC välein (kutsutaan jokaisesta tilikyselystä).
+    """
+    global _imported, _exported_at
+    if not _imported:
+        import_history_json()
+        _imported = True
+    append(equity, balance)
+    now = time.monotonic()
+    if export and (_exported_at is None or now - _exported_at >= EXPORT_MIN_SEC):
+        _exported_at = now
+        export_json()
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Hakee equity (oman pääoman) Capital.com API:sta ja päivittää data/equity_history.json
+Hakee equity (oman pääoman) Capital.com API:sta ja lisää sen tools.equity_store-sarjaan,
+joka kirjoittaa dashboardin data/equity_history.json -näkymät (LTTB-harvennettu)
 """
 
 import os, json, datetime
@@ -25,16 +26,12 @@ def fetch_equity():
     except Exception:
         print("[equity] could not parse account info:", info)
         return
-    eq_path = DATA / "equity_history.json"
-    hist = {"entries": []}
-    if eq_path.exists():
-        try:
-            hist = json.load(open(eq_path))
-        except Exception:
-            hist = {"entries": []}
+    try:
+        from tools import equity_store
+    except ImportError:  # ajettu suoraan tools/-kansiosta
+        import equity_store
     now = datetime.datetime.utcnow().isoformat()
-    hist["entries"].append({"timestamp": now, "equity": equity, "balance": balance})
-    json.dump(hist, open(eq_path, "w"), indent=2)
+    equity_store.record(equity, balance)
     print(f"[equity] {now} equity={equity:.2f} balance={balance:.2f}")
 
 if __name__ == "__main__":
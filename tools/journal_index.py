@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+journal_index.py – inkrementaalinen indeksi trade_journal.jsonl:lle
+
+Päivä- ja symbolikohtaiset koosteet pidetään ajan tasalla lisäysten yhteydessä,
+joten riskitarkistukset ovat O(1)-hakuja eivätkä lue koko päiväkirjaa:
+
+    days[YYYY-MM-DD]  = {"r": summa, "closes": n, "by_symbol": {SYM: r}}
+    symbols[SYM]      = {"orig_size", "adds_done", "open_risk", "last_event"}
+
+Koosteet tallennetaan viereiseen tiedostoon (<journal>.idx.json) yhdessä luetun
+tavuoffsetin kanssa. Jos toinen prosessi on lisännyt rivejä, vain uudet rivit
+luetaan (tail). Lisäys, tail ja rotaatio tehdään flock-lukon alla.
+
+Rotaatio: kun journal ylittää JOURNAL_MAX_BYTES (oletus 20 MB), se nimetään
+<stem>.<UTC-aikaleima>.jsonl ja uusi tiedosto aloitetaan; koosteet säilyvät.
+Ulkoinen katkaisu tai tiedoston korvaus (eri inode / koko < offset) rakentaa
+koosteet uudelleen nykyisestä tiedostosta.
+Päiväkoosteet karsitaan JOURNAL_KEEP_DAYS (oletus 120) päivän jälkeen.
+"""
+from __future__ import annotations
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+MAX_BYTES = int(os.getenv("JOURNAL_MAX_BYTES", str(20 * 1024 * 1024)))
+KEEP_DAYS = int(os.getenv("JOURNAL_KEEP_DAYS", "120"))
+
+
+def _day_of(ts: Any) -> Optional[str]:
+    if not isinstance(ts, str) or not ts:
+        return None
+    try:
+        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    except Exception:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime("%Y-%m-%d")
+
+
+def _empty() -> Dict[str, Any]:
+    return {"version": 1, "inode": None, "offset": 0, "days": {}, "symbols": {}}
+
+
+class JournalIndex:
+    def __init__(self, journal: Path, max_bytes: int = MAX_BYTES, keep_days: int = KEEP_DAYS):
+        self.journal = Path(journal)
+        self.idx_path = self.journal.with_name(self.journal.name + ".idx.json")
+        self.lock_path = self.journal.with_name(self.journal.name + ".lock")
+        self.max_bytes = int(max_bytes)
+        self.keep_days = int(keep_days)
+        self._mu = threading.RLock()
+        self._state: Dict[str, Any] = _empty()
+        self._seen: Optional[tuple] = None  # (inode, size) kun viimeksi synkattu
+
+    # ---- lukitus ----
+    @contextmanager
+    def _flock(self):
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._mu, open(self.lock_path, "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _file_id(self) -> tuple:
+        try:
+            st = self.journal.stat()
+            return (st.st_ino, st.st_size)
+        except OSError:
+            return (None, 0)
+
+    # ---- koosteet ----
+    def _apply(self, ev: Dict[str, Any]):
+        kind = ev.get("event")
+        sym = (ev.get("symbol") or "").upper()
+        s = self._state["symbols"].setdefault(sym, {"orig_size": 0.0, "adds_done": 0, "open_risk": 0.0}) if sym else None
+        if kind == "OPEN" and s is not None:
+            s["orig_size"] = float(ev.get("orig_size", ev.get("size", 0.0)) or 0.0)
+            s["adds_done"] = 0
+            rpu = ev.get("risk_per_unit")
+            s["open_risk"] = float(rpu) * float(ev.get("size", 0.0) or 0.0) if isinstance(rpu, (int, float)) else 0.0
+        elif kind == "SCALE_IN" and s is not None:
+            s["adds_done"] = int(s.get("adds_done", 0)) + 1
+            rpu = ev.get("risk_per_unit")
+            if isinstance(rpu, (int, float)):
+                s["open_risk"] = float(s.get("open_risk", 0.0)) + float(rpu) * float(ev.get("size", 0.0) or 0.0)
+        elif kind == "CLOSE":
+            if s is not None:
+                s["open_risk"] = 0.0
+            day = _day_of(ev.get("ts"))
+            r = ev.get("r_realized")
+            if day and isinstance(r, (int, float)):
+                d = self._state["days"].setdefault(day, {"r": 0.0, "closes": 0, "by_symbol": {}})
+                d["r"] += float(r)
+                d["closes"] += 1
+                if sym:
+                    d["by_symbol"][sym] = d["by_symbol"].get(sym, 0.0) + float(r)
+        if s is not None and kind:
+            s["last_event"] = kind
+
+    def _prune(self):
+        if self.keep_days <= 0:
+            return
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.keep_days)).strftime("%Y-%m-%d")
+        for day in [d for d in self._state["days"] if d < cutoff]:
+            del self._state["days"][day]
+
+    def _load_idx(self):
+        try:
+            st = json.loads(self.idx_path.read_text(encoding="utf-8"))
+            if isinstance(st, dict) and st.get("version") == 1:
+                self._state = st
+                return
+        except Exception:
+            pass
+        self._state = _empty()
+
+    def _save_idx(self):
+        tmp = self.idx_path.with_name(self.idx_path.name + ".tmp")
+        tmp.write_text(json.dumps(self._state, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.idx_path)
+
+    def _tail(self) -> bool:
+        """Lue journalista rivit offsetin jälkeen (kutsutaan lukon alla). True jos jotain muuttui."""
+        ino, size = self._file_id()
+        if ino is None:
+            return False
+        known = self._state.get("inode")
+        if known != ino or size < int(self._state.get("offset", 0)):
+            if known is not None:
+                # ulkoinen katkaisu / korvaus: luetaan tiedosto alusta, joten koosteet
+                # rakennetaan siitä uudelleen (muuten samat rivit laskettaisiin kahdesti)
+                self._state["days"], self._state["symbols"] = {}, {}
+            # known None = oma _rotate tai ensimmäinen ajo: koosteet säilyvät
+            self._state["inode"], self._state["offset"] = ino, 0
+        off = int(self._state["offset"])
+        if size == off:
+            return False
+        with self.journal.open("rb") as f:
+            f.seek(off)
+            chunk = f.read(size - off)
+        end = chunk.rfind(b"\n") + 1  # vain kokonaiset rivit
+        for ln in chunk[:end].splitlines():
+            ln = ln.strip()
+            if not ln:
+                continue
+            try:
+                self._apply(json.loads(ln))
+            except Exception:
+                continue
+        self._state["offset"] = off + end
+        return end > 0
+
+    def _sync(self, force: bool = False):
+        """Halpa polku: jos (inode, size) ei ole muuttunut, ei tehdä mitään."""
+        fid = self._file_id()
+        if not force and fid == self._seen:
+            return
+        with self._flock():
+            self._load_idx()
+            if self._tail():
+                self._prune()
+                self._save_idx()
+            self._seen = self._file_id()
+
+    # ---- julkinen API ----
+    def append(self, ev: Dict[str, Any]):
+        """Lisää rivi journaliin ja päivitä koosteet samassa lukossa; rotaatio tarvittaessa."""
+        line = (json.dumps(ev, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._flock():
+            self._load_idx()
+            self._tail()
+            self.journal.parent.mkdir(parents=True, exist_ok=True)
+            with self.journal.open("ab") as f:
+                f.write(line)
+            # rivi on kirjoitettu: koosteiden virhe ei saa näkyä kutsujalle (varapolku
+            # kirjoittaisi rivin toiseen kertaan); seuraava _sync tailaa tallennetusta offsetista
+            try:
+                self._tail()
+                if self.max_bytes > 0 and self._file_id()[1] >= self.max_bytes:
+                    self._rotate()
+                self._prune()
+                self._save_idx()
+                self._seen = self._file_id()
+            except Exception as e:
+                self._seen = None
+                print(f"[JOURNAL] index update failed after append: {e}", flush=True)
+
+    def _rotate(self):
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        dst = self.journal.with_name(f"{self.journal.stem}.{stamp}{self.journal.suffix}")
+        os.replace(self.journal, dst)
+        self._state["inode"], self._state["offset"] = None, 0
+
+    def realized_R(self, day: Optional[str] = None, symbol: Optional[str] = None) -> Optional[float]:
+        """Päivän realisoitu R (koko salkku tai symboli); None jos päivältä ei ole CLOSE-rivejä."""
+        self._sync()
+        day = day or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        d = self._state["days"].get(day)
+        if not d or not d.get("closes"):
+            return None
+        if symbol is None:
+            return float(d["r"])
+        v = d["by_symbol"].get(symbol.upper())
+        return float(v) if v is not None else None
+
+    def symbol_state(self, symbol: str) -> Optional[Dict[str, Any]]:
+        self._sync()
+        return self._state["symbols"].get((symbol or "").upper())
+
+    def open_risk(self) -> float:
+        self._sync()
+        return float(sum(s.get("open_risk", 0.0) for s in self._state["symbols"].values()))
+
+    def rebuild(self):
+        """Rakenna koosteet uudelleen nykyisestä journalista (rotatoidut tiedostot eivät ole mukana)."""
+        with self._flock():
+            self._state = _empty()
+            self._tail()
+            self._prune()
+            self._save_idx()
+            self._seen = self._file_id()
@@ -1,6 +1,5 @@
-import os, json, time
+import os, csv, json, time
 from pathlib import Path
-import pandas as pd
 
 ROOT = Path(os.environ.get("ROOT","/root/pro_botti"))
 RESULTS = ROOT/"results"; RESULTS.mkdir(parents=True, exist_ok=True)
@@ -8,56 +7,58 @@ STATE = ROOT/"state"; STATE.mkdir(parents=True, exist_ok=True)
 
 LEDGER_CSV = RESULTS/"trades.csv"
 POS_JSON   = STATE/"positions.json"
+# trades.csv peilataan oletuksena (halpa csv-rivi); arkisto on tools.trade_archive
+CSV_MIRROR = os.getenv("LEDGER_CSV_MIRROR", "1").lower() in ("1", "true", "yes")
+_csv_header = None
 
 def _now_ms(): return int(time.time()*1000)
 
-def append_trade(symbol, tf, side, price, amount, mode, p=None, why=None, order_id=None, fee=None):
+def _mirror_csv(row):
+    """Lisää rivi trades.csv:hen olemassa olevan otsikon sarakkeilla (ei pandasia, ei koko tiedoston lukua)."""
+    global _csv_header
+    if _csv_header is None or not LEDGER_CSV.exists():
+        _csv_header = None
+        if LEDGER_CSV.exists() and LEDGER_CSV.stat().st_size > 0:
+            with LEDGER_CSV.open("r", encoding="utf-8", newline="") as f:
+                _csv_header = next(csv.reader(f), None)
+    with LEDGER_CSV.open("a", encoding="utf-8", newline="") as f:
+        if not _csv_header:
+            _csv_header = [k for k in row if k != "pnl" or row[k] is not None]
+            csv.writer(f).writerow(_csv_header)
+        csv.writer(f).writerow(["" if row.get(k) is None else row.get(k) for k in _csv_header])
+
+def append_trade(symbol, tf, side, price, amount, mode, p=None, why=None, order_id=None, fee=None, pnl=None):
     row = {
         "ts": _now_ms(),
         "symbol": symbol, "tf": tf, "side": side,
         "price": float(price), "amount": float(amount),
         "notional": float(price)*float(amount),
         "mode": mode, "p": (None if p is None else float(p)),
-        "why": (why or ""), "order_id": (order_id or ""), "fee": (fee or 0.0)
+        "why": (why or ""), "order_id": (order_id or ""), "fee": (fee or 0.0),
+        "pnl": (None if pnl is None else float(pnl))
     }
-    df = pd.DataFrame([row])
-    hdr = not LEDGER_CSV.exists()
-    df.to_csv(LEDGER_CSV, index=False, mode="a", header=hdr)
+    from tools import trade_archive
+    trade_archive.default().append(row)
+    if CSV_MIRROR:
+        _mirror_csv(row)
     return row
 
+# Positiot ovat tools.state_store-kannassa (SQLite/WAL, source="ledger");
+# positions.json tuodaan sinne kerran migraatiossa.
+
 def load_positions():
-    if POS_JSON.exists():
-        return json.loads(POS_JSON.read_text())
-    return {}
+    from tools import state_store
+    return state_store.all_positions("ledger")
 
 def save_positions(pos):
-    POS_JSON.write_text(json.dumps(pos, indent=2, sort_keys=True))
+    from tools import state_store
+    state_store.replace_positions("ledger", pos)
 
-def update_position_on_fill(symbol, side, qty, price, allow_shorts=False):
+def update_position_on_fill(symbol, side, qty, price, allow_shorts=False, order_id=None, tf=None):
     """
     Pitää vain *pitkät* oletuksena (allow_shorts=False). 
     BUY kasvattaa positiota, SELL pienentää. Negatiiviseen ei mennä, loput ohitetaan.
+    Päivitys + fill-rivi kirjoitetaan yhdessä transaktiossa (ei kadonneita päivityksiä rinnakkaisilta daemoneilta).
     """
-    pos = load_positions()
-    p = pos.get(symbol, {"qty":0.0,"avg":0.0,"realized":0.0})
-
-    qty = float(qty); price = float(price)
-    if side == "BUY":
-        new_qty  = p["qty"] + qty
-        if new_qty <= 0:  # outo kulma
-            p["qty"], p["avg"] = 0.0, 0.0
-        else:
-            p["avg"] = (p["avg"]*p["qty"] + price*qty)/new_qty
-            p["qty"] = new_qty
-    elif side == "SELL":
-        sell_qty = min(p["qty"] if not allow_shorts else qty, qty)
-        # realisoitu PnL siitä osasta jonka suljemme
-        p["realized"] += (price - p["avg"])*sell_qty
-        p["qty"] -= sell_qty
-        if p["qty"] <= 1e-12:
-            p["qty"], p["avg"] = 0.0, 0.0
-        # jos shortsit ei sallittuja, ylimenevä osa ignoroidaan
-
-    pos[symbol] = p
-    save_positions(pos)
-    return p
+    from tools import state_store
+    return state_store.apply_fill(symbol, side, qty, price, allow_shorts=allow_shorts, order_id=order_id, tf=tf)
@@ -1,5 +1,61 @@
 from __future__ import annotations
-import argparse, subprocess, os
+import argparse, io, os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Iterator, List, Tuple
+
+_THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_MAX_THREADS")
+
+
+def _worker_init() -> None:
+    # Raskaat importit (pandas/sklearn/joblib) kerran per worker, ei kerran per symboli.
+    import tools.live_one  # noqa: F401
+
+
+def _worker_run(symbol: str, tf: str) -> Tuple[str, str]:
+    """Aja tools.live_one.run_one workerissa; palauttaa (stdout, stderr) kuten ennen aliprosessilta."""
+    from tools import live_one
+    out, err = io.StringIO(), io.StringIO()
+    with redirect_stdout(out), redirect_stderr(err):
+        try:
+            live_one.run_one(symbol.strip().upper(), tf)
+        except Exception as e:
+            print(f"[ERROR] {symbol} {tf}: {e}", file=sys.stderr)
+    return out.getvalue(), err.getvalue()
+
+
+class LiveWorkerPool:
+    """
+    Pitkäikäinen worker-pooli live_one-ajoille.
+
+    Workerit importtaavat kirjastot kerran ja pitävät mallit (tools.model_cache)
+    sekä historian (live_one.load_history_cached) muistissa ajojen välillä.
+    Jobit kulkevat poolin jonon kautta; tulokset palautetaan syöttöjärjestyksessä.
+    """
+
+    def __init__(self, workers: int | None = None):
+        for k in _THREAD_ENV:
+            os.environ.setdefault(k, "1")
+        self.workers = max(1, int(workers or min(4, os.cpu_count() or 1)))
+        self._ex = ProcessPoolExecutor(max_workers=self.workers, initializer=_worker_init)
+
+    def run(self, symbols: List[str], tf: str) -> Iterator[Tuple[str, str, str]]:
+        futs = [(s, self._ex.submit(_worker_run, s, tf)) for s in symbols]
+        for s, f in futs:
+            try:
+                out, err = f.result()
+            except Exception as e:
+                out, err = "", f"[ERROR] {s} {tf}: worker failed: {e}"
+            yield s, out, err
+
+    def close(self) -> None:
+        self._ex.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 
 def main():
@@ -9,39 +65,21 @@ def main():
     ap.add_argument("--limit_rows", type=int, default=2000)
     ap.add_argument("--thr_buy", type=float, default=0.10)
     ap.add_argument("--thr_sell", type=float, default=0.10)
+    ap.add_argument("--workers", type=int, default=int(os.getenv("LIVE_BATCH_WORKERS", "0")) or None)
+    ap.add_argument("--loop", type=float, default=0.0, help="toista batch N sekunnin välein samalla poolilla (0 = kerran)")
     args = ap.parse_args()
 
-    env = os.environ.copy()
-    env.setdefault("OMP_NUM_THREADS", "1")
-    env.setdefault("MKL_NUM_THREADS", "1")
-    env.setdefault("OPENBLAS_NUM_THREADS", "1")
-    env.setdefault("NUMEXPR_MAX_THREADS", "1")
-
-    for s in args.symbols:
-        print(f"[i] {s}")
-        p = subprocess.run(
-            [
-                "python3",
-                "-m",
-                "tools.live_one",
-                "--symbol",
-                s,
-                "--tf",
-                args.tf,
-                "--limit_rows",
-                str(args.limit_rows),
-                "--thr_buy",
-                str(args.thr_buy),
-                "--thr_sell",
-                str(args.thr_sell),
-            ],
-            env=env,
-            capture_output=True,
-            text=True,
-        )
-        if p.stderr:
-            print(f"[ERR {s}] {p.stderr.strip()}")
-        print(f"[OUT {s}] {p.stdout.strip()}")
+    with LiveWorkerPool(args.workers) as pool:
+        while True:
+            for s, out, err in pool.run(args.symbols, args.tf):
+                print(f"[i] {s}")
+                if err:
+                    print(f"[ERR {s}] {err.strip()}")
+                print(f"[OUT {s}] {out.strip()}")
+            if args.loop <= 0:
+                break
+            sys.stdout.flush()
+            time.sleep(args.loop)
 
 
 if __name__ == "__main__":
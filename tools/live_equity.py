@@ -29,6 +29,16 @@ def _login_if_needed():
     s.headers.update(_headers)
     _session = s
 
+def _record_equity(acc):
+    """Näyte tools.equity_store-sarjaan (koosteet + dashboardin näkymät); ei koskaan kaada kutsujaa."""
+    try:
+        eq = acc.get("equity") if acc.get("equity") is not None else acc.get("balance")
+        if eq is not None:
+            from tools import equity_store
+            equity_store.record(float(eq), acc.get("balance"))
+    except Exception:
+        pass
+
 def get_account_summary():
     _login_if_needed()
     paths = [
@@ -50,6 +60,7 @@ def get_account_summary():
             if "available" not in acc:
                 for k in ("availableCash","available_to_deal","cashAvailable"):
                     if k in data: acc["available"] = data[k]
+            _record_equity(acc)
             return acc
         except Exception as e:
             last = e
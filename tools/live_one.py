@@ -1,5 +1,5 @@
 from __future__ import annotations
-import os, sys, json
+import argparse, os, sys, json
 from pathlib import Path
 import numpy as np
 import pandas as pd
@@ -30,13 +30,40 @@ except Exception:
 DATA_DIR   = Path(os.getenv("DATA_DIR",   "data"))
 MODELS_DIR = Path(os.getenv("MODELS_DIR", "models"))
 
+# Pitkäikäisissä workereissa (tools.live_batch) historia pidetään muistissa
+# ja luetaan uudelleen vain kun tiedosto muuttuu.
+_HIST_CACHE: dict = {}
+
+def _history_stamp(data_dir: Path, symbol: str, tf: str):
+    stem = f"{symbol}_{tf}"
+    for base in (data_dir / "history", data_dir):
+        for ext in (".parquet", ".feather", ".csv", ".csv.gz"):
+            p = base / f"{stem}{ext}"
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            return (str(p), st.st_mtime_ns, st.st_size)
+    return None
+
+def load_history_cached(data_dir: Path, symbol: str, tf: str) -> pd.DataFrame:
+    stamp = _history_stamp(data_dir, symbol, tf)
+    key = (str(data_dir), symbol, tf)
+    hit = _HIST_CACHE.get(key)
+    if stamp is not None and hit is not None and hit[0] == stamp:
+        return hit[1]
+    df = load_history(data_dir, symbol, tf)
+    if stamp is not None:
+        _HIST_CACHE[key] = (stamp, df)
+    return df
+
 def safe_features(df: pd.DataFrame) -> np.ndarray:
     if df is None or len(df) == 0:
         return np.zeros((1, 1), dtype=float)
     cols = [c for c in df.columns if str(c).lower() in ("close","close_price","price","last","c")]
     if not cols:
         return np.zeros((len(df), 1), dtype=float)
-    s = pd.to_numeric(df[cols[0]], errors="coerce").fillna(method="ffill").fillna(method="bfill")
+    s = pd.to_numeric(df[cols[0]], errors="coerce").ffill().bfill()
     ret1 = s.pct_change(1).fillna(0.0).to_numpy()
     ret3 = s.pct_change(3).fillna(0.0).to_numpy()
     ret5 = s.pct_change(5).fillna(0.0).to_numpy()
@@ -79,13 +106,14 @@ def decide_side(clf, X_row: np.ndarray) -> str:
         return "SELL"
 
 def run_one(symbol: str, tf: str) -> None:
-    df = load_history(DATA_DIR, symbol, tf)
+    df = load_history_cached(DATA_DIR, symbol, tf)
     model_path = MODELS_DIR / f"pro_{symbol}_{tf}.joblib"
     if not model_path.exists():
         print(f"[WARN] model missing: {model_path}", file=sys.stderr)
         return
     try:
-        clf = load(model_path)
+        from tools import model_cache
+        clf = model_cache.load_model(model_path, loader=load)
     except Exception as e:
         print(f"[WARN] model load failed ({symbol} {tf}): {e}", file=sys.stderr)
         return
@@ -99,8 +127,15 @@ def run_one(symbol: str, tf: str) -> None:
     print(json.dumps({"symbol": symbol, "tf": tf, "side": side}, ensure_ascii=False))
 
 def main() -> None:
-    symbols = [x.strip().upper() for x in os.getenv("SYMBOLS", "BTCUSD,ETHUSD").split(",") if x.strip()]
-    tfs     = [x.strip()          for x in os.getenv("TFS", "15m,1h,4h").split(",")          if x.strip()]
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--symbol")
+    ap.add_argument("--tf")
+    ap.add_argument("--limit_rows", type=int, default=2000)
+    ap.add_argument("--thr_buy", type=float, default=0.10)
+    ap.add_argument("--thr_sell", type=float, default=0.10)
+    args = ap.parse_args()
+    symbols = [x.strip().upper() for x in (args.symbol or os.getenv("SYMBOLS", "BTCUSD,ETHUSD")).split(",") if x.strip()]
+    tfs     = [x.strip()          for x in (args.tf or os.getenv("TFS", "15m,1h,4h")).split(",")          if x.strip()]
     for s in symbols:
         for tf in tfs:
             try:
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+loadtest.py – live-syklin kuormatesti: trade_engine.run_cycle mock-brokeria vasten
+
+    python -m tools.loadtest --symbols 40 --cycles 5                 # tulos results/loadtest/
+    python -m tools.loadtest --sweep 40,100,200,400 --cycles 3       # missä yksisäikeinen looppi hajoaa
+    python -m tools.loadtest --symbols 40 --save-baseline            # tallenna vertailukohdaksi
+    python -m tools.loadtest --symbols 40 --baseline results/loadtest/baseline_40x3.json
+
+Ajo on eristetty: tools.capital_mock palvelee N synteettistä symbolia (SYN0000..), malli-
+rekisteri, state-kanta ja telemetria menevät väliaikaishakemistoon, dry-run on aina päällä.
+Jokainen (symboli, TF) saa saman kahden mallin rekisteririvin, joten myös batch-inferenssi
+ja ensemble-päätös ajetaan.
+
+Mitataan per sykli: seinäkelloaika, API-kutsut (mockin laskurista), RSS; per pari:
+prepare + finish -viive (p50/p99). page_sleep / pause ovat tuotannossa 0.8 s ja 2 s – testissä
+oletuksena 0, ja niiden osuus raportoidaan erikseen laskennallisena (sleep_budget_s).
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+OUT_DIR = ROOT / "results" / "loadtest"
+TFS = ("15m", "1h", "4h")
+PROD_PAGE_SLEEP = 0.8
+PROD_PAUSE = 2.0
+# vertailun toleranssit
+TIME_RATIO = 1.25
+CALLS_RATIO = 1.10
+RSS_GROWTH_SLACK_MB = 20.0
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _pct(xs: Sequence[float], q: float) -> float:
+    return float(np.percentile(np.asarray(xs, dtype=float), q)) if len(xs) else 0.0
+
+
+def _train_models(model_dir: Path, seed: int) -> List[str]:
+    """Kaksi pientä LR-mallia synteettisillä piirteillä (sama artefakti kaikille pareille)."""
+    from joblib import dump
+    from sklearn.linear_model import LogisticRegression
+    from tools.ml.features import compute_features
+    from tools.synth_data import ohlcv
+
+    df = ohlcv(3000, tf="1h", seed=seed)
+    X = compute_features(df).replace([np.inf, -np.inf], np.nan).ffill().bfill().fillna(0.0)
+    y = (df["close"].shift(-1) > df["close"]).astype(int).values
+    cols = list(X.columns)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    for name, c in (("lr_a", 1.0), ("lr_b", 0.1)):
+        dump(LogisticRegression(C=c, max_iter=300).fit(X.values[:-1], y[:-1]), model_dir / f"{name}.joblib")
+    return cols
+
+
+def _registry(path: Path, symbols: Sequence[str], tfs: Sequence[str], cols: List[str]):
+    models = {"lr_a": {"file": "lr_a.joblib"}, "lr_b": {"file": "lr_b.joblib"}}
+    rows = [{"symbol": s, "tf": tf, "features": cols, "models": models, "ens_weights": {"lr_a": 0.5, "lr_b": 0.5}}
+            for s in symbols for tf in tfs]
+    path.write_text(json.dumps({"models": rows}), encoding="utf-8")
+
+
+@contextlib.contextmanager
+def _patched(obj, **attrs):
+    old = {k: getattr(obj, k) for k in attrs}
+    for k, v in attrs.items():
+        setattr(obj, k, v)
+    try:
+        yield
+    finally:
+        for k, v in old.items():
+            setattr(obj, k, v)
+
+
+def run(n_symbols: int = 40, tfs: Sequence[str] = TFS, cycles: int = 5, seed: int = 42,
+        latency_ms: float = 0.0, page_sleep: float = 0.0, history_bars: int = 1200,
+        log: Callable[[str], None] = print) -> Dict[str, Any]:
+    from core import cov_engine
+    from tools import capital_session as cs
+    from tools import state_store, telemetry
+    from tools import trade_engine as te
+    from tools.bar_scheduler import bar_seconds
+    from tools.capital_mock import MockCapital, MockConfig
+
+    symbols = [f"SYN{i:04d}" for i in range(n_symbols)]
+    rows: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as tmp:
+        work = Path(tmp)
+        cols = _train_models(work / "models_meta", seed)
+        _registry(work / "models_meta.json", symbols, tfs, cols)
+
+        pair_ms: Dict[str, List[float]] = {}
+        orig_prepare, orig_finish, orig_fetch = te.prepare_symbol_tf, te.finish_symbol_tf, te.capital_get_candles_df
+
+        def timed(fn):
+            def wrapper(symbol, tf, *a, **kw):
+                t0 = time.perf_counter()
+                try:
+                    return fn(symbol, tf, *a, **kw)
+                finally:
+                    k = f"{symbol}|{tf}"
+                    pair_ms.setdefault(k, []).append((time.perf_counter() - t0) * 1000.0)
+            return wrapper
+
+        def fetch(*a, **kw):
+            kw["sleep_sec"] = page_sleep
+            return orig_fetch(*a, **kw)
+
+        cfg = MockConfig(symbols=tuple(symbols), history_bars=history_bars, seed=seed, latency_ms=latency_ms)
+        env = {}
+        with MockCapital(cfg) as mock, contextlib.ExitStack() as stack:
+            env = mock.env()
+            old_env = {k: os.environ.get(k) for k in env}
+            os.environ.update(env)
+            stack.callback(lambda: [os.environ.pop(k, None) if v is None else os.environ.__setitem__(k, v)
+                                    for k, v in old_env.items()])
+            stack.enter_context(_patched(cs, SESSION_PATH=work / "sess.json", COOKIES_PATH=work / "cookies.pkl",
+                                         EPIC_CACHE_PATH=work / "epics.json", _CAPITAL_SESS=None, _COOLDOWN_UNTIL=0.0))
+            stack.enter_context(_patched(state_store, DB_PATH=work / "state.sqlite"))
+            stack.enter_context(_patched(cov_engine, STATE_DIR=work / "cov", _engines={}))
+            # tallennetaan nyt, ettei atexit-flush kirjoita poistettuun työhakemistoon
+            stack.callback(lambda: [e.flush() for e in list(cov_engine._engines.values())])
+            if telemetry._writer is None:
+                stack.enter_context(_patched(telemetry, DB=work / "telemetry.sqlite"))
+            stack.enter_context(_patched(te, META_REG=work / "models_meta.json", META_DIR=work / "models_meta",
+                                         _telegram_available=False, capital_get_candles_df=fetch,
+                                         prepare_symbol_tf=timed(orig_prepare), finish_symbol_tf=timed(orig_finish)))
+
+            for c in range(cycles):
+                pair_ms.clear()
+                before = mock.stats()
+                t0 = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    results = te.run_cycle(symbols, list(tfs), dry_run=True)
+                wall = time.perf_counter() - t0
+                after = mock.stats()
+                calls = after["requests"] - before["requests"]
+                pages = after["by_path"].get("GET /api/v1/prices/*", 0) - before["by_path"].get("GET /api/v1/prices/*", 0)
+                per_pair = [sum(v) for v in pair_ms.values()]
+                status: Dict[str, int] = {}
+                for r in results.values():
+                    status[r.get("status", "?")] = status.get(r.get("status", "?"), 0) + 1
+                row = {"cycle": c, "wall_s": wall, "api_calls": calls, "rss_mb": _rss_mb(),
+                       "pair_p50_ms": _pct(per_pair, 50), "pair_p99_ms": _pct(per_pair, 99),
+                       "sleep_budget_s": pages * PROD_PAGE_SLEEP + len(results) * PROD_PAUSE, "status": status}
+                rows.append(row)
+                log(f"[LOAD] n={n_symbols} cycle {c}: {wall:.2f}s calls={calls} p50={row['pair_p50_ms']:.1f}ms "
+                    f"p99={row['pair_p99_ms']:.1f}ms rss={row['rss_mb']:.0f}MB {status}")
+
+    steady = rows[1:] or rows  # 1. sykli lämmittää välimuistit (epic-haku, mallit)
+    shortest = min(bar_seconds(tf) for tf in tfs)
+    wall = [r["wall_s"] for r in steady]
+    summary = {
+        "cycle_wall_p50_s": _pct(wall, 50), "cycle_wall_max_s": max(wall),
+        "pair_p50_ms": _pct([r["pair_p50_ms"] for r in steady], 50),
+        "pair_p99_ms": max(r["pair_p99_ms"] for r in steady),
+        "api_calls_per_cycle": float(np.mean([r["api_calls"] for r in steady])),
+        "rss_growth_mb": rows[-1]["rss_mb"] - steady[0]["rss_mb"],
+        "prod_cycle_estimate_s": _pct(wall, 50) + float(np.mean([r["sleep_budget_s"] for r in steady])),
+    }
+    summary["bar_budget_used"] = summary["prod_cycle_estimate_s"] / shortest
+    return {"symbols": n_symbols, "tfs": list(tfs), "cycles": cycles, "latency_ms": latency_ms,
+            "page_sleep": page_sleep, "seed": seed, "commit": _git_rev(), "summary": summary, "rows": rows}
+
+
+def compare(cur: Dict[str, Any], base: Dict[str, Any]) -> List[str]:
+    """Regressiot baselineen nähden (tyhjä lista = ok)."""
+    a, b = cur["summary"], base["summary"]
+    out = []
+    for k in ("cycle_wall_p50_s", "pair_p99_ms"):
+        if b.get(k) and a[k] > b[k] * TIME_RATIO:
+            out.append(f"{k}: {b[k]:.3f} -> {a[k]:.3f} (x{a[k] / b[k]:.2f})")
+    if b.get("api_calls_per_cycle") and a["api_calls_per_cycle"] > b["api_calls_per_cycle"] * CALLS_RATIO:
+        out.append(f"api_calls_per_cycle: {b['api_calls_per_cycle']:.0f} -> {a['api_calls_per_cycle']:.0f}")
+    if a["rss_growth_mb"] > max(0.0, b.get("rss_growth_mb", 0.0)) + RSS_GROWTH_SLACK_MB:
+        out.append(f"rss_growth_mb: {b.get('rss_growth_mb', 0.0):.1f} -> {a['rss_growth_mb']:.1f}")
+    return out
+
+
+def baseline_path(n_symbols: int, tfs: Sequence[str]) -> Path:
+    return OUT_DIR / f"baseline_{n_symbols}x{len(tfs)}.json"
+
+
+def _git_rev() -> str:
+    from tools.bench import _git_rev as rev
+    return rev()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="End-to-end live-cycle load test against the Capital mock")
+    ap.add_argument("--symbols", type=int, default=40)
+    ap.add_argument("--sweep", default="", help="comma list of symbol counts (overrides --symbols)")
+    ap.add_argument("--tfs", default=",".join(TFS))
+    ap.add_argument("--cycles", type=int, default=5)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--page-sleep", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--baseline", default="", help="compare against a stored result (default per-size baseline if it exists)")
+    ap.add_argument("--save-baseline", action="store_true")
+    a = ap.parse_args(argv)
+
+    tfs = [t.strip() for t in a.tfs.split(",") if t.strip()]
+    sizes = [int(x) for x in a.sweep.split(",") if x.strip()] or [a.symbols]
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    rc = 0
+    for n in sizes:
+        res = run(n, tfs, a.cycles, a.seed, a.latency_ms, a.page_sleep)
+        s = res["summary"]
+        print(f"[LOAD] n={n}x{len(tfs)}: cycle p50 {s['cycle_wall_p50_s']:.2f}s, pair p99 {s['pair_p99_ms']:.0f}ms, "
+              f"{s['api_calls_per_cycle']:.0f} calls/cycle, rss +{s['rss_growth_mb']:.1f}MB, "
+              f"prod estimate {s['prod_cycle_estimate_s']:.0f}s = {s['bar_budget_used'] * 100:.0f}% of shortest bar",
+              flush=True)
+        out = OUT_DIR / f"{time.strftime('%Y%m%dT%H%M%S')}-{res['commit']}-{n}x{len(tfs)}.json"
+        out.write_text(json.dumps(res, indent=2), encoding="utf-8")
+        bp = Path(a.baseline) if a.baseline else baseline_path(n, tfs)
+        if a.save_baseline:
+            baseline_path(n, tfs).write_text(json.dumps(res, indent=2), encoding="utf-8")
+            print(f"[LOAD] baseline saved: {baseline_path(n, tfs)}", flush=True)
+        elif bp.exists():
+            regs = compare(res, json.loads(bp.read_text(encoding="utf-8")))
+            for r in regs:
+                print(f"[LOAD] REGRESSION n={n}: {r}", flush=True)
+            rc = rc or (1 if regs else 0)
+    return rc
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Push-based market data layer.
+
+A MarketStream takes quotes from a pluggable transport, keeps the latest
+bid/ask per symbol, builds 15m/1h/4h candles incrementally in memory and
+publishes events to subscribers:
+
+    "quote" -> fn(Quote)             every tick
+    "bar"   -> fn(Bar)               when a candle closes
+
+Transports:
+    CapitalWebsocketTransport  Capital.com streaming API (marketData.subscribe)
+    PollingTransport           REST fallback via capital_get_bid_ask
+    SimulatedTransport         seeded random walk (local dev / load tests)
+    ReplayTransport            replays a list of quotes (tests, backfills)
+
+Usage:
+    stream = MarketStream(SimulatedTransport(["EURUSD", "GOLD"]))
+    stream.subscribe("bar", lambda b: print(b))
+    stream.start()
+    set_default_stream(stream)   # tools.prices.last_price() and tools.vol_service read from it
+"""
+from __future__ import annotations
+import abc
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from tools.bar_scheduler import bar_seconds
+
+STREAM_TFS = tuple(t.strip() for t in os.getenv("STREAM_TFS", "15m,1h,4h").split(",") if t.strip())
+STREAM_HISTORY = int(os.getenv("STREAM_HISTORY", "600"))
+
+
+@dataclass
+class Quote:
+    symbol: str
+    bid: float
+    ask: float
+    ts: float  # epoch seconds
+
+    @property
+    def mid(self) -> float:
+        return (self.bid + self.ask) / 2.0
+
+
+@dataclass
+class Bar:
+    symbol: str
+    tf: str
+    start: int  # epoch seconds, bar open time
+    open: float
+    high: float
+    low: float
+    close: float
+    ticks: int = 1
+    spread: float = 0.0  # last ask-bid
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class CandleBuilder:
+    """Incremental OHLC for one (symbol, tf) from mid prices."""
+
+    def __init__(self, symbol: str, tf: str):
+        self.symbol, self.tf = symbol, tf
+        self.step = bar_seconds(tf)
+        self.cur: Optional[Bar] = None
+        self.last_closed: Optional[int] = None  # start of the newest bar already emitted
+
+    def update(self, q: Quote) -> Optional[Bar]:
+        """Apply a quote; returns the bar that closed because of it, if any."""
+        start = int(q.ts // self.step) * self.step
+        if self.last_closed is not None and start <= self.last_closed:
+            return None  # late tick for a bar already emitted (e.g. after flush) -> ignore
+        px = q.mid
+        closed = None
+        if self.cur is not None and start > self.cur.start:
+            closed, self.cur = self.cur, None
+            self.last_closed = closed.start
+        if self.cur is None:
+            self.cur = Bar(self.symbol, self.tf, start, px, px, px, px, 1, q.ask - q.bid)
+        elif start == self.cur.start:
+            b = self.cur
+            b.high = max(b.high, px)
+            b.low = min(b.low, px)
+            b.close = px
+            b.ticks += 1
+            b.spread = q.ask - q.bid
+        # start < cur.start: out-of-order tick for an already closed bar -> ignore
+        return closed
+
+    def flush(self, now: float) -> Optional[Bar]:
+        """Close the current bar if its period is over (no tick needed)."""
+        if self.cur is not None and now >= self.cur.start + self.step:
+            closed, self.cur = self.cur, None
+            self.last_closed = closed.start
+            return closed
+        return None
+
+
+class MarketStream:
+    def __init__(self, transport: "Transport", tfs: Iterable[str] = STREAM_TFS, history: int = STREAM_HISTORY):
+        self.transport = transport
+        self.tfs = tuple(tfs)
+        self.history = int(history)
+        self._lock = threading.RLock()
+        self._subs: Dict[str, List[Callable[[Any], None]]] = {"quote": [], "bar": []}
+        self._last: Dict[str, Quote] = {}
+        self._builders: Dict[Tuple[str, str], CandleBuilder] = {}
+        self._bars: Dict[Tuple[str, str], Deque[Bar]] = {}
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    # ---- pub/sub ----
+    def subscribe(self, kind: str, fn: Callable[[Any], None]) -> Callable[[], None]:
+        with self._lock:
+            self._subs.setdefault(kind, []).append(fn)
+
+        def _unsub():
+            with self._lock:
+                if fn in self._subs.get(kind, []):
+                    self._subs[kind].remove(fn)
+        return _unsub
+
+    def _publish(self, kind: str, obj: Any):
+        for fn in list(self._subs.get(kind, [])):
+            try:
+                fn(obj)
+            except Exception as e:
+                print(f"[STREAM] subscriber {getattr(fn, '__name__', fn)} failed on {kind}: {e}", flush=True)
+
+    # ---- ingest ----
+    def on_quote(self, q: Quote):
+        closed: List[Bar] = []
+        with self._lock:
+            self._last[q.symbol] = q
+            for tf in self.tfs:
+                key = (q.symbol, tf)
+                b = self._builders.get(key)
+                if b is None:
+                    b = self._builders[key] = CandleBuilder(q.symbol, tf)
+                bar = b.update(q)
+                if bar is not None:
+                    self._store(bar)
+                    closed.append(bar)
+            if not self.transport.live:
+                # replayed feed: the quote's own timestamp is the clock, not wall time
+                for b in self._builders.values():
+                    bar = b.flush(q.ts)
+                    if bar is not None:
+                        self._store(bar)
+                        closed.append(bar)
+        self._publish("quote", q)
+        for bar in closed:
+            self._publish("bar", bar)
+
+    def flush(self, now: Optional[float] = None) -> List[Bar]:
+        """Close bars whose period ended even if no new tick arrived (quiet markets)."""
+        t = time.time() if now is None else now
+        closed: List[Bar] = []
+        with self._lock:
+            for b in self._builders.values():
+                bar = b.flush(t)
+                if bar is not None:
+                    self._store(bar)
+                    closed.append(bar)
+        for bar in closed:
+            self._publish("bar", bar)
+        return closed
+
+    def _store(self, bar: Bar):
+        dq = self._bars.get((bar.symbol, bar.tf))
+        if dq is None:
+            dq = self._bars[(bar.symbol, bar.tf)] = deque(maxlen=self.history)
+        dq.append(bar)
+
+    # ---- queries ----
+    def last_quote(self, symbol: str) -> Optional[Quote]:
+        return self._last.get(symbol)
+
+    def last_price(self, symbol: str) -> Optional[float]:
+        q = self._last.get(symbol)
+        return q.mid if q else None
+
+    def bars(self, symbol: str, tf: str) -> List[Bar]:
+        with self._lock:
+            return list(self._bars.get((symbol, tf), ()))
+
+    def candles_df(self, symbol: str, tf: str):
+        """Closed bars as a capital_get_candles_df-style DataFrame (time, open, high, low, close, volume)."""
+        import pandas as pd
+        rows = self.bars(symbol, tf)
+        df = pd.DataFrame([{"time": b.start, "open": b.open, "high": b.high, "low": b.low,
+                            "close": b.close, "volume": float(b.ticks)} for b in rows],
+                          columns=["time", "open", "high", "low", "close", "volume"])
+        df["time"] = pd.to_datetime(df["time"], unit="s", utc=True)
+        return df
+
+    # ---- lifecycle ----
+    def start(self, flush_every: float = 1.0):
+        """Run the transport; live feeds also get a wall-clock flusher for quiet markets."""
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._run_transport, daemon=True, name="market-stream")]
+        if self.transport.live:
+            self._threads.append(threading.Thread(target=self._run_flusher, args=(flush_every,), daemon=True,
+                                                  name="market-stream-flush"))
+        for t in self._threads:
+            t.start()
+        return self
+
+    def _run_transport(self):
+        while not self._stop.is_set():
+            try:
+                self.transport.run(self.on_quote, self._stop)
+            except Exception as e:
+                print(f"[STREAM] transport error: {e} -> reconnect in 5s", flush=True)
+                self._stop.wait(5.0)
+            else:
+                break
+
+    def _run_flusher(self, every: float):
+        while not self._stop.wait(every):
+            self.flush()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=timeout)
+
+
+# ---------- transports ----------
+
+class Transport(abc.ABC):
+    """run(on_quote, stop) blocks, calling on_quote(Quote) until stop is set or the feed ends."""
+
+    live = True  # quotes stamped with wall time; False = historical feed (bars close on quote time)
+
+    @abc.abstractmethod
+    def run(self, on_quote: Callable[[Quote], None], stop: threading.Event) -> None:
+        ...
+
+
+class ReplayTransport(Transport):
+    live = False
+
+    def __init__(self, quotes: Iterable[Quote], speed: float = 0.0):
+        self.quotes = quotes
+        self.speed = float(speed)  # 0 = as fast as possible, 1 = real time
+
+    def run(self, on_quote, stop):
+        prev_ts = None
+        for q in self.quotes:
+            if stop.is_set():
+                return
+            if self.speed > 0 and prev_ts is not None and q.ts > prev_ts:
+                stop.wait((q.ts - prev_ts) / self.speed)
+            prev_ts = q.ts
+            on_quote(q)
+
+
+class SimulatedTransport(Transport):
+    def __init__(self, symbols: List[str], seed: int = 0, interval: float = 0.25,
+                 start_px: float = 100.0, vol: float = 0.0005, spread_bps: float = 1.0):
+        self.symbols = list(symbols)
+        self.rng = random.Random(seed)
+        self.interval = float(interval)
+        self.px = {s: float(start_px) for s in self.symbols}
+        self.vol = float(vol)
+        self.spread = float(spread_bps) / 1e4
+
+    def next_quotes(self, ts: float) -> List[Quote]:
+        out = []
+        for s in self.symbols:
+            self.px[s] *= 1.0 + self.rng.gauss(0.0, self.vol)
+            half = self.px[s] * self.spread / 2.0
+            out.append(Quote(s, self.px[s] - half, self.px[s] + half, ts))
+        return out
+
+    def run(self, on_quote, stop):
+        while not stop.is_set():
+            for q in self.next_quotes(time.time()):
+                on_quote(q)
+            stop.wait(self.interval)
+
+
+class PollingTransport(Transport):
+    """Fallback: REST polling through capital_session (what the bot did before streaming)."""
+
+    def __init__(self, symbols: List[str], interval: float = 2.0):
+        self.symbols = list(symbols)
+        self.interval = float(interval)
+
+    def run(self, on_quote, stop):
+        from tools.capital_session import capital_get_bid_ask
+        while not stop.is_set():
+            for s in self.symbols:
+                try:
+                    ba = capital_get_bid_ask(s)
+                except Exception as e:
+                    print(f"[STREAM] poll {s} failed: {e}", flush=True)
+                    continue
+                if ba:
+                    on_quote(Quote(s, float(ba[0]), float(ba[1]), time.time()))
+            stop.wait(self.interval)
+
+
+class CapitalWebsocketTransport(Transport):
+    """
+    Capital.com streaming API:
+      wss://api-streaming-capital.backend-capital.com/connect
+      -> {"destination":"marketData.subscribe","cst":..,"securityToken":..,"payload":{"epics":[...]}}
+      <- {"destination":"quote","payload":{"epic":..,"bid":..,"ofr":..,"timestamp":ms}}
+    Sessions come from capital_session.capital_rest_login; max 40 epics per subscription,
+    ping at least every 10 minutes.
+    """
+    URL = os.getenv("CAPITAL_STREAM_URL", "wss://api-streaming-capital.backend-capital.com/connect")
+    MAX_EPICS = 40
+    PING_EVERY = 300.0
+
+    def __init__(self, symbols: List[str], url: Optional[str] = None):
+        self.symbols = list(symbols)
+        self.url = url or self.URL
+
+    def _tokens(self) -> Tuple[str, str, Dict[str, str]]:
+        from tools.capital_session import capital_rest_login, _resolve_epic
+        sess, _base = capital_rest_login()
+        epic_to_sym = {_resolve_epic(s): s for s in self.symbols}
+        return sess.headers.get("CST", ""), sess.headers.get("X-SECURITY-TOKEN", ""), epic_to_sym
+
+    def run(self, on_quote, stop):
+        from websockets.sync.client import connect
+        cst, xst, epic_to_sym = self._tokens()
+        epics = list(epic_to_sym)
+        with connect(self.url, open_timeout=20) as ws:
+            for i in range(0, len(epics), self.MAX_EPICS):
+                ws.send(json.dumps({
+                    "destination": "marketData.subscribe", "correlationId": str(i),
+                    "cst": cst, "securityToken": xst,
+                    "payload": {"epics": epics[i:i + self.MAX_EPICS]},
+                }))
+            last_ping = time.time()
+            while not stop.is_set():
+                if time.time() - last_ping > self.PING_EVERY:
+                    ws.send(json.dumps({"destination": "ping", "correlationId": "ping", "cst": cst, "securityToken": xst}))
+                    last_ping = time.time()
+                try:
+                    raw = ws.recv(timeout=1.0)
+                except TimeoutError:
+                    continue
+                try:
+                    msg = json.loads(raw)
+                except Exception:
+                    continue
+                if msg.get("destination") != "quote":
+                    continue
+                p = msg.get("payload") or {}
+                try:
+                    sym = epic_to_sym.get(p["epic"], p["epic"])
+                    ts = float(p.get("timestamp") or time.time() * 1000.0) / 1000.0
+                    on_quote(Quote(sym, float(p["bid"]), float(p["ofr"]), ts))
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+
+# ---------- process-wide default ----------
+
+_default: Optional[MarketStream] = None
+_default_unsubs: List[Callable[[], None]] = []
+
+
+def set_default_stream(stream: Optional[MarketStream]):
+    """Set the process-wide stream; its closed bars also feed tools.vol_service and core.cov_engine."""
+    global _default
+    while _default_unsubs:
+        _default_unsubs.pop()()
+    _default = stream
+    if stream is not None:
+        from tools import vol_service
+        _default_unsubs.append(vol_service.get_service().attach(stream))
+        from core import cov_engine
+        _default_unsubs.append(stream.subscribe("bar", cov_engine.on_bar))
+
+
+def get_default_stream() -> Optional[MarketStream]:
+    return _default
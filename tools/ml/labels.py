@@ -4,7 +4,7 @@ import pandas as pd
 
 def rolling_vola(close: pd.Series, span: int = 50) -> pd.Series:
     r = close.pct_change()
-    return r.ewm(span=span, adjust=False).std().fillna(method="bfill")
+    return r.ewm(span=span, adjust=False).std().bfill()
 
 def label_meta_from_entries(
     df: pd.DataFrame,
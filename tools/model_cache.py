@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Prosessin sisäinen välimuisti mallirekistereille (JSON) ja joblib-malleille.
+
+- Rekisterit (state/models_meta.json, state/models_pro.json, models/pro_*.json)
+  luetaan laiskasti ja jäsennetään vain kun tiedoston (mtime_ns, size) muuttuu.
+- (symbol, tf) -> rivi -haku tehdään indeksistä, joka rakennetaan kerran per
+  rekisteriversio.
+- joblib-mallit pidetään LRU-muistissa (MODEL_CACHE_MAX, oletus 64).
+- Versioleima (state/models.version) mitätöi kaiken kerralla; activate_if_better
+  kutsuu bump_version() kun uusi malli aktivoidaan.
+
+Uudelleenlataus on atominen: uusi arvo ladataan kokonaan ennen kuin se vaihdetaan
+välimuistiin, ja jos lataus epäonnistuu, vanha arvo jää käyttöön.
+Palautettuja dict-olioita ei saa muokata (ne jaetaan kutsujien kesken).
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from tools.ops_runtime import cache_hit
+
+ROOT = Path(__file__).resolve().parents[1]
+STATE = ROOT / "state"
+VERSION_FILE = STATE / "models.version"
+
+MODEL_CACHE_MAX = int(os.getenv("MODEL_CACHE_MAX", "64"))
+
+_lock = threading.RLock()
+_json_cache: Dict[str, Tuple[Any, Any]] = {}        # path -> (stamp, obj)
+_index_cache: Dict[Tuple[str, bool], Tuple[Any, Dict]] = {}  # (path, latest) -> (stamp, index)
+_model_cache: "OrderedDict[str, Tuple[Any, Any]]" = OrderedDict()  # path -> (stamp, model)
+_stats = {"hits": 0, "misses": 0, "reloads": 0, "evictions": 0}
+
+
+def _stamp(p: Path) -> Optional[Tuple[int, int, int]]:
+    """(mtime_ns, size, version) tai None jos tiedostoa ei ole."""
+    try:
+        st = p.stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, _version_stamp())
+
+
+def _version_stamp() -> int:
+    try:
+        return VERSION_FILE.stat().st_mtime_ns
+    except OSError:
+        return 0
+
+
+def current_version() -> str:
+    try:
+        return VERSION_FILE.read_text().strip()
+    except OSError:
+        return ""
+
+
+def bump_version(tag: Optional[str] = None) -> str:
+    """Kirjoita uusi versioleima atomisesti -> kaikki välimuistit mitätöityvät."""
+    import time
+    v = tag or f"{time.time_ns()}"
+    VERSION_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = VERSION_FILE.with_suffix(".version.tmp")
+    tmp.write_text(v)
+    os.replace(tmp, VERSION_FILE)
+    return v
+
+
+def _load_json_stamped(p: Path, default: Any) -> Tuple[Any, Any]:
+    key = str(p)
+    st = _stamp(p)
+    if st is None:
+        return None, default
+    with _lock:
+        hit = _json_cache.get(key)
+        if hit and hit[0] == st:
+            _stats["hits"] += 1
+            cache_hit("json", True)
+            return hit
+    try:
+        obj = json.loads(p.read_text(encoding="utf-8") or "null")
+    except Exception:
+        # puolivalmis kirjoitus tms. -> palvele vanhaa arvoa jos sellainen on
+        return hit if hit else (None, default)
+    if obj is None:
+        obj = default
+    with _lock:
+        _stats["misses"] += 1
+        if hit:
+            _stats["reloads"] += 1
+        _json_cache[key] = (st, obj)
+    cache_hit("json", False)
+    return st, obj
+
+
+def load_json(path: Path | str, default: Any = None) -> Any:
+    """Jäsennetty JSON; luetaan levyltä vain kun tiedosto on muuttunut."""
+    return _load_json_stamped(Path(path), default)[1]
+
+
+def find_in_registry(path: Path | str, symbol: str, tf: str, latest: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Hae rekisterin {"models":[...]} rivi (symbol, tf) indeksistä.
+
+    latest=False -> ensimmäinen osuma (trade_engine.find_model_config),
+    latest=True  -> suurin trained_at (position_sizer/_find_model).
+    """
+    p = Path(path)
+    st, reg = _load_json_stamped(p, {"models": []})
+    key = (str(p), bool(latest))
+    with _lock:
+        hit = _index_cache.get(key)
+        if st is not None and hit and hit[0] == st:
+            return hit[1].get((symbol, tf))
+    idx: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for m in (reg or {}).get("models", []) if isinstance(reg, dict) else []:
+        k = (m.get("symbol"), m.get("tf"))
+        cur = idx.get(k)
+        if cur is None:
+            idx[k] = m
+        elif latest and int(m.get("trained_at", 0) or 0) > int(cur.get("trained_at", 0) or 0):
+            idx[k] = m
+    if st is not None:
+        with _lock:
+            _index_cache[key] = (st, idx)
+    return idx.get((symbol, tf))
+
+
+def load_model(path: Path | str, loader: Optional[Callable[[Path], Any]] = None) -> Any:
+    """joblib-malli LRU-välimuistista; ladataan uudelleen jos tiedosto/versio muuttui."""
+    p = Path(path)
+    key = str(p)
+    st = _stamp(p)
+    if st is None:
+        return None
+    with _lock:
+        hit = _model_cache.get(key)
+        if hit and hit[0] == st:
+            _model_cache.move_to_end(key)
+            _stats["hits"] += 1
+            cache_hit("model", True)
+            return hit[1]
+    if loader is None:
+        from joblib import load as loader
+    try:
+        model = loader(p)
+    except Exception:
+        if hit:
+            return hit[1]
+        raise
+    with _lock:
+        _stats["misses"] += 1
+        if hit:
+            _stats["reloads"] += 1
+        _model_cache[key] = (st, model)
+        _model_cache.move_to_end(key)
+        while len(_model_cache) > max(1, MODEL_CACHE_MAX):
+            _model_cache.popitem(last=False)
+            _stats["evictions"] += 1
+    cache_hit("model", False)
+    return model
+
+
+def clear():
+    with _lock:
+        _json_cache.clear()
+        _index_cache.clear()
+        _model_cache.clear()
+
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        out = dict(_stats)
+        out["models"] = len(_model_cache)
+        out["registries"] = len(_json_cache)
+    return out
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+news_calendar.py – uutiskalenteri intervalli-indeksillä (blackout-gating + featuret)
+
+Kaksi lähdettä yhdistetään:
+- toistuvat päivittäiset ikkunat NEWS_WINDOWS-merkkijonosta ("CPI@13:30Z±30;FOMC@18:00Z±45")
+- kertatapahtumat data/news_schedule.json:sta (tools/news_fetcher ylläpitää:
+  [{"ts": "2025-09-01T12:30:00Z", "label": "CPI (US)", "impact": "high"}, ...]);
+  blackout-ikkuna impactin mukaan NEWS_BLACKOUT_MIN ("high:30,medium:15,low:0", ± minuuttia)
+
+Intervallit yhdistetään lajiteltuihin, erillisiin [alku, loppu] -taulukoihin, joten
+
+    cal = get_calendar()
+    cal.in_blackout(time.time())    -> "CPI (US)" / None       O(log n), live-gating
+    cal.features(df.index)          -> DataFrame per baari     vektoroitu, koko historia
+
+features-sarakkeet: news_blackout (0/1), news_min_to_next, news_min_since_last
+(minuutteja, katto horizon_min), news_next_impact (0=ei tapahtumaa horisontissa,
+1=low, 2=medium, 3=high). Toistuvat ikkunat lasketaan vuorokauden sekunneista,
+kertatapahtumat epoch-sekunneista; lähempi voittaa.
+
+get_calendar() lukee schedule-tiedoston uudelleen vain kun se on muuttunut.
+"""
+from __future__ import annotations
+import bisect
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+SCHEDULE = Path(os.getenv("NEWS_SCHEDULE", str(ROOT / "data" / "news_schedule.json")))
+DAY = 86400
+IMPACT = {"low": 1, "medium": 2, "high": 3}
+RECURRING_IMPACT = 3  # NEWS_WINDOWS-ikkunat ovat erikseen nimettyjä blackoutteja
+
+
+def parse_news_windows(raw: str) -> List[Tuple[int, int]]:
+    """"CPI@13:30Z±30;FOMC@18:00Z±45" -> [(780, 840), (1035, 1125)] (minuutteja UTC-päivässä)."""
+    return [(s, e) for s, e, _ in _parse_windows(raw)]
+
+
+def _parse_windows(raw: str) -> List[Tuple[int, int, str]]:
+    res = []
+    for p in (x.strip() for x in (raw or "").split(";")):
+        if not p:
+            continue
+        try:
+            label, at = p.split("@", 1)
+            hh, mm = at.split("Z", 1)[0].split(":")
+            minute, span = int(hh) * 60 + int(mm), int(p.split("±", 1)[1])
+            res.append((minute - span, minute + span, label.strip()))
+        except Exception:
+            continue
+    return res
+
+
+def _blackout_spans(raw: Optional[str] = None) -> Dict[int, int]:
+    """impact-taso -> ± sekuntia."""
+    spans = {3: 30, 2: 15, 1: 0}
+    for part in (raw if raw is not None else os.getenv("NEWS_BLACKOUT_MIN", "")).split(","):
+        k, _, v = part.partition(":")
+        if k.strip().lower() in IMPACT and v.strip():
+            try:
+                spans[IMPACT[k.strip().lower()]] = int(v)
+            except ValueError:
+                continue
+    return {k: v * 60 for k, v in spans.items()}
+
+
+def merge_intervals(iv: Iterable[Tuple[float, float, str]]) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """Päällekkäiset/vierekkäiset [s, e] yhdeksi; palauttaa (alut, loput, labelit) alun mukaan lajiteltuna."""
+    out: List[List[Any]] = []
+    for s, e, lab in sorted(iv, key=lambda x: (x[0], x[1])):
+        if out and s <= out[-1][1]:
+            out[-1][1] = max(out[-1][1], e)
+            if lab and lab not in out[-1][2]:
+                out[-1][2].append(lab)
+        else:
+            out.append([s, e, [lab] if lab else []])
+    return (np.array([o[0] for o in out], dtype=np.int64), np.array([o[1] for o in out], dtype=np.int64),
+            ["+".join(o[2]) for o in out])
+
+
+def _epoch(times: Any) -> np.ndarray:
+    """DatetimeIndex / Series / ndarray (epoch s tai datetime64) -> int64 epoch-sekunnit."""
+    if isinstance(times, (pd.DatetimeIndex, pd.Series)) or (isinstance(times, np.ndarray) and times.dtype.kind == "M"):
+        t = pd.DatetimeIndex(times)
+        t = t.tz_localize("UTC") if t.tz is None else t.tz_convert("UTC")
+        return (t.as_unit("s").asi8 if hasattr(t, "as_unit") else t.asi8 // 10**9).astype(np.int64)
+    return np.asarray(times, dtype=np.int64)
+
+
+class NewsCalendar:
+    def __init__(self, windows: str = "", events: Sequence[Dict[str, Any]] = (), spans: Optional[Dict[int, int]] = None):
+        spans = spans or _blackout_spans()
+        # toistuvat: vuorokauden sekunnit, ympäri kääritty
+        rec, centers = [], []
+        for s, e, lab in _parse_windows(windows):
+            s, e = s * 60, e * 60
+            centers.append(((s + e) // 2 % DAY, lab))
+            if e - s >= DAY:
+                rec.append((0, DAY - 1, lab))
+                continue
+            s, e = s % DAY, e % DAY
+            rec.extend([(s, e, lab)] if s <= e else [(s, DAY - 1, lab), (0, e, lab)])
+        self.r_start, self.r_end, self.r_label = merge_intervals(rec)
+        centers.sort()
+        self.r_center = np.array([c for c, _ in centers], dtype=np.int64)
+
+        # kertatapahtumat: epoch-sekunnit
+        ev = []
+        for e in events:
+            try:
+                t = int(datetime.fromisoformat(str(e["ts"]).replace("Z", "+00:00")).timestamp())
+            except Exception:
+                continue
+            ev.append((t, IMPACT.get(str(e.get("impact") or "medium").lower(), 2), str(e.get("label") or "")))
+        ev.sort()
+        self.e_time = np.array([t for t, _, _ in ev], dtype=np.int64)
+        self.e_impact = np.array([i for _, i, _ in ev], dtype=np.int8)
+        self.e_label = [lab for _, _, lab in ev]
+        self.o_start, self.o_end, self.o_label = merge_intervals(
+            (t - spans.get(i, 0), t + spans.get(i, 0), lab) for t, i, lab in ev if spans.get(i, 0) > 0)
+        # bisect-listat live-polulle (nopeampi kuin numpy yksittäiselle arvolle)
+        self._rs, self._os = self.r_start.tolist(), self.o_start.tolist()
+
+    def __len__(self) -> int:
+        return len(self.r_center) + len(self.e_time)
+
+    # ---- live ----
+    def in_blackout(self, t: float) -> Optional[str]:
+        """Blackout-ikkunan label jos t (epoch s) osuu johonkin, muuten None."""
+        t = int(t)
+        i = bisect.bisect_right(self._os, t) - 1
+        if i >= 0 and t <= self.o_end[i]:
+            return self.o_label[i] or "news"
+        sod = t % DAY
+        i = bisect.bisect_right(self._rs, sod) - 1
+        if i >= 0 and sod <= self.r_end[i]:
+            return self.r_label[i] or "news"
+        return None
+
+    # ---- historia ----
+    def blackout_mask(self, times: Any) -> np.ndarray:
+        t = _epoch(times)
+        m = np.zeros(len(t), dtype=bool)
+        for starts, ends, x in ((self.o_start, self.o_end, t), (self.r_start, self.r_end, t % DAY)):
+            if len(starts):
+                i = np.searchsorted(starts, x, side="right") - 1
+                m |= (i >= 0) & (x <= ends[np.maximum(i, 0)])
+        return m
+
+    def features(self, times: Any, horizon_min: float = 1440.0) -> pd.DataFrame:
+        t = _epoch(times)
+        n = len(t)
+        cap = float(horizon_min) * 60.0
+        to_next, since, imp = np.full(n, np.inf), np.full(n, np.inf), np.zeros(n, dtype=np.int8)
+        if len(self.e_time):
+            j = np.searchsorted(self.e_time, t, side="left")
+            has = j < len(self.e_time)
+            jj = np.minimum(j, len(self.e_time) - 1)
+            to_next = np.where(has, self.e_time[jj] - t, np.inf).astype(float)
+            imp = np.where(has, self.e_impact[jj], 0).astype(np.int8)
+            k = np.searchsorted(self.e_time, t, side="right") - 1
+            since = np.where(k >= 0, t - self.e_time[np.maximum(k, 0)], np.inf).astype(float)
+        if len(self.r_center):
+            c = self.r_center
+            sod = t % DAY
+            j = np.searchsorted(c, sod, side="left")
+            r_next = np.where(j < len(c), c[np.minimum(j, len(c) - 1)] - sod, c[0] + DAY - sod).astype(float)
+            k = np.searchsorted(c, sod, side="right") - 1
+            r_since = np.where(k >= 0, sod - c[np.maximum(k, 0)], sod - c[-1] + DAY).astype(float)
+            imp = np.where(r_next < to_next, RECURRING_IMPACT,
+                           np.where(r_next == to_next, np.maximum(imp, RECURRING_IMPACT), imp)).astype(np.int8)
+            to_next = np.minimum(to_next, r_next)
+            since = np.minimum(since, r_since)
+        imp = np.where(to_next <= cap, imp, 0).astype(np.int8)
+        idx = times if isinstance(times, pd.DatetimeIndex) else None
+        return pd.DataFrame({
+            "news_blackout": self.blackout_mask(t).astype(float),
+            "news_min_to_next": np.minimum(to_next, cap) / 60.0,
+            "news_min_since_last": np.minimum(since, cap) / 60.0,
+            "news_next_impact": imp.astype(float),
+        }, index=idx)
+
+
+def load_events(path: Path = SCHEDULE) -> List[Dict[str, Any]]:
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        return data if isinstance(data, list) else []
+    except Exception:
+        return []
+
+
+_cal: Optional[NewsCalendar] = None
+_cal_key: Any = None
+_lock = threading.Lock()
+
+
+def get_calendar(windows: Optional[str] = None, path: Optional[Path] = None) -> NewsCalendar:
+    """NEWS_WINDOWS (tai windows) + schedule-tiedosto; rakennetaan uudelleen vain kun jokin muuttui."""
+    global _cal, _cal_key
+    p = Path(path) if path else SCHEDULE
+    w = os.getenv("NEWS_WINDOWS", "") if windows is None else windows
+    try:
+        st = p.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        stamp = None
+    key = (str(p), stamp, w, os.getenv("NEWS_BLACKOUT_MIN", ""))
+    with _lock:
+        if _cal is None or key != _cal_key:
+            _cal = NewsCalendar(w, load_events(p) if stamp else [])
+            _cal_key = key
+        return _cal
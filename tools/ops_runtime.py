@@ -1,6 +1,12 @@
 from __future__ import annotations
 import logging, threading, time, json, socket
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
 from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from tools import profiler
 
 log = logging.getLogger(__name__)
 
@@ -72,6 +78,205 @@ def start_healthz_server(host: str = "0.0.0.0", port: int = 8787):
         t.start()
         log.info("healthz: started on %s:%d", host, port)
 
+# ---- Metrics registry (Prometheus-tekstimuoto, ei ulkoisia riippuvuuksia) ----
+# Mittarit ovat prosessikohtaisia; päivitys on lukko + muutama aritmeettinen operaatio.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = ['%s="%s"' % (n, str(v).replace("\\", "\\\\").replace('"', '\\"')) for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt_num(v: float) -> str:
+    return "+Inf" if v == float("inf") else repr(float(v))
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str = "", labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, kw: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(kw.get(n, "")) for n in self.labels)
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        out.extend(self._samples())
+        return out
+
+    def _samples(self) -> List[str]:
+        return []
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self._v: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        k = self._key(labels)
+        with self._lock:
+            self._v[k] = self._v.get(k, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._v.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._v.items())
+        return [f"{self.name}{_fmt_labels(self.labels, k)} {_fmt_num(v)}" for k, v in items]
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self._v: Dict[Tuple[str, ...], float] = {}
+        self._fn: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        k = self._key(labels)
+        with self._lock:
+            self._v[k] = float(value)
+
+    def set_function(self, fn: Callable[[], float], **labels):
+        """Arvo luetaan vasta scrapessa (esim. jonon pituus)."""
+        with self._lock:
+            self._fn[self._key(labels)] = fn
+
+    def value(self, **labels) -> Optional[float]:
+        k = self._key(labels)
+        fn = self._fn.get(k)
+        return float(fn()) if fn else self._v.get(k)
+
+    def _samples(self):
+        with self._lock:
+            items = dict(self._v)
+            fns = dict(self._fn)
+        for k, fn in fns.items():
+            try:
+                items[k] = float(fn())
+            except Exception:
+                continue
+        return [f"{self.name}{_fmt_labels(self.labels, k)} {_fmt_num(v)}" for k, v in items.items()]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str = "", labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._v: Dict[Tuple[str, ...], List[float]] = {}  # [count per bucket..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        k = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._v.get(k)
+            if row is None:
+                row = self._v[k] = [0.0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def count(self, **labels) -> int:
+        row = self._v.get(self._key(labels))
+        return int(sum(row[:-1])) if row else 0
+
+    def _samples(self):
+        with self._lock:
+            items = [(k, list(r)) for k, r in self._v.items()]
+        out = []
+        for k, row in items:
+            acc = 0.0
+            for b, c in zip(self.buckets + (float("inf"),), row[:-1]):
+                acc += c
+                le = 'le="%s"' % _fmt_num(b)
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, k, le)} {_fmt_num(acc)}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, k)} {_fmt_num(row[-1])}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, k)} {_fmt_num(acc)}")
+        return out
+
+class Registry:
+    def __init__(self):
+        self._m: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels, **kw):
+        with self._lock:
+            m = self._m.get(name)
+            if m is None:
+                m = self._m[name] = cls(name, help, labels, **kw)
+            elif not isinstance(m, cls):
+                raise ValueError(f"metric {name} already registered as {m.kind}")
+            return m
+
+    def counter(self, name: str, help: str = "", labels: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str = "", labels: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str = "", labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            ms = list(self._m.values())
+        lines: List[str] = []
+        for m in ms:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# Live-putken vaiheet: position_check, candle_fetch, feature_build, predict, combine_gate, position_size,
+# risk_check, order_place (vain brokerikutsu), order_confirm
+STAGE_SECONDS = REGISTRY.histogram("bot_stage_seconds", "Latency of live pipeline stages", ("stage",))
+HTTP_429 = REGISTRY.counter("bot_http_429_total", "HTTP 429 responses from the broker API", ("endpoint",))
+RETRIES = REGISTRY.counter("bot_retries_total", "Retried broker/API operations", ("op",))
+CACHE_REQUESTS = REGISTRY.counter("bot_cache_requests_total", "Cache lookups", ("cache", "result"))
+ERRORS = REGISTRY.counter("bot_stage_errors_total", "Exceptions raised inside timed stages", ("stage",))
+QUEUE_DEPTH = REGISTRY.gauge("bot_queue_depth", "Items waiting in internal queues", ("queue",))
+BAR_CLOSE_LAG = REGISTRY.gauge("bot_bar_close_lag_seconds", "Delay from bar close to job start", ("tf",))
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """with stage_timer("predict"): ...  -> bot_stage_seconds{stage="predict"} (+ virhelaskuri)"""
+    t0 = time.perf_counter()
+    try:
+        with profiler.span(stage):
+            yield
+    except BaseException:
+        ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage=stage)
+
+def timed(stage: str):
+    """Dekoraattori: koko funktiokutsu on yksi stage-havainto."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*a, **kw):
+            with stage_timer(stage):
+                return fn(*a, **kw)
+        return wrapper
+    return deco
+
+def cache_hit(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
 # ---- Metrics HTTP (kevyt Prometheus-tyylinen tekstitulos) ----
 class _MetricsHandler(BaseHTTPRequestHandler):
     def log_message(self, fmt, *args):
@@ -88,7 +293,7 @@ class _MetricsHandler(BaseHTTPRequestHandler):
             lines.append("# HELP bot_heartbeat_lag_seconds Seconds since last heartbeat")
             lines.append("# TYPE bot_heartbeat_lag_seconds gauge")
             lines.append(f"bot_heartbeat_lag_seconds {round(lag,3)}")
-            body = ("\n".join(lines) + "\n").encode("utf-8")
+            body = ("\n".join(lines) + "\n" + REGISTRY.render()).encode("utf-8")
             self.send_response(200)
             self.send_header("Content-Type", "text/plain; version=0.0.4")
             self.send_header("Content-Length", str(len(body)))
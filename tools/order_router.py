@@ -5,6 +5,7 @@ from typing import Optional, Dict, Any
 
 # Yksinkertainen reititin: käytä capital_client.market_order
 from tools import capital_client as cap
+from tools.ops_runtime import stage_timer
 
 def _norm_symbol_for_env_key(symbol: str) -> str:
     """
@@ -56,7 +57,13 @@ def route_order(symbol: str, side: str, qty: float, tf: Optional[str]=None, dry_
         }
 
     # TÄRKEÄ: välitä näyttönimi/symboli resolverille – se hakee oikean EPICin (esim. 'US SPX 500' -> 'US500')
-    res = cap.market_order(epic=symbol, direction=s, size=float(qty))
+    with stage_timer("order_place"):
+        res = cap.market_order(epic=symbol, direction=s, size=float(qty))
+    try:
+        from tools.sync_positions import nudge
+        nudge()  # sync_positions pollaa nopeasti kunnes täyttö näkyy
+    except Exception:
+        pass
     return {
         "dry_run": False,
         "exchange": "capital",
@@ -31,11 +31,25 @@ def plot_equity(df:pd.DataFrame):
     plt.tight_layout(); plt.savefig(buf, format="png"); buf.seek(0)
     return buf
 
+def plot_equity_curve(eq:pd.DataFrame):
+    """Sama kuvaaja valmiiksi kumuloidusta käyrästä (trade_archive.equity())."""
+    fig = plt.figure(figsize=(10,4))
+    if eq.empty:
+        plt.title("No trades yet")
+    else:
+        eq["equity"].reset_index(drop=True).plot()
+        plt.title("Equity curve")
+        plt.grid(True)
+    buf = io.BytesIO()
+    plt.tight_layout(); plt.savefig(buf, format="png"); buf.seek(0)
+    return buf
+
 if __name__=="__main__":
+    from tools import trade_archive
     os.makedirs(f"{ROOT}/results", exist_ok=True)
-    df = pd.read_csv(TRADES) if os.path.exists(TRADES) else pd.DataFrame(columns=["time","symbol","side","pnl"])
-    if "pnl" in df: df["pnl"] = pd.to_numeric(df["pnl"], errors="coerce").fillna(0.0)
-    kpi = kpi_from_trades(df)
+    ar = trade_archive.default()
+    ar.import_csv(TRADES)  # vanha historia arkistoon kerran
+    kpi = ar.update_kpis()  # vain edellisen checkpointin jälkeiset rivit
     text = (f"📊 Päiväraportti {dt.datetime.utcnow().strftime('%Y-%m-%d')} (UTC)\n"
             f"• Trades: {kpi['trades']}\n"
             f"• P&L: {kpi['pnl']:.2f}\n"
@@ -43,5 +57,5 @@ if __name__=="__main__":
             f"• Sharpe~: {kpi['sharpe']:.2f}\n"
             f"• MaxDD: {kpi['maxdd']:.2f}")
     tgsend(text)
-    buf = plot_equity(df)
+    buf = plot_equity_curve(ar.equity())
     tgphoto(buf.getvalue(), caption="Equity")
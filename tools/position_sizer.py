@@ -2,64 +2,149 @@
 from __future__ import annotations
 import json, os
 from pathlib import Path
-from typing import Optional
+from typing import Any, Mapping, Optional, Sequence, Tuple
 import numpy as np
 import pandas as pd
 
-STATE = Path(__file__).resolve().parents[1] / "state"
+from tools import model_cache, vol_service
+
+ROOT = Path(__file__).resolve().parents[1]
+STATE = ROOT / "state"
 REG = STATE / "models_pro.json"
+SIZES = ROOT / "config" / "sizes.json"               # {"SYM": {"min": .., "step": ..}}
+SIZE_OVERRIDES = ROOT / "config" / "size_overrides.json"  # {"SYM": min} – voittaa sizes.jsonin minimin
 
 def _load_models() -> dict:
-    if not REG.exists():
-        return {"models":[]}
-    return json.loads(REG.read_text())
+    return model_cache.load_json(REG, {"models":[]}) or {"models":[]}
 
 def _find_model(symbol: str, tf: str) -> Optional[dict]:
-    reg = _load_models()
-    rows = [m for m in reg.get("models", []) if m.get("symbol")==symbol and m.get("tf")==tf]
-    if not rows:
-        return None
-    rows.sort(key=lambda r: int(r.get("trained_at", 0)), reverse=True)
-    return rows[0]
+    return model_cache.find_in_registry(REG, symbol, tf, latest=True)
 
 def _atr(df: pd.DataFrame, n: int = 14) -> float:
-    h = df["high"].astype(float).values
-    l = df["low"].astype(float).values
-    c = df["close"].astype(float).values
-    tr = np.maximum.reduce([h[1:]-l[1:], np.abs(h[1:]-c[:-1]), np.abs(l[1:]-c[:-1])])
-    atr = pd.Series(tr).rolling(n, min_periods=n).mean().values
-    return float(atr[-1]) if atr.size else 0.0
+    return float(vol_service.atr_from_df(df, n) or 0.0)
 
 def _risk_pct_from_metrics(sharpe: float, pf: float, maxdd: float) -> float:
-    base = 0.25  # %
-    add = 0.2 * max(0.0, min(2.0, sharpe)) + 0.2 * max(0.0, min(2.0, (pf-1.0)))
-    dd_pen = 0.5 * min(0.0, max(-0.5, maxdd))  # maxdd on negatiivinen
-    risk_pct = base + add + dd_pen
-    return float(max(0.1, min(1.0, risk_pct)))  # 0.1%..1.0%
+    return float(risk_pct_batch([sharpe], [pf], [maxdd])[0])
 
-def pick_size(symbol: str, tf: str, last_price: float, equity: float, df_recent: Optional[pd.DataFrame]=None) -> float:
-    mode = os.getenv("POSITION_SIZER_MODE","auto").lower()
-    max_risk = float(os.getenv("RISK_MAX_PER_TRADE_PCT", "1.0"))
-    fallback_risk = float(os.getenv("RISK_FALLBACK_PER_TRADE_PCT", "0.25"))
-    stop_k = float(os.getenv("RISK_STOP_ATR_MULT","2.0"))
+def risk_pct_batch(sharpe: Sequence[float], pf: Sequence[float], maxdd: Sequence[float]) -> np.ndarray:
+    """_risk_pct_from_metrics vektorina: 0.25 % + sharpe/pf-lisä - dd-sakko, rajattu 0.1..1.0 %."""
+    sh = np.nan_to_num(np.asarray(sharpe, dtype=float), nan=0.0)
+    pf = np.nan_to_num(np.asarray(pf, dtype=float), nan=1.0)
+    dd = np.nan_to_num(np.asarray(maxdd, dtype=float), nan=0.0)
+    add = 0.2 * np.clip(sh, 0.0, 2.0) + 0.2 * np.clip(pf - 1.0, 0.0, 2.0)
+    dd_pen = 0.5 * np.clip(dd, -0.5, 0.0)  # maxdd on negatiivinen
+    return np.clip(0.25 + add + dd_pen, 0.1, 1.0)  # 0.1%..1.0%
+
+def _model_metrics(mdl: Optional[dict]) -> Tuple[float, float, float]:
+    if not mdl:
+        return np.nan, np.nan, np.nan
+    m = mdl.get("metrics", {})
+    return (float(m.get("sh_oos_mean") or m.get("sharpe_oos_mean") or 0.0),
+            float(m.get("pf_oos_mean", 1.0)), float(m.get("maxdd_oos_min", 0.0)))
 
-    mdl = _find_model(symbol, tf)
-    if mode != "auto" or not mdl:
-        risk_pct = min(max_risk, fallback_risk)
+def size_rules(symbols: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """(min, step) per symboli config/sizes.json + size_overrides.json -tiedostoista (0 = ei sääntöä)."""
+    sizes = model_cache.load_json(SIZES, {}) or {}
+    over = model_cache.load_json(SIZE_OVERRIDES, {}) or {}
+    mins, steps = np.zeros(len(symbols)), np.zeros(len(symbols))
+    for i, sym in enumerate(symbols):
+        u = str(sym).upper().replace("/", "")
+        r = sizes.get(u) or {}
+        mins[i] = float(over.get(u, r.get("min", r.get("min_size", 0.0))) or 0.0)
+        steps[i] = float(r.get("step", 0.0) or 0.0)
+    return mins, steps
+
+def size_batch(symbols: Sequence[str],
+               prices: Sequence[float],
+               stop_dist: Sequence[float],
+               equity: float,
+               risk_pct: Optional[Sequence[float]] = None,
+               sharpe: Optional[Sequence[float]] = None,
+               pf: Optional[Sequence[float]] = None,
+               maxdd: Optional[Sequence[float]] = None,
+               pip_value: Sequence[float] | float = 1.0,
+               apply_rules: bool = True,
+               round_up_min: bool = False,
+               max_risk_pct: Optional[float] = None,
+               max_notional_pct: Optional[float] = None,
+               max_total_notional_pct: Optional[float] = None,
+               max_total_risk_pct: Optional[float] = None) -> np.ndarray:
+    """
+    Koko kaikille syklin signaaleille yhdellä kutsulla.
+
+    risk_pct (%) annetaan suoraan tai lasketaan mallimetriikoista (sharpe/pf/maxdd;
+    NaN -> RISK_FALLBACK_PER_TRADE_PCT), rajattu max_risk_pct:hen (RISK_MAX_PER_TRADE_PCT).
+    qty = equity * risk_pct/100 / (stop_dist * pip_value); puuttuva/<=0 stop -> 1 % hinnasta.
+    Katot (% equitystä, 0/None = pois): yksittäisen position notional, kaikkien
+    notional yhteensä ja kaikkien riski yhteensä – ylitys skaalaa kaikkia samassa suhteessa.
+    apply_rules: pyöristys alaspäin brokerin steppiin; minimin alittava -> 0
+    (round_up_min=True -> nostetaan minimiin).
+    """
+    n = len(symbols)
+    px = np.asarray(prices, dtype=float)
+    dist = np.asarray(stop_dist, dtype=float)
+    max_risk = float(os.getenv("RISK_MAX_PER_TRADE_PCT", "1.0")) if max_risk_pct is None else float(max_risk_pct)
+    if risk_pct is not None:
+        rp = np.broadcast_to(np.asarray(risk_pct, dtype=float), (n,)).copy()
     else:
-        m = mdl.get("metrics", {})
-        sharpe = float(m.get("sh_oos_mean") or m.get("sharpe_oos_mean") or 0.0)
-        pf = float(m.get("pf_oos_mean", 1.0))
-        maxdd = float(m.get("maxdd_oos_min", 0.0))
-        risk_pct = _risk_pct_from_metrics(sharpe, pf, maxdd)
-        risk_pct = min(max_risk, risk_pct)
+        fallback = float(os.getenv("RISK_FALLBACK_PER_TRADE_PCT", "0.25"))
+        sh = np.full(n, np.nan) if sharpe is None else np.asarray(sharpe, dtype=float)
+        rp = risk_pct_batch(sh, np.full(n, 1.0) if pf is None else pf, np.zeros(n) if maxdd is None else maxdd)
+        rp = np.where(np.isnan(sh), fallback, rp)
+    rp = np.nan_to_num(rp, nan=0.0)
+    if max_risk > 0:
+        rp = np.minimum(rp, max_risk)
+    dist = np.where(np.isfinite(dist) & (dist > 0), dist, 0.01 * px)
+    dist = np.maximum(dist, 1e-12) * np.asarray(pip_value, dtype=float)
+    qty = np.maximum(0.0, float(equity) * rp / 100.0 / dist)
+    qty = np.where(np.isfinite(px) & (px > 0), qty, 0.0)
+
+    def _env(v, name):
+        return float(os.getenv(name, "0") or 0.0) if v is None else float(v)
+
+    cap = _env(max_notional_pct, "SIZE_MAX_NOTIONAL_PCT")
+    if cap > 0:
+        qty = np.minimum(qty, float(equity) * cap / 100.0 / np.where(px > 0, px, np.inf))
+    tot = _env(max_total_notional_pct, "SIZE_MAX_TOTAL_NOTIONAL_PCT")
+    if tot > 0:
+        notional = float(np.sum(qty * np.where(px > 0, px, 0.0)))
+        if notional > float(equity) * tot / 100.0:
+            qty = qty * (float(equity) * tot / 100.0 / notional)
+    trisk = _env(max_total_risk_pct, "RISK_MAX_TOTAL_PCT")
+    if trisk > 0:
+        used = float(np.sum(qty * dist)) / max(float(equity), 1e-12) * 100.0
+        if used > trisk:
+            qty = qty * (trisk / used)
 
+    if apply_rules:
+        mins, steps = size_rules(symbols)
+        qty = np.where(steps > 0, np.floor(qty / np.where(steps > 0, steps, 1.0) + 1e-9) * steps, qty)
+        below = qty < mins
+        qty = np.where(below, mins if round_up_min else 0.0, qty)
+        qty = np.where(steps > 0, np.round(qty / np.where(steps > 0, steps, 1.0)) * steps, qty)  # float-siistintä
+    return qty
+
+def pick_sizes(signals: Sequence[Mapping[str, Any]], equity: float, **kw) -> np.ndarray:
+    """
+    Batch-versio pick_size:sta: signals = [{"symbol","tf","price","stop_dist"?}, ...].
+    Mallimetriikat haetaan rekisteristä (POSITION_SIZER_MODE=auto), broker-säännöt
+    ja katot kuten size_batch.
+    """
+    auto = os.getenv("POSITION_SIZER_MODE", "auto").lower() == "auto"
+    met = np.array([_model_metrics(_find_model(s["symbol"], s.get("tf", "")) if auto else None)
+                    for s in signals], dtype=float).reshape(-1, 3)
+    return size_batch([s["symbol"] for s in signals],
+                      [float(s.get("price") or 0.0) for s in signals],
+                      [float(s.get("stop_dist") or 0.0) for s in signals],
+                      equity, sharpe=met[:, 0], pf=met[:, 1], maxdd=met[:, 2], **kw)
+
+def pick_size(symbol: str, tf: str, last_price: float, equity: float, df_recent: Optional[pd.DataFrame]=None) -> float:
+    stop_k = float(os.getenv("RISK_STOP_ATR_MULT","2.0"))
+
+    stop_dist = 0.0
     if df_recent is not None and len(df_recent) >= 20:
-        atr_val = _atr(df_recent, 14)
+        atr_val = vol_service.atr(symbol, tf, 14, df=df_recent) or 0.0
         stop_dist = max(1e-12, stop_k * atr_val)
-    else:
-        stop_dist = max(1e-12, 0.01 * last_price)
-
-    risk_cash = equity * (risk_pct / 100.0)
-    qty = max(0.0, risk_cash / stop_dist)
-    return float(qty)
+    sig = {"symbol": symbol, "tf": tf, "price": last_price, "stop_dist": stop_dist}
+    return float(pick_sizes([sig], equity, apply_rules=False, max_notional_pct=0,
+                            max_total_notional_pct=0, max_total_risk_pct=0)[0])
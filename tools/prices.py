@@ -1,4 +1,9 @@
-# Stub hinnanhakuun. Palaa None jos et halua PnL-laskentaa vielä.
-# Voit korvata tämän oikealla datasyötöllä.
+# Viimeisin hinta. Jos market_stream on käynnissä (set_default_stream), palautetaan
+# sen mid-hinta; muuten None (ei PnL-laskentaa).
 def last_price(symbol:str):
-    return None
+    try:
+        from tools.market_stream import get_default_stream
+    except Exception:
+        return None
+    stream = get_default_stream()
+    return stream.last_price(symbol) if stream is not None else None
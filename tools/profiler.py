@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+profiler.py – valinnainen profilointi daemoneille (trade_engine, trainer_daemon, auto_daemon_pro)
+
+Kaksi osaa, molemmat oletuksena pois päältä:
+  - span(name, **args): sisäkkäiset aikavälit -> Chrome trace JSON (chrome://tracing, Perfetto)
+  - näytteistäjä: taustasäie lukee kaikkien säikeiden pinot PROFILE_SAMPLE_HZ kertaa sekunnissa
+    ja kerää ne "collapsed stacks" -muotoon (flamegraph.pl, speedscope)
+
+Päälle:
+    PROFILE=trace | sample | all          käynnistyksessä (install() lukee)
+    kill -USR2 <pid>                      vaihtaa päälle/pois ajossa olevassa daemonissa;
+                                          pois kytkettäessä tiedostot kirjoitetaan heti
+Tiedostot: logs/profile/<tag>-<pid>-<aika>.trace.json ja .folded (PROFILE_DIR).
+
+Pois päältä span() palauttaa jaetun tyhjän kontekstin: yksi globaalin lipun tarkistus.
+"""
+from __future__ import annotations
+import atexit
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BASE = Path(__file__).resolve().parents[1]
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(BASE / "logs" / "profile")))
+SAMPLE_HZ = float(os.getenv("PROFILE_SAMPLE_HZ", "97"))
+MAX_EVENTS = int(os.getenv("PROFILE_MAX_EVENTS", "500000"))
+MAX_DEPTH = 128
+
+_on = False
+_events: List[Dict[str, Any]] = []
+_dropped = 0
+_t0 = time.perf_counter_ns()
+_tag = "proc"
+_sampler: Optional["_Sampler"] = None
+_installed = False
+_NULL = nullcontext()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name: str, args: Dict[str, Any]):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        global _dropped
+        end = time.perf_counter_ns()
+        if len(_events) >= MAX_EVENTS:
+            _dropped += 1
+            return False
+        ev = {"name": self.name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+              "ts": (self.start - _t0) / 1000.0, "dur": (end - self.start) / 1000.0}
+        if self.args or exc[0] is not None:
+            ev["args"] = dict(self.args, error=exc[0].__name__) if exc[0] is not None else self.args
+        _events.append(ev)  # list.append on GIL:n alla atominen -> ei lukkoa
+        return False
+
+
+def span(name: str, /, **args: Any):
+    """with span("cycle", tf="15m"): ...  (ei tee mitään kun profilointi on pois)"""
+    if not _on:
+        return _NULL
+    return _Span(name, args)
+
+
+def traced(name: Optional[str] = None):
+    """Dekoraattori: koko kutsu yhtenä spanina."""
+    def deco(fn):
+        label = name or fn.__qualname__
+
+        @wraps(fn)
+        def wrapper(*a, **kw):
+            if not _on:
+                return fn(*a, **kw)
+            with _Span(label, {}):
+                return fn(*a, **kw)
+        return wrapper
+    return deco
+
+
+# ---------- näytteistäjä ----------
+
+def _frame_label(f) -> str:
+    co = f.f_code
+    return f"{co.co_name} ({os.path.basename(co.co_filename)}:{co.co_firstlineno})"
+
+
+def collapse(frame, thread_name: str = "") -> str:
+    """Pino juuresta lehteen, puolipisteillä eroteltuna (Brendan Greggin collapsed-muoto)."""
+    parts: List[str] = []
+    while frame is not None and len(parts) < MAX_DEPTH:
+        parts.append(_frame_label(frame))
+        frame = frame.f_back
+    if thread_name:
+        parts.append(thread_name)
+    return ";".join(reversed(parts))
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, hz: float = SAMPLE_HZ):
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.interval = 1.0 / max(1.0, hz)
+        self.counts: Dict[str, int] = {}
+        self.samples = 0
+        self._halt = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._halt.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                key = collapse(frame, names.get(tid, str(tid)))
+                self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+
+    def stop(self):
+        self._halt.set()
+        self.join(timeout=2.0)
+
+
+# ---------- ohjaus ----------
+
+def enabled() -> bool:
+    return _on or _sampler is not None
+
+
+def enable(trace: bool = True, sample: bool = False, hz: float = SAMPLE_HZ):
+    global _on, _sampler
+    _on = bool(trace)
+    if sample and _sampler is None:
+        _sampler = _Sampler(hz)
+        _sampler.start()
+
+
+def disable() -> List[Path]:
+    """Pysäytä ja kirjoita kerätyt tiedostot."""
+    global _on, _sampler
+    _on = False
+    s, _sampler = _sampler, None
+    if s is not None:
+        s.stop()
+    return dump(s)
+
+
+def dump(sampler: Optional[_Sampler] = None) -> List[Path]:
+    global _events, _dropped
+    evs, _events = _events, []
+    dropped, _dropped = _dropped, 0
+    out: List[Path] = []
+    if not evs and not (sampler and sampler.counts):
+        return out
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stem = PROFILE_DIR / f"{_tag}-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}"
+    if evs:
+        meta = [{"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": _tag}}]
+        for t in threading.enumerate():
+            meta.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": t.ident, "args": {"name": t.name}})
+        p = stem.with_suffix(".trace.json")
+        p.write_text(json.dumps({"traceEvents": meta + evs, "displayTimeUnit": "ms",
+                                 "otherData": {"dropped": dropped}}), encoding="utf-8")
+        out.append(p)
+    if sampler and sampler.counts:
+        p = stem.with_suffix(".folded")
+        p.write_text("".join(f"{k} {v}\n" for k, v in sorted(sampler.counts.items())), encoding="utf-8")
+        out.append(p)
+    for p in out:
+        print(f"[PROFILE] wrote {p}", flush=True)
+    return out
+
+
+def toggle(mode: Optional[str] = None) -> List[Path]:
+    if enabled():
+        return disable()
+    mode = (mode or os.getenv("PROFILE") or "all").lower()
+    if mode in ("0", "off"):
+        mode = "all"
+    enable(trace=mode in ("1", "all", "trace"), sample=mode in ("1", "all", "sample"))
+    print(f"[PROFILE] enabled ({mode})", flush=True)
+    return []
+
+
+def install(tag: str, sig: Optional[int] = getattr(signal, "SIGUSR2", None)):
+    """Daemonin käynnistyksessä: lue PROFILE, rekisteröi signaali ja atexit-kirjoitus."""
+    global _tag, _installed
+    _tag = tag
+    mode = (os.getenv("PROFILE") or "").lower()
+    if mode and mode not in ("0", "off"):
+        toggle(mode)
+    if _installed:
+        return
+    _installed = True
+    atexit.register(lambda: enabled() and disable())
+    if sig is not None and threading.current_thread() is threading.main_thread():
+        try:
+            signal.signal(sig, lambda *_: toggle())
+        except (ValueError, OSError):
+            pass
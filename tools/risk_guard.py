@@ -11,6 +11,7 @@ Tarjoaa:
 - todays_realized_R() -> float | None   (päivän realisoitu R-summa; None jos ei laskettavissa)
 - update_trade_journal(event_dict)      (kirjaa OPEN/SCALE_IN/CLOSE jne.)
 - position_R_progress(open_position_dict) -> (current_R, can_add_more, orig_size, adds_done)
+- watch_stops(stream, positions, on_hit)  (SL/TP/trailing suoraan market_stream-quoteista)
 
 Riippuvuudet: pandas, numpy (jos ei saatavilla tai data puuttuu, funktiot palauttavat None/fallit eivätkä kaada liveä)
 Dataoletukset:
@@ -29,10 +30,12 @@ Ympäristömuuttujat (valinnaisia):
 """
 
 from __future__ import annotations
-import os, json, math
+import os, json, math, time
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Optional, Tuple, Dict, Any
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from tools.journal_index import JournalIndex
 
 # Pandas/numpy valinnaisesti; jos puuttuvat, guardit eivät kaadu
 try:
@@ -48,7 +51,8 @@ STATE  = ROOT / "state"
 STATE.mkdir(parents=True, exist_ok=True)
 
 JOURNAL = STATE / "trade_journal.jsonl"     # rivikohtainen JSONL
-SCALE_STATE = STATE / "scale_state.json"    # synteettinen lisäyslaskuri (fallback)
+SCALE_STATE = STATE / "scale_state.json"    # vanha lisäyslaskuri (luetaan vain fallbackina)
+_JIDX = JournalIndex(JOURNAL)               # päivä-/symbolikoosteet, ylläpidetään lisäyksissä
 
 def _utcnow() -> datetime:
     return datetime.now(timezone.utc)
@@ -127,31 +131,21 @@ def _atr_series(df: "pd.DataFrame", lookback: int) -> Optional["np.ndarray"]:
     return atr
 
 def atr(symbol: str, tf: str) -> Optional[float]:
-    """Palauta tämänhetkinen ATR tai viite-ATR (tf+"_ref")."""
-    look = int(_envf("VOL_ATR_LOOKBACK", 14))
-    is_ref = False
-    base_tf = tf
-    if tf.endswith("_ref"):
-        is_ref = True
-        base_tf = tf[:-4]  # poista "_ref"
+    """Palauta tämänhetkinen ATR tai viite-ATR (tf+"_ref").
 
-    df = _load_df(symbol, base_tf)
-    if df is None:
-        return None
-
-    atr_arr = _atr_series(df, look)
-    if atr_arr is None or len(atr_arr) == 0:
+    Arvot tulevat tools.vol_service-tilasta (inkrementaalinen, välimuistissa);
+    historiatiedosto luetaan vain kun se on muuttunut edellisestä kerrasta.
+    """
+    look = int(_envf("VOL_ATR_LOOKBACK", 14))
+    if pd is None or np is None:
         return None
-
-    if not is_ref:
-        # viimeisin ATR (sma-sarjan uusin)
-        return float(atr_arr[-1])
-
-    # viite: median viimeisten (lookback * ATR_REF_WINDOW_MULT) havaintojen yli
-    mult = max(2, int(_envf("ATR_REF_WINDOW_MULT", 5)))
-    k = min(len(atr_arr), look * mult)
-    ref = float(np.median(atr_arr[-k:]))
-    return ref
+    from tools import vol_service
+    svc = vol_service.get_service()
+    if tf.endswith("_ref"):
+        # viite: median viimeisten (lookback * ATR_REF_WINDOW_MULT) havaintojen yli
+        mult = max(2, int(_envf("ATR_REF_WINDOW_MULT", 5)))
+        return svc.atr_ref(symbol, tf[:-4], look, mult)
+    return svc.atr(symbol, tf, look)
 
 def make_sl_tp(symbol: str, side: str, entry_px: float, atr_val: float,
                sl_mult: float, tp_mult: float) -> Tuple[Optional[float], Optional[float]]:
@@ -239,40 +233,23 @@ def update_trade_journal(ev: Dict[str, Any]) -> None:
         except Exception:
             pass
 
-    _append_jsonl(JOURNAL, ev)
-
-    # Päivitä myös synteettinen lisäysloki (fallback adds_donein laskentaan)
-    if ev.get("event") == "OPEN":
-        # nollaa laskuri
-        st = _load_scale_state()
-        sym = (ev.get("symbol") or "").upper()
-        st[sym] = {"orig_size": float(ev.get("size", 0.0)), "adds_done": 0}
-        _save_scale_state(st)
-    elif ev.get("event") == "SCALE_IN":
-        st = _load_scale_state()
-        sym = (ev.get("symbol") or "").upper()
-        d = st.get(sym, {"orig_size": 0.0, "adds_done": 0})
-        d["adds_done"] = int(d.get("adds_done", 0)) + 1
-        st[sym] = d
-        _save_scale_state(st)
+    try:
+        _JIDX.append(ev)  # rivi + koosteet (R/päivä, adds_done, open_risk) + rotaatio
+    except Exception:  # append nostaa vain jos riviä ei ehditty kirjoittaa
+        _append_jsonl(JOURNAL, ev)
 
 def todays_realized_R() -> Optional[float]:
     """
     Summaa kuluvan UTC-päivän realisoidut R:t.
     Jos ei löydy tietoa, palauttaa 0.0 (turvallinen – ei käynnistä cooldownia koska raja on negatiivinen).
     """
-    day = _utcnow().strftime("%Y-%m-%d")
-    total = 0.0
-    found = False
-    for ev in _read_jsonl(JOURNAL) or []:
-        if ev.get("event") == "CLOSE" and ev.get("ts") and _same_day_utc(ev["ts"], day):
-            r = ev.get("r_realized")
-            if isinstance(r, (int, float)):
-                total += float(r)
-                found = True
-    if not found:
+    try:
+        r = _JIDX.realized_R(_utcnow().strftime("%Y-%m-%d"))
+    except Exception:
+        r = None
+    if r is None:
         return 0.0
-    return total
+    return float(r)
 
 def _load_scale_state() -> Dict[str, Any]:
     try:
@@ -351,19 +328,108 @@ def position_R_progress(open_pos: Dict[str, Any]) -> Tuple[float, bool, float, i
         adds_done, orig_size = _adds_done_for(sym), _orig_size_for(sym, default=size)
         return 0.0, False, float(orig_size), int(adds_done)
 
+def _symbol_rollup(sym: str) -> Optional[Dict[str, Any]]:
+    try:
+        return _JIDX.symbol_state(sym)
+    except Exception:
+        return None
+
 def _adds_done_for(sym: str) -> int:
-    st = _load_scale_state()
-    d = st.get((sym or "").upper(), {})
+    d = _symbol_rollup(sym) or _load_scale_state().get((sym or "").upper(), {})
     try:
         return int(d.get("adds_done", 0))
     except Exception:
         return 0
 
 def _orig_size_for(sym: str, default: float = 0.0) -> float:
-    st = _load_scale_state()
-    d = st.get((sym or "").upper(), {})
+    d = _symbol_rollup(sym) or _load_scale_state().get((sym or "").upper(), {})
     try:
         v = d.get("orig_size")
         return float(v) if v is not None else float(default)
     except Exception:
         return float(default)
+
+# ---------- Stop-vahti streamille ----------
+
+def _book_key(symbol: Any) -> str:
+    """Positiokirjan avain: isot kirjaimet ilman '/' (sync_positions tallentaa epicin näin)."""
+    return str(symbol).upper().replace("/", "")
+
+
+def watch_stops(stream, positions, on_hit, trail_atr_mult: Optional[float] = None,
+                key_fn: Optional[Callable[[str], str]] = None, refresh_sec: float = 1.0):
+    """
+    Kytke SL/TP/trailing-tarkistus market_stream-quoteihin (reagoi sub-sekunnissa, ei pollausta).
+
+    - stream: tools.market_stream.MarketStream
+    - positions: dict tai callable -> {symbol: {"side":"LONG"/"SHORT"/"BUY"/"SELL", "sl":float, "tp":float}}
+      (sync_positions / open_positions.json -muoto). Callable luetaan korkeintaan refresh_sec
+      välein (esim. state_store-kysely), ei jokaisella quotella; samoin ATR.
+    - key_fn: quoten symboli -> positiokirjan avain (esim. "XAUUSD" -> "GOLD"); molemmat
+      puolet normalisoidaan _book_key:llä
+    - on_hit(symbol, reason, price, pos): reason "SL" | "TP"; kutsutaan kerran per taso
+    - trail_atr_mult: jos annettu, SL:ää kiristetään hinnan perässä trail_atr_mult * atr(symbol, tf)
+      (pos["tf"], oletus "1h"); SL ei koskaan löysene. Kiristys on paikallinen (ei lähetetä
+      brokerille) ja nollautuu kun positio sulkeutuu tai vaihtuu (deal_id / side / entry_price eri).
+
+    Palauttaa unsubscribe-funktion.
+    """
+    fired = set()
+    trail: Dict[str, Tuple[Any, float]] = {}  # symbol -> (position ident, kiristetty SL)
+    keys: Dict[str, str] = {}
+    cache: Dict[Any, Tuple[float, Any]] = {}  # "book" / (symbol, tf) -> (luettu, arvo)
+
+    def _cached(k, fn):
+        now = time.monotonic()
+        hit = cache.get(k)
+        if hit is None or now - hit[0] >= refresh_sec:
+            hit = cache[k] = (now, fn())
+        return hit[1]
+
+    def _book() -> Dict[str, Any]:
+        if callable(positions):
+            return _cached("book", lambda: {_book_key(k): v for k, v in (positions() or {}).items()})
+        return {_book_key(k): v for k, v in (positions or {}).items()}
+
+    def _on_quote(q):
+        key = keys.get(q.symbol)
+        if key is None:
+            key = keys[q.symbol] = _book_key(key_fn(q.symbol) if key_fn else q.symbol)
+        pos = _book().get(key)
+        if not pos:
+            # positio suljettu: seuraava samaan symboliin alkaa puhtaalta pöydältä
+            trail.pop(q.symbol, None)
+            fired.difference_update({f for f in fired if f[0] == q.symbol})
+            return
+        side = (pos.get("side") or "").upper()
+        is_long = side in ("LONG", "BUY")
+        if not is_long and side not in ("SHORT", "SELL"):
+            return
+        px = q.bid if is_long else q.ask  # sulkeutuva puoli
+        ident = (pos.get("deal_id") or pos.get("dealId"), side, pos.get("entry_price", pos.get("entry")))
+        held = trail.get(q.symbol)
+        if held is not None and held[0] != ident:
+            trail.pop(q.symbol)
+            held = None
+        sl = held[1] if held is not None else pos.get("sl")
+        tp = pos.get("tp")
+
+        if trail_atr_mult and sl is not None:
+            tf = pos.get("tf") or "1h"
+            a = _cached((q.symbol, tf), lambda: atr(q.symbol, tf))
+            if a:
+                cand = px - trail_atr_mult * a if is_long else px + trail_atr_mult * a
+                if (is_long and cand > sl) or (not is_long and cand < sl):
+                    sl = float(cand)
+                    trail[q.symbol] = (ident, sl)
+
+        hit = None
+        if sl is not None and ((is_long and px <= sl) or (not is_long and px >= sl)):
+            hit = "SL"
+        elif tp is not None and ((is_long and px >= tp) or (not is_long and px <= tp)):
+            hit = "TP"
+        if hit and (q.symbol, hit, sl if hit == "SL" else tp) not in fired:
+            fired.add((q.symbol, hit, sl if hit == "SL" else tp))
+            on_hit(q.symbol, hit, float(px), dict(pos, sl=sl))
+
+    return stream.subscribe("quote", _on_quote)
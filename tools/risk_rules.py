@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+risk_rules.py – käännetty pre-trade-riskisääntömoottori
+
+Rajat luetaan kerran config/risk.yaml:n `rules:`-osiosta ja käännetään listaksi
+sulkeumia; tiedoston muutos (mtime/koko, tarkistus korkeintaan RISK_RULES_CHECK_SEC
+välein) kääntää ne uudelleen. Jokainen toimeksianto arvioidaan yhdellä kutsulla:
+
+    from tools import risk_rules
+    d = risk_rules.check(risk_rules.Order("EURUSD", "BUY", size=1000, price=1.08, equity=10_000, risk_pct=0.5))
+    if not d.allow: print(d.reasons)        # ["leverage: 5.40x > 5.00x", ...]
+    risk_rules.get_engine().note_order("EURUSD")   # cooldown alkaa
+
+Säännöt (puuttuva/0 = pois päältä):
+
+    rules:
+      max_leverage: 5.0             # (brutto notional + tilaus) / equity
+      max_risk_pct: 1.0             # tilauksen riski stoppiin, % equitystä (puuttuu -> risk_per_trade * 100; 0 = pois)
+      daily_r_stop: -3.0            # päivän realisoitu R <= raja -> ei uusia
+      cooldown_min: 0               # saman symbolin tilausten väli
+      cooldown_min_by_symbol: {BTCUSD: 60}
+      group_exposure_pct: {USD: 150, CRYPTO: 50}   # tools.corr_guard-ryhmän notional % equitystä
+      max_group_positions: {INDEX: 1}
+      news_windows: "CPI@13:30Z±30"  # tyhjä -> NEWS_WINDOWS env
+      news_groups: [USD, INDEX]     # tyhjä = kaikki symbolit
+      news_schedule: true           # + kertatapahtumat tools.news_calendarin schedule-tiedostosta
+      max_var_pct: 2.0              # salkku + tilaus: 1 baarin parametrinen VaR (core.cov_engine) % equitystä
+      var_alpha: 0.95
+      var_tf: 1h                    # kovarianssimoottori kun Order.tf puuttuu
+
+Tulos on Decision(allow, reasons, checks, us): kaikki rikkomukset kerätään (ei
+oikotietä), jotta lokissa näkyy koko syy. Book kuvaa salkun tilan (notional per
+symboli, päivän R); ilman sitä päivän R luetaan tools.risk_guardista. VaR-sääntö
+käyttää Book.net-etumerkillistä notionalia ja ohittaa symbolit, joilla moottorissa
+ei ole vielä min_obs havaintoa.
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from tools import news_calendar
+from tools.news_calendar import parse_news_windows  # noqa: F401  (vanha rajapinta)
+
+ROOT = Path(__file__).resolve().parents[1]
+CONFIG = Path(os.getenv("RISK_CONFIG", str(ROOT / "config" / "risk.yaml")))
+CHECK_SEC = float(os.getenv("RISK_RULES_CHECK_SEC", "2"))
+
+Rule = Callable[["Order", "Book", float], Optional[str]]
+
+
+@dataclass
+class Order:
+    symbol: str
+    side: str = "BUY"
+    size: float = 0.0
+    price: Optional[float] = None      # ilman hintaa notional-säännöt ohitetaan
+    equity: Optional[float] = None
+    risk_pct: Optional[float] = None   # % equitystä stoppiin
+    tf: str = ""
+    ts: Optional[float] = None         # epoch s; oletus time.time()
+
+    @property
+    def notional(self) -> Optional[float]:
+        if self.price is None or not self.size:
+            return None
+        return abs(float(self.size) * float(self.price))
+
+
+@dataclass
+class Book:
+    exposure: Dict[str, float] = field(default_factory=dict)  # SYMBOL -> brutto notional
+    day_r: Optional[float] = None
+    net: Dict[str, float] = field(default_factory=dict)       # SYMBOL -> netto notional (short < 0)
+
+
+@dataclass
+class Decision:
+    allow: bool
+    reasons: List[str]
+    checks: List[str]
+    us: float = 0.0
+    version: Any = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"allow": self.allow, "reasons": self.reasons, "checks": self.checks, "us": round(self.us, 1)}
+
+
+def _load_yaml(path: Path) -> Dict[str, Any]:
+    try:
+        import yaml
+        return yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"[RISK] config read failed {path}: {e}", flush=True)
+        return {}
+
+
+class RiskRules:
+    def __init__(self, config: Optional[Path] = CONFIG, cfg: Optional[Dict[str, Any]] = None,
+                 day_r_fn: Optional[Callable[[], Optional[float]]] = None,
+                 group_fn: Optional[Callable[[str], str]] = None,
+                 cov_fn: Optional[Callable[[str], Any]] = None):
+        self.path = Path(config) if config else None
+        self._static = cfg  # suora dict (testit) ohittaa tiedoston
+        self.day_r_fn = day_r_fn
+        self.cov_fn = cov_fn  # tf -> core.cov_engine.EwmaCov (oletus get_engine)
+        if group_fn is None:
+            from tools.corr_guard import group_of
+            group_fn = group_of
+        self._group_fn = group_fn
+        self._groups: Dict[str, str] = {}
+        self._last: Dict[str, float] = {}   # cooldown: SYMBOL -> viimeisin tilaus
+        self._lock = threading.Lock()
+        self._stamp: Any = None
+        self._checked = 0.0
+        self._rules: List[Tuple[str, Rule]] = []
+        self.version = 0
+        self.reload(force=True)
+
+    # ---- konfiguraatio ----
+    def _file_stamp(self):
+        try:
+            st = self.path.stat()
+            return (st.st_mtime_ns, st.st_size)
+        except (OSError, AttributeError):
+            return None
+
+    def reload(self, force: bool = False) -> bool:
+        """Käännä säännöt uudelleen jos tiedosto muuttui (tai force)."""
+        if self._static is not None and not force:
+            return False
+        stamp = None if self._static is not None else self._file_stamp()
+        if not force and stamp == self._stamp:
+            return False
+        raw = self._static if self._static is not None else (_load_yaml(self.path) if self.path else {})
+        rules = self._compile(raw)
+        with self._lock:
+            self._rules, self._stamp = rules, stamp
+            self.version += 1
+        return True
+
+    def _maybe_reload(self, now: float):
+        if now - self._checked >= CHECK_SEC:
+            self._checked = now
+            self.reload()
+
+    def group(self, symbol: str) -> str:
+        g = self._groups.get(symbol)
+        if g is None:
+            g = self._groups[symbol] = self._group_fn(symbol)
+        return g
+
+    def _compile(self, raw: Dict[str, Any]) -> List[Tuple[str, Rule]]:
+        r = dict(raw.get("rules") or {})
+        out: List[Tuple[str, Rule]] = []
+
+        lev = float(r.get("max_leverage") or 0.0)
+        if lev > 0:
+            def leverage(o: Order, b: Book, now: float) -> Optional[str]:
+                n = o.notional
+                if n is None or not o.equity:
+                    return None
+                x = (sum(b.exposure.values()) + n) / float(o.equity)
+                return f"leverage: {x:.2f}x > {lev:.2f}x" if x > lev else None
+            out.append(("leverage", leverage))
+
+        rpt = raw.get("risk_per_trade")
+        if r.get("max_risk_pct") is not None:
+            max_risk = float(r["max_risk_pct"])  # eksplisiittinen 0 kytkee pois myös risk_per_trade-oletuksen
+        else:
+            max_risk = float(rpt) * 100.0 if rpt else 0.0
+        if max_risk > 0:
+            def risk_pct(o: Order, b: Book, now: float) -> Optional[str]:
+                if o.risk_pct is None:
+                    return None
+                return f"risk_pct: {o.risk_pct:.2f}% > {max_risk:.2f}%" if o.risk_pct > max_risk + 1e-12 else None
+            out.append(("risk_pct", risk_pct))
+
+        stop = r.get("daily_r_stop")
+        if stop is not None and float(stop) != 0.0:
+            stop = -abs(float(stop))
+            day_r_fn = self.day_r_fn or _todays_r
+
+            def daily_r(o: Order, b: Book, now: float) -> Optional[str]:
+                dr = b.day_r if b.day_r is not None else day_r_fn()
+                return f"daily_r_stop: {dr:.2f}R <= {stop:.2f}R" if dr is not None and dr <= stop else None
+            out.append(("daily_r_stop", daily_r))
+
+        cd_default = float(r.get("cooldown_min") or 0.0) * 60.0
+        cd_sym = {str(k).upper(): float(v) * 60.0 for k, v in (r.get("cooldown_min_by_symbol") or {}).items()}
+        if cd_default > 0 or any(v > 0 for v in cd_sym.values()):
+            last = self._last
+
+            def cooldown(o: Order, b: Book, now: float) -> Optional[str]:
+                sym = o.symbol.upper()
+                t = last.get(sym)
+                span = cd_sym.get(sym, cd_default)
+                if t is None or span <= 0 or now - t >= span:
+                    return None
+                return f"cooldown: {sym} {now - t:.0f}s < {span:.0f}s"
+            out.append(("cooldown", cooldown))
+
+        gcap = {str(k): float(v) for k, v in (r.get("group_exposure_pct") or {}).items() if float(v) > 0}
+        gpos = {str(k): int(v) for k, v in (r.get("max_group_positions") or {}).items()}
+        if gcap or gpos:
+            group = self.group
+
+            def group_exposure(o: Order, b: Book, now: float) -> Optional[str]:
+                g = group(o.symbol.upper())
+                if g not in gcap and g not in gpos:
+                    return None
+                syms = [s for s, v in b.exposure.items() if v and group(s.upper()) == g]
+                if g in gpos and o.symbol.upper() not in {s.upper() for s in syms} and len(syms) >= gpos[g]:
+                    return f"group_positions: {g} {len(syms)} >= {gpos[g]}"
+                n = o.notional
+                if g in gcap and n is not None and o.equity:
+                    pct = (sum(b.exposure[s] for s in syms) + n) / float(o.equity) * 100.0
+                    if pct > gcap[g]:
+                        return f"group_exposure: {g} {pct:.1f}% > {gcap[g]:.1f}%"
+                return None
+            out.append(("group_exposure", group_exposure))
+
+        windows = r.get("news_windows") or os.getenv("NEWS_WINDOWS", "")
+        if r.get("news_schedule"):
+            cal_fn = lambda: news_calendar.get_calendar(windows)  # noqa: E731  (seuraa schedule-tiedostoa)
+        else:
+            fixed = news_calendar.NewsCalendar(windows)
+            cal_fn = lambda: fixed  # noqa: E731
+        if r.get("news_schedule") or len(cal_fn()):
+            ngroups = {str(g) for g in (r.get("news_groups") or [])}
+            group = self.group
+
+            def news(o: Order, b: Book, now: float) -> Optional[str]:
+                if ngroups and group(o.symbol.upper()) not in ngroups:
+                    return None
+                hit = cal_fn().in_blackout(now)
+                if hit:
+                    m = int(now // 60) % 1440
+                    return f"news_blackout: {m // 60:02d}:{m % 60:02d}Z {hit}"
+                return None
+            out.append(("news_blackout", news))
+
+        max_var = float(r.get("max_var_pct") or 0.0)
+        if max_var > 0:
+            alpha = float(r.get("var_alpha") or 0.95)
+            var_tf = str(r.get("var_tf") or "1h")
+            cov_fn = self.cov_fn
+            if cov_fn is None:
+                from core import cov_engine
+                cov_fn = cov_engine.get_engine
+
+            def portfolio_var(o: Order, b: Book, now: float) -> Optional[str]:
+                n = o.notional
+                if n is None or not o.equity:
+                    return None
+                sym = o.symbol.upper()
+                w = {s.upper(): float(v) for s, v in (b.net or b.exposure).items() if v}
+                w[sym] = w.get(sym, 0.0) + (n if o.side.upper() in ("BUY", "LONG") else -n)
+                eng = cov_fn(o.tf or var_tf)
+                ready = eng.ready(w)
+                if sym not in ready:
+                    return None  # liian vähän historiaa -> ei arviota
+                eq = float(o.equity)
+                x = eng.var({s: w[s] / eq for s in ready}, alpha) * 100.0
+                return f"portfolio_var: {x:.2f}% > {max_var:.2f}%" if x > max_var else None
+            out.append(("portfolio_var", portfolio_var))
+        return out
+
+    # ---- arviointi ----
+    def evaluate(self, order: Order, book: Optional[Book] = None) -> Decision:
+        t0 = time.perf_counter()
+        now = float(order.ts if order.ts is not None else time.time())
+        self._maybe_reload(time.monotonic())
+        book = book or Book()
+        rules = self._rules
+        reasons = []
+        for _name, fn in rules:
+            msg = fn(order, book, now)
+            if msg:
+                reasons.append(msg)
+        return Decision(not reasons, reasons, [n for n, _ in rules], (time.perf_counter() - t0) * 1e6, self.version)
+
+    def note_order(self, symbol: str, ts: Optional[float] = None):
+        """Kirjaa hyväksytty tilaus cooldownia varten."""
+        self._last[str(symbol).upper()] = float(ts if ts is not None else time.time())
+
+
+def _todays_r() -> Optional[float]:
+    try:
+        from tools import risk_guard
+        return risk_guard.todays_realized_R()
+    except Exception:
+        return None
+
+
+def book_from_state(source: str = "broker") -> Book:
+    """Brutto ja netto notional per symboli tools.state_store-positioista (size*entry_price tai qty*avg)."""
+    from tools import state_store
+    exp: Dict[str, float] = {}
+    net: Dict[str, float] = {}
+    for key, p in state_store.all_positions(source).items():
+        try:
+            q = float(p.get("size", p.get("qty", 0.0)) or 0.0)
+            px = float(p.get("entry_price") or p.get("entry") or p.get("avg") or 0.0)
+        except (TypeError, ValueError):
+            continue
+        if q and px:
+            sym = str(p.get("symbol") or key).upper()
+            exp[sym] = exp.get(sym, 0.0) + abs(q * px)
+            short = str(p.get("side") or "").upper() in ("SHORT", "SELL") or q < 0
+            net[sym] = net.get(sym, 0.0) + (-abs(q * px) if short else abs(q * px))
+    return Book(exposure=exp, net=net)
+
+
+_default: Optional[RiskRules] = None
+_dlock = threading.Lock()
+
+
+def get_engine() -> RiskRules:
+    global _default
+    if _default is None:
+        with _dlock:
+            if _default is None:
+                _default = RiskRules()
+    return _default
+
+
+def set_engine(eng: Optional[RiskRules]):
+    global _default
+    _default = eng
+
+
+def check(order: Order, book: Optional[Book] = None) -> Decision:
+    return get_engine().evaluate(order, book)
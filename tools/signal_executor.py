@@ -3,17 +3,23 @@ from __future__ import annotations
 import os, inspect
 from typing import Optional, Callable, Dict, Any
 
+from tools import risk_rules
+from tools.ops_runtime import stage_timer
+from tools.position_sizer import size_batch
+
 try:
     import tools.capital_client as capital_client
 except Exception:
     capital_client = None
 
 def _pos_size(equity: float, risk_pct: float, sl_px: Optional[float], entry_px: float, symbol: str) -> float:
-    base = equity * risk_pct
     if sl_px and sl_px > 0:
         dist = abs(entry_px - sl_px)
         if dist > 0:
-            return max(base / dist, 0.0)
+            # risk_pct on osuus (0.01 = 1 %); broker min/step config/sizes.json:sta. LIVE_RISK_PCT
+            # on jo kutsujan päätös -> ei RISK_MAX_PER_TRADE_PCT-kattoa (riskikatto = risk_rules)
+            return float(size_batch([symbol], [entry_px], [dist], equity, risk_pct=[risk_pct * 100.0],
+                                    max_risk_pct=0, max_total_risk_pct=0)[0])
     return float(os.getenv("LIVE_FIXED_SIZE", "1"))
 
 def _resolve_broker_func() -> Optional[Callable]:
@@ -81,7 +87,22 @@ def execute_action(symbol: str, tf: str, action: str, entry_px: float, equity: f
     try:
         side = "BUY" if action == "BUY" else "SELL"
         risk_pct = float(os.getenv("LIVE_RISK_PCT", "0.01"))
-        size = _pos_size(equity, risk_pct, sl_px, entry_px, symbol)
+        with stage_timer("position_size"):
+            size = _pos_size(equity, risk_pct, sl_px, entry_px, symbol)
+        if size <= 0:
+            print(f"[EXEC] {symbol} {tf}: size below broker minimum for risk budget, skip", flush=True)
+            return False
+        risk_pct = size * abs(entry_px - sl_px) / equity * 100.0 if (sl_px and sl_px > 0 and equity) else None
+        with stage_timer("risk_check"):
+            try:
+                book = risk_rules.book_from_state("broker")
+            except Exception:
+                book = None
+            decision = risk_rules.check(risk_rules.Order(symbol, side, size=size, price=entry_px, equity=equity,
+                                                         risk_pct=risk_pct, tf=tf), book)
+        if not decision.allow:
+            print(f"[EXEC] {symbol} {tf} {action} denied: {'; '.join(decision.reasons)}", flush=True)
+            return False
         attach = (os.getenv("LIVE_TP_SL", "0") == "1")
         sl = float(sl_px) if (attach and sl_px and sl_px > 0) else None
         tp = float(tp_px) if (attach and tp_px and tp_px > 0) else None
@@ -94,7 +115,10 @@ def execute_action(symbol: str, tf: str, action: str, entry_px: float, equity: f
         base_kwargs = dict(symbol= symbol, side= side, size= size, price_hint= entry_px,
                            stop_loss= sl, take_profit= tp, tf= tf)
         call_kwargs = _map_kwargs(broker_fn, base_kwargs)
-        ok = broker_fn(**call_kwargs)
+        with stage_timer("order_place"):
+            ok = broker_fn(**call_kwargs)
+        if ok:
+            risk_rules.get_engine().note_order(symbol)
         return bool(ok)
     except Exception as e:
         print(f"[EXEC] failed {symbol} {tf} {action}: {e}", flush=True)
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Transactional position/order/fill store (embedded SQLite, WAL).
+
+Replaces the JSON read-modify-write files:
+    state/positions.json               (tools.ledger)          -> positions, source="ledger"
+    state/trade_engine_positions.json  (tools.trade_engine)    -> positions, source="engine"
+    state/trade_engine_orders.json     (tools.trade_engine)    -> orders
+    data/open_positions.json           (tools.sync_positions)  -> positions, source="broker"
+
+Every write is a single transaction (BEGIN IMMEDIATE), so several daemons can
+update positions concurrently without losing updates, and a write costs
+O(changed rows) instead of O(total state). The JSON files are imported once by
+migrate_from_json() on first use (idempotent, recorded in the migrations table).
+
+Env:
+    STATE_DB   path to the database (default state/trading_state.sqlite)
+"""
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+STATE = ROOT / "state"
+DATA = ROOT / "data"
+DB_PATH = Path(os.getenv("STATE_DB", str(STATE / "trading_state.sqlite")))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions(
+    source TEXT NOT NULL,
+    key TEXT NOT NULL,
+    symbol TEXT,
+    tf TEXT,
+    side TEXT,
+    qty REAL DEFAULT 0,
+    avg REAL DEFAULT 0,
+    realized REAL DEFAULT 0,
+    status TEXT,
+    data TEXT,
+    updated_ts REAL,
+    PRIMARY KEY(source, key)
+);
+CREATE INDEX IF NOT EXISTS ix_positions_sym_tf ON positions(symbol, tf);
+CREATE TABLE IF NOT EXISTS orders(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id TEXT UNIQUE,
+    ts REAL,
+    symbol TEXT,
+    tf TEXT,
+    side TEXT,
+    status TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_orders_sym_tf ON orders(symbol, tf, ts);
+CREATE TABLE IF NOT EXISTS fills(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL,
+    order_id TEXT,
+    symbol TEXT,
+    tf TEXT,
+    side TEXT,
+    qty REAL,
+    price REAL,
+    fee REAL DEFAULT 0,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_fills_order ON fills(order_id);
+CREATE INDEX IF NOT EXISTS ix_fills_sym_tf ON fills(symbol, tf, ts);
+CREATE TABLE IF NOT EXISTS migrations(name TEXT PRIMARY KEY, ts REAL);
+"""
+
+_POS_COLS = ("symbol", "tf", "side", "qty", "avg", "realized", "status")
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized: set = set()
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(str(path), timeout=30.0, isolation_level=None, check_same_thread=False)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("PRAGMA busy_timeout=30000")
+    return con
+
+
+def conn(path: Optional[Path] = None) -> sqlite3.Connection:
+    """Per-thread connection; schema and JSON migration run once per process and path."""
+    p = Path(path or DB_PATH)
+    cache = getattr(_local, "cons", None)
+    if cache is None:
+        cache = _local.cons = {}
+    con = cache.get(str(p))
+    if con is None:
+        con = cache[str(p)] = _connect(p)
+    if str(p) not in _initialized:
+        with _init_lock:
+            if str(p) not in _initialized:
+                con.executescript(_SCHEMA)
+                _initialized.add(str(p))
+                if path is None:
+                    migrate_from_json(con)
+    return con
+
+
+@contextmanager
+def transaction(con: Optional[sqlite3.Connection] = None) -> Iterator[sqlite3.Connection]:
+    """BEGIN IMMEDIATE … COMMIT; takes the write lock up front so read-modify-write is atomic."""
+    c = con or conn()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        yield c
+    except BaseException:
+        c.execute("ROLLBACK")
+        raise
+    else:
+        c.execute("COMMIT")
+
+
+# ---------- positions ----------
+
+def _pos_from_row(r: sqlite3.Row) -> Dict[str, Any]:
+    d = json.loads(r["data"]) if r["data"] else {}
+    return d
+
+
+def _upsert_position(c: sqlite3.Connection, source: str, key: str, data: Dict[str, Any],
+                     symbol: Optional[str] = None, tf: Optional[str] = None):
+    cols = {k: data.get(k) for k in _POS_COLS}
+    cols["symbol"] = symbol or cols["symbol"]
+    cols["tf"] = tf or cols["tf"]
+    c.execute(
+        """INSERT INTO positions(source,key,symbol,tf,side,qty,avg,realized,status,data,updated_ts)
+           VALUES(?,?,?,?,?,?,?,?,?,?,?)
+           ON CONFLICT(source,key) DO UPDATE SET
+             symbol=excluded.symbol, tf=excluded.tf, side=excluded.side, qty=excluded.qty,
+             avg=excluded.avg, realized=excluded.realized, status=excluded.status,
+             data=excluded.data, updated_ts=excluded.updated_ts""",
+        (source, key, cols["symbol"], cols["tf"], cols["side"], cols["qty"], cols["avg"],
+         cols["realized"], cols["status"], json.dumps(data, ensure_ascii=False), time.time()),
+    )
+
+
+def get_position(source: str, key: str, con: Optional[sqlite3.Connection] = None) -> Optional[Dict[str, Any]]:
+    c = con or conn()
+    r = c.execute("SELECT data FROM positions WHERE source=? AND key=?", (source, key)).fetchone()
+    return _pos_from_row(r) if r else None
+
+
+def all_positions(source: str, con: Optional[sqlite3.Connection] = None) -> Dict[str, Dict[str, Any]]:
+    c = con or conn()
+    return {r["key"]: _pos_from_row(r)
+            for r in c.execute("SELECT key, data FROM positions WHERE source=? ORDER BY key", (source,))}
+
+
+def positions_for(symbol: str, tf: Optional[str] = None, con: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+    c = con or conn()
+    if tf is None:
+        rows = c.execute("SELECT source, key, data FROM positions WHERE symbol=?", (symbol,))
+    else:
+        rows = c.execute("SELECT source, key, data FROM positions WHERE symbol=? AND tf=?", (symbol, tf))
+    return [dict(_pos_from_row(r), _source=r["source"], _key=r["key"]) for r in rows]
+
+
+def upsert_position(source: str, key: str, data: Dict[str, Any], symbol: Optional[str] = None,
+                    tf: Optional[str] = None, con: Optional[sqlite3.Connection] = None):
+    with transaction(con) as c:
+        _upsert_position(c, source, key, data, symbol=symbol, tf=tf)
+
+
+def replace_positions(source: str, mapping: Dict[str, Dict[str, Any]], con: Optional[sqlite3.Connection] = None,
+                      key_fn: Optional[Callable[[str], Tuple[str, Optional[str]]]] = None) -> Dict[str, List[str]]:
+    """
+    Make `source` equal to `mapping` in one transaction, touching only changed rows.
+    key_fn maps a key to its indexed (symbol, tf); default: key is the symbol.
+    Returns {"opened": [...], "closed": [...], "modified": [...]} keys.
+    """
+    with transaction(con) as c:
+        cur = {r["key"]: r["data"] for r in c.execute("SELECT key, data FROM positions WHERE source=?", (source,))}
+        diff: Dict[str, List[str]] = {"opened": [], "closed": [], "modified": []}
+        for key, data in mapping.items():
+            enc = json.dumps(data, ensure_ascii=False)
+            if key not in cur:
+                diff["opened"].append(key)
+            elif cur[key] != enc:
+                diff["modified"].append(key)
+            else:
+                continue
+            sym, tf = key_fn(key) if key_fn else (key, None)
+            _upsert_position(c, source, key, data, symbol=sym, tf=tf)
+        for key in cur.keys() - mapping.keys():
+            c.execute("DELETE FROM positions WHERE source=? AND key=?", (source, key))
+            diff["closed"].append(key)
+    return diff
+
+
+def apply_fill(symbol: str, side: str, qty: float, price: float, allow_shorts: bool = False,
+               order_id: Optional[str] = None, tf: Optional[str] = None, fee: float = 0.0,
+               source: str = "ledger", con: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
+    """
+    Atomic position update + fill record (same rules as ledger.update_position_on_fill).
+    BUY increases the position, SELL reduces it; without allow_shorts it never goes negative.
+    """
+    qty = float(qty); price = float(price)
+    with transaction(con) as c:
+        r = c.execute("SELECT data FROM positions WHERE source=? AND key=?", (source, symbol)).fetchone()
+        p = _pos_from_row(r) if r else {"qty": 0.0, "avg": 0.0, "realized": 0.0}
+        if side == "BUY":
+            new_qty = p["qty"] + qty
+            if new_qty <= 0:
+                p["qty"], p["avg"] = 0.0, 0.0
+            else:
+                p["avg"] = (p["avg"] * p["qty"] + price * qty) / new_qty
+                p["qty"] = new_qty
+        elif side == "SELL":
+            sell_qty = min(p["qty"] if not allow_shorts else qty, qty)
+            p["realized"] += (price - p["avg"]) * sell_qty
+            p["qty"] -= sell_qty
+            if p["qty"] <= 1e-12:
+                p["qty"], p["avg"] = 0.0, 0.0
+        _upsert_position(c, source, symbol, p, symbol=symbol, tf=tf)
+        c.execute(
+            "INSERT INTO fills(ts,order_id,symbol,tf,side,qty,price,fee,data) VALUES(?,?,?,?,?,?,?,?,?)",
+            (time.time(), order_id, symbol, tf, side, qty, price, float(fee or 0.0), None),
+        )
+    return {k: p[k] for k in ("qty", "avg", "realized")}
+
+
+# ---------- orders / fills ----------
+
+def insert_order(info: Dict[str, Any], con: Optional[sqlite3.Connection] = None) -> int:
+    """Append an order record; rows with an existing order_id are updated in place."""
+    oid = info.get("order_id") or info.get("dealId") or info.get("dealReference")
+    with transaction(con) as c:
+        cur = c.execute(
+            """INSERT INTO orders(order_id,ts,symbol,tf,side,status,data) VALUES(?,?,?,?,?,?,?)
+               ON CONFLICT(order_id) DO UPDATE SET status=excluded.status, data=excluded.data""",
+            (oid, float(info.get("timestamp") or info.get("ts") or time.time()), info.get("symbol"),
+             info.get("tf"), info.get("side") or info.get("signal"), info.get("status"),
+             json.dumps(info, ensure_ascii=False)),
+        )
+        return int(cur.lastrowid or 0)
+
+
+def get_order(order_id: str, con: Optional[sqlite3.Connection] = None) -> Optional[Dict[str, Any]]:
+    c = con or conn()
+    r = c.execute("SELECT data FROM orders WHERE order_id=?", (order_id,)).fetchone()
+    return json.loads(r["data"]) if r else None
+
+
+def orders(symbol: Optional[str] = None, tf: Optional[str] = None, limit: int = 100,
+           con: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+    c = con or conn()
+    q, args = "SELECT data FROM orders", []
+    if symbol is not None:
+        q += " WHERE symbol=?"; args.append(symbol)
+        if tf is not None:
+            q += " AND tf=?"; args.append(tf)
+    q += " ORDER BY id DESC LIMIT ?"; args.append(int(limit))
+    return [json.loads(r["data"]) for r in c.execute(q, args)]
+
+
+def fills(symbol: Optional[str] = None, order_id: Optional[str] = None, limit: int = 100,
+          con: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+    c = con or conn()
+    if order_id is not None:
+        rows = c.execute("SELECT * FROM fills WHERE order_id=? ORDER BY id DESC LIMIT ?", (order_id, int(limit)))
+    elif symbol is not None:
+        rows = c.execute("SELECT * FROM fills WHERE symbol=? ORDER BY id DESC LIMIT ?", (symbol, int(limit)))
+    else:
+        rows = c.execute("SELECT * FROM fills ORDER BY id DESC LIMIT ?", (int(limit),))
+    return [{k: r[k] for k in r.keys() if k != "data"} for r in rows]
+
+
+# ---------- migration ----------
+
+def _read_json(p: Path, default: Any) -> Any:
+    try:
+        return json.loads(p.read_text() or "null") or default
+    except Exception:
+        return default
+
+
+def migrate_from_json(con: Optional[sqlite3.Connection] = None, state_dir: Path = STATE, data_dir: Path = DATA) -> Dict[str, int]:
+    """Import the legacy JSON state files once. Safe to call repeatedly."""
+    c = con or conn()
+    done = {r["name"] for r in c.execute("SELECT name FROM migrations")}
+    if "json_v1" in done:
+        return {}
+    counts = {"ledger": 0, "engine": 0, "broker": 0, "orders": 0}
+    with transaction(c):
+        # toinen prosessi on voinut ehtiä ensin: merkintä varataan kirjoituslukon alla
+        if c.execute("INSERT OR IGNORE INTO migrations(name, ts) VALUES('json_v1', ?)", (time.time(),)).rowcount == 0:
+            return {}
+        for sym, p in (_read_json(state_dir / "positions.json", {}) or {}).items():
+            _upsert_position(c, "ledger", sym, p, symbol=sym); counts["ledger"] += 1
+        for key, p in (_read_json(state_dir / "trade_engine_positions.json", {}) or {}).items():
+            sym, _, tf = key.rpartition("_")
+            _upsert_position(c, "engine", key, p, symbol=p.get("symbol") or sym or key, tf=tf or None); counts["engine"] += 1
+        broker = (_read_json(data_dir / "open_positions.json", {}) or {}).get("positions", {})
+        for sym, p in broker.items():
+            _upsert_position(c, "broker", sym, p, symbol=sym); counts["broker"] += 1
+        for o in _read_json(state_dir / "trade_engine_orders.json", []) or []:
+            c.execute(
+                "INSERT OR IGNORE INTO orders(order_id,ts,symbol,tf,side,status,data) VALUES(?,?,?,?,?,?,?)",
+                (o.get("order_id"), float(o.get("timestamp") or 0), o.get("symbol"), o.get("tf"),
+                 o.get("signal") or o.get("side"), o.get("status"), json.dumps(o, ensure_ascii=False)),
+            )
+            counts["orders"] += 1
+    if any(counts.values()):
+        print(f"[STATE] migrated JSON state -> {DB_PATH.name}: {counts}", flush=True)
+    return counts
+
+
+if __name__ == "__main__":
+    _c = _connect(DB_PATH)
+    _c.executescript(_SCHEMA)
+    print(json.dumps(migrate_from_json(_c), indent=2))
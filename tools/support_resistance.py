@@ -1,57 +1,220 @@
 #!/usr/bin/env python3
 from __future__ import annotations
+import bisect
+from collections import deque
+from operator import itemgetter
+from typing import List, Optional, Sequence, Tuple
+
 import pandas as pd
 import numpy as np
 
+TOL_PCT = 0.0015  # ~0.15% toleranssi, säädä instrumentin mukaan
+MAX_PIVOTS = 100  # klusteroidaan korkeintaan näin monta uusinta pivotia per tyyppi
+
+
+def _window_extrema(a: np.ndarray, left: int, right: int) -> Tuple[np.ndarray, np.ndarray]:
+    """max/min ikkunasta [i-left, i+right] jokaiselle i:lle (NaN reunoilla); pandas rolling = O(n)."""
+    w = left + right + 1
+    s = pd.Series(a, dtype=float)
+    mx = s.rolling(w, min_periods=w).max().shift(-right).to_numpy()
+    mn = s.rolling(w, min_periods=w).min().shift(-right).to_numpy()
+    return mx, mn
+
+
+def pivot_flags(high: np.ndarray, low: np.ndarray, left: int = 3, right: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+    """(pivot_high, pivot_low) bool-taulukot ilman DataFrame-kopiota."""
+    h = np.asarray(high, dtype=float)
+    l = np.asarray(low, dtype=float)
+    if len(h) < left + right + 1:
+        return np.zeros(len(h), dtype=bool), np.zeros(len(h), dtype=bool)
+    mx, _ = _window_extrema(h, left, right)
+    _, mn = _window_extrema(l, left, right)
+    return h == mx, l == mn
+
+
 def pivots(df: pd.DataFrame, left: int = 3, right: int = 3) -> pd.DataFrame:
     """
     Merkitse paikalliset huiput/kuopat (pivot high/low) yksinkertaisella naapurivertailulla.
     left/right = kuinka monta kynttilää molemmin puolin.
     """
-    h = df["high"].values
-    l = df["low"].values
-    n = len(df)
-    ph = np.zeros(n, dtype=bool)
-    pl = np.zeros(n, dtype=bool)
-    for i in range(left, n - right):
-        if h[i] == max(h[i-left:i+right+1]):
-            ph[i] = True
-        if l[i] == min(l[i-left:i+right+1]):
-            pl[i] = True
+    ph, pl = pivot_flags(df["high"].values, df["low"].values, left, right)
     out = df.copy()
     out["pivot_high"] = ph
     out["pivot_low"]  = pl
     return out
 
+
+def _cluster(levels: Sequence[Tuple], tol: float, max_levels: int) -> List[List]:
+    """
+    Hintajärjestyksessä (levels valmiiksi lajiteltu, (hinta, tyyppi, ...)) peräkkäiset
+    saman tyypin tasot tol-etäisyydellä yhdeksi liukuvalla keskiarvolla.
+    """
+    clustered: List[List] = []
+    last_p, last_t, cnt = 0.0, None, 0
+    for item in levels:
+        price, typ = item[0], item[1]
+        if typ == last_t and abs(price - last_p) <= tol:
+            last_p = (last_p * cnt + price) / (cnt + 1)
+            cnt += 1
+        else:
+            if last_t is not None:
+                clustered.append([last_p, last_t, cnt])
+            last_p, last_t, cnt = price, typ, 1
+    if last_t is not None:
+        clustered.append([last_p, last_t, cnt])
+    # pisteytä klusterit frekvenssin mukaan ja poimi top tasot
+    return sorted(clustered, key=itemgetter(2), reverse=True)[:max_levels]
+
+
 def sr_levels(df: pd.DataFrame, window: int = 300, max_levels: int = 5) -> pd.DataFrame:
     """
     Laske S/R‑tasot viimeisestä window-ikkunasta pivotien mukaan.
     Palauttaa DataFrame, jossa sarakkeet ['level', 'type'] (type: 'S'/'R'), uusimmat ensin.
     """
-    x = df.iloc[-window:].copy()
-    x = pivots(x, left=3, right=3)
-    levels = []
-    # Resistance: pivot_high hinnat
-    for price in x.loc[x["pivot_high"], "high"].tail(100).tolist():
-        levels.append((price, "R"))
-    # Support: pivot_low hinnat
-    for price in x.loc[x["pivot_low"], "low"].tail(100).tolist():
-        levels.append((price, "S"))
-    # Klusteroi lähellä olevat tasot yhdeksi (yksinkertainen tolerantti)
-    levels = sorted(levels, key=lambda t: t[0])
-    clustered = []
-    tol = np.mean(x["close"]) * 0.0015  # ~0.15% toleranssi, säädä instrumentin mukaan
-    for price, typ in levels:
-        if not clustered:
-            clustered.append([price, typ, 1])
-        else:
-            last_p, last_t, cnt = clustered[-1]
-            if abs(price - last_p) <= tol and typ == last_t:
-                # yhdistä klusteriin keskiarvolla
-                new_p = (last_p * cnt + price) / (cnt + 1)
-                clustered[-1] = [new_p, last_t, cnt + 1]
-            else:
-                clustered.append([price, typ, 1])
-    # pisteytä klusterit frekvenssin mukaan ja poimi top tasot
-    clustered = sorted(clustered, key=lambda t: t[2], reverse=True)[:max_levels]
+    x = df.iloc[-window:]
+    hi, lo = x["high"].to_numpy(dtype=float), x["low"].to_numpy(dtype=float)
+    ph, pl = pivot_flags(hi, lo, 3, 3)
+    levels = [(p, "R") for p in hi[ph][-MAX_PIVOTS:].tolist()] + [(p, "S") for p in lo[pl][-MAX_PIVOTS:].tolist()]
+    clustered = _cluster(sorted(levels, key=lambda t: t[0]), np.mean(x["close"]) * TOL_PCT, max_levels)
     return pd.DataFrame({"level": [c[0] for c in clustered], "type": [c[1] for c in clustered]})
+
+
+class SRTracker:
+    """
+    Inkrementaalinen S/R: yksi baari kerrallaan update(high, low, close).
+
+    Ikkunan max/min pidetään monotonisilla dequeilla (O(1) amortisoitu / baari);
+    pivot vahvistuu `right` baarin viiveellä ja vanhenee kun se putoaa window-
+    ikkunan ulkopuolelle. Pivotit pidetään hintajärjestyksessä (insort), joten
+    klusterointi on yksi lineaarinen läpikäynti ja tehdään vain kun pivot-joukko
+    muuttuu, toleranssina ikkunan keskihinta * tol_pct sillä hetkellä – tällöin
+    levels() vastaa sr_levels(df[:i+1]) -kutsua.
+    """
+
+    def __init__(self, window: int = 300, left: int = 3, right: int = 3,
+                 max_levels: int = 5, tol_pct: float = TOL_PCT):
+        self.window, self.left, self.right = int(window), int(left), int(right)
+        self.max_levels, self.tol_pct = int(max_levels), float(tol_pct)
+        self.i = -1
+        self._buf: deque = deque(maxlen=self.left + self.right + 1)  # (high, low)
+        self._hq: deque = deque()  # laskevat highit (i, h)
+        self._lq: deque = deque()  # nousevat lowit (i, l)
+        self._closes: deque = deque()
+        self._csum = 0.0
+        self._piv = {"R": deque(), "S": deque()}  # (i, price) bar-järjestyksessä
+        self._sorted: List[Tuple[float, int, int]] = []  # (price, R=0/S=1, i) = sr_levels:n vakaa järjestys
+        self._dirty = True
+        self._levels: List[List] = []
+        self._prices: List[float] = []
+
+    def update(self, high: float, low: float, close: float) -> bool:
+        """Lisää baari; True jos pivot-joukko muuttui."""
+        i = self.i + 1
+        w = self.left + self.right + 1
+        self._buf.append((high, low))
+        hq, lq = self._hq, self._lq
+        while hq and hq[-1][1] <= high:
+            hq.pop()
+        hq.append((i, high))
+        while lq and lq[-1][1] >= low:
+            lq.pop()
+        lq.append((i, low))
+        if hq[0][0] <= i - w:
+            hq.popleft()
+        if lq[0][0] <= i - w:
+            lq.popleft()
+        ph = pl = None
+        if len(self._buf) == w:
+            ch, cl = self._buf[self.left]  # keskibaari i - right
+            ph = ch if ch == hq[0][1] else None
+            pl = cl if cl == lq[0][1] else None
+        return self._step(close, ph, pl)
+
+    def _step(self, close: float, ph: Optional[float], pl: Optional[float]) -> bool:
+        """Baarin i kirjanpito: ph/pl = baarin i - right vahvistunut pivot-hinta tai None."""
+        self.i = i = self.i + 1
+        self._closes.append(close)
+        self._csum += close
+        if len(self._closes) > self.window:
+            self._csum -= self._closes.popleft()
+        changed = False
+        start = i - self.window + 1  # ikkunan ensimmäinen baari
+        c = i - self.right
+        if c - self.left >= start:
+            for typ, rank, p in (("R", 0, ph), ("S", 1, pl)):
+                if p is not None:
+                    self._piv[typ].append((c, p))
+                    bisect.insort(self._sorted, (p, rank, c))
+                    changed = True
+        for typ, rank in (("R", 0), ("S", 1)):
+            q = self._piv[typ]
+            while q and q[0][0] - self.left < start:
+                c0, p0 = q.popleft()
+                del self._sorted[bisect.bisect_left(self._sorted, (p0, rank, c0))]
+                changed = True
+        self._dirty |= changed
+        return changed
+
+    def levels(self) -> List[List]:
+        """[[taso, 'S'/'R', pivotien määrä], ...] frekvenssin mukaan."""
+        if self._dirty:
+            qr, qs = self._piv["R"], self._piv["S"]
+            if len(qr) > MAX_PIVOTS or len(qs) > MAX_PIVOTS:  # vain MAX_PIVOTS uusinta per tyyppi
+                cut = (qr[-MAX_PIVOTS][0] if len(qr) > MAX_PIVOTS else -1,
+                       qs[-MAX_PIVOTS][0] if len(qs) > MAX_PIVOTS else -1)
+                levels = [x for x in self._sorted if x[2] >= cut[x[1]]]
+            else:
+                levels = self._sorted
+            tol = self._csum / max(1, len(self._closes)) * self.tol_pct
+            self._levels = [[p, "RS"[r], n] for p, r, n in _cluster(levels, tol, self.max_levels)]
+            self._prices = sorted(c[0] for c in self._levels)
+            self._dirty = False
+        return self._levels
+
+    def nearest(self, price: float) -> Tuple[Optional[float], Optional[float]]:
+        """(lähin taso <= price, lähin taso >= price) tai None."""
+        self.levels()
+        ps = self._prices
+        k = bisect.bisect_right(ps, price)
+        sup = ps[k - 1] if k else None
+        k = bisect.bisect_left(ps, price)
+        res = ps[k] if k < len(ps) else None
+        return sup, res
+
+
+def sr_features(df: pd.DataFrame, window: int = 300, left: int = 3, right: int = 3,
+                max_levels: int = 5, tol_pct: float = TOL_PCT) -> pd.DataFrame:
+    """
+    S/R-etäisyysfeaturet koko historialle (kausaalinen, vain vahvistuneet pivotit):
+    sr_sup_dist / sr_res_dist = (close - tuki) / close, (vastus - close) / close
+    (NaN jos tasoa ei ole), sr_sup_n / sr_res_n = tason pivotien määrä.
+    Pivotit lasketaan vektoroidusti kerralla; SRTracker hoitaa vain klusterit.
+    """
+    tr = SRTracker(window, left, right, max_levels, tol_pct)
+    hi, lo, cl = (df[c].to_numpy(dtype=float) for c in ("high", "low", "close"))
+    n = len(cl)
+    ph, pl = pivot_flags(hi, lo, left, right)
+    # baarilla i vahvistuu baarin i - right pivot
+    conf_h = np.full(n, None, dtype=object)
+    conf_l = np.full(n, None, dtype=object)
+    if n > right:
+        conf_h[right:] = np.where(ph[:n - right], hi[:n - right], None)
+        conf_l[right:] = np.where(pl[:n - right], lo[:n - right], None)
+    out = np.full((n, 4), np.nan)
+    ps: List[float] = []
+    strength: dict = {}
+    closes = cl.tolist()
+    for i, (c, h, l) in enumerate(zip(closes, conf_h.tolist(), conf_l.tolist())):
+        if tr._step(c, h, l) or i == 0:
+            lv = tr.levels()
+            ps = tr._prices
+            strength = {x[0]: x[2] for x in lv}
+        k = bisect.bisect_right(ps, c)
+        if k:
+            sup = ps[k - 1]
+            out[i, 0], out[i, 2] = (c - sup) / c, strength[sup]
+        k = bisect.bisect_left(ps, c)
+        if k < len(ps):
+            res = ps[k]
+            out[i, 1], out[i, 3] = (res - c) / c, strength[res]
+    return pd.DataFrame(out, index=df.index, columns=["sr_sup_dist", "sr_res_dist", "sr_sup_n", "sr_res_n"])
@@ -12,20 +12,46 @@ sync_positions.py
       "US500":  {"side":"SHORT","size":1.00, ...}
     }
   }
-- Päivittää 5 s välein ja logittaa logs/sync_positions.log
+- Pollaa adaptiivisesti (PositionSync) ja logittaa logs/sync_positions.log:
+    SYNC_FAST_SEC (1 s)   kun toimeksianto on juuri lähetetty tai positiot juuri muuttuneet (SYNC_HOT_SEC, 30 s)
+    SYNC_POLL_SEC (5 s)   kun positioita on auki
+    SYNC_IDLE_SEC (20 s)  kun ollaan flat
+  Toiminut endpoint muistetaan; muut polut kokeillaan vasta jos se lakkaa vastaamasta.
+- Uutta tilaa verrataan edelliseen: vain open/close/modify-tapahtumat julkaistaan
+  (subscribe() prosessin sisällä, data/position_events.jsonl muille prosesseille).
+  JSON/state_store kirjoitetaan vain muutoksista; pelkkä pnl_pct päivitetään
+  korkeintaan SYNC_PNL_WRITE_SEC (30 s) välein.
+- nudge(): toimeksiannon lähettäjä (order_router) herättää nopean pollauksen.
 """
 
 import os, time, json, sys, traceback
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable, Tuple
 
 import requests
 
+from tools.ops_runtime import STAGE_SECONDS
+
 BASE_DIR = Path(__file__).resolve().parents[1]
 DATA_DIR = BASE_DIR / "data"
 LOGS_DIR = BASE_DIR / "logs"
 OUT_PATH = DATA_DIR / "open_positions.json"
 LOG_PATH = LOGS_DIR / "sync_positions.log"
+EVENTS_PATH = DATA_DIR / "position_events.jsonl"
+NUDGE_PATH = DATA_DIR / ".sync_nudge"
+
+CANDIDATE_PATHS = (
+    "/api/v1/positions",                 # yleinen
+    "/api/v1/positions?status=OPEN",     # filtteri
+    "/api/v1/positions/open",            # vaihtoehtoinen
+    "/api/v1/position",                  # joissain asennuksissa yksikkömuotoinen
+)
+FAST_SEC = float(os.getenv("SYNC_FAST_SEC", "1"))
+POLL_SEC = float(os.getenv("SYNC_POLL_SEC", "5"))
+IDLE_SEC = float(os.getenv("SYNC_IDLE_SEC", "20"))
+HOT_SEC = float(os.getenv("SYNC_HOT_SEC", "30"))
+PNL_WRITE_SEC = float(os.getenv("SYNC_PNL_WRITE_SEC", "30"))
+STRUCT_FIELDS = ("side", "size", "entry_price", "tp", "sl")  # pnl_pct ei ole tapahtuma
 
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 LOGS_DIR.mkdir(parents=True, exist_ok=True)
@@ -40,6 +66,9 @@ def getenv_str(name: str, default: str = "") -> str:
     return str(val) if val is not None else default
 
 def get_base_url() -> str:
+    base = getenv_str("CAPITAL_API_BASE").strip()
+    if base:
+        return base
     env = getenv_str("CAPITAL_ENV", "live").lower().strip()
     if env == "demo":
         return "https://demo-api-capital.backend-capital.com"
@@ -85,44 +114,57 @@ def try_get_json(session: requests.Session, path: str) -> Optional[Dict[str, Any
         log(f"[GET {path}] JSON parse error")
         return None
 
-def fetch_open_positions(session: requests.Session) -> List[Dict[str, Any]]:
+def _extract_positions(data: Any) -> Optional[List[Dict[str, Any]]]:
+    """Normalisoi eri vastausmuodot listaksi; None jos muotoa ei tunnisteta."""
+    if isinstance(data, dict):
+        if "positions" in data and isinstance(data["positions"], list):
+            return data["positions"]
+        # joskus {"items": [...]}
+        if "items" in data and isinstance(data["items"], list):
+            return data["items"]
+        # joskus suoraan lista sisällä "data"
+        if "data" in data and isinstance(data["data"], list):
+            return data["data"]
+        # joskus yksittäinen position dict
+        if "instrument" in data or "epic" in data or "market" in data:
+            return [data]
+    if isinstance(data, list):
+        return data
+    return None
+
+def fetch_positions(session: requests.Session, prefer: Optional[str] = None) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
     """
-    Kokeillaan useita polkuja, koska dokumentaatio-/ympäristöeroja voi olla.
-    Palauttaa raakalistan positio-olioita (dict).
+    Hae positiot; `prefer` (viimeksi toiminut polku) kokeillaan ensin ja muut vasta jos se ei vastaa.
+    Palauttaa (lista, toiminut polku) tai (None, None) jos mikään polku ei toiminut.
     """
-    candidates = [
-        "/api/v1/positions",                 # yleinen
-        "/api/v1/positions?status=OPEN",     # filtteri
-        "/api/v1/positions/open",            # vaihtoehtoinen
-        "/api/v1/position"                   # joissain asennuksissa yksikkömuotoinen
-    ]
-    for path in candidates:
+    paths = [prefer] + [p for p in CANDIDATE_PATHS if p != prefer] if prefer else list(CANDIDATE_PATHS)
+    for path in paths:
         data = try_get_json(session, path)
-        if not data:
+        if data is None:
             continue
+        lst = _extract_positions(data)
+        if lst is not None:
+            return lst, path
+    return None, None
 
-        # Normalisoi eri muotoihin
-        if isinstance(data, dict):
-            if "positions" in data and isinstance(data["positions"], list):
-                return data["positions"]
-            # joskus {"items": [...]}
-            if "items" in data and isinstance(data["items"], list):
-                return data["items"]
-            # joskus suoraan lista sisällä "data"
-            if "data" in data and isinstance(data["data"], list):
-                return data["data"]
-            # joskus yksittäinen position dict
-            if "instrument" in data or "epic" in data or "market" in data:
-                return [data]
-        if isinstance(data, list):
-            return data
-
-    return []
+def fetch_open_positions(session: requests.Session) -> List[Dict[str, Any]]:
+    """
+    Kokeillaan useita polkuja, koska dokumentaatio-/ympäristöeroja voi olla.
+    Palauttaa raakalistan positio-olioita (dict).
+    """
+    lst, _ = fetch_positions(session)
+    return lst or []
 
 def normalize_position(rec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """
     Yrittää poimia tiedot eri avainvariaatioista (BUY/SELL/long/short, level/averagePrice jne.)
     """
+    # Capitalin muoto: {"position": {...}, "market": {...}} -> litteäksi
+    if isinstance(rec.get("position"), dict):
+        rec = {**(rec.get("market") or {}), **rec["position"]}
+        rec.setdefault("profitLoss", rec.get("upl"))
+        rec.setdefault("limitLevel", rec.get("profitLevel"))
+
     # symbol/epic
     symbol = rec.get("epic") or rec.get("instrument") or rec.get("market") or rec.get("symbol")
     if not symbol:
@@ -176,47 +218,207 @@ def normalize_position(rec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     }
 
 def write_positions(positions: Dict[str, Any]):
+    """Päivitä state_store (vain muuttuneet rivit) ja kirjoita JSON-vienti dashboardille vain jos jokin muuttui."""
+    try:
+        from tools import state_store
+        diff = state_store.replace_positions("broker", positions)
+        if not any(diff.values()) and OUT_PATH.exists():
+            return
+    except Exception:
+        log("[state_store] " + traceback.format_exc())
     tmp = OUT_PATH.with_suffix(".json.tmp")
     with tmp.open("w", encoding="utf-8") as f:
         json.dump({"positions": positions}, f, ensure_ascii=False, indent=2)
     tmp.replace(OUT_PATH)
 
-def main_loop():
-    session = requests.Session()
-    session.headers.update({"User-Agent": "CapitalBot Sync/1.0"})
-    if not capital_login(session):
-        time.sleep(10)
-        return
+def diff_positions(prev: Dict[str, Dict[str, Any]], cur: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """open/close/modify-tapahtumat kahden {symbol: positio} -tilannekuvan välillä (vain STRUCT_FIELDS)."""
+    ts = time.time()
+    out: List[Dict[str, Any]] = []
+    for sym, pos in cur.items():
+        old = prev.get(sym)
+        if old is None:
+            out.append({"type": "open", "symbol": sym, "position": pos, "ts": ts})
+        else:
+            changed = [f for f in STRUCT_FIELDS if old.get(f) != pos.get(f)]
+            if changed:
+                out.append({"type": "modify", "symbol": sym, "position": pos, "previous": old,
+                            "changed": changed, "ts": ts})
+    for sym in prev.keys() - cur.keys():
+        out.append({"type": "close", "symbol": sym, "previous": prev[sym], "ts": ts})
+    return out
+
+def nudge():
+    """Kerro sync-palvelulle (myös toisessa prosessissa), että toimeksianto lähti -> nopea pollaus."""
+    try:
+        NUDGE_PATH.touch()
+    except OSError:
+        pass
 
-    # kevyt keep-alive: login uusiksi ~15 min välein
-    last_login_ts = time.time()
+def _nudge_ts() -> float:
+    try:
+        return NUDGE_PATH.stat().st_mtime
+    except OSError:
+        return 0.0
 
-    while True:
+def _last_order_ts() -> float:
+    try:
+        from tools import state_store
+        r = state_store.conn().execute("SELECT MAX(ts) FROM orders").fetchone()
+        return float(r[0] or 0.0)
+    except Exception:
+        return 0.0
+
+
+class PositionSync:
+    """
+    Brokerin positioiden synkka: muistaa toimivan endpointin, pollaa adaptiivisesti
+    ja julkaisee vain muutokset. Tilaajat: subscribe(fn) -> fn(event); nykyinen
+    tilannekuva positions() (sopii esim. risk_guard.watch_stops(stream, sync.positions, ...)).
+    """
+
+    def __init__(self, session: Optional[requests.Session] = None, fetch=fetch_positions,
+                 login: Callable[[requests.Session], bool] = capital_login, clock: Callable[[], float] = time.time,
+                 write: Optional[Callable[[Dict[str, Any]], None]] = None, events_path: Optional[Path] = EVENTS_PATH,
+                 last_order_ts: Callable[[], float] = _last_order_ts,
+                 snapshot: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.session = session or requests.Session()
+        self.session.headers.update({"User-Agent": "CapitalBot Sync/1.0"})
+        self.fetch = fetch
+        self.login = login
+        self.clock = clock
+        self.write = write or write_positions
+        self.events_path = events_path
+        self.last_order_ts = last_order_ts
+        self.endpoint: Optional[str] = None
+        self.snapshot: Dict[str, Dict[str, Any]] = self._initial_snapshot() if snapshot is None else dict(snapshot)
+        self.last_change = 0.0
+        self.last_write = 0.0
+        self.last_login = 0.0
+        self.api_calls = 0
+        self._confirmed_ts = 0.0
+        self._subs: List[Callable[[Dict[str, Any]], None]] = []
+
+    @staticmethod
+    def _initial_snapshot() -> Dict[str, Dict[str, Any]]:
+        # edellinen ajo on jo kirjoittanut tilan -> uudelleenkäynnistys ei julkaise turhia open-tapahtumia
         try:
-            if time.time() - last_login_ts > 14*60:
-                capital_login(session)
-                last_login_ts = time.time()
+            from tools import state_store
+            return state_store.all_positions("broker")
+        except Exception:
+            return {}
+
+    def subscribe(self, fn: Callable[[Dict[str, Any]], None]) -> Callable[[], None]:
+        self._subs.append(fn)
+
+        def _unsub():
+            if fn in self._subs:
+                self._subs.remove(fn)
+        return _unsub
+
+    def positions(self) -> Dict[str, Dict[str, Any]]:
+        return self.snapshot
 
-            raw = fetch_open_positions(session)
-            norm_list = []
-            for rec in raw:
+    def _publish(self, events: List[Dict[str, Any]]):
+        if self.events_path is not None:
+            with self.events_path.open("a", encoding="utf-8") as f:
+                for ev in events:
+                    f.write(json.dumps(ev, ensure_ascii=False) + "\n")
+        for ev in events:
+            log(f"[event] {ev['type']} {ev['symbol']}")
+            for fn in list(self._subs):
                 try:
-                    n = normalize_position(rec)
-                    if n: norm_list.append(n)
+                    fn(ev)
                 except Exception:
-                    log("[normalize] " + traceback.format_exc())
+                    log("[subscriber] " + traceback.format_exc())
 
-            by_symbol = {r["symbol"]: {
-                "side": r["side"], "size": r["size"], "entry_price": r["entry_price"],
-                "tp": r["tp"], "sl": r["sl"], "pnl_pct": r["pnl_pct"], "reason": r["reason"]
-            } for r in norm_list}
+    def ensure_login(self) -> bool:
+        now = self.clock()
+        # kevyt keep-alive: login uusiksi ~14 min välein
+        if self.last_login and now - self.last_login < 14 * 60:
+            return True
+        ok = self.login(self.session)
+        if ok:
+            self.last_login = now
+        return ok
 
-            write_positions(by_symbol)
-            log(f"[ok] positions={len(by_symbol)} -> {OUT_PATH.name}")
-        except Exception:
-            log("[loop] " + traceback.format_exc())
+    def poll_once(self) -> List[Dict[str, Any]]:
+        """Yksi kierros: hae, normalisoi, vertaa, julkaise. Palauttaa tapahtumat."""
+        if not self.ensure_login():
+            return []
+        raw, path = self.fetch(self.session, self.endpoint)
+        self.api_calls += 1
+        if raw is None:
+            # token voi olla vanhentunut; kirjaudutaan seuraavalla kierroksella uudelleen
+            log(f"[fetch] no endpoint answered (last={self.endpoint})")
+            self.endpoint, self.last_login = None, 0.0
+            return []
+        if path != self.endpoint:
+            log(f"[endpoint] using {path}")
+            self.endpoint = path
+
+        norm: Dict[str, Dict[str, Any]] = {}
+        for rec in raw:
+            try:
+                n = normalize_position(rec)
+                if n:
+                    norm[n["symbol"]] = {k: n[k] for k in ("side", "size", "entry_price", "tp", "sl", "pnl_pct", "reason")}
+            except Exception:
+                log("[normalize] " + traceback.format_exc())
+
+        now = self.clock()
+        events = diff_positions(self.snapshot, norm)
+        pnl_due = norm != self.snapshot and now - self.last_write >= PNL_WRITE_SEC
+        self.snapshot = norm
+        if events or pnl_due:
+            self.write(norm)
+            self.last_write = now
+        if events:
+            self.last_change = now
+            self._observe_confirm(now, events)
+            self._publish(events)
+        return events
+
+    def _observe_confirm(self, now: float, events: List[Dict[str, Any]]):
+        # order_confirm = toimeksiannosta siihen, kun täyttö näkyy brokerin positioissa
+        sent = max(_nudge_ts(), self.last_order_ts())
+        if sent <= self._confirmed_ts or not 0.0 <= now - sent < HOT_SEC:
+            return
+        if any(e["type"] in ("open", "close") or "size" in e.get("changed", ()) for e in events):
+            self._confirmed_ts = sent
+            STAGE_SECONDS.observe(now - sent, stage="order_confirm")
+
+    def next_interval(self) -> float:
+        now = self.clock()
+        hot_since = max(self.last_change, _nudge_ts(), self.last_order_ts())
+        if now - hot_since < HOT_SEC:
+            return FAST_SEC
+        return POLL_SEC if self.snapshot else IDLE_SEC
 
-        time.sleep(5)
+    def run(self, stop: Callable[[], bool] = lambda: False, sleep: Callable[[float], None] = time.sleep):
+        while not stop():
+            t0 = self.clock()
+            try:
+                events = self.poll_once()
+                if events:
+                    log(f"[ok] positions={len(self.snapshot)} events={len(events)} -> {OUT_PATH.name}")
+            except Exception:
+                log("[loop] " + traceback.format_exc())
+            # nukutaan FAST_SEC paloissa, jotta nudge/uusi toimeksianto lyhentää odotusta
+            while not stop():
+                left = self.next_interval() - (self.clock() - t0)
+                if left <= 0:
+                    break
+                sleep(min(left, FAST_SEC))
+
+def main_loop():
+    sync = PositionSync()
+    try:
+        from tools import telemetry
+        sync.subscribe(lambda ev: telemetry.log("position", ev))
+    except Exception:
+        pass
+    sync.run()
 
 if __name__ == "__main__":
     try:
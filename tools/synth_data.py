@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+synth_data.py – deterministinen synteettinen OHLCV-paneeli skaalatesteihin
+
+    python -m tools.synth_data --symbols 500 --years 10 --tfs 15m,1h,4h --seed 42
+    python -m tools.synth_data --symbols EURUSD,US500,BTCUSD,AAPL --bars 20000 --tfs 1h
+
+Kirjoittaa <out>/<SYMBOL>_<tf>.parquet (oletus data/history), joten core.io.load_history
+(ja tools.walkforward) lukevat tiedostot sellaisenaan. Sarakkeet:
+time, open, high, low, close, volume, spread.
+
+Malli (kaikki log-tuotoissa, yhteisellä aikaruudukolla):
+  - tekijämalli: markkina + omaisuusluokka + sektori -> ristikorrelaatiot, beetat per symboli
+  - volatiliteettiregiimit: kahden tilan Markov-ketju (rauhallinen / kriisi), yhteinen kaikille
+  - paksut hännät: Student-t (df=4) skaalattuna yksikkövarianssiin
+  - kaupankäyntiajat luokittain: crypto 24/7, fx ja indeksit arkipäivisin, osakkeet klo 14:30-21 UTC.
+    Suljetun ajan tuotot kertyvät seuraavan avauksen openiin -> yön- ja viikonlopun gapit
+  - spread: luokan perustaso (bps) kasvaa volatiliteetin mukana
+Isommat TF:t kootaan pienimmästä, joten 15m/1h/4h ovat keskenään johdonmukaisia.
+Sama siemen -> samat tiedostot; symbolin sarja ei riipu muista symboleista eikä järjestyksestä.
+"""
+from __future__ import annotations
+import argparse
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from history.history_utils import tf_to_seconds
+
+ROOT = Path(__file__).resolve().parents[1]
+OUT_DIR = ROOT / "data" / "history"
+START = "2015-01-05"  # maanantai
+
+CLASSES = ("fx", "index", "crypto", "stock")
+N_SECTORS = 12
+# vuotuinen volatiliteetti, spread bps, markkinabeetan skaala
+CLASS_PARAMS = {
+    "fx":     {"vol": 0.08, "spread_bps": 0.8, "beta": 0.3, "px": 1.2},
+    "index":  {"vol": 0.18, "spread_bps": 1.0, "beta": 1.0, "px": 4000.0},
+    "crypto": {"vol": 0.70, "spread_bps": 5.0, "beta": 0.8, "px": 20000.0},
+    "stock":  {"vol": 0.30, "spread_bps": 3.0, "beta": 1.1, "px": 150.0},
+}
+REGIME_VOL = (1.0, 2.5)
+REGIME_STAY = (0.999, 0.99)  # todennäköisyys pysyä tilassa per perusbaari (15m)
+T_DF = 4.0
+YEAR_SEC = 365.25 * 86400
+
+_INDEX_NAMES = {"US500", "US100", "US30", "DE40", "UK100", "JP225", "FR40", "EU50", "SPX500", "NAS100"}
+
+
+def asset_class(symbol: str) -> str:
+    """Karkea luokitus nimestä; SYNnnnn-symbolit jaetaan tasaisesti luokkiin."""
+    u = symbol.upper().replace("/", "")
+    if u.startswith("SYN") and u[3:].isdigit():
+        return CLASSES[int(u[3:]) % len(CLASSES)]
+    if u in _INDEX_NAMES:
+        return "index"
+    if u.endswith("USDT") or u[:3] in ("BTC", "ETH", "XRP", "SOL", "ADA", "DOG", "LTC"):
+        return "crypto"
+    if len(u) == 6 and u.isalpha() and (u[:3] in ("EUR", "GBP", "AUD", "NZD", "USD", "CAD", "CHF", "JPY")):
+        return "fx"
+    return "stock"
+
+
+def _seed(seed: int, *parts: str) -> List[int]:
+    return [int(seed)] + [zlib.crc32(p.encode("utf-8")) for p in parts]
+
+
+def _t(rng: np.random.Generator, size) -> np.ndarray:
+    return rng.standard_t(T_DF, size) / np.sqrt(T_DF / (T_DF - 2.0))
+
+
+def session_mask(times: pd.DatetimeIndex, cls: str) -> np.ndarray:
+    """True kun luokka käy kauppaa baarin alussa."""
+    if cls == "crypto":
+        return np.ones(len(times), dtype=bool)
+    wd = times.dayofweek.values
+    if cls == "stock":
+        minute = times.hour.values * 60 + times.minute.values
+        return (wd < 5) & (minute >= 14 * 60 + 30) & (minute < 21 * 60)
+    # fx / indeksit: sunnuntai 22:00 -> perjantai 22:00 UTC
+    hour = times.hour.values
+    return ((wd < 4) | ((wd == 4) & (hour < 22)) | ((wd == 6) & (hour >= 22)))
+
+
+class Market:
+    """Yhteinen aikaruudukko, regiimi ja tekijätuotot; symbolisarjat lasketaan tästä."""
+
+    def __init__(self, grid: pd.DatetimeIndex, seed: int = 42):
+        self.grid = grid
+        self.seed = int(seed)
+        self.dt = (grid[1] - grid[0]).total_seconds() if len(grid) > 1 else 900.0
+        n = len(grid)
+        rng = np.random.default_rng(_seed(seed, "regime"))
+        # Markov-regiimi: pysymistodennäköisyys skaalattuna baarin pituuteen
+        steps = self.dt / 900.0
+        stay = np.array(REGIME_STAY) ** steps
+        u = rng.random(n)
+        reg = np.empty(n, dtype=np.int8)
+        s = 0
+        for i in range(n):  # n ~ 3.5e5 kymmenelle vuodelle 15m -> nopea
+            if u[i] > stay[s]:
+                s = 1 - s
+            reg[i] = s
+        self.regime = reg
+        self.vol_mult = np.asarray(REGIME_VOL)[reg]
+        per_bar = np.sqrt(self.dt / YEAR_SEC)
+        self.market = _t(np.random.default_rng(_seed(seed, "f:market")), n) * per_bar * self.vol_mult
+        self.cls_f = {c: _t(np.random.default_rng(_seed(seed, "f:" + c)), n) * per_bar * self.vol_mult
+                      for c in CLASSES}
+        self._sector: Dict[int, np.ndarray] = {}
+
+    def sector(self, k: int) -> np.ndarray:
+        f = self._sector.get(k)
+        if f is None:
+            f = _t(np.random.default_rng(_seed(self.seed, f"f:sector{k}")), len(self.grid))
+            f = self._sector[k] = f * np.sqrt(self.dt / YEAR_SEC) * self.vol_mult
+        return f
+
+    def symbol(self, symbol: str, cls: Optional[str] = None) -> pd.DataFrame:
+        cls = cls or asset_class(symbol)
+        p = CLASS_PARAMS[cls]
+        rng = np.random.default_rng(_seed(self.seed, "s:" + symbol))
+        n = len(self.grid)
+        vol = p["vol"] * float(np.exp(rng.normal(0.0, 0.25)))
+        beta = p["beta"] * float(rng.normal(1.0, 0.2))
+        sector = zlib.crc32(symbol.encode("utf-8")) % N_SECTORS
+        # kokonaisvarianssi jaetaan: markkina ~35 %, luokka ~20 %, sektori ~15 %, oma ~30 %
+        w_mkt, w_cls, w_sec, w_idio = np.sqrt([0.35, 0.20, 0.15, 0.30])
+        idio = _t(rng, n) * np.sqrt(self.dt / YEAR_SEC) * self.vol_mult
+        ret = vol * (w_mkt * beta * self.market + w_cls * self.cls_f[cls] + w_sec * self.sector(sector) + w_idio * idio)
+        logp = np.log(p["px"] * float(np.exp(rng.normal(0.0, 0.5)))) + np.cumsum(ret)
+
+        open_mask = session_mask(self.grid, cls)
+        idx = np.flatnonzero(open_mask)
+        close = np.exp(logp[idx])
+        prev = np.exp(logp[np.maximum(idx - 1, 0)])  # suljetun ajan tuotto päätyy openiin -> gap
+        bar_sd = vol * np.sqrt(self.dt / YEAR_SEC) * self.vol_mult[idx]
+        hi_x = np.abs(rng.normal(0.0, 0.6, len(idx))) * bar_sd
+        lo_x = np.abs(rng.normal(0.0, 0.6, len(idx))) * bar_sd
+        high = np.maximum(prev, close) * np.exp(hi_x)
+        low = np.minimum(prev, close) * np.exp(-lo_x)
+        volume = np.round(np.exp(rng.normal(7.0, 0.5, len(idx))) * self.vol_mult[idx] * (1.0 + 50.0 * np.abs(ret[idx])))
+        rel_vol = bar_sd / (p["vol"] * np.sqrt(self.dt / YEAR_SEC))
+        spread = close * p["spread_bps"] / 1e4 * (0.5 + 0.5 * rel_vol) * np.exp(rng.normal(0.0, 0.1, len(idx)))
+        return pd.DataFrame({"time": self.grid[idx], "open": prev, "high": high, "low": low, "close": close,
+                             "volume": volume, "spread": spread})
+
+
+def make_grid(tf: str, start: str = START, bars: Optional[int] = None, years: Optional[float] = None,
+              cls_hint: Optional[Iterable[str]] = None) -> pd.DatetimeIndex:
+    """Kalenteriruudukko; `bars` = haluttu kaupankäyntibaarien määrä harvimmin käyvälle luokalle."""
+    sec = tf_to_seconds(tf)
+    if bars is not None:
+        frac = min(float(session_mask(pd.date_range(START, periods=7 * 96, freq="15min", tz="UTC"), c).mean())
+                   for c in (cls_hint or CLASSES))
+        n = int(bars / max(frac, 1e-3) * 1.05) + 7 * 86400 // sec
+    else:
+        n = int((years or 1.0) * YEAR_SEC // sec)
+    return pd.date_range(start, periods=n, freq=pd.Timedelta(seconds=sec), tz="UTC")
+
+
+def resample(df: pd.DataFrame, tf: str) -> pd.DataFrame:
+    """Kokoa pienemmän TF:n baarit isompaan (vain kaupankäyntiajat, tyhjät pois)."""
+    g = df.set_index("time").resample(pd.Timedelta(seconds=tf_to_seconds(tf)), origin="epoch")
+    out = g.agg({"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum", "spread": "mean"})
+    return out.dropna(subset=["close"]).reset_index()
+
+
+def generate(symbols: Sequence[str], tfs: Sequence[str] = ("15m",), bars: Optional[int] = None,
+             years: Optional[float] = None, seed: int = 42, start: str = START,
+             classes: Optional[Dict[str, str]] = None):
+    """Generaattori: (symbol, tf, DataFrame) – yksi symboli kerrallaan muistissa."""
+    classes = classes or {}
+    tfs = sorted(tfs, key=tf_to_seconds)
+    base = tfs[0]
+    cls_of = {s: classes.get(s) or asset_class(s) for s in symbols}
+    grid = make_grid(base, start, bars=None if bars is None else bars * tf_to_seconds(tfs[-1]) // tf_to_seconds(base),
+                     years=years, cls_hint=set(cls_of.values()))
+    mkt = Market(grid, seed)
+    for s in symbols:
+        df = mkt.symbol(s, cls_of[s])
+        for tf in tfs:
+            out = df if tf == base else resample(df, tf)
+            yield s, tf, (out.tail(bars).reset_index(drop=True) if bars is not None else out)
+
+
+def ohlcv(n: int, tf: str = "15m", symbol: str = "SYN0002", seed: int = 42) -> pd.DataFrame:
+    """Yksi sarja tasan n baarilla (oletuksena 24/7 crypto-luokka -> ei aukkoja)."""
+    return next(generate([symbol], [tf], bars=n, seed=seed))[2]
+
+
+def write(symbols: Sequence[str], tfs: Sequence[str] = ("15m", "1h", "4h"), out_dir: Path = OUT_DIR,
+          fmt: str = "parquet", **kw) -> List[Path]:
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths: List[Path] = []
+    for s, tf, df in generate(symbols, tfs, **kw):
+        p = out_dir / f"{s}_{tf}.{fmt}"
+        if fmt == "parquet":
+            df.to_parquet(p, index=False)
+        else:
+            df.to_csv(p, index=False)
+        paths.append(p)
+    return paths
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Deterministic synthetic OHLCV panel generator")
+    ap.add_argument("--symbols", default="50", help="count (SYN0000..) or comma list")
+    ap.add_argument("--tfs", default="15m,1h,4h")
+    ap.add_argument("--years", type=float, default=None)
+    ap.add_argument("--bars", type=int, default=None, help="bars per series of the largest TF")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--start", default=START)
+    ap.add_argument("--out", default=str(OUT_DIR))
+    ap.add_argument("--format", choices=("parquet", "csv"), default="parquet")
+    a = ap.parse_args(argv)
+    syms = ([f"SYN{i:04d}" for i in range(int(a.symbols))] if a.symbols.isdigit()
+            else [s.strip() for s in a.symbols.split(",") if s.strip()])
+    years = a.years if (a.years or a.bars) else 1.0
+    paths = write(syms, [t.strip() for t in a.tfs.split(",") if t.strip()], Path(a.out), a.format,
+                  bars=a.bars, years=years if a.bars is None else None, seed=a.seed, start=a.start)
+    print(f"[SYNTH] wrote {len(paths)} files to {a.out}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
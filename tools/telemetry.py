@@ -1,31 +1,269 @@
+"""
+Telemetry events -> SQLite (data/telemetry.sqlite).
+
+log() only enqueues; a background writer thread owns one persistent connection
+(WAL, index on (kind, ts)) and commits in batches of TELEMETRY_BATCH rows or
+every TELEMETRY_FLUSH_SEC seconds, whichever comes first. The queue is bounded
+(TELEMETRY_QUEUE_MAX); when it is full events are dropped and counted instead of
+blocking the trading loop. Pending events are flushed at interpreter exit.
+
+    telemetry.log("order", {"symbol": "GOLD", "side": "BUY"})
+    with telemetry.stage("predict", symbol="GOLD", tf="1h"):
+        ...
+    telemetry.query(kind="timing", since=time.time() - 3600)   # -> List[Event]
+    telemetry.stage_summary(since=...)                          # -> {stage: StageStats}
+"""
 from __future__ import annotations
-import os, sqlite3, time, json, requests
+import atexit, os, queue, sqlite3, threading, time, json, requests
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from tools._dotenv import load_dotenv
+from tools import profiler
+from tools.ops_runtime import QUEUE_DEPTH
 
 load_dotenv()
-DB = Path("data/telemetry.sqlite")
-DB.parent.mkdir(exist_ok=True)
+DB = Path(os.getenv("TELEMETRY_DB", "data/telemetry.sqlite"))
+DB.parent.mkdir(parents=True, exist_ok=True)
+
+BATCH = int(os.getenv("TELEMETRY_BATCH", "500"))
+FLUSH_SEC = float(os.getenv("TELEMETRY_FLUSH_SEC", "1.0"))
+QUEUE_MAX = int(os.getenv("TELEMETRY_QUEUE_MAX", "20000"))
 
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events(ts REAL, kind TEXT, payload TEXT);
+CREATE INDEX IF NOT EXISTS ix_events_kind_ts ON events(kind, ts);
+"""
 
-def _db():
-    con = sqlite3.connect(DB)
-    con.execute(
-        """CREATE TABLE IF NOT EXISTS events(
-        ts REAL, kind TEXT, payload TEXT
-    )"""
-    )
+
+def _db(path: Path = None) -> sqlite3.Connection:
+    con = sqlite3.connect(str(path or DB), timeout=30.0, check_same_thread=False)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.executescript(_SCHEMA)
     return con
 
 
+class _Writer:
+    def __init__(self, path: Path):
+        self.path = path
+        self.q: "queue.Queue[Optional[Tuple[float, str, str]]]" = queue.Queue(maxsize=QUEUE_MAX)
+        self.dropped = 0
+        self.written = 0
+        self.pid = os.getpid()
+        self._flush_req = threading.Event()
+        self._cond = threading.Condition()
+        self._seq = 0   # rivejä jonoon
+        self._done = 0  # rivejä käsitelty (kirjoitettu tai pudotettu kirjoitusvirheessä)
+        self._thr = threading.Thread(target=self._run, daemon=True, name="telemetry-writer")
+        self._thr.start()
+
+    def put(self, row: Tuple[float, str, str]):
+        with self._cond:
+            try:
+                self.q.put_nowait(row)
+                self._seq += 1
+            except queue.Full:
+                self.dropped += 1
+
+    def _run(self):
+        con = _db(self.path)
+        buf: List[Tuple[float, str, str]] = []
+        last = time.monotonic()
+        stop = False
+        while not stop:
+            timeout = max(0.0, FLUSH_SEC - (time.monotonic() - last))
+            try:
+                item = self.q.get(timeout=timeout)
+                if item is None:
+                    stop = True
+                else:
+                    buf.append(item)
+                    # imuroi jonosta kerralla mitä siellä on
+                    while len(buf) < BATCH:
+                        item = self.q.get_nowait()
+                        if item is None:
+                            stop = True
+                            break
+                        buf.append(item)
+            except queue.Empty:
+                pass
+            due = len(buf) >= BATCH or (time.monotonic() - last) >= FLUSH_SEC or self._flush_req.is_set() or stop
+            if buf and due:
+                try:
+                    con.executemany("INSERT INTO events(ts,kind,payload) VALUES(?,?,?)", buf)
+                    con.commit()
+                    self.written += len(buf)
+                except Exception as e:
+                    print(f"[TELEMETRY] write failed ({len(buf)} rows dropped): {e}", flush=True)
+                    self.dropped += len(buf)
+                with self._cond:
+                    self._done += len(buf)
+                    self._cond.notify_all()
+                buf = []
+            if due:
+                last = time.monotonic()
+            if not buf and self.q.empty():
+                self._flush_req.clear()
+        con.close()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        with self._cond:
+            target = self._seq
+            if self._done >= target:
+                return True
+            self._flush_req.set()
+            return self._cond.wait_for(lambda: self._done >= target, timeout)
+
+    def close(self, timeout: float = 10.0):
+        try:
+            self.q.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thr.join(timeout)
+
+
+_writer: Optional[_Writer] = None
+_wlock = threading.Lock()
+
+
+def _get_writer() -> _Writer:
+    global _writer
+    w = _writer
+    if w is None or w.pid != os.getpid():
+        with _wlock:
+            if _writer is None or _writer.pid != os.getpid():
+                forked = _writer is not None
+                # forkattu lapsi (esim. live_batchin ProcessPoolExecutor) ei peri writer-säiettä:
+                # aloitetaan tyhjästä omalla säikeellä ja yhteydellä
+                _writer = _Writer(DB)
+                QUEUE_DEPTH.set_function(_writer.q.qsize, queue="telemetry")
+                atexit.register(shutdown)
+                if forked:
+                    # pool-workerit poistuvat os._exit:llä ilman atexitiä; multiprocessing ajaa finalizerit
+                    from multiprocessing.util import Finalize
+                    Finalize(None, shutdown, exitpriority=10)
+            w = _writer
+    return w
+
+
 def log(kind: str, payload: dict):
-    con = _db()
-    con.execute(
-        "INSERT INTO events(ts,kind,payload) VALUES(?,?,?)",
-        (time.time(), kind, json.dumps(payload, ensure_ascii=False)),
-    )
-    con.commit()
-    con.close()
+    """Enqueue one event (non-blocking)."""
+    _get_writer().put((time.time(), kind, json.dumps(payload, ensure_ascii=False)))
+
+
+def flush(timeout: float = 10.0) -> bool:
+    """Block until everything queued so far is committed."""
+    w = _writer
+    return _get_writer().flush(timeout) if w is not None and w.pid == os.getpid() else True
+
+
+def shutdown(timeout: float = 10.0):
+    global _writer
+    w = _writer
+    if w is not None and w.pid == os.getpid():
+        w.close(timeout)
+    _writer = None
+
+
+def stats() -> Dict[str, int]:
+    w = _writer
+    if w is None or w.pid != os.getpid():
+        return {"queued": 0, "written": 0, "dropped": 0}
+    return {"queued": w.q.qsize(), "written": w.written, "dropped": w.dropped}
+
+
+_RESERVED = ("stage", "ms", "ok")
+
+
+@contextmanager
+def stage(name: str, /, **fields: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time a block and log kind="timing" {"stage", "ms", "ok", **fields}; extra fields can be set on the
+    yielded dict. Caller fields named like the fixed keys are stored as "x_<key>" instead of clashing.
+    """
+    extra: Dict[str, Any] = {}
+    t0 = time.perf_counter()
+    ok = True
+    try:
+        with profiler.span(name, **fields):
+            yield extra
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        ms = (time.perf_counter() - t0) * 1000.0
+        payload = {(f"x_{k}" if k in _RESERVED else k): v for k, v in {**fields, **extra}.items()}
+        payload.update(stage=name, ms=round(ms, 3), ok=ok)
+        log("timing", payload)
+
+
+# ---------- query API (dashboard) ----------
+
+@dataclass
+class Event:
+    ts: float
+    kind: str
+    payload: Dict[str, Any]
+
+
+@dataclass
+class StageStats:
+    stage: str
+    count: int
+    errors: int
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    max_ms: float
+
+
+def query(kind: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+          limit: int = 1000, path: Optional[Path] = None) -> List[Event]:
+    """Newest-first events, filtered by kind and [since, until) on the (kind, ts) index."""
+    sql, args = "SELECT ts, kind, payload FROM events WHERE 1=1", []
+    if kind is not None:
+        sql += " AND kind=?"; args.append(kind)
+    if since is not None:
+        sql += " AND ts>=?"; args.append(float(since))
+    if until is not None:
+        sql += " AND ts<?"; args.append(float(until))
+    sql += " ORDER BY ts DESC LIMIT ?"; args.append(int(limit))
+    con = _db(path)
+    try:
+        rows = con.execute(sql, args).fetchall()
+    finally:
+        con.close()
+    out = []
+    for ts, k, p in rows:
+        try:
+            payload = json.loads(p) if p else {}
+        except Exception:
+            payload = {"raw": p}
+        out.append(Event(float(ts), k, payload))
+    return out
+
+
+def stage_summary(since: Optional[float] = None, limit: int = 100000, path: Optional[Path] = None) -> Dict[str, StageStats]:
+    """Per-stage latency summary over kind="timing" events."""
+    by: Dict[str, List[float]] = {}
+    errs: Dict[str, int] = {}
+    for ev in query("timing", since=since, limit=limit, path=path):
+        st = str(ev.payload.get("stage", "?"))
+        try:
+            by.setdefault(st, []).append(float(ev.payload.get("ms", 0.0)))
+        except (TypeError, ValueError):
+            continue
+        if ev.payload.get("ok") is False:
+            errs[st] = errs.get(st, 0) + 1
+    out: Dict[str, StageStats] = {}
+    for st, xs in by.items():
+        xs.sort()
+        n = len(xs)
+        out[st] = StageStats(st, n, errs.get(st, 0), sum(xs) / n,
+                             xs[int(0.50 * (n - 1))], xs[int(0.95 * (n - 1))], xs[-1])
+    return out
 
 
 def notify(msg: str):
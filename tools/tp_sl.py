@@ -1,10 +1,14 @@
 import numpy as np
 import pandas as pd
 
-def compute_levels(symbol, side, entry_px, risk_model="default", df=None):
+from tools import vol_service
+
+def compute_levels(symbol, side, entry_px, risk_model="default", df=None, tf=None):
     """
     Laskee TP/SL/Trail-tasot position suuntaan, hintaan ja riskimalliin perustuen.
     Tukee useita riskimalleja: default, ATR, percent.
+    Jos tf annetaan, ATR luetaan tools.vol_service-tilasta (df päivittää sen);
+    ilman tf:ää (esim. backtest-ikkunat) lasketaan pelkästä df:stä.
     """
     # Oletusparametrit
     tp_mult = 1.5
@@ -13,7 +17,7 @@ def compute_levels(symbol, side, entry_px, risk_model="default", df=None):
 
     # Jos ATR-riskimalli, käytä df:ää
     if risk_model.lower() == "atr" and df is not None and len(df) > 14:
-        atr = compute_atr(df, 14)[-1]
+        atr = vol_service.atr(symbol, tf, 14, df=df) if tf else vol_service.atr_from_df(df, 14)
         sl_dist = atr * sl_mult
         tp_dist = atr * tp_mult
         trail_dist = atr * trail_mult
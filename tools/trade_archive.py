@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+trade_archive.py – kauppakirjanpidon tallennus (ledger.append_trade:n backend)
+
+Rakenne (oletus $ROOT/results/ledger):
+
+    journal/YYYY-MM-DD.jsonl         halpa lisäyspolku: yksi JSON-rivi per täyttö
+    archive/date=YYYY-MM-DD.parquet  suljetut päivät sarakemuodossa (symbol, ts -järjestys)
+    kpi_checkpoint.json              juoksevat KPI-koosteet + kursori per päivä (suurin luettu seq)
+    imports.json                     tehdyt CSV-tuonnit (lähde -> rivit), kuten migraatiotaulu
+    equity.csv                       kumulatiivinen pnl kursoriin asti (lisätään inkrementaalisesti)
+
+Päivän ensimmäinen lisäys tiivistää edelliset journal-päivät parquetiksi (tai
+`python -m tools.trade_archive compact`). Jokainen rivi saa päivän sisäisen
+järjestysnumeron `seq` (rivin indeksi journalissa), joka säilyy tiivistyksessä,
+joten KPI-kursori toimii kummassakin muodossa. Jos jo tiivistetylle päivälle tulee
+myöhästyneitä rivejä, niiden seq jatkuu parquetin perästä ja seuraava tiivistys
+yhdistää ne olemassa olevaan osaan; KPI-kursori on päiväkohtainen, joten ne
+lasketaan mukaan vaikka uudempia päiviä olisi jo luettu.
+
+scan(start, end, symbols) karsii partitiot tiedostonimen perusteella ja
+käyttää parquetin symbol-suodatinta. export_csv() kirjoittaa vanhan
+results/trades.csv -muodon. Ilman pyarrowia päivät jäävät jsonl-muotoon.
+"""
+from __future__ import annotations
+import argparse
+import fcntl
+import json
+import math
+import os
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    _arrow_available = True
+except ImportError:
+    pa = pq = None
+    _arrow_available = False
+
+ROOT = Path(os.environ.get("ROOT", "/root/pro_botti"))
+BASE = Path(os.getenv("LEDGER_DIR", str(ROOT / "results" / "ledger")))
+
+COLUMNS = ["ts", "symbol", "tf", "side", "price", "amount", "notional", "mode", "p", "why", "order_id", "fee", "pnl"]
+
+
+def _day(ts_ms: int) -> str:
+    return datetime.fromtimestamp(ts_ms / 1000.0, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _empty_kpi() -> Dict[str, Any]:
+    # seqs: päivä -> suurin luettu seq; mtimes: päivä -> parquetin mtime_ns luettaessa
+    return {"day": "", "seq": -1, "seqs": {}, "mtimes": {}, "trades": 0, "sum": 0.0, "sumsq": 0.0,
+            "wins": 0, "cum": 0.0, "peak": None, "maxdd": 0.0}
+
+
+class TradeArchive:
+    def __init__(self, base: Path = BASE):
+        self.base = Path(base)
+        self.journal_dir = self.base / "journal"
+        self.archive_dir = self.base / "archive"
+        self.kpi_path = self.base / "kpi_checkpoint.json"
+        self.equity_path = self.base / "equity.csv"
+        self.imports_path = self.base / "imports.json"
+        self.lock_path = self.base / ".lock"
+        self._last_day: Optional[str] = None
+
+    @contextmanager
+    def _flock(self):
+        self.base.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _journal(self, day: str) -> Path:
+        return self.journal_dir / f"{day}.jsonl"
+
+    def _parquet(self, day: str) -> Path:
+        return self.archive_dir / f"date={day}.parquet"
+
+    # ---- kirjoitus ----
+    def append(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """O(1): yksi rivi päivän journaliin (O_APPEND, yksi write)."""
+        day = _day(int(row["ts"]))
+        if day != self._last_day:
+            if self._last_day is not None or not self._journal(day).exists():
+                self.compact(before=day)
+            self._last_day = day
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        line = json.dumps({k: row.get(k) for k in COLUMNS}, ensure_ascii=False) + "\n"
+        with self._journal(day).open("a", encoding="utf-8") as f:
+            f.write(line)
+        return row
+
+    def compact(self, before: Optional[str] = None) -> List[str]:
+        """Tiivistä journal-päivät < before (oletus tänään UTC) parquetiksi."""
+        if not _arrow_available:
+            return []
+        before = before or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        done = []
+        with self._flock():
+            for p in sorted(self.journal_dir.glob("*.jsonl")) if self.journal_dir.exists() else []:
+                day = p.stem
+                if day >= before:
+                    continue
+                df = self._read_journal(p, self._next_seq(day))
+                if not df.empty:
+                    self.archive_dir.mkdir(parents=True, exist_ok=True)
+                    if self._parquet(day).exists():  # myöhästyneet rivit -> yhdistä, älä korvaa
+                        df = pd.concat([pq.read_table(self._parquet(day)).to_pandas(), df], ignore_index=True)
+                    df = df.sort_values(["symbol", "ts"], kind="stable")
+                    tmp = self._parquet(day).with_suffix(".parquet.tmp")
+                    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp, row_group_size=50_000)
+                    os.replace(tmp, self._parquet(day))
+                p.unlink()
+                done.append(day)
+        return done
+
+    def _load_imports(self) -> Dict[str, Any]:
+        try:
+            d = json.loads(self.imports_path.read_text(encoding="utf-8"))
+            return d if isinstance(d, dict) else {}
+        except Exception:
+            return {}
+
+    def import_csv(self, path: Path) -> int:
+        """
+        Kertaluonteinen tuonti vanhasta trades.csv:stä. Tuonti kirjataan imports.json:iin,
+        joten sama lähde tuodaan vain kerran; arkistossa jo olevat rivit (ledgerin
+        peilaamat, sama ts/symbol/side) ohitetaan.
+        """
+        path = Path(path)
+        key = str(path.resolve())
+        if not path.exists() or key in self._load_imports():
+            return 0
+        df = pd.read_csv(path)
+        if not df.empty and "ts" in df:
+            df["ts"] = pd.to_numeric(df["ts"], errors="coerce")
+            df = df.dropna(subset=["ts"])
+        else:
+            df = pd.DataFrame(columns=["ts"])
+        days = df["ts"].astype("int64").map(_day) if len(df) else pd.Series(dtype=str)
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        with self._flock():
+            imports = self._load_imports()
+            if key in imports:
+                return 0
+            if len(df):
+                have = self.scan(days.min(), days.max())
+                seen = set(zip(have["ts"].astype("int64"), have["symbol"], have["side"]))
+                none = [None] * len(df)
+                dup = [(int(t), s, d) in seen
+                       for t, s, d in zip(df["ts"], df.get("symbol", none), df.get("side", none))]
+                keep = ~pd.Series(dup, index=df.index, dtype=bool)
+                df, days = df[keep], days[keep]
+            for day, g in df.groupby(days, sort=True):
+                with self._journal(day).open("a", encoding="utf-8") as f:
+                    for r in g.to_dict("records"):
+                        r = {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in r.items()}
+                        r["ts"] = int(r["ts"])
+                        f.write(json.dumps({k: r.get(k) for k in COLUMNS}, ensure_ascii=False) + "\n")
+            imports[key] = {"rows": len(df), "at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+            tmp = self.imports_path.with_suffix(".json.tmp")
+            tmp.write_text(json.dumps(imports), encoding="utf-8")
+            os.replace(tmp, self.imports_path)
+        self.compact()
+        return len(df)
+
+    # ---- luku ----
+    @staticmethod
+    def _read_journal(path: Path, seq0: int = 0) -> pd.DataFrame:
+        rows = []
+        with path.open("r", encoding="utf-8") as f:
+            for i, ln in enumerate(f):
+                try:
+                    r = json.loads(ln)
+                except Exception:
+                    r = None  # rikkinäinen rivi pitää silti paikkansa seq-numeroinnissa
+                if isinstance(r, dict):
+                    r["seq"] = seq0 + i
+                    rows.append(r)
+        df = pd.DataFrame(rows, columns=COLUMNS + ["seq"])
+        return df
+
+    def _next_seq(self, day: str) -> int:
+        """Journalin ensimmäinen seq: 0, tai tiivistetyn päivän suurin seq + 1."""
+        pqp = self._parquet(day)
+        if not (_arrow_available and pqp.exists()):
+            return 0
+        seq = pq.read_table(pqp, columns=["seq"]).column("seq").to_pylist()
+        return max(seq) + 1 if seq else 0
+
+    def days(self) -> List[str]:
+        out = set()
+        if self.archive_dir.exists():
+            out.update(p.stem.split("=", 1)[1] for p in self.archive_dir.glob("date=*.parquet"))
+        if self.journal_dir.exists():
+            out.update(p.stem for p in self.journal_dir.glob("*.jsonl"))
+        return sorted(out)
+
+    def _read_day(self, day: str, symbols: Optional[List[str]] = None, min_seq: Optional[int] = None) -> pd.DataFrame:
+        pqp = self._parquet(day)
+        parts = []
+        if _arrow_available and pqp.exists():
+            filters = []
+            if symbols:
+                filters.append(("symbol", "in", list(symbols)))
+            if min_seq is not None:
+                filters.append(("seq", ">", int(min_seq)))
+            parts.append(pq.read_table(pqp, filters=filters or None).to_pandas())
+        if self._journal(day).exists():  # myös tiivistetyn päivän myöhästyneet rivit
+            df = self._read_journal(self._journal(day), self._next_seq(day))
+            if symbols:
+                df = df[df["symbol"].isin(symbols)]
+            if min_seq is not None:
+                df = df[df["seq"] > min_seq]
+            parts.append(df)
+        parts = [p for p in parts if not p.empty]
+        if not parts:
+            return pd.DataFrame(columns=COLUMNS + ["seq"])
+        df = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+        return df.sort_values("seq", kind="stable")
+
+    def scan(self, start: Optional[str] = None, end: Optional[str] = None,
+             symbols: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Rivit päiviltä [start, end] (YYYY-MM-DD, inkl.), valinnaisesti symboleittain, aikajärjestyksessä."""
+        syms = [s for s in symbols] if symbols else None
+        parts = [self._read_day(d, syms) for d in self.days()
+                 if (start is None or d >= start) and (end is None or d <= end)]
+        parts = [p for p in parts if not p.empty]
+        if not parts:
+            return pd.DataFrame(columns=COLUMNS)
+        return pd.concat(parts, ignore_index=True)[COLUMNS]
+
+    def export_csv(self, path: Path, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        """Yhteensopiva results/trades.csv -vienti (atominen kirjoitus)."""
+        df = self.scan(start, end)
+        if df["pnl"].isna().all():
+            df = df.drop(columns=["pnl"])
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, path)
+        return len(df)
+
+    # ---- inkrementaaliset KPI:t ----
+    def _load_kpi(self) -> Dict[str, Any]:
+        try:
+            k = json.loads(self.kpi_path.read_text(encoding="utf-8"))
+            if isinstance(k, dict):
+                return {**_empty_kpi(), **k}
+        except Exception:
+            pass
+        return _empty_kpi()
+
+    def _mtime(self, day: str) -> Optional[int]:
+        try:
+            return self._parquet(day).stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def update_kpis(self) -> Dict[str, Any]:
+        """Lue vain kursorin jälkeiset rivit, päivitä koosteet + equity.csv ja palauta KPI:t (kuten pnl_reporter.kpi_from_trades).
+
+        Kursori on päiväkohtainen: vanhaa päivää luetaan uudelleen vain jos sillä on journal
+        (myöhästyneitä rivejä) tai sen parquet on muuttunut (myöhästyneet rivit tiivistetty).
+        """
+        with self._flock():
+            k = self._load_kpi()
+            seqs, mtimes = k["seqs"], k["mtimes"]
+            if k["day"] and not seqs:
+                # vanha yhden kursorin checkpoint: aiemmat päivät on luettu loppuun
+                for day in self.days():
+                    if day < k["day"]:
+                        seqs[day], mtimes[day] = self._next_seq(day) - 1, self._mtime(day)
+                seqs[k["day"]], mtimes[k["day"]] = k["seq"], self._mtime(k["day"])
+            eq_rows = []
+            for day in self.days():
+                if day in seqs and not self._journal(day).exists() and mtimes.get(day) == self._mtime(day):
+                    continue
+                df = self._read_day(day, min_seq=seqs.get(day))
+                mtimes[day] = self._mtime(day)
+                if df.empty:
+                    continue
+                pnl = pd.to_numeric(df["pnl"], errors="coerce").fillna(0.0).to_numpy()
+                for ts, x in zip(df["ts"].to_numpy(), pnl):
+                    x = float(x)
+                    k["trades"] += 1
+                    k["sum"] += x
+                    k["sumsq"] += x * x
+                    k["wins"] += int(x > 0)
+                    k["cum"] += x
+                    k["peak"] = k["cum"] if k["peak"] is None else max(k["peak"], k["cum"])
+                    k["maxdd"] = min(k["maxdd"], k["cum"] - k["peak"])
+                    eq_rows.append(f"{int(ts)},{k['cum']:.10g}\n")
+                seqs[day] = int(df["seq"].max())
+                if day >= k["day"]:
+                    k["day"], k["seq"] = day, seqs[day]
+            if eq_rows:
+                new = not self.equity_path.exists()
+                with self.equity_path.open("a", encoding="utf-8") as f:
+                    if new:
+                        f.write("ts,equity\n")
+                    f.writelines(eq_rows)
+            tmp = self.kpi_path.with_suffix(".json.tmp")
+            tmp.write_text(json.dumps(k), encoding="utf-8")
+            os.replace(tmp, self.kpi_path)
+        return kpis_from_checkpoint(k)
+
+    def equity(self) -> pd.DataFrame:
+        """Kumulatiivinen pnl-käyrä (päivitä ensin update_kpis())."""
+        if not self.equity_path.exists():
+            return pd.DataFrame(columns=["ts", "equity"])
+        return pd.read_csv(self.equity_path)
+
+    def reset_kpis(self):
+        with self._flock():
+            for p in (self.kpi_path, self.equity_path):
+                if p.exists():
+                    p.unlink()
+
+
+def kpis_from_checkpoint(k: Dict[str, Any]) -> Dict[str, Any]:
+    n = int(k.get("trades", 0))
+    if n == 0:
+        return {"trades": 0, "pnl": 0.0, "hit": 0.0, "sharpe": 0.0, "maxdd": 0.0}
+    mean = k["sum"] / n
+    var = (k["sumsq"] - n * mean * mean) / (n - 1) if n > 1 else 0.0
+    sharpe = (mean / (math.sqrt(max(var, 0.0)) + 1e-9)) * (252 ** 0.5) if n > 1 else 0.0
+    return {"trades": n, "pnl": float(k["cum"]), "hit": k["wins"] / n,
+            "sharpe": float(sharpe), "maxdd": float(k["maxdd"])}
+
+
+_default: Optional[TradeArchive] = None
+
+
+def default() -> TradeArchive:
+    global _default
+    if _default is None:
+        _default = TradeArchive()
+    return _default
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Trade ledger archive")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("compact")
+    ex = sub.add_parser("export")
+    ex.add_argument("--out", default=str(ROOT / "results" / "trades.csv"))
+    ex.add_argument("--start"); ex.add_argument("--end")
+    sub.add_parser("kpi")
+    args = ap.parse_args()
+    ar = default()
+    if args.cmd == "compact":
+        print(f"[LEDGER] compacted: {ar.compact() or '-'}", flush=True)
+    elif args.cmd == "export":
+        n = ar.export_csv(Path(args.out), args.start, args.end)
+        print(f"[LEDGER] exported {n} rows -> {args.out}", flush=True)
+    else:
+        print(json.dumps(ar.update_kpis(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ This module:
 Usage:
     python -m tools.trade_engine --symbol ETH/USD --tf 1h --run-once
     python -m tools.trade_engine --symbol BTC/USD --tf 15m --daemon
+    python -m tools.trade_engine --symbol BTC/USD,ETH/USD --tf 15m,1h --daemon --align-bars
 """
 from __future__ import annotations
 import argparse
@@ -26,6 +27,11 @@ import numpy as np
 import pandas as pd
 
 from tools.capital_constants import get_display_symbol
+from tools import model_cache, profiler, risk_rules, state_store, telemetry
+from tools.ops_runtime import stage_timer
+from tools.batch_infer import InferenceJob, predict_batch
+from tools.bar_scheduler import bar_seconds
+from core import cov_engine
 
 warnings.filterwarnings("ignore")
 
@@ -39,14 +45,15 @@ TAKE_PROFIT_PCT = float(os.getenv("TAKE_PROFIT_PCT", "4.0"))
 META_THR = float(os.getenv("META_THR", "0.6"))  # Decision threshold
 VOTE_TYPE = os.getenv("VOTE_TYPE", "weighted")  # 'majority' or 'weighted'
 MIN_MODELS = int(os.getenv("MIN_MODELS", "2"))  # Minimum models required for decision
+STREAM_TRANSPORT = os.getenv("STREAM_TRANSPORT", "")  # ws | poll | sim; empty = no push stream
 
 ROOT = Path(__file__).resolve().parents[1]
 STATE = ROOT / "state"
 STATE.mkdir(parents=True, exist_ok=True)
 META_DIR = STATE / "models_meta"
 META_REG = STATE / "models_meta.json"
-ORDERS_LOG = STATE / "trade_engine_orders.json"
-POSITIONS_STATE = STATE / "trade_engine_positions.json"
+ORDERS_LOG = STATE / "trade_engine_orders.json"  # legacy; migrated into tools.state_store
+POSITIONS_STATE = STATE / "trade_engine_positions.json"  # legacy; migrated into tools.state_store
 
 # Try to import dependencies
 try:
@@ -111,11 +118,9 @@ def notify_telegram(msg: str):
 
 
 def load_meta_registry() -> Dict[str, Any]:
-    """Load META registry."""
-    if not META_REG.exists():
-        return {"models": []}
+    """Load META registry (cached, re-parsed only when the file changes)."""
     try:
-        return json.loads(META_REG.read_text() or '{"models":[]}')
+        return model_cache.load_json(META_REG, {"models": []}) or {"models": []}
     except Exception as e:
         log_error(f"Failed to load META registry: {e}")
         return {"models": []}
@@ -123,19 +128,15 @@ def load_meta_registry() -> Dict[str, Any]:
 
 def find_model_config(symbol: str, tf: str) -> Optional[Dict[str, Any]]:
     """Find model configuration for symbol/tf."""
-    registry = load_meta_registry()
-    for model in registry.get("models", []):
-        if model.get("symbol") == symbol and model.get("tf") == tf:
-            return model
-    return None
+    return model_cache.find_in_registry(META_REG, symbol, tf)
 
 
 def load_model(model_path: Path) -> Any:
-    """Load a joblib model."""
+    """Load a joblib model (LRU cached, reloaded when the file or version stamp changes)."""
     if not _joblib_available:
         raise RuntimeError("joblib not available")
     try:
-        return joblib_load(model_path)
+        return model_cache.load_model(model_path, loader=joblib_load)
     except Exception as e:
         log_error(f"Failed to load model {model_path}: {e}")
         return None
@@ -153,51 +154,16 @@ def get_model_predictions(symbol: str, tf: str, df: pd.DataFrame) -> Dict[str, f
         log_warning(f"No model config found for {symbol} {tf}")
         return {}
     
-    # Compute features
     if not _ml_features_available or compute_features is None:
         raise RuntimeError("ML features not available")
+    if not _joblib_available:
+        raise RuntimeError("joblib not available")
     
-    features = compute_features(df).replace([np.inf, -np.inf], np.nan).ffill().bfill().fillna(0.0)
-    if features.empty:
-        log_warning(f"No features computed for {symbol} {tf}")
-        return {}
-    
-    # Get latest feature row
-    X_latest = features.iloc[[-1]]
-    
-    # Load models and predict
-    predictions = {}
-    models_info = config.get("models", {})
-    feature_cols = config.get("features", [])
-    
-    # Ensure we have the right features
-    X_model = X_latest.reindex(columns=feature_cols).fillna(0.0)
-    
-    for model_name, model_info in models_info.items():
-        model_file = model_info.get("file")
-        if not model_file:
-            continue
-        
-        model_path = META_DIR / model_file
-        if not model_path.exists():
-            log_warning(f"Model file not found: {model_path}")
-            continue
-        
-        model = load_model(model_path)
-        if model is None:
-            continue
-        
-        try:
-            # Get probability for positive class
-            if hasattr(model, "predict_proba"):
-                prob = model.predict_proba(X_model)[0, 1]
-            else:
-                prob = float(model.predict(X_model)[0])
-            predictions[model_name] = float(prob)
-        except Exception as e:
-            log_error(f"Prediction failed for {model_name}: {e}")
-    
-    return predictions
+    job = InferenceJob(symbol, tf, df=df, config=config)
+    predictions = predict_batch([job], model_dir=META_DIR, feature_fn=compute_features, loader=joblib_load)
+    for err in job.errors:
+        log_warning(f"{symbol} {tf}: {err}")
+    return predictions.get(job.key, {})
 
 
 def combine_signals(predictions: Dict[str, float], weights: Dict[str, float] = None) -> Tuple[str, float]:
@@ -254,37 +220,32 @@ def combine_signals(predictions: Dict[str, float], weights: Dict[str, float] = N
             return "FLAT", 0.0
 
 
+def _engine_key(key: str) -> Tuple[str, Optional[str]]:
+    symbol, _, tf = key.rpartition("_")
+    return (symbol or key, tf or None)
+
+
 def load_positions_state() -> Dict[str, Any]:
-    """Load positions state from file."""
-    if not POSITIONS_STATE.exists():
-        return {}
+    """Load positions state from the state store."""
     try:
-        return json.loads(POSITIONS_STATE.read_text() or '{}')
-    except Exception:
+        return state_store.all_positions("engine")
+    except Exception as e:
+        log_error(f"Failed to load positions state: {e}")
         return {}
 
 
 def save_positions_state(state: Dict[str, Any]):
-    """Save positions state to file."""
+    """Save positions state (only changed rows are written)."""
     try:
-        POSITIONS_STATE.write_text(json.dumps(state, indent=2))
+        state_store.replace_positions("engine", state, key_fn=_engine_key)
     except Exception as e:
         log_error(f"Failed to save positions state: {e}")
 
 
 def log_order(order_info: Dict[str, Any]):
-    """Log order to file."""
-    orders = []
-    if ORDERS_LOG.exists():
-        try:
-            orders = json.loads(ORDERS_LOG.read_text() or '[]')
-        except Exception:
-            orders = []
-    
-    orders.append(order_info)
-    
+    """Append order to the state store."""
     try:
-        ORDERS_LOG.write_text(json.dumps(orders, indent=2))
+        state_store.insert_order(order_info)
     except Exception as e:
         log_error(f"Failed to log order: {e}")
 
@@ -296,11 +257,14 @@ def check_idempotency(symbol: str, tf: str) -> bool:
     Returns:
         True if we should skip (already have position), False otherwise
     """
-    state = load_positions_state()
     key = f"{symbol}_{tf}"
+    try:
+        pos_info = state_store.get_position("engine", key)
+    except Exception as e:
+        log_error(f"Failed to read position state: {e}")
+        pos_info = None
     
-    if key in state:
-        pos_info = state[key]
+    if pos_info:
         # Check if position is still open
         if pos_info.get("status") == "open":
             log_info(f"Already have open position for {symbol} {tf}")
@@ -309,16 +273,41 @@ def check_idempotency(symbol: str, tf: str) -> bool:
     return False
 
 
+def _account_equity() -> Optional[float]:
+    """Latest recorded account equity (tools.equity_store); None skips the notional risk rules."""
+    try:
+        from tools import equity_store
+        if not equity_store.DB.exists():
+            return None
+        row = equity_store.latest()
+        return float(row["equity"]) if row and row.get("equity") else None
+    except Exception:
+        return None
+
+
+def _last_close(df: Optional[pd.DataFrame]) -> Optional[float]:
+    try:
+        px = float(df["close"].iloc[-1])
+    except Exception:
+        return None
+    return px if px > 0 else None
+
+
 def execute_trade(
     symbol: str,
     signal: str,
     confidence: float,
     predictions: Dict[str, float],
-    dry_run: bool = False
+    dry_run: bool = False,
+    price: Optional[float] = None,
+    tf: str = ""
 ) -> Dict[str, Any]:
     """
     Execute a trade based on signal.
     
+    price (last close) and the recorded equity feed the notional risk rules
+    (leverage, group exposure, portfolio VaR); without them those rules skip.
+    
     Returns:
         Order result dictionary
     """
@@ -335,6 +324,20 @@ def execute_trade(
         "dry_run": dry_run
     }
     
+    with stage_timer("risk_check"):
+        try:
+            book = risk_rules.book_from_state("broker")
+        except Exception:
+            book = None
+        order = risk_rules.Order(symbol, signal, size=ORDER_SIZE, price=price, equity=_account_equity(), tf=tf)
+        decision = risk_rules.check(order, book)
+    if not decision.allow:
+        log_warning(f"Risk rules deny {signal} {symbol}: {'; '.join(decision.reasons)}")
+        order_info["status"] = "denied"
+        order_info["reasons"] = decision.reasons
+        log_order(order_info)
+        return order_info
+    
     if dry_run:
         log_info(f"DRY RUN: Would {signal} {symbol} (confidence={confidence:.2%})")
         order_info["status"] = "dry_run"
@@ -385,6 +388,7 @@ def execute_trade(
         order_info["status"] = "executed"
         order_info["order"] = order_result
         log_order(order_info)
+        risk_rules.get_engine().note_order(symbol)
         
         notify_telegram(
             f"{'🟢' if signal == 'BUY' else '🔴'} {signal} {symbol}\n"
@@ -404,18 +408,20 @@ def execute_trade(
         return order_info
 
 
-def process_symbol_tf(symbol: str, tf: str, dry_run: bool = False) -> Dict[str, Any]:
+def prepare_symbol_tf(symbol: str, tf: str) -> Tuple[Optional[InferenceJob], Optional[Dict[str, Any]]]:
     """
-    Process a single symbol/timeframe combination.
+    Pre-inference stage: idempotency check, candle fetch and config lookup.
     
     Returns:
-        Result dictionary
+        (job, None) when the pair is ready for scoring, else (None, result)
     """
     log_info(f"Processing {symbol} {tf}")
     
     # Check idempotency
-    if check_idempotency(symbol, tf):
-        return {"status": "skipped", "reason": "already_open"}
+    with stage_timer("position_check"):
+        already_open = check_idempotency(symbol, tf)
+    if already_open:
+        return None, {"status": "skipped", "reason": "already_open"}
     
     # Fetch data
     if not _capital_available:
@@ -426,15 +432,22 @@ def process_symbol_tf(symbol: str, tf: str, dry_run: bool = False) -> Dict[str,
     
     if df.empty or len(df) < 100:
         log_warning(f"Insufficient data for {symbol} {tf}: {len(df)} rows")
-        return {"status": "skipped", "reason": "insufficient_data"}
+        return None, {"status": "skipped", "reason": "insufficient_data"}
     
-    # Get model predictions
-    try:
-        predictions = get_model_predictions(symbol, tf, df)
-    except Exception as e:
-        log_error(f"Failed to get predictions: {e}")
-        return {"status": "error", "error": str(e)}
+    # Closed bars feed the EWMA covariance; they are folded as cross-sections at the end of the cycle
+    cov_engine.get_engine(tf).add_frame(symbol, df, closed_before=int(time.time()) - bar_seconds(tf) + 1)
     
+    config = find_model_config(symbol, tf)
+    if not config:
+        log_warning(f"No model config found for {symbol} {tf}")
+        return None, {"status": "skipped", "reason": "no_predictions"}
+    
+    return InferenceJob(symbol, tf, df=df, config=config), None
+
+
+def finish_symbol_tf(symbol: str, tf: str, predictions: Dict[str, float], dry_run: bool = False,
+                     price: Optional[float] = None) -> Dict[str, Any]:
+    """Post-inference stage: combine model probabilities and execute."""
     if not predictions:
         log_warning(f"No predictions available for {symbol} {tf}")
         return {"status": "skipped", "reason": "no_predictions"}
@@ -446,13 +459,99 @@ def process_symbol_tf(symbol: str, tf: str, dry_run: bool = False) -> Dict[str,
     weights = config.get("ens_weights") if config else None
     
     # Combine signals
-    signal, confidence = combine_signals(predictions, weights)
+    with stage_timer("combine_gate"):
+        signal, confidence = combine_signals(predictions, weights)
     log_info(f"Combined signal: {signal} (confidence={confidence:.2%})")
     
     # Execute trade
-    result = execute_trade(symbol, signal, confidence, predictions, dry_run)
+    return execute_trade(symbol, signal, confidence, predictions, dry_run, price=price, tf=tf)
+
+
+def process_symbol_tf(symbol: str, tf: str, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Process a single symbol/timeframe combination.
+    
+    Returns:
+        Result dictionary
+    """
+    job, result = prepare_symbol_tf(symbol, tf)
+    if job is None:
+        return result
+    
+    # Get model predictions
+    try:
+        predictions = get_model_predictions(symbol, tf, job.df)
+    except Exception as e:
+        log_error(f"Failed to get predictions: {e}")
+        return {"status": "error", "error": str(e)}
+    
+    return finish_symbol_tf(symbol, tf, predictions, dry_run, price=_last_close(job.df))
+
+
+def run_cycle(symbols: List[str], tfs: List[str], dry_run: bool = False, pause: float = 0.0) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """
+    Process every (symbol, tf) with one batched inference stage.
     
-    return result
+    Feature rows of all due pairs are collected first and scored with one
+    predict call per model artefact (see tools.batch_infer).
+    """
+    with profiler.span("cycle", symbols=len(symbols), tfs=",".join(tfs)):
+        return _run_cycle(symbols, tfs, dry_run, pause)
+
+
+def _run_cycle(symbols: List[str], tfs: List[str], dry_run: bool, pause: float) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    results: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    jobs: List[InferenceJob] = []
+    for symbol in symbols:
+        for tf in tfs:
+            try:
+                with telemetry.stage("prepare", symbol=symbol, tf=tf):
+                    job, result = prepare_symbol_tf(symbol, tf)
+            except Exception as e:
+                log_error(f"Failed to process {symbol} {tf}: {e}")
+                result, job = {"status": "error", "error": str(e)}, None
+            if job is None:
+                results[(symbol, tf)] = result
+            else:
+                jobs.append(job)
+            
+            # Small delay between candle fetches
+            if pause > 0:
+                time.sleep(pause)
+    
+    for tf in tfs:
+        try:
+            cov_engine.get_engine(tf).commit()
+        except Exception as e:
+            log_error(f"Covariance update failed for {tf}: {e}")
+    
+    if not jobs:
+        return results
+    
+    try:
+        if not _ml_features_available or compute_features is None:
+            raise RuntimeError("ML features not available")
+        if not _joblib_available:
+            raise RuntimeError("joblib not available")
+        with telemetry.stage("predict_batch", jobs=len(jobs)):
+            preds = predict_batch(jobs, model_dir=META_DIR, feature_fn=compute_features, loader=joblib_load)
+    except Exception as e:
+        log_error(f"Batched inference failed: {e}")
+        for job in jobs:
+            results[job.key] = {"status": "error", "error": str(e)}
+        return results
+    
+    for job in jobs:
+        for err in job.errors:
+            log_warning(f"{job.symbol} {job.tf}: {err}")
+        try:
+            with telemetry.stage("finish", symbol=job.symbol, tf=job.tf):
+                results[job.key] = finish_symbol_tf(job.symbol, job.tf, preds.get(job.key, {}), dry_run,
+                                                    price=_last_close(job.df))
+        except Exception as e:
+            log_error(f"Failed to process {job.symbol} {job.tf}: {e}")
+            results[job.key] = {"status": "error", "error": str(e)}
+    return results
 
 
 def run_once(symbol: str, tf: str, dry_run: bool = False):
@@ -472,25 +571,109 @@ def run_once(symbol: str, tf: str, dry_run: bool = False):
         traceback.print_exc()
 
 
-def run_daemon(symbols: List[str], tfs: List[str], interval: int = 300, dry_run: bool = False):
+def _log_cycle(results: Dict[Tuple[str, str], Dict[str, Any]]):
+    for (symbol, tf), result in results.items():
+        log_info(f"{symbol} {tf}: {result.get('status')}")
+
+
+def _on_stop_hit(symbol: str, reason: str, price: float, pos: Dict[str, Any]):
+    """watch_stops callback: record and announce a broker position crossing its SL/TP."""
+    log_warning(f"{reason} hit for {symbol} at {price} (sl={pos.get('sl')} tp={pos.get('tp')})")
+    log_order({"timestamp": int(time.time()), "symbol": symbol, "signal": reason, "status": "stop_hit",
+               "price": price, "position": pos})
+    notify_telegram(f"⛔ {reason} {symbol} @ {price}")
+
+
+def _broker_keys(symbols: List[str], resolve: bool) -> Dict[str, str]:
+    """
+    Map stream symbols to the keys sync_positions stores broker positions under.
+    
+    Quotes carry the CLI symbol ("BTC/USD", "XAUUSD") while the broker book is
+    keyed by the uppercased epic ("BTCUSD", "GOLD"). With resolve=True the epic
+    comes from tools.capital_session (cached, may log in once); otherwise, or on
+    failure, from the display-symbol override table.
+    """
+    keys = {}
+    for s in symbols:
+        key = get_display_symbol(s)
+        if resolve and _capital_available:
+            try:
+                from tools.capital_session import _resolve_epic
+                key = _resolve_epic(s)
+            except Exception as e:
+                log_warning(f"epic lookup failed for {s}: {e}")
+        keys[s] = key.upper().replace("/", "")
+    return keys
+
+
+def start_market_stream(symbols: List[str], transport: str = STREAM_TRANSPORT, on_hit=None):
+    """
+    Start the push market-data stream for the daemon.
+    
+    The stream becomes the process default (tools.prices, vol_service and
+    cov_engine read from it) and tools.risk_guard.watch_stops checks the
+    broker positions from tools.state_store against every quote. Hits are
+    recorded and announced only; the broker's own SL/TP closes the position.
+    
+    Returns:
+        (stream, stop) or (None, no-op) when transport is empty
+    """
+    if not transport:
+        return None, lambda: None
+    from tools import market_stream, risk_guard
+    kinds = {"ws": market_stream.CapitalWebsocketTransport, "poll": market_stream.PollingTransport,
+             "sim": market_stream.SimulatedTransport}
+    if transport not in kinds:
+        raise ValueError(f"unknown STREAM_TRANSPORT {transport!r} (expected one of {sorted(kinds)})")
+    stream = market_stream.MarketStream(kinds[transport](list(symbols)))
+    keys = _broker_keys(list(symbols), resolve=transport == "ws")
+    unsub = risk_guard.watch_stops(stream, lambda: state_store.all_positions("broker"), on_hit or _on_stop_hit,
+                                   key_fn=lambda s: keys.get(s, s))
+    market_stream.set_default_stream(stream)
+    stream.start()
+    log_info(f"Market stream started ({transport}) for {len(symbols)} symbols")
+    
+    def stop():
+        unsub()
+        market_stream.set_default_stream(None)
+        stream.stop()
+    return stream, stop
+
+
+def run_daemon(symbols: List[str], tfs: List[str], interval: int = 300, dry_run: bool = False, align_bars: bool = False,
+               stream: str = STREAM_TRANSPORT):
     """Run trade engine in daemon mode."""
     log_info(f"=== Trade Engine Start (daemon) ===")
-    log_info(f"Symbols: {symbols}, TFs: {tfs}, Interval: {interval}s, DRY_RUN: {dry_run}")
-    
-    while True:
-        for symbol in symbols:
-            for tf in tfs:
-                try:
-                    result = process_symbol_tf(symbol, tf, dry_run)
-                    log_info(f"{symbol} {tf}: {result.get('status')}")
-                except Exception as e:
-                    log_error(f"Failed to process {symbol} {tf}: {e}")
-                
-                # Small delay between symbols
-                time.sleep(2)
+    log_info(f"Symbols: {symbols}, TFs: {tfs}, Interval: {interval}s, DRY_RUN: {dry_run}, ALIGN: {align_bars}, STREAM: {stream or 'off'}")
+    
+    _stream, stop_stream = start_market_stream(symbols, stream)
+    try:
+        if align_bars:
+            run_daemon_aligned(symbols, tfs, dry_run)
+            return
         
-        log_info(f"Cycle complete, sleeping {interval}s")
-        time.sleep(interval)
+        while True:
+            _log_cycle(run_cycle(symbols, tfs, dry_run, pause=2))
+            
+            log_info(f"Cycle complete, sleeping {interval}s")
+            time.sleep(interval)
+    finally:
+        stop_stream()
+
+
+def run_daemon_aligned(symbols: List[str], tfs: List[str], dry_run: bool = False):
+    """Run one batched cycle per TF shortly after each bar close (see tools.bar_scheduler)."""
+    import asyncio
+    from tools.bar_scheduler import BarScheduler
+    
+    sched = BarScheduler()
+    for tf in tfs:
+        def _job(tf=tf):
+            _log_cycle(run_cycle(symbols, [tf], dry_run, pause=2))
+            st = sched.stats().get(f"cycle_{tf}", {})
+            log_info(f"Cycle {tf} started {st.get('last_late_ms', 0.0):.0f}ms after bar close")
+        sched.add_job(tf, _job, name=f"cycle_{tf}")
+    asyncio.run(sched.run())
 
 
 def main():
@@ -502,8 +685,12 @@ def main():
     parser.add_argument("--daemon", action="store_true", help="Run in daemon mode")
     parser.add_argument("--interval", type=int, default=300, help="Daemon interval in seconds (default: 300)")
     parser.add_argument("--dry-run", action="store_true", help="Dry run mode (no actual orders)")
+    parser.add_argument("--align-bars", action="store_true", help="Daemon: run each TF right after its bar close instead of every --interval")
+    parser.add_argument("--stream", choices=["ws", "poll", "sim"], default=STREAM_TRANSPORT or None,
+                        help="Daemon: push market data + SL/TP watch over this transport (default: STREAM_TRANSPORT)")
     
     args = parser.parse_args()
+    profiler.install("trade_engine")
     
     # Override DRY_RUN if specified
     dry_run = DRY_RUN or args.dry_run
@@ -513,7 +700,7 @@ def main():
     elif args.daemon:
         symbols = [s.strip() for s in args.symbol.split(",")]
         tfs = [t.strip() for t in args.tf.split(",")]
-        run_daemon(symbols, tfs, args.interval, dry_run)
+        run_daemon(symbols, tfs, args.interval, dry_run, align_bars=args.align_bars, stream=args.stream or "")
     else:
         # Default to run-once
         run_once(args.symbol, args.tf, dry_run)
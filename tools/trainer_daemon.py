@@ -6,6 +6,12 @@ from datetime import datetime, timezone
 import pandas as pd
 from ohlcv_bridge import get_ohlcv
 
+# ajetaan suoraan tools/-hakemistosta (systemd: python tools/trainer_daemon.py): 'tools' löytyy juuresta
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+from tools import profiler, news_calendar, support_resistance
+
 # Valinnaiset kirjastot
 try:
     import xgboost as xgb  # type: ignore
@@ -52,22 +58,7 @@ def _news_windows_from_env() -> list[tuple[int, int]]:
     Palauttaa minuutti-offset-ikkunat UTC-päivän sisällä [(min_start, min_end), ...].
     Esim: "CPI@13:30Z±30;FOMC@18:00Z±45" -> [(13*60+30-30, 13*60+30+30), (18*60-45, 18*60+45)]
     """
-    raw = os.environ.get("NEWS_WINDOWS", "")  # puolipiste-erottelu
-    res = []
-    if not raw:
-        return res
-    parts = [p.strip() for p in raw.split(";") if p.strip()]
-    for p in parts:
-        try:
-            at = p.split("@", 1)[1]
-            hhmm, span = at.split("Z", 1)[0], p.split("±", 1)[1]
-            hh, mm = hhmm.split(":")
-            minute = int(hh) * 60 + int(mm)
-            span = int(span)
-            res.append((minute - span, minute + span))
-        except Exception:
-            continue
-    return res
+    return news_calendar.parse_news_windows(os.environ.get("NEWS_WINDOWS", ""))
 
 # ----------------------------- featurenrakennus -----------------------------
 
@@ -109,16 +100,11 @@ def _vol_regime(atr: pd.Series) -> pd.Series:
     return bins  # 0=low,1=med,2=high
 
 def _news_dummy(idx: pd.DatetimeIndex) -> pd.Series:
-    windows = _news_windows_from_env()
-    if not windows:
+    # vain toistuvat NEWS_WINDOWS-ikkunat (mallin vanha feature); schedule-tapahtumat -> NEWS_FEATURES
+    cal = news_calendar.NewsCalendar(os.environ.get("NEWS_WINDOWS", ""))
+    if not len(cal):
         return pd.Series(index=idx, data=0.0)
-    # mapataan päivän minuuttiin (UTC)
-    mins = (idx.tz_convert("UTC") if idx.tz is not None else idx.tz_localize("UTC")).hour * 60 + \
-           (idx.tz_convert("UTC") if idx.tz is not None else idx.tz_localize("UTC")).minute
-    mask = np.zeros(len(idx), dtype=float)
-    for s, e in windows:
-        mask = np.logical_or(mask, np.logical_and(mins >= s, mins <= e))
-    return pd.Series(mask.astype(float), index=idx)
+    return pd.Series(cal.blackout_mask(idx).astype(float), index=idx)
 
 def build_features(symbol: str, tf: str):
     """
@@ -152,6 +138,19 @@ def build_features(symbol: str, tf: str):
 
     # Uutisikkuna dummy
     df["news"] = _news_dummy(df.index)
+    extra_feats = []
+    if _env_bool("NEWS_FEATURES", False):  # muuttaa mallin featurejoukkoa -> opt-in
+        nf = news_calendar.get_calendar().features(df.index)
+        extra_feats = ["news_blackout", "news_min_to_next", "news_min_since_last", "news_next_impact"]
+        for c in extra_feats:
+            df[c] = nf[c].to_numpy()
+    if _env_bool("SR_FEATURES", False):  # S/R-etäisyydet, samoin opt-in
+        sf = support_resistance.sr_features(df)
+        # ei tasoa -> "kaukana" / 0 pivotia, jotta dropna ei pudota rivejä
+        sf = sf.fillna({"sr_sup_dist": 1.0, "sr_res_dist": 1.0, "sr_sup_n": 0.0, "sr_res_n": 0.0})
+        extra_feats += list(sf.columns)
+        for c in sf.columns:
+            df[c] = sf[c].to_numpy()
 
     # Jotta ei-äärettömät
     df = df.replace([np.inf, -np.inf], np.nan).dropna()
@@ -178,7 +177,7 @@ def build_features(symbol: str, tf: str):
     y = y.astype(int)
 
     # Feats-matriisi
-    feats = ["ema20", "ema50", "rsi14", "atr14", "rv_par14", "htf_day", "htf_week", "vol_reg", "news"]
+    feats = ["ema20", "ema50", "rsi14", "atr14", "rv_par14", "htf_day", "htf_week", "vol_reg", "news"] + extra_feats
     X = df[feats].astype(float).copy()
     y = y.loc[X.index]
     close = df["close"].loc[X.index]
@@ -413,15 +412,18 @@ def loop():
 
     print(f"[{datetime.now(timezone.utc).isoformat()}] Trainer käynnissä. SYMBOLS={SYMBOLS} TFS={TFS} interval={interval_min}min lookahead={lookahead} xgb={use_xgb}")
 
+    profiler.install("trainer_daemon")
     while True:
-        for sym in SYMBOLS:
-            for tf in TFS:
-                try:
-                    meta, ok = train_symbol_tf(sym, tf)
-                except Exception as e:
-                    traceback.print_exc()
-                    print(f"[ERROR] {sym} {tf}: {e}")
-                    continue
+        with profiler.span("cycle"):
+            for sym in SYMBOLS:
+                for tf in TFS:
+                    try:
+                        with profiler.span("train", symbol=sym, tf=tf):
+                            meta, ok = train_symbol_tf(sym, tf)
+                    except Exception as e:
+                        traceback.print_exc()
+                        print(f"[ERROR] {sym} {tf}: {e}")
+                        continue
         # odotus
         time.sleep(max(60, interval_min * 60))
 
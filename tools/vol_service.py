@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Per-(symbol, tf) volatility state: ATR, realised vol, Parkinson vol.
+
+Each key keeps the last VOL_KEEP_BARS closed bars (high, low, close) plus the
+open time of the newest one. Bars are folded in incrementally:
+
+    svc.update_bar(symbol, tf, start, high, low, close)   # bar close
+    svc.attach(stream)                                    # market_stream "bar" events
+    svc.seed(symbol, tf, df)                              # only closed rows newer than the state
+
+Reads are served from a per-key cache that is invalidated when a bar arrives,
+so repeated atr()/realized_vol() calls between bars are dict lookups:
+
+    svc.atr(symbol, tf, n=14)             SMA of true range (same as risk_guard)
+    svc.atr_ref(symbol, tf, n=14, mult=5) median ATR over the last n*mult bars
+    svc.realized_vol(symbol, tf, n=20)    stdev of log close-to-close returns
+    svc.parkinson_vol(symbol, tf, n=20)   sqrt(mean(ln(H/L)^2) / (4 ln 2))
+
+State is written to state/vol_state.json (atomic, at most every VOL_SAVE_SEC
+seconds and at exit) and reloaded on start.
+
+atr_from_df(df, n) is the one shared ATR formula for callers that only have a
+DataFrame and no (symbol, tf) key.
+"""
+from __future__ import annotations
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tools.bar_scheduler import bar_seconds
+
+ROOT = Path(__file__).resolve().parents[1]
+STATE_PATH = Path(os.getenv("VOL_STATE", str(ROOT / "state" / "vol_state.json")))
+KEEP_BARS = int(os.getenv("VOL_KEEP_BARS", "512"))
+SAVE_SEC = float(os.getenv("VOL_SAVE_SEC", "5"))
+
+_TIME_COLS = ("time", "timestamp", "ts", "date", "datetime", "start")
+
+
+def true_range(h: np.ndarray, l: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """TR; the first bar has no previous close and uses high-low."""
+    prev_c = np.empty_like(c)
+    prev_c[0] = c[0]
+    prev_c[1:] = c[:-1]
+    return np.maximum(h - l, np.maximum(np.abs(h - prev_c), np.abs(l - prev_c)))
+
+
+def atr_from_df(df: pd.DataFrame, n: int = 14) -> Optional[float]:
+    """Latest SMA(n) ATR from a high/low/close frame; None if fewer than n+1 bars."""
+    if df is None or len(df) < n + 1:
+        return None
+    h = df["high"].astype(float).to_numpy()
+    l = df["low"].astype(float).to_numpy()
+    c = df["close"].astype(float).to_numpy()
+    return float(true_range(h, l, c)[-n:].mean())
+
+
+def _epoch_seconds(df: pd.DataFrame) -> Optional[np.ndarray]:
+    cols = {str(c).lower(): c for c in df.columns}
+    col = next((cols[c] for c in _TIME_COLS if c in cols), None)
+    if col is None:
+        if isinstance(df.index, pd.DatetimeIndex):
+            s = pd.Series(df.index)
+        else:
+            return None
+    else:
+        s = df[col]
+    if pd.api.types.is_numeric_dtype(s):
+        v = s.astype("int64").to_numpy()
+        return v // 1000 if len(v) and v.max() > 10**11 else v  # ms -> s
+    t = pd.to_datetime(s, utc=True, errors="coerce")
+    if t.isna().any():
+        return None
+    return ((t - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)).astype("int64").to_numpy()
+
+
+class _Series:
+    __slots__ = ("last", "bars", "version", "cache")
+
+    def __init__(self, keep: int):
+        self.last: Optional[int] = None  # newest bar open time (epoch s)
+        self.bars: Deque[Tuple[float, float, float]] = deque(maxlen=keep)
+        self.version = 0
+        self.cache: Dict[Tuple, Optional[float]] = {}
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        a = np.asarray(self.bars, dtype=float)
+        return a[:, 0], a[:, 1], a[:, 2]
+
+
+class VolService:
+    def __init__(self, path: Optional[Path] = STATE_PATH, keep: int = KEEP_BARS,
+                 loader: Optional[Callable[[str, str], Optional[pd.DataFrame]]] = None,
+                 stamp: Optional[Callable[[str, str], Any]] = None):
+        self.path = Path(path) if path else None
+        self.keep = int(keep)
+        self.loader = loader  # (symbol, tf) -> DataFrame, used to (re)seed a key lazily
+        self.stamp = stamp    # (symbol, tf) -> source version; reseed when it changes
+        self._stamps: Dict[Tuple[str, str], Any] = {}
+        self._s: Dict[Tuple[str, str], _Series] = {}
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._saved_at = 0.0
+        self.load()
+
+    @staticmethod
+    def _key(symbol: str, tf: str) -> Tuple[str, str]:
+        return (str(symbol).upper(), str(tf))
+
+    def _series(self, key: Tuple[str, str]) -> _Series:
+        s = self._s.get(key)
+        if s is None:
+            s = self._s[key] = _Series(self.keep)
+        return s
+
+    # ---- updates ----
+    def update_bar(self, symbol: str, tf: str, start: int, high: float, low: float, close: float) -> bool:
+        """Fold one closed bar; bars not newer than the state are ignored."""
+        key = self._key(symbol, tf)
+        with self._lock:
+            s = self._series(key)
+            start = int(start)
+            if s.last is not None and start <= s.last:
+                return False
+            s.bars.append((float(high), float(low), float(close)))
+            s.last = start
+            s.version += 1
+            s.cache.clear()
+            self._dirty = True
+        self._maybe_save()
+        return True
+
+    def on_bar(self, bar) -> None:
+        """market_stream "bar" subscriber."""
+        self.update_bar(bar.symbol, bar.tf, bar.start, bar.high, bar.low, bar.close)
+
+    def attach(self, stream) -> Callable[[], None]:
+        return stream.subscribe("bar", self.on_bar)
+
+    def seed(self, symbol: str, tf: str, df: pd.DataFrame, now: Optional[float] = None) -> int:
+        """
+        Fold rows of df newer than the state (all rows if the key is new). Returns rows folded.
+        Rows whose bar has not closed yet (start + bar length > now) are left out: the state only
+        holds closed bars, and a forming candle folded here would block the real close later.
+        """
+        if df is None or len(df) == 0:
+            return 0
+        key = self._key(symbol, tf)
+        lower = {str(c).lower(): c for c in df.columns}
+        if not all(c in lower for c in ("high", "low", "close")):
+            return 0
+        h = df[lower["high"]].astype(float).to_numpy()
+        l = df[lower["low"]].astype(float).to_numpy()
+        c = df[lower["close"]].astype(float).to_numpy()
+        ts = _epoch_seconds(df)
+        if ts is not None:
+            t_now = time.time() if now is None else now
+            n_closed = int(np.searchsorted(ts + bar_seconds(tf), t_now, side="right"))
+            if n_closed < len(ts):
+                h, l, c, ts = h[:n_closed], l[:n_closed], c[:n_closed], ts[:n_closed]
+        with self._lock:
+            s = self._series(key)
+            if ts is None:
+                # ilman aikasaraketta ei voi tietää mitkä rivit ovat uusia -> korvaa tila
+                s = self._s[key] = _Series(self.keep)
+                i0, ts = max(0, len(df) - self.keep), np.arange(len(df))
+            else:
+                i0 = 0 if s.last is None else int(np.searchsorted(ts, s.last, side="right"))
+                i0 = max(i0, len(ts) - self.keep)
+            if i0 >= len(ts):
+                return 0
+            s.bars.extend(zip(h[i0:].tolist(), l[i0:].tolist(), c[i0:].tolist()))
+            s.last = int(ts[-1])
+            s.version += 1
+            s.cache.clear()
+            self._dirty = True
+        self._maybe_save()
+        return len(ts) - i0
+
+    def _refresh(self, key: Tuple[str, str]):
+        """Lazy (re)seed through loader when the key is unknown or its source stamp moved."""
+        if self.loader is None:
+            return
+        st = self.stamp(*key) if self.stamp else None
+        if key in self._s and (self.stamp is None or self._stamps.get(key) == st):
+            return
+        try:
+            df = self.loader(*key)
+        except Exception:
+            df = None
+        self._stamps[key] = st
+        if df is not None:
+            self.seed(key[0], key[1], df)
+
+    # ---- reads ----
+    def _cached(self, symbol: str, tf: str, name: str, args: Tuple, fn) -> Optional[float]:
+        key = self._key(symbol, tf)
+        self._refresh(key)
+        s = self._s.get(key)
+        if s is None or not s.bars:
+            return None
+        ck = (name,) + args
+        if ck in s.cache:
+            return s.cache[ck]
+        with self._lock:
+            h, l, c = s.arrays()
+            try:
+                v = fn(h, l, c)
+            except Exception:
+                v = None
+            v = None if v is None or not math.isfinite(v) else float(v)
+            s.cache[ck] = v
+        return v
+
+    def atr(self, symbol: str, tf: str, n: int = 14) -> Optional[float]:
+        def f(h, l, c):
+            if len(c) < n + 1:
+                return None
+            return true_range(h, l, c)[-n:].mean()
+        return self._cached(symbol, tf, "atr", (n,), f)
+
+    def atr_ref(self, symbol: str, tf: str, n: int = 14, mult: int = 5) -> Optional[float]:
+        def f(h, l, c):
+            if len(c) < n + 1:
+                return None
+            tr = true_range(h, l, c)
+            cs = np.concatenate(([0.0], np.cumsum(tr)))
+            atrs = (cs[n:] - cs[:-n]) / n
+            return float(np.median(atrs[-min(len(atrs), n * mult):]))
+        return self._cached(symbol, tf, "atr_ref", (n, mult), f)
+
+    def realized_vol(self, symbol: str, tf: str, n: int = 20) -> Optional[float]:
+        def f(h, l, c):
+            if len(c) < n + 1 or np.any(c[-n - 1:] <= 0):
+                return None
+            return np.diff(np.log(c[-n - 1:])).std(ddof=1)
+        return self._cached(symbol, tf, "rv", (n,), f)
+
+    def parkinson_vol(self, symbol: str, tf: str, n: int = 20) -> Optional[float]:
+        def f(h, l, c):
+            if len(c) < n or np.any(l[-n:] <= 0):
+                return None
+            return math.sqrt(np.mean(np.log(h[-n:] / l[-n:]) ** 2) / (4.0 * math.log(2.0)))
+        return self._cached(symbol, tf, "pk", (n,), f)
+
+    def bars(self, symbol: str, tf: str) -> int:
+        s = self._s.get(self._key(symbol, tf))
+        return len(s.bars) if s else 0
+
+    def last_bar_time(self, symbol: str, tf: str) -> Optional[int]:
+        s = self._s.get(self._key(symbol, tf))
+        return s.last if s else None
+
+    # ---- persistence ----
+    def load(self):
+        if not self.path or not self.path.exists():
+            return
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception:
+            return
+        with self._lock:
+            for k, v in (raw.get("series") or {}).items():
+                sym, _, tf = k.partition("|")
+                s = _Series(self.keep)
+                s.bars.extend(tuple(b) for b in v.get("bars", []))
+                s.last = v.get("last")
+                self._s[(sym, tf)] = s
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {"version": 1, "series": {f"{k[0]}|{k[1]}": {"last": s.last, "bars": list(s.bars)}
+                                             for k, s in self._s.items()}}
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def _maybe_save(self):
+        if self._dirty and time.monotonic() - self._saved_at >= SAVE_SEC:
+            try:
+                self.save()
+            except Exception as e:
+                print(f"[VOL] save failed: {e}", flush=True)
+
+    def flush(self):
+        if self._dirty:
+            self.save()
+
+
+_default: Optional[VolService] = None
+_dlock = threading.Lock()
+
+
+def get_service() -> VolService:
+    """Process-wide service backed by data/history (risk_guard layout) and state/vol_state.json."""
+    global _default
+    if _default is None:
+        with _dlock:
+            if _default is None:
+                _default = VolService(loader=_history_loader, stamp=_history_stamp)
+                atexit.register(_default.flush)
+    return _default
+
+
+def set_service(svc: Optional[VolService]):
+    global _default
+    _default = svc
+
+
+def _history_paths(symbol: str, tf: str):
+    from tools import risk_guard
+    base = risk_guard.HIST / f"{symbol.upper()}_{tf}"
+    return base.with_suffix(".parquet"), base.with_suffix(".csv")
+
+
+def _history_stamp(symbol: str, tf: str):
+    for p in _history_paths(symbol, tf):
+        try:
+            st = p.stat()
+            return (str(p), st.st_mtime_ns, st.st_size)
+        except OSError:
+            continue
+    return None
+
+
+def _history_loader(symbol: str, tf: str) -> Optional[pd.DataFrame]:
+    from tools import risk_guard
+    df = risk_guard._load_df(symbol, tf)
+    return None if df is None else risk_guard._norm_cols(df)
+
+
+def atr(symbol: str, tf: str, n: int = 14, df: Optional[pd.DataFrame] = None) -> Optional[float]:
+    """ATR for (symbol, tf); closed bars of df (if given) are folded in first, so callers with fresh candles stay current."""
+    svc = get_service()
+    if df is not None:
+        svc.seed(symbol, tf, df)
+    return svc.atr(symbol, tf, n)
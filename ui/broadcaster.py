@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboardin yhteinen tuottaja: yksi taustasilmukka riippumatta asiakkaiden määrästä.
+
+- Lähdetiedostot tarkistetaan (mtime_ns, size) -leimalla; tiedosto parsitaan vain kun se muuttui.
+- Muutoksesta lasketaan JSON Patch (RFC 6902) edelliseen tilaan ja viesti serialisoidaan
+  kerran; jokaiselle asiakkaalle lähetetään sama merkkijono.
+- Iso equity-sarja harvennetaan (EQUITY_MAX_POINTS) kahden potenssin askeleella, jolloin
+  uusi piste muuttaa vain sarjan häntää ja delta pysyy pienenä. Koko sarja sivutetaan
+  erikseen (page()).
+
+Viestit asiakkaalle:
+    {"type": "snapshot", "version": n, "time": iso, "data": {...}}
+    {"type": "patch",    "version": n, "time": iso, "ops": [...]}
+Hidas asiakas, jonka jono täyttyy, saa seuraavaksi uuden snapshotin. Tiedostot luetaan
+säikeessä, mutta tila ja versio päivitetään tapahtumasilmukassa samalla kun patch
+julkaistaan, joten tilaaja saa joko snapshotin tai patchin, ei molempia; asiakas
+ohittaa silti patchit, joiden versio <= snapshotin versio.
+"""
+from __future__ import annotations
+import asyncio
+import copy
+import datetime
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+EQUITY_MAX_POINTS = int(os.getenv("DASH_EQUITY_MAX_POINTS", "500"))
+POLL_SEC = float(os.getenv("DASH_POLL_SEC", "0.5"))
+CLIENT_QUEUE = int(os.getenv("DASH_CLIENT_QUEUE", "64"))
+
+
+# ---------- JSON Patch ----------
+
+def _esc(key: Any) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def json_patch(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """Minimaalinen RFC 6902 -diff: dictit rekursiivisesti, listat yhteisen alun jälkeen."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops: List[Dict[str, Any]] = []
+        for k in old.keys() - new.keys():
+            ops.append({"op": "remove", "path": f"{path}/{_esc(k)}"})
+        for k, v in new.items():
+            p = f"{path}/{_esc(k)}"
+            if k not in old:
+                ops.append({"op": "add", "path": p, "value": v})
+            elif old[k] != v:
+                ops.extend(json_patch(old[k], v, p))
+        return ops
+    if isinstance(old, list) and isinstance(new, list):
+        n = 0
+        for a, b in zip(old, new):
+            if a != b:
+                break
+            n += 1
+        ops = [{"op": "remove", "path": f"{path}/{i}"} for i in range(len(old) - 1, n - 1, -1)]
+        ops += [{"op": "add", "path": f"{path}/-", "value": v} for v in new[n:]]
+        if len(ops) <= max(1, len(new) // 2):
+            return ops
+    if old == new:
+        return []
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def _parts(path: str) -> List[str]:
+    return [p.replace("~1", "/").replace("~0", "~") for p in path.split("/")[1:]]
+
+
+def apply_patch(doc: Any, ops: List[Dict[str, Any]]) -> Any:
+    """Sovella json_patch()-operaatiot (sama logiikka kuin selaimen applyPatch)."""
+    for op in ops:
+        parts = _parts(op["path"])
+        if not parts:
+            doc = copy.deepcopy(op["value"])
+            continue
+        parent = doc
+        for p in parts[:-1]:
+            parent = parent[int(p)] if isinstance(parent, list) else parent[p]
+        last = parts[-1]
+        if isinstance(parent, list):
+            if op["op"] == "remove":
+                parent.pop(int(last))
+            elif last == "-":
+                parent.append(copy.deepcopy(op["value"]))
+            elif op["op"] == "add":
+                parent.insert(int(last), copy.deepcopy(op["value"]))
+            else:
+                parent[int(last)] = copy.deepcopy(op["value"])
+        else:
+            if op["op"] == "remove":
+                parent.pop(last, None)
+            else:
+                parent[last] = copy.deepcopy(op["value"])
+    return doc
+
+
+# ---------- harvennus ----------
+
+def downsample(seq: List[Any], max_points: int = EQUITY_MAX_POINTS) -> List[Any]:
+    """Joka 2^k:s piste + viimeinen; askel kasvaa vain kun sarja kaksinkertaistuu."""
+    n = len(seq)
+    if max_points <= 0 or n <= max_points:
+        return list(seq)
+    step = 1
+    while (n + step - 1) // step > max_points - 1:
+        step *= 2
+    out = seq[::step]
+    if (n - 1) % step:
+        out.append(seq[-1])
+    return out
+
+
+def equity_view(doc: Any) -> Any:
+    if isinstance(doc, dict) and isinstance(doc.get("entries"), list):
+        entries = doc["entries"]
+        return dict(doc, entries=downsample(entries), total=len(entries))
+    return doc
+
+
+def _jload(p: Path) -> Any:
+    try:
+        with open(p, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+# ---------- tuottaja ----------
+
+class Broadcaster:
+    def __init__(self, sources: Dict[str, Path], views: Optional[Dict[str, Callable[[Any], Any]]] = None,
+                 poll_sec: float = POLL_SEC, queue_size: int = CLIENT_QUEUE):
+        self.sources = {k: Path(v) for k, v in sources.items()}
+        self.views = views or {}
+        self.poll_sec = poll_sec
+        self.queue_size = queue_size
+        self.state: Dict[str, Any] = {k: {} for k in self.sources}
+        self.raw: Dict[str, Any] = {k: {} for k in self.sources}
+        self.version = 0
+        self.parses = 0
+        self._stamps: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._clients: List[asyncio.Queue] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.datetime.utcnow().isoformat() + "Z"
+
+    def _stamp(self, p: Path) -> Optional[Tuple[int, int]]:
+        try:
+            st = p.stat()
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _read(self) -> List[Tuple[str, Any, Any]]:
+        """Lue muuttuneet tiedostot (kerran per muutos); ei koske tilaan, ajetaan säikeessä."""
+        changed: List[Tuple[str, Any, Any]] = []
+        for name, p in self.sources.items():
+            st = self._stamp(p)
+            if name in self._stamps and st == self._stamps[name]:
+                continue
+            self._stamps[name] = st
+            raw = _jload(p) if st is not None else {}
+            self.parses += 1
+            changed.append((name, raw, self.views.get(name, lambda d: d)(raw)))
+        return changed
+
+    def _apply(self, changed: List[Tuple[str, Any, Any]]) -> List[Dict[str, Any]]:
+        """Päivitä tila + versio ja palauta patch-operaatiot (tapahtumasilmukassa ennen publish())."""
+        ops: List[Dict[str, Any]] = []
+        for name, raw, view in changed:
+            ops.extend(json_patch(self.state[name], view, f"/{_esc(name)}"))
+            self.raw[name], self.state[name] = raw, view
+        if ops:
+            self.version += 1
+        return ops
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """Lue muuttuneet tiedostot ja palauta patch-operaatiot (synkroninen _read + _apply)."""
+        return self._apply(self._read())
+
+    def snapshot_message(self) -> str:
+        return json.dumps({"type": "snapshot", "version": self.version, "time": self._now(), "data": self.state})
+
+    def subscribe(self) -> Tuple[str, "asyncio.Queue"]:
+        q: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._clients.append(q)
+        return self.snapshot_message(), q
+
+    def unsubscribe(self, q: "asyncio.Queue"):
+        if q in self._clients:
+            self._clients.remove(q)
+
+    @property
+    def clients(self) -> int:
+        return len(self._clients)
+
+    def publish(self, ops: List[Dict[str, Any]]):
+        if not ops:
+            return
+        msg = json.dumps({"type": "patch", "version": self.version, "time": self._now(), "ops": ops})
+        snap = None
+        for q in list(self._clients):
+            try:
+                q.put_nowait(msg)
+            except asyncio.QueueFull:
+                # hidas asiakas: tyhjennä jono ja anna tilalle tuore snapshot
+                while not q.empty():
+                    q.get_nowait()
+                snap = snap or self.snapshot_message()
+                q.put_nowait(snap)
+
+    def page(self, name: str, key: str, offset: int = 0, limit: int = 1000) -> Dict[str, Any]:
+        """Raakasarjan sivu (esim. equity entries) ilman harvennusta."""
+        seq = (self.raw.get(name) or {}).get(key) or []
+        offset, limit = max(0, int(offset)), max(1, min(int(limit), 10000))
+        return {"total": len(seq), "offset": offset, "limit": limit, key: seq[offset:offset + limit]}
+
+    async def run(self):
+        while True:
+            try:
+                changed = await asyncio.to_thread(self._read)
+                self.publish(self._apply(changed))
+            except Exception as e:
+                print(f"[DASH] broadcaster poll failed: {e}", flush=True)
+            await asyncio.sleep(self.poll_sec)
+
+    def start(self) -> "asyncio.Task":
+        if self._task is None or self._task.done():
+            self.poll()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
@@ -7,12 +7,14 @@ CapitalBot Dashboard v13 Pro
 ✅ Tilin saldon/oman pääoman graafi (1 h / 1 d / 1 kk)
 """
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Query, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
 import json, asyncio, datetime, math
 
+from ui.broadcaster import Broadcaster, equity_view as _equity_bus_view
+
 BASE = Path(__file__).resolve().parents[1]
 DATA = BASE / "data"
 LOGS = BASE / "logs"
@@ -20,40 +22,76 @@ LOGS = BASE / "logs"
 app = FastAPI(title="CapitalBot Dashboard v13 Pro")
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
+# Yksi tuottaja kaikille asiakkaille: tiedostot luetaan vain muuttuessaan, asiakkaille deltat
+BUS = Broadcaster(
+    {
+        "positions": DATA/"open_positions.json",
+        "risk": DATA/"risk_state.json",
+        "train": DATA/"train_history.json",
+        "equity": DATA/"equity_history.json",
+    },
+    views={"equity": _equity_bus_view},
+)
+
 def jload(p):
     try: return json.load(open(p))
     except: return {}
 
+@app.on_event("startup")
+async def _start_bus():
+    BUS.start()
+
 @app.get("/status")
 def status():
-    return JSONResponse({
-        "time": datetime.datetime.utcnow().isoformat()+"Z",
-        "positions": jload(DATA/"open_positions.json"),
-        "risk": jload(DATA/"risk_state.json"),
-        "train": jload(DATA/"train_history.json"),
-        "equity": jload(DATA/"equity_history.json")
-    })
+    return JSONResponse(dict(BUS.state, time=datetime.datetime.utcnow().isoformat()+"Z"))
+
+@app.get("/equity")
+def equity_page(offset: int = 0, limit: int = 1000):
+    """Raaka equity-sarja sivuittain tools.equity_storesta (websocket lähettää harvennetun näkymän)."""
+    from tools import equity_store
+    return JSONResponse(equity_store.page(offset, limit))
+
+@app.get("/equity/view")
+def equity_lttb(rng: str = Query("1d", alias="range"), points: int = 300):
+    """LTTB-harvennettu equity-näkymä tools.equity_storesta (range: 1h/1d/1mo tai sekunteina)."""
+    from tools import equity_store
+    span = equity_store.VIEWS.get(rng)
+    if span is None:
+        try: span = float(rng)
+        except ValueError: span = math.nan
+    if not (math.isfinite(span) and span > 0):
+        return JSONResponse({"error": f"invalid range {rng!r}: use 1h/1d/1mo or seconds > 0"}, status_code=400)
+    return JSONResponse(equity_store.view(span, max(3, min(points, 2000))))
+
+@app.get("/equity/ohlc")
+def equity_ohlc(res: str = "1h", since: float = None, until: float = None):
+    from tools import equity_store
+    return JSONResponse(equity_store.ohlc(res, since, until))
+
+@app.get("/telemetry")
+def telemetry_events(kind: str = None, since: float = None, until: float = None, limit: int = 500):
+    from dataclasses import asdict
+    from tools import telemetry
+    return JSONResponse([asdict(e) for e in telemetry.query(kind, since, until, limit)])
+
+@app.get("/telemetry/stages")
+def telemetry_stages(since: float = None):
+    from dataclasses import asdict
+    from tools import telemetry
+    return JSONResponse({k: asdict(v) for k, v in telemetry.stage_summary(since).items()})
 
 @app.websocket("/ws")
 async def ws(websocket: WebSocket):
     await websocket.accept()
-    last_hash = ""
+    snap, q = BUS.subscribe()
     try:
+        await websocket.send_text(snap)
         while True:
-            data = {
-                "time": datetime.datetime.utcnow().isoformat()+"Z",
-                "positions": jload(DATA/"open_positions.json"),
-                "risk": jload(DATA/"risk_state.json"),
-                "train": jload(DATA/"train_history.json"),
-                "equity": jload(DATA/"equity_history.json")
-            }
-            h = hash(json.dumps(data))
-            if h != last_hash:
-                await websocket.send_json(data)
-                last_hash = h
-            await asyncio.sleep(2)
+            await websocket.send_text(await q.get())
     except WebSocketDisconnect:
         pass
+    finally:
+        BUS.unsubscribe(q)
 
 @app.get("/", response_class=HTMLResponse)
 def home():
@@ -83,7 +121,9 @@ canvas{background:#10121c;border-radius:8px;padding:6px}
 
 <div class="grid">
   <div class="card"><h2>Sharpe History</h2><canvas id="sharpe"></canvas></div>
-  <div class="card"><h2>Equity Growth</h2><canvas id="equity"></canvas></div>
+  <div class="card"><h2>Equity Growth
+    <select id="eqrange" class="small"><option value="1h">1 h</option><option value="1d">1 d</option><option value="1mo" selected>1 kk</option></select>
+  </h2><canvas id="equity"></canvas></div>
 </div>
 
 <div class="card">
@@ -103,13 +143,42 @@ const ctxE=document.getElementById('equity').getContext('2d');
 let sharpeChart=new Chart(ctxS,{type:'line',data:{labels:[],datasets:[{label:'Sharpe',borderColor:'#72e2ff',fill:false,tension:0.4,data:[]}]},options:{scales:{x:{ticks:{color:'#888'}},y:{ticks:{color:'#888'}}}}});
 let equityChart=new Chart(ctxE,{type:'line',data:{labels:[],datasets:[{label:'Equity €',borderColor:'#00ff9c',fill:false,tension:0.3,data:[]}]},options:{scales:{x:{ticks:{color:'#888'}},y:{ticks:{color:'#888'}}}}});
 
+// JSON Patch (RFC 6902, add/remove/replace) palvelimen deltoille
+let state={};
+function applyPatch(doc,ops){
+  for(const op of ops){
+    const parts=op.path.split('/').slice(1).map(p=>p.replace(/~1/g,'/').replace(/~0/g,'~'));
+    if(!parts.length){doc=op.value;continue;}
+    let parent=doc;
+    for(const p of parts.slice(0,-1)) parent=parent[Array.isArray(parent)?+p:p];
+    const last=parts[parts.length-1];
+    if(Array.isArray(parent)){
+      if(op.op==='remove') parent.splice(+last,1);
+      else if(last==='-') parent.push(op.value);
+      else if(op.op==='add') parent.splice(+last,0,op.value);
+      else parent[+last]=op.value;
+    }else if(op.op==='remove') delete parent[last];
+    else parent[last]=op.value;
+  }
+  return doc;
+}
+
+let version=-1;
 ws.onmessage=ev=>{
-  let d=JSON.parse(ev.data);
-  document.getElementById("clock").textContent="Updated "+new Date(d.time).toLocaleTimeString();
+  let m=JSON.parse(ev.data);
+  if(m.type!=='snapshot'&&m.version<=version) return;  // jo snapshotissa mukana
+  version=m.version;
+  state=(m.type==='snapshot')?m.data:applyPatch(state,m.ops);
+  document.getElementById("clock").textContent="Updated "+new Date(m.time).toLocaleTimeString();
+  render(state);
+};
+document.getElementById('eqrange').onchange=()=>render(state);
+
+function render(d){
 
   // Positions
   let tb=document.querySelector("#pos tbody");tb.innerHTML='';
-  for(let [sym,v] of Object.entries(d.positions.positions||{})){
+  for(let [sym,v] of Object.entries((d.positions||{}).positions||{})){
     let tr=document.createElement('tr');
     tr.innerHTML=`<td>${sym}</td><td class="pos-${v.side}">${v.side}</td><td>${v.size}</td><td>${v.entry||'-'}</td><td>${v.tp||'-'}</td><td>${v.sl||'-'}</td><td>${(v.pnl_pct||0).toFixed(2)}%</td>`;
     tb.appendChild(tr);
@@ -130,11 +199,12 @@ ws.onmessage=ev=>{
   sharpeChart.update();
 
   // Equity
-  let eq=d.equity.entries||[];
+  let eqd=d.equity||{}, rng=document.getElementById('eqrange').value;
+  let eq=(eqd.views&&eqd.views[rng])||eqd.entries||[];
   equityChart.data.labels=eq.map(x=>x.timestamp);
   equityChart.data.datasets[0].data=eq.map(x=>x.equity);
   equityChart.update();
-};
+}
 </script>
 </body></html>
 """)